@@ -0,0 +1,104 @@
+# bench/cities_memory_bench.py
+"""
+Память CITIES_DATA (utils/cities_loader.py): полные записи API против CityRecord.
+
+Таблицы собираются из синтетического дампа bench/cities_startup_bench.py и
+сохраняются в pickle; каждый вариант загружается в отдельном свежем процессе
+(как воркер бота читает снимок) — меряется прирост VmRSS и глубокий размер
+CITIES_DATA.
+  raw   — CITIES_DATA хранит словари из дампа целиком (как было)
+  slim  — CityRecord с интернированными кодами стран и часовыми поясами
+
+Без сети и Redis, только Linux (/proc/self/status):
+    python bench/cities_memory_bench.py
+"""
+import argparse
+import builtins
+import gc
+import json
+import pickle
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _rss_kb() -> int:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return 0
+
+
+def _deep_size(obj, seen=None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(v, seen) for v in obj)
+    return size
+
+
+def _prepare(tmp: Path) -> None:
+    """Таблицы обоих вариантов — в pickle, как их читает воркер из снимка."""
+    from bench.cities_startup_bench import _dump
+    from utils import cities_loader as cl
+
+    data = _dump()
+    print_ = builtins.print
+    builtins.print = lambda *a, **k: None
+    try:
+        tables = cl._build_tables(data)
+    finally:
+        builtins.print = print_
+    raw = dict(tables, cities_data={c["code"]: c for c in data if c.get("code") in tables["cities_data"]})
+    for mode, t in (("raw", raw), ("slim", tables)):
+        (tmp / f"{mode}.pkl").write_bytes(pickle.dumps(t, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _child(path: str) -> None:
+    from utils import cities_loader as cl
+
+    blob = Path(path).read_bytes()
+    gc.collect()
+    base = _rss_kb()
+    tables = pickle.loads(blob)
+    del blob
+    builtins.print = lambda *a, **k: None
+    cl._install_tables(tables)
+    del tables
+    gc.collect()
+    sys.stdout.write(json.dumps({"rss_kb": _rss_kb() - base, "cities_data_kb": _deep_size(cl.CITIES_DATA) // 1024,
+                                 "records": len(cl.CITIES_DATA)}) + "\n")
+
+
+def main(args) -> None:
+    rows = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        _prepare(Path(tmp))
+        for mode in ("raw", "slim"):
+            out = subprocess.run([sys.executable, __file__, "--child", str(Path(tmp) / f"{mode}.pkl")],
+                                 capture_output=True, text=True, check=True)
+            rows[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    print(f"записей={rows['slim']['records']}")
+    print(f"{'вариант':>8} {'CITIES_DATA, КБ':>16} {'прирост RSS, КБ':>16}")
+    for mode, r in rows.items():
+        print(f"{mode:>8} {r['cities_data_kb']:>16,} {r['rss_kb']:>16,}")
+    if args.json:
+        print(json.dumps(rows))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--json",  action="store_true")
+    args = parser.parse_args()
+    _child(args.child) if args.child else main(args)
@@ -0,0 +1,98 @@
+# bench/cities_startup_bench.py
+"""
+Бенчмарк загрузки базы городов при старте (utils/cities_loader.load_cities_from_api).
+
+Дамп строится из data/cities_IATA_utf8.csv в формате Travelpayouts cities.json
+(все падежи, переводы, координаты, часовой пояс; indent=2 — как пишет загрузчик)
+и кладётся во временный каталог. Сравниваются:
+  json      — разбор cities_cache.json и сборка таблиц (прежний путь)
+  snapshot  — чтение data/cities_snapshot.bin с готовыми таблицами
+
+Без сети и Redis:
+    python bench/cities_startup_bench.py
+    python bench/cities_startup_bench.py --repeat 5 --json
+"""
+import argparse
+import asyncio
+import builtins
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils import cities_loader as cl
+
+
+def _dump(seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    csv_path = ROOT / "data" / "cities_IATA_utf8.csv"
+    out = []
+    for row in csv_path.read_text(encoding="utf-8-sig").splitlines()[1:]:
+        parts = row.split("|")
+        if len(parts) < 4 or not parts[0].isalpha():
+            continue
+        iata, name = parts[0], parts[3] or parts[2]
+        out.append({
+            "code": iata,
+            "name": name or None,
+            "country_code": rnd.choice(["RU", "TR", "AE", "TH", "US", "DE", "CN", "IT"]),
+            "time_zone": rnd.choice(["Europe/Moscow", "Asia/Novosibirsk", "Europe/Istanbul"]),
+            "coordinates": {"lat": rnd.uniform(-60, 70), "lon": rnd.uniform(-180, 180)},
+            "has_flightable_airport": bool(name) and rnd.random() < 0.9,
+            "cases": {k: name for k in ("su", "ro", "da", "vi", "tv", "pr")} if name else {},
+            "name_translations": {"en": f"{iata.title()} City"},
+        })
+    return out
+
+
+async def _load() -> float:
+    t0 = time.perf_counter()
+    await cl.load_cities_from_api()
+    return time.perf_counter() - t0
+
+
+def main(args) -> None:
+    data = _dump()
+    print_ = builtins.print
+    builtins.print = lambda *a, **k: None  # cities_loader печатает каждый шаг
+    rows = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cl.CACHE_FILE = Path(tmp) / "cities_cache.json"
+            cl.SNAPSHOT_FILE = Path(tmp) / "cities_snapshot.bin"
+            with open(cl.CACHE_FILE, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            cache_kb = cl.CACHE_FILE.stat().st_size // 1024
+
+            best = float("inf")
+            for _ in range(args.repeat):
+                cl.SNAPSHOT_FILE.unlink(missing_ok=True)
+                best = min(best, asyncio.run(_load()))
+            rows["json"] = best
+            expected = dict(cl.CITY_TO_IATA)
+            snap_kb = cl.SNAPSHOT_FILE.stat().st_size // 1024
+
+            rows["snapshot"] = min(asyncio.run(_load()) for _ in range(args.repeat))
+            assert cl.CITY_TO_IATA == expected, "таблицы из снимка расходятся"
+    finally:
+        builtins.print = print_
+
+    print(f"записей={len(data)} названий={len(cl.CITY_TO_IATA)} кэш={cache_kb} КБ снимок={snap_kb} КБ")
+    print(f"{'вариант':>9} {'мс':>8} {'speedup':>8}")
+    for name, sec in rows.items():
+        print(f"{name:>9} {sec * 1000:>8.0f} {rows['json'] / sec:>7.1f}x")
+    if args.json:
+        print(json.dumps({k: round(v * 1000, 1) for k, v in rows.items()}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json",   action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+# bench/fuzzy_index_bench.py
+"""
+Бенчмарк нечёткого поиска города (utils/cities_loader.fuzzy_get_iata).
+
+Справочник: fallback utils/cities.py + названия из data/cities_IATA_utf8.csv
+(≈ размер ответа API с английскими алиасами). Запросы — названия с 0–2
+случайными опечатками. Сравниваются:
+  scan   — прежний линейный проход с _levenshtein по всему CITY_TO_IATA
+  index  — индекс удалений (_fuzzy_lookup)
+
+Без сети и Redis:
+    python bench/fuzzy_index_bench.py
+    python bench/fuzzy_index_bench.py --queries 500 --json
+"""
+import argparse
+import builtins
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from utils import cities_loader as cl
+
+ALPHA = "абвгдежзийклмнопрстуфхцчшщыьэюя "
+
+
+def _load() -> None:
+    cl._load_fallback()
+    csv_path = ROOT / "data" / "cities_IATA_utf8.csv"
+    for row in csv_path.read_text(encoding="utf-8-sig").splitlines()[1:]:
+        parts = row.split("|")
+        if len(parts) > 3 and parts[3] and parts[0].isalpha():
+            cl.CITY_TO_IATA.setdefault(cl._normalize_name(parts[3]), parts[0])
+
+
+def _queries(n: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    names = list(cl.CITY_TO_IATA)
+    out = []
+    while len(out) < n:
+        w = list(rnd.choice(names))
+        for _ in range(rnd.randint(0, 2)):
+            i = rnd.randrange(len(w) + 1)
+            op = rnd.randint(0, 2)
+            if op == 0 and i < len(w):
+                del w[i]
+            elif op == 1:
+                w.insert(i, rnd.choice(ALPHA))
+            elif i < len(w):
+                w[i] = rnd.choice(ALPHA)
+        q = cl._normalize_name("".join(w))
+        if len(q) >= 3:
+            out.append(q)
+    return out
+
+
+def main(args) -> None:
+    print_ = builtins.print
+    builtins.print = lambda *a, **k: None  # cities_loader логирует каждый вызов
+    try:
+        _load()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        cl._build_fuzzy_index()
+        build_sec = time.perf_counter() - t0
+        index_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+
+        queries = _queries(args.queries)
+        rows = {}
+        for name, fn in (("scan", cl._fuzzy_scan), ("index", cl._fuzzy_lookup)):
+            t0 = time.perf_counter()
+            answers = [fn(q, 2) for q in queries]
+            rows[name] = (time.perf_counter() - t0) / len(queries)
+            if name == "scan":
+                expected = answers
+        assert answers == expected, "индекс и линейный проход расходятся"
+    finally:
+        builtins.print = print_
+
+    print(f"названий={len(cl._FUZZY_NAMES)} вариантов={len(cl._FUZZY_INDEX)} "
+          f"сборка={build_sec:.2f}с память≈{index_mb:.1f}МБ запросов={len(queries)}")
+    print(f"{'вариант':>8} {'мкс/запрос':>12} {'speedup':>8}")
+    for name, sec in rows.items():
+        print(f"{name:>8} {sec * 1e6:>12,.0f} {rows['scan'] / sec:>7.0f}x")
+    if args.json:
+        print(json.dumps({k: round(v * 1e6, 1) for k, v in rows.items()}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--json",    action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,148 @@
+# bench/hot_scoring_bench.py
+"""
+Бенчмарк оценки кандидатов горячих предложений (services/hot_scoring.py).
+
+Синтетический цикл: SUBS подписок × ROUTES маршрутов (по умолчанию 50 000 × 15),
+цены и базовые цены уже в CycleStore, у части подписок маршруты на кулдауне.
+Сравниваются:
+  legacy  — прежний цикл _check_hot_sub: маршрут за маршрутом через await,
+            затем первый кандидат не на кулдауне
+  numpy   — hot_scoring.score_subs + Ranked.pick (кулдауны — маской)
+
+Один процесс, одно ядро, без Redis и сети:
+    python bench/hot_scoring_bench.py
+    python bench/hot_scoring_bench.py --subs 50000 --routes 15 --origins 8 --json
+    python bench/hot_scoring_bench.py --distinct-budgets   # худший случай: группа ≈ подписка
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import logging
+logging.disable(logging.WARNING)
+
+from services import hot_scoring
+from services.cycle_store import CycleStore
+from services.hot_deals_sender import DROP_THRESHOLD, _sub_routes
+from services.route_queue import route_key
+
+DEPART = date(2030, 3, 15)
+
+
+def _resolve(sub: dict) -> date:
+    return DEPART
+
+
+def _build(n_subs: int, n_routes: int, n_origins: int, distinct_budgets: bool = False, seed: int = 42):
+    rnd = random.Random(seed)
+    origins = [f"O{i:02d}" for i in range(n_origins)]
+    dests   = [f"D{i:03d}" for i in range(n_routes * 2)]
+    store = CycleStore("Bench")
+    depart = DEPART.strftime("%Y-%m-%d")
+    for o in origins:
+        for d in dests:
+            if rnd.random() < 0.1:
+                store._results[route_key(o, d, depart, None)] = None  # пустой маршрут
+                continue
+            price = rnd.randint(2000, 40000)
+            base = None if rnd.random() < 0.2 else price * rnd.uniform(0.9, 1.3)
+            store._results[route_key(o, d, depart, None)] = {"price": price, "flight": {"value": price}, "baseline": base}
+    # Подписки по «категориям»: небольшое число наборов направлений, как в CATEGORIES
+    pools = [rnd.sample(dests, n_routes) for _ in range(12)]
+    subs = [{
+        "origin_iata": rnd.choice(origins), "category": "custom", "dest_iata_list": rnd.choice(pools),
+        "max_price": (rnd.randint(5000, 40000) if rnd.random() < 0.7 else 0) if distinct_budgets
+                     else rnd.choice([0, 0, 0, 8000, 15000, 25000]),
+    } for _ in range(n_subs)]
+    cooldowns = {
+        f"s{i}": set(rnd.sample(sub["dest_iata_list"], rnd.choice([0, 0, 0, 1, 3])))
+        for i, sub in enumerate(subs)
+    }
+    return store, subs, cooldowns
+
+
+async def _legacy(subs, store, cooldowns):
+    """Прежняя логика _check_hot_sub (кулдауны уже прочитаны, без отправки)."""
+    async def cheapest(o, d, dep):
+        return store.get(o, d, dep)
+
+    out = []
+    for sub in subs:
+        origin_iatas, dest_pool = _sub_routes(sub)
+        depart = _resolve(sub).strftime("%Y-%m-%d")
+        max_price = sub.get("max_price", 0)
+        candidates = []
+        for origin in origin_iatas:
+            for dest in [d for d in dest_pool if d != origin]:
+                res = await cheapest(origin, dest, depart)
+                if not res:
+                    continue
+                price, baseline = res["price"], res.get("baseline")
+                if max_price:
+                    if price > max_price * 1.10:
+                        continue
+                elif baseline is not None and (baseline - price) / baseline < DROP_THRESHOLD:
+                    continue
+                candidates.append((price, origin, dest, res["flight"], baseline))
+        candidates.sort(key=lambda x: x[0])
+        on_cooldown = cooldowns[f"s{len(out)}"]
+        out.append((candidates, next((c for c in candidates if c[2] not in on_cooldown), None)))
+    return out
+
+
+def _vectorized(subs, store, cooldowns):
+    ranked = hot_scoring.score_subs(subs, store, DROP_THRESHOLD, _sub_routes, _resolve)
+    return ranked, ranked.pick([f"s{i}" for i in range(len(subs))], cooldowns)
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(args) -> None:
+    store, subs, cooldowns = _build(args.subs, args.routes, args.origins, args.distinct_budgets)
+    pairs = args.subs * args.routes
+    groups = len(set(hot_scoring._index_routes(subs, store, _sub_routes, _resolve)[3]))
+    print(f"subs={args.subs} routes/sub={args.routes} пар={pairs} origins={args.origins} "
+          f"групп (профиль, бюджет)={groups}")
+
+    rows = {}
+    rows["legacy"] = _time(lambda: asyncio.run(_legacy(subs, store, cooldowns)), args.repeat)
+    rows["numpy"]  = _time(lambda: _vectorized(subs, store, cooldowns), args.repeat)
+
+    # Проверка: те же кандидаты и тот же выбранный маршрут
+    legacy = asyncio.run(_legacy(subs[:2000], store, cooldowns))
+    ranked, chosen = _vectorized(subs[:2000], store, cooldowns)
+    assert all(legacy[i] == (ranked.candidates(i), chosen[i]) for i in range(len(legacy))), "результаты расходятся"
+
+    print(f"{'вариант':>8} {'сек':>8} {'пар/с':>12} {'speedup':>8}")
+    for name, sec in rows.items():
+        print(f"{name:>8} {sec:>8.3f} {pairs / sec:>12,.0f} {rows['legacy'] / sec:>7.1f}x")
+    if args.json:
+        print(json.dumps({k: round(v, 4) for k, v in rows.items()}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subs",    type=int, default=50_000)
+    parser.add_argument("--routes",  type=int, default=15, help="маршрутов на подписку")
+    parser.add_argument("--origins", type=int, default=8,  help="разных городов вылета")
+    parser.add_argument("--repeat",  type=int, default=3)
+    parser.add_argument("--distinct-budgets", action="store_true",
+                        help="почти у каждой подписки свой бюджет (худший случай для группировки)")
+    parser.add_argument("--json",    action="store_true")
+    main(parser.parse_args())
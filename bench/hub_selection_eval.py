@@ -0,0 +1,135 @@
+# bench/hub_selection_eval.py
+"""
+Офлайн-оценка выбора хабов (services/hub_selector.py) на журнале наблюдений.
+
+Журнал — LIST hubobs в Redis (record_outcome), по строке JSON на перебор:
+    {"ts": ..., "side": "from", "iata": "MOW", "day": "2026-03-15",
+     "prices": {"IST": 8000, "AER": 0, ...}}       0 — пустой ответ
+Выгрузка:
+    redis-cli --raw LRANGE flight_bot:prod:hubobs 0 -1 > hubobs.jsonl
+
+Наблюдения проигрываются по времени. В каждом переборе политика выбирает
+кандидатов только среди записанных в нём (остальные неизвестны) и учится
+лишь на том, что выбрала сама — как в проде. Политики:
+  all       — все кандидаты (прежнее поведение: весь статичный список)
+  static    — первые --budget из статичного порядка
+  adaptive  — select_candidates по статистике предыдущих переборов
+Метрики: запросов на перебор, доля переборов с найденным билетом, отношение
+лучшей найденной цены к лучшей в переборе, покрытие топ-5 дешёвых.
+
+Без журнала — синтетические наблюдения (у каждого города свои «живые» хабы):
+    python bench/hub_selection_eval.py
+    python bench/hub_selection_eval.py --log hubobs.jsonl --budget 12 --json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from services.everywhere_engine import HUBS
+from services.hub_selector import select_candidates
+
+EMPTY_TTL = 48 * 3600  # как route_empty
+TOP_N = 5
+
+
+def _synthetic(searches: int, seed: int) -> list:
+    """Города с разными наборами непустых хабов и своим уровнем цен на каждом."""
+    rnd = random.Random(seed)
+    cities = ["MOW", "LED", "KZN", "OVB", "SVX", "KJA", "VOG", "MRV", "IKT", "TJM"]
+    profile = {}
+    for city in cities:
+        for hub in HUBS:
+            alive = rnd.random() < (0.8 if city in ("MOW", "LED") else 0.35)
+            profile[city, hub] = (alive, rnd.uniform(4000, 40000))
+    entries, ts = [], 1_760_000_000
+    for _ in range(searches):
+        ts += rnd.randint(600, 7200)
+        city = rnd.choice(cities)
+        prices = {}
+        for hub in HUBS:
+            if hub == city:
+                continue
+            alive, base = profile[city, hub]
+            prices[hub] = int(base * rnd.lognormvariate(0, 0.15)) if alive and rnd.random() < 0.9 else 0
+        entries.append({"ts": ts, "side": "from", "iata": city, "day": "", "prices": prices})
+    return entries
+
+
+def _load(path: str) -> list:
+    entries = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+    return sorted(entries, key=lambda e: e["ts"])
+
+
+def _score(chosen: list, prices: dict) -> tuple:
+    found = sorted(prices[c] for c in chosen if prices[c])
+    best_all = sorted(p for p in prices.values() if p)
+    if not best_all:
+        return None
+    ratio = best_all[0] / found[0] if found else 0.0
+    top = {c for c, p in sorted(((c, p) for c, p in prices.items() if p), key=lambda x: x[1])[:TOP_N]}
+    return bool(found), ratio, len(top & set(chosen)) / len(top)
+
+
+def main(args) -> None:
+    entries = _load(args.log) if args.log else _synthetic(args.searches, args.seed)
+    rng = random.Random(args.seed)
+    stats, series, empty_at = {}, {}, {}
+    rows = {name: {"calls": [], "hit": [], "ratio": [], "top": []} for name in ("all", "static", "adaptive")}
+
+    for e in entries:
+        key = (e["side"], e["iata"])
+        prices = e["prices"]
+        logged = [h for h in HUBS if h in prices] + [c for c in prices if c not in HUBS]
+        st = stats.setdefault(key, {})
+        empty = {c for c in logged if e["ts"] - empty_at.get((key, c), -EMPTY_TTL) < EMPTY_TTL}
+        medians = {c: statistics.median(p) for (k, c), p in series.items() if k == key}
+        picks = {
+            "all":      logged,
+            "static":   logged[:args.budget],
+            "adaptive": select_candidates(logged, args.budget, st, medians, empty, rng=rng),
+        }
+        for name, chosen in picks.items():
+            res = _score(chosen, prices)
+            rows[name]["calls"].append(len(chosen))
+            if res is not None:
+                rows[name]["hit"].append(res[0])
+                rows[name]["ratio"].append(res[1])
+                rows[name]["top"].append(res[2])
+        # Прод учится только на том, что спросил сам
+        for c in picks["adaptive"]:
+            counts = st.setdefault(c, [0, 0])
+            counts[0] += 1
+            if prices[c]:
+                counts[1] += 1
+                series.setdefault((key, c), []).append(prices[c])
+                empty_at.pop((key, c), None)
+            else:
+                empty_at[key, c] = e["ts"]
+
+    summary = {
+        name: {m: round(statistics.mean(v), 3) if v else None for m, v in r.items()}
+        for name, r in rows.items()
+    }
+    print(f"переборов={len(entries)} бюджет={args.budget}")
+    print(f"{'политика':>9} {'запросов':>9} {'найдено':>8} {'цена/лучшая':>12} {'топ-5':>6}")
+    for name, s in summary.items():
+        print(f"{name:>9} {s['calls']:>9} {s['hit']:>8} {s['ratio']:>12} {s['top']:>6}")
+    if args.json:
+        print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log",      help="журнал hubobs в JSONL (по умолчанию — синтетика)")
+    parser.add_argument("--budget",   type=int, default=12)
+    parser.add_argument("--searches", type=int, default=3000)
+    parser.add_argument("--seed",     type=int, default=7)
+    parser.add_argument("--json",     action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+# bench/nearby_bench.py
+"""
+Бенчмарк «аэропорты рядом» (utils/cities_loader.nearby_airports).
+
+Таблицы строятся из синтетического дампа bench/cities_startup_bench.py
+(~8 тыс. городов с координатами). Сравниваются:
+  scan  — гаверсинус до каждого города CITIES_DATA (без индекса)
+  grid  — сетка 1°×1°: просматриваются только ячейки вокруг круга
+
+Без сети и Redis:
+    python bench/nearby_bench.py
+    python bench/nearby_bench.py --radius 500 --queries 5000 --json
+"""
+import argparse
+import builtins
+import json
+import random
+import sys
+import time
+from heapq import nsmallest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench.cities_startup_bench import _dump
+from utils import cities_loader as cl
+
+
+def _scan(iata: str, radius_km: float, limit: int) -> list:
+    rec = cl.CITIES_DATA[iata]
+    found = []
+    for code, other in cl.CITIES_DATA.items():
+        if code == iata or other.lat is None:
+            continue
+        km = cl._distance_km(rec.lat, rec.lon, other.lat, other.lon)
+        if km <= radius_km:
+            found.append((code, round(km)))
+    return nsmallest(limit, found, key=lambda item: (item[1], item[0]))
+
+
+def main(args) -> None:
+    print_ = builtins.print
+    builtins.print = lambda *a, **k: None  # cities_loader печатает каждый шаг
+    try:
+        cl._install_tables(cl._build_tables(_dump()))
+    finally:
+        builtins.print = print_
+
+    rnd = random.Random(7)
+    # Города без метро и своих аэропортов: соседей-аэропортов scan не пропускает
+    plain = [c for c in cl.CITIES_DATA if not (cl.PLACES[c].metro or cl.PLACES[c].airports)]
+    queries = [rnd.choice(plain) for _ in range(args.queries)]
+    rows = {}
+    for name, fn in (("scan", _scan), ("grid", cl.nearby_airports)):
+        t0 = time.perf_counter()
+        answers = [fn(q, args.radius, args.limit) for q in queries]
+        rows[name] = (time.perf_counter() - t0) / len(queries)
+        if name == "scan":
+            expected = answers
+    assert answers == expected, "сетка расходится с полным проходом"
+
+    print(f"городов={len(cl.CITIES_DATA)} ячеек={len(cl._GEO_GRID)} радиус={args.radius} км")
+    print(f"{'вариант':>8} {'мкс/запрос':>11} {'speedup':>8}")
+    for name, sec in rows.items():
+        print(f"{name:>8} {sec * 1e6:>11.1f} {rows['scan'] / sec:>7.1f}x")
+    if args.json:
+        print(json.dumps({k: round(v * 1e6, 2) for k, v in rows.items()}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--radius",  type=float, default=cl.NEARBY_RADIUS_KM)
+    parser.add_argument("--limit",   type=int,   default=cl.NEARBY_MAX_EXTRA)
+    parser.add_argument("--queries", type=int,   default=500)
+    parser.add_argument("--json",    action="store_true")
+    main(parser.parse_args())
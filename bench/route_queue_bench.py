@@ -0,0 +1,244 @@
+# bench/route_queue_bench.py
+"""
+Бенчмарк очереди проверок маршрутов (services/route_queue.py).
+
+Поднимает локальный мок grouped_prices (задержка + крупный JSON),
+затем для N = 1, 2, 4, ... процессов-воркеров публикует JOBS заданий
+и меряет время до получения всех результатов. Воркеры — настоящий код:
+route_queue.run_consumer → check_route → search_flights (HTTP к моку).
+
+Нужен Redis — настоящий или fakeredis на локальном порту:
+    REDIS_URL=redis://localhost:6379/0 python bench/route_queue_bench.py
+    python bench/route_queue_bench.py --fake-redis 6411
+    python bench/route_queue_bench.py --workers 1 2 4 8 --jobs 120 --latency 800 --consumers 1
+
+Замер начинается, когда все потребители уже ждут в XREADGROUP, — запуск
+процессов (импорт aiogram и т.д.) во время не входит.
+
+Ключи пишутся под BOT_ENV=bench и удаляются после прогона.
+
+Результаты (1 vCPU, redis-server 6.2, по умолчанию: 300 заданий, 120 мс,
+3 потребителя на процесс):
+
+    workers    сек   jobs/s  speedup
+          1  13.07     22.9    1.00x
+          2   6.55     45.8    2.00x
+          4   4.08     73.5    3.20x
+          8   2.05    146.2    6.37x
+
+--jobs 120 --latency 800 --consumers 1 (один процесс держит не больше
+3 запросов сразу — BACKGROUND_SEMAPHORE, поэтому 120 × 0.8 / 3 ≈ 32 с):
+
+          1  39.16      3.1    1.00x
+          2  20.60      5.8    1.90x
+          4  11.04     10.9    3.55x
+          8   7.55     15.9    5.19x
+
+То же по умолчанию на --fake-redis: 1.00x / 2.20x / 3.94x / 5.02x — сервер
+fakeredis однопоточный на Python и на 8 процессах сам становится узким местом.
+Пропускная способность растёт почти линейно, пока упирается в ожидание
+upstream; на одном ядре ограничивают разбор JSON и сам Redis.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ["BOT_ENV"] = "bench"
+os.environ["AVIASALES_TOKEN"] = "bench"
+os.environ["ROUTE_QUEUE"] = "1"
+
+IATAS = ["MOW", "LED", "AER", "KZN", "OVB", "SVX", "KRR", "IST", "DXB", "AYT",
+         "TBS", "EVN", "BKK", "HKT", "DPS", "ALA", "TAS", "BCN", "ROM", "PAR"]
+
+
+# ══════════════════════════════════════════════════════════════════
+# Мок upstream
+# ══════════════════════════════════════════════════════════════════
+
+def _mock_server(port: int, latency_ms: int, dates: int) -> None:
+    from aiohttp import web
+
+    async def grouped_prices(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency_ms / 1000)
+        origin = request.query.get("origin", "MOW")
+        dest   = request.query.get("destination", "LED")
+        month  = request.query.get("departure_at", "2030-01-15")[:7]
+        data = {
+            f"{month}-{d:02d}": {
+                "origin": origin, "destination": dest,
+                "price": random.randint(3000, 40000),
+                "airline": "SU", "flight_number": str(random.randint(100, 9999)),
+                "departure_at": f"{month}-{d:02d}T10:00:00+03:00",
+                "transfers": random.randint(0, 2), "duration": random.randint(60, 900),
+                "link": f"/search/{origin}{d:02d}01{dest}1",
+            }
+            for d in range(1, dates + 1)
+        }
+        return web.json_response({"success": True, "data": data, "currency": "rub"})
+
+    app = web.Application()
+    app.router.add_get("/grouped_prices", grouped_prices)
+    web.run_app(app, host="127.0.0.1", port=port, print=None)
+
+
+def _fake_redis_server(port: int) -> None:
+    """Redis-протокол на fakeredis — когда настоящего Redis под рукой нет."""
+    from fakeredis import TcpFakeServer
+
+    TcpFakeServer(("127.0.0.1", port)).serve_forever()
+
+
+# ══════════════════════════════════════════════════════════════════
+# Процесс-воркер
+# ══════════════════════════════════════════════════════════════════
+
+def _worker(idx: int, mock_url: str, consumers: int) -> None:
+    async def run():
+        import services.flight_search as fs
+        from services import route_queue
+        from utils.redis_client import redis_client
+
+        fs.AVIASALES_GROUPED_URL = mock_url
+        await redis_client.connect()
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        await asyncio.gather(*[route_queue.run_consumer(f"{base}:{i}") for i in range(consumers)])
+
+    import logging
+    logging.disable(logging.WARNING)
+    asyncio.run(run())
+
+
+# ══════════════════════════════════════════════════════════════════
+# Прогон
+# ══════════════════════════════════════════════════════════════════
+
+async def _cleanup(redis_client) -> None:
+    cursor = 0
+    while True:
+        cursor, keys = await redis_client.client.scan(cursor=cursor, match=f"{redis_client.prefix}*", count=500)
+        if keys:
+            await redis_client.client.delete(*keys)
+        if cursor == 0:
+            break
+
+
+async def _wait_consumers(redis_client, expected: int, timeout: float = 180) -> None:
+    """Ждёт expected соединений, заблокированных в XREADGROUP (CLIENT LIST)."""
+    deadline = time.monotonic() + timeout
+    waiting = 0
+    while time.monotonic() < deadline:
+        try:
+            clients = await redis_client.client.client_list()
+        except Exception:
+            await asyncio.sleep(2.0 * expected)  # сервер без CLIENT LIST — просто пауза
+            return
+        waiting = sum(1 for c in clients if c.get("cmd") == "xreadgroup")
+        if waiting >= expected:
+            return
+        await asyncio.sleep(0.2)
+    print(f"  ⚠️ за {timeout:.0f} с готовы не все потребители ({waiting} из {expected})")
+
+
+async def _run_once(n_workers: int, jobs_n: int, mock_url: str, consumers: int) -> float:
+    from services import route_queue
+    from utils.redis_client import redis_client
+
+    await _cleanup(redis_client)
+    await route_queue._ensure_group()
+
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=_worker, args=(i, mock_url, consumers), daemon=True) for i in range(n_workers)]
+    for p in procs:
+        p.start()
+    # Часы запускаются, когда все потребители ждут в XREADGROUP: импорт N процессов
+    # на одном ядре занимает десятки секунд и в замер входить не должен
+    await _wait_consumers(redis_client, n_workers * consumers)
+
+    rnd = random.Random(42)
+    jobs, seen = [], set()
+    while len(jobs) < jobs_n:
+        o, d = rnd.sample(IATAS, 2)
+        day = rnd.randint(1, 28)
+        key = (o, d, day)
+        if key in seen:
+            continue
+        seen.add(key)
+        jobs.append({"origin": o, "dest": d, "depart_date": f"2030-{rnd.randint(1, 12):02d}-{day:02d}"})
+
+    t0 = time.perf_counter()
+    results = await route_queue.check_routes(f"bench:{n_workers}", jobs, timeout=600)
+    elapsed = time.perf_counter() - t0
+
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        p.join(timeout=5)
+    if len(results) != len(jobs):
+        print(f"  ⚠️ получено {len(results)} из {len(jobs)} результатов")
+    return elapsed
+
+
+async def main(args) -> None:
+    from utils.redis_client import redis_client
+
+    ctx = mp.get_context("spawn")
+    if args.fake_redis:
+        fake = ctx.Process(target=_fake_redis_server, args=(args.fake_redis,), daemon=True)
+        fake.start()
+        await asyncio.sleep(1.0)
+        os.environ["REDIS_URL"] = f"redis://127.0.0.1:{args.fake_redis}/0"  # наследуют воркеры
+    if not os.getenv("REDIS_URL"):
+        print("REDIS_URL не задан — нужен Redis или --fake-redis PORT")
+        raise SystemExit(1)
+    await redis_client.connect()
+    if not redis_client.client:
+        raise SystemExit(1)
+
+    server = ctx.Process(target=_mock_server, args=(args.port, args.latency, args.dates), daemon=True)
+    server.start()
+    await asyncio.sleep(1.5)
+    mock_url = f"http://127.0.0.1:{args.port}/grouped_prices"
+
+    print(f"jobs={args.jobs} latency={args.latency}ms dates/ответ={args.dates} consumers/процесс={args.consumers}")
+    print(f"{'workers':>8} {'сек':>8} {'jobs/s':>8} {'speedup':>8}")
+    base = None
+    rows = []
+    try:
+        for n in args.workers:
+            elapsed = await _run_once(n, args.jobs, mock_url, args.consumers)
+            rate = args.jobs / elapsed
+            base = base or rate
+            rows.append({"workers": n, "seconds": round(elapsed, 2), "jobs_per_s": round(rate, 1)})
+            print(f"{n:>8} {elapsed:>8.2f} {rate:>8.1f} {rate / base:>7.2f}x")
+    finally:
+        await _cleanup(redis_client)
+        await redis_client.close()
+        server.terminate()
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers",   type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--jobs",      type=int, default=300)
+    parser.add_argument("--latency",   type=int, default=120, help="задержка мока, мс")
+    parser.add_argument("--dates",     type=int, default=28,  help="дат в одном ответе (размер JSON)")
+    parser.add_argument("--consumers", type=int, default=3,   help="потребителей на процесс")
+    parser.add_argument("--port",      type=int, default=8765)
+    parser.add_argument("--fake-redis", type=int, default=0, metavar="PORT",
+                        help="поднять fakeredis TcpFakeServer на PORT вместо REDIS_URL")
+    parser.add_argument("--json",      action="store_true")
+    asyncio.run(main(parser.parse_args()))
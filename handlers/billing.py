@@ -11,13 +11,18 @@
 Redis-ключи:
   flight_bot:plan:{user_id}           — JSON с данными активного тарифа
   flight_bot:payment_pending:{pay_id} — TTL 24ч, ожидающий платёж
+
+Кэш планов в процессе (PLAN_CACHE_TTL): get_user_plan / get_plans читают
+Redis только на промахе; фоновые проходы получают планы всех подписчиков
+одним MGET. Запись после оплаты сразу обновляет кэш, истёкший тариф
+вытесняется по expires_at.
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
 import json
 import os
 import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Iterable, Optional, Tuple
 
 from aiogram import Router, F
 from aiogram.types import (
@@ -100,6 +105,10 @@ PLANS: dict[str, dict] = {
 PLAN_DURATION_DAYS = 30
 _PLAN_TTL = (PLAN_DURATION_DAYS + 5) * 86400
 
+PLAN_CACHE_TTL  = 60     # сек — сколько процесс верит своему кэшу плана
+PLAN_CACHE_MAX  = 50_000 # записей; при переполнении вытесняем просроченные
+PAID_PLANS      = ("plus", "premium", "vip")  # получают уведомления без задержки
+
 
 # ══════════════════════════════════════════════════════════════════
 #  VIP — безлимит из env, без оплаты
@@ -131,33 +140,119 @@ def _empty_plan() -> dict:
     return {"plan": "free", "expires_at": 0, "paid_at": 0, "payment_id": ""}
 
 
-async def get_user_plan(user_id: int, username: Optional[str] = None) -> dict:
-    if is_vip(username):
-        return {"plan": "vip", "expires_at": 0, "paid_at": 0, "payment_id": ""}
+# user_id → (годен до, план); годен до = min(сейчас + PLAN_CACHE_TTL, expires_at).
+# Наружу отдаются только копии плана (планы плоские — хватает dict(plan))
+_plan_cache: Dict[int, Tuple[float, dict]] = {}
 
-    if not redis_client.client:
-        return _empty_plan()
 
-    raw = await redis_client.client.get(f"{redis_client.prefix}plan:{user_id}")
-    if not raw:
-        return _empty_plan()
+def _cache_plan(user_id: int, plan: dict) -> None:
+    valid_until = time.time() + PLAN_CACHE_TTL
+    expires = plan.get("expires_at", 0)
+    if plan.get("plan", "free") != "free" and expires:
+        valid_until = min(valid_until, expires)
+    if len(_plan_cache) >= PLAN_CACHE_MAX:
+        now = time.time()
+        for uid in [u for u, (until, _) in _plan_cache.items() if until <= now]:
+            del _plan_cache[uid]
+        if len(_plan_cache) >= PLAN_CACHE_MAX:
+            _plan_cache.clear()
+    _plan_cache[user_id] = (valid_until, dict(plan))  # своя копия — вызывающий может менять plan
 
+
+def _cached_plan(user_id: int) -> Optional[dict]:
+    entry = _plan_cache.get(user_id)
+    if entry is None:
+        return None
+    if time.time() >= entry[0]:
+        _plan_cache.pop(user_id, None)
+        return None
+    return dict(entry[1])  # копия: правка плана одним вызывающим не портит кэш остальным
+
+
+def invalidate_plan(user_id: int) -> None:
+    _plan_cache.pop(user_id, None)
+
+
+def _parse_plan(user_id: int, raw) -> Tuple[dict, bool]:
+    """JSON из Redis → (план, истёк ли платный тариф)."""
+    if not raw:
+        return _empty_plan(), False
     try:
         plan = json.loads(raw)
     except Exception:
-        return _empty_plan()
+        return _empty_plan(), False
 
     # Автопонижение при истечении срока
     if plan.get("plan", "free") != "free":
         expires = plan.get("expires_at", 0)
         if expires and time.time() > expires:
             logger.info(f"[Billing] user={user_id}: план истёк → free")
-            plan = _empty_plan()
-            await _persist_plan(user_id, plan)
+            return _empty_plan(), True
+    return plan, False
+
 
+async def get_user_plan(user_id: int, username: Optional[str] = None) -> dict:
+    if is_vip(username):
+        return {"plan": "vip", "expires_at": 0, "paid_at": 0, "payment_id": ""}
+
+    cached = _cached_plan(user_id)
+    if cached is not None:
+        return cached
+
+    if not redis_client.client:
+        return _empty_plan()
+
+    raw = await redis_client.client.get(f"{redis_client.prefix}plan:{user_id}")
+    plan, expired = _parse_plan(user_id, raw)
+    if expired:
+        await _persist_plan(user_id, plan)
+    else:
+        _cache_plan(user_id, plan)
     return plan
 
 
+async def get_plans(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Планы сразу многих пользователей: кэш + один MGET на промахи.
+    Для фоновых проходов (username там нет — VIP по нику не определяется,
+    как и в get_user_plan(user_id)).
+    """
+    result: Dict[int, dict] = {}
+    missing = []
+    for uid in dict.fromkeys(user_ids):
+        cached = _cached_plan(uid)
+        if cached is not None:
+            result[uid] = cached
+        else:
+            missing.append(uid)
+    if not missing:
+        return result
+
+    if not redis_client.client:
+        result.update({uid: _empty_plan() for uid in missing})
+        return result
+
+    raws = await redis_client.client.mget([f"{redis_client.prefix}plan:{uid}" for uid in missing])
+    expired_ids = []
+    for uid, raw in zip(missing, raws):
+        plan, expired = _parse_plan(uid, raw)
+        result[uid] = plan
+        _cache_plan(uid, plan)
+        if expired:
+            expired_ids.append(uid)
+
+    if expired_ids:
+        pipe = redis_client.client.pipeline()
+        for uid in expired_ids:
+            pipe.set(f"{redis_client.prefix}plan:{uid}", json.dumps(_empty_plan()), ex=_PLAN_TTL)
+        await pipe.execute()
+    return result
+
+
+def is_paid(plan: dict) -> bool:
+    return plan.get("plan", "free") in PAID_PLANS
+
+
 async def _persist_plan(user_id: int, plan: dict):
     if redis_client.client:
         await redis_client.client.set(
@@ -165,6 +260,7 @@ async def _persist_plan(user_id: int, plan: dict):
             json.dumps(plan),
             ex=_PLAN_TTL,
         )
+    _cache_plan(user_id, plan)
 
 
 async def get_flystack_balance(user_id: int) -> int:
@@ -504,7 +600,8 @@ async def successful_payment_handler(message: Message):
             return
         await redis_client.client.set(idem_key, "1", ex=90 * 86400)
 
-        # Активируем тариф
+        # Активируем тариф (старый план из кэша процесса — сразу вон)
+        invalidate_plan(user_id)
         now     = int(time.time())
         expires = now + PLAN_DURATION_DAYS * 86400
         await _persist_plan(user_id, {
@@ -14,7 +14,7 @@ from aiogram.fsm.context import FSMContext
 from utils.cities_loader import (
     get_iata, get_city_name, fuzzy_get_iata,
     CITY_TO_IATA, _normalize_name,
-    COUNTRY_TOP_CITIES, COUNTRY_NAME_TO_ISO,
+    country_candidates, resolve_country,
 )
 from utils.smart_reminder import schedule_inactivity
 from handlers.flight_constants import CANCEL_KB
@@ -134,8 +134,8 @@ async def _ask_country_city(
     role: str,  # "origin" или "dest"
 ):
     """Показывает топ-города страны + 'Ввести свой' + 'Любой город' + 'Отменить'."""
-    iso = COUNTRY_NAME_TO_ISO.get(country_name.lower().strip().replace("ё", "е"))
-    all_country_iatas = COUNTRY_TOP_CITIES.get(iso, []) if iso else [c["iata"] for c in cities]
+    iso = resolve_country(country_name)
+    all_country_iatas = country_candidates(iso) if iso else [c["iata"] for c in cities]
 
     # Правильное написание и склонение
     names         = COUNTRY_NAMES_RU.get(iso) if iso else None
@@ -148,6 +148,7 @@ async def _ask_country_city(
         _country_name=display_name,
         _country_dative=dative,
         _country_iatas=all_country_iatas,
+        _country_iso=iso,
     )
     await state.set_state(FlightSearch.choose_country_city)
 
@@ -218,6 +219,7 @@ async def process_country_city_pick(callback: CallbackQuery, state: FSMContext):
                 dest_iata=None,
                 dest_name=country_name,
                 _country_dest_iatas=country_iatas,
+                _country_dest_iso=data.get("_country_iso"),
                 _country_role=None, _country_custom_role=None,
             )
             await _finalize_route(callback.message, state)
@@ -6,15 +6,15 @@ from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from services.flight_search import (
-    search_flights,
     generate_booking_link,
     normalize_date,
     format_avia_link_date,
     update_passengers_in_link,
     format_duration as format_duration_helper
 )
+from services.everywhere_engine import cheapest_everywhere
 from utils.cities_loader import get_iata, get_city_name, CITY_TO_IATA, IATA_TO_CITY, _normalize_name
-from utils.cities import GLOBAL_HUBS
+from utils.progressive import LegProgress
 from utils.redis_client import redis_client
 from utils.logger import logger
 from utils.link_converter import convert_to_partner_link
@@ -63,95 +63,33 @@ def build_passenger_desc(code: str) -> str:
     except:
         return "1 взр."
 
-# Расширенный список хабов для поиска "Везде → Город" и "Город → Везде"
-# Разбит по регионам для лучшего покрытия
-SEARCH_HUBS_RUSSIA = [
-    "MOW", "LED", "AER", "KZN", "OVB", "SVX", "UFA", "ROV",
-    "KRR", "IKT", "VVO", "CEK", "KUF", "GOJ", "PEE"
-]
-SEARCH_HUBS_INTERNATIONAL = [
-    "IST", "DXB", "BKK", "BCN", "AMS", "CDG", "FCO", "BER",
-    "PRG", "BUD", "ATH", "WAW", "VIE", "TLV", "HEL"
-]
-# Полный список: сначала российские хабы, потом международные
-ALL_SEARCH_HUBS = SEARCH_HUBS_RUSSIA + SEARCH_HUBS_INTERNATIONAL
+def _filter_flight_type(flights: List[Dict], flight_type: str) -> List[Dict]:
+    if flight_type == "direct":
+        return [f for f in flights if f.get("transfers", 999) == 0]
+    if flight_type == "transfer":
+        return [f for f in flights if f.get("transfers", 0) > 0]
+    return flights
 
 
 async def search_origin_everywhere(
     dest_iata: str,
     depart_date: str,
-    flight_type: str = "all"
+    flight_type: str = "all",
+    on_leg=None,
 ) -> List[Dict]:
-    """Поиск рейсов из всех городов в указанный (до 15 хабов параллельно)"""
-    # Используем расширенный список, исключаем сам пункт назначения
-    origins = [o for o in ALL_SEARCH_HUBS if o != dest_iata]
-    all_flights = []
-
-    # Параллельные запросы по 5 хабов за раз
-    for i in range(0, len(origins), 5):
-        chunk = origins[i:i+5]
-        tasks = [
-            search_flights(orig, dest_iata, normalize_date(depart_date), None)
-            for orig in chunk
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for orig, result in zip(chunk, results):
-            if isinstance(result, Exception):
-                logger.warning(f"[everywhere] Ошибка для {orig}→{dest_iata}: {result}")
-                continue
-            flights = result
-            if flight_type == "direct":
-                flights = [f for f in flights if f.get("transfers", 999) == 0]
-            elif flight_type == "transfer":
-                flights = [f for f in flights if f.get("transfers", 0) > 0]
-            # Гарантируем корректный destination
-            flights = [f for f in flights if f.get("destination", dest_iata) == dest_iata]
-            for f in flights:
-                f["origin"] = orig
-                f["destination"] = dest_iata
-            all_flights.extend(flights)
-
-        if i + 5 < len(origins):
-            await asyncio.sleep(0.3)
-
-    return all_flights
+    """Самый дешёвый рейс из каждого города в указанный (services/everywhere_engine)"""
+    flights = await cheapest_everywhere(normalize_date(depart_date), destination=dest_iata, on_leg=on_leg)
+    return _filter_flight_type(flights, flight_type)
 
 async def search_destination_everywhere(
     origin_iata: str,
     depart_date: str,
-    flight_type: str = "all"
+    flight_type: str = "all",
+    on_leg=None,
 ) -> List[Dict]:
-    """Поиск рейсов из указанного города во все направления (до 15 хабов параллельно)"""
-    destinations = [d for d in ALL_SEARCH_HUBS if d != origin_iata]
-    all_flights = []
-
-    for i in range(0, len(destinations), 5):
-        chunk = destinations[i:i+5]
-        tasks = [
-            search_flights(origin_iata, dest, normalize_date(depart_date), None)
-            for dest in chunk
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for dest, result in zip(chunk, results):
-            if isinstance(result, Exception):
-                logger.warning(f"[everywhere] Ошибка для {origin_iata}→{dest}: {result}")
-                continue
-            flights = result
-            if flight_type == "direct":
-                flights = [f for f in flights if f.get("transfers", 999) == 0]
-            elif flight_type == "transfer":
-                flights = [f for f in flights if f.get("transfers", 0) > 0]
-            for f in flights:
-                f["origin"] = origin_iata
-                f["destination"] = dest
-            all_flights.extend(flights)
-
-        if i + 5 < len(destinations):
-            await asyncio.sleep(0.3)
-
-    return all_flights
+    """Самый дешёвый рейс из указанного города в каждое направление (services/everywhere_engine)"""
+    flights = await cheapest_everywhere(normalize_date(depart_date), origin=origin_iata, on_leg=on_leg)
+    return _filter_flight_type(flights, flight_type)
 
 async def process_everywhere_search(
     callback: CallbackQuery,
@@ -342,7 +280,6 @@ async def handle_everywhere_search_manual(
     dest_iata = None
     
     if is_origin_everywhere:
-        origins = GLOBAL_HUBS[:5]
         origin_name = "Везде"
     else:
         # ← ИСПОЛЬЗУЕМ get_iata() + fallback
@@ -350,12 +287,10 @@ async def handle_everywhere_search_manual(
         if not orig_iata:
             await message.answer(f"Не знаю город вылета: {origin_city.strip()}", reply_markup=CANCEL_KB)
             return False
-        origins = [orig_iata]
         # ← ИСПОЛЬЗУЕМ get_city_name() + fallback
         origin_name = get_city_name(orig_iata) or IATA_TO_CITY.get(orig_iata, origin_city.strip().capitalize())
     
     if is_dest_everywhere:
-        destinations = GLOBAL_HUBS[:5]
         dest_name = "Везде"
     else:
         # ← ИСПОЛЬЗУЕМ get_iata() + fallback
@@ -363,37 +298,18 @@ async def handle_everywhere_search_manual(
         if not dest_iata:
             await message.answer(f"Не знаю город прилёта: {dest_city.strip()}", reply_markup=CANCEL_KB)
             return False
-        destinations = [dest_iata]
         # ← ИСПОЛЬЗУЕМ get_city_name() + fallback
         dest_name = get_city_name(dest_iata) or IATA_TO_CITY.get(dest_iata, dest_city.strip().capitalize())
     
     passenger_desc = build_passenger_desc(passengers_code)
     display_depart = format_user_date(depart_date)
     
-    await message.answer("Ищу билеты (включая с пересадками)...")
-    all_flights = []
-    
-    for orig in origins:
-        for dest in destinations:
-            if orig == dest:
-                continue
-            
-            flights = await search_flights(
-                orig,
-                dest,
-                normalize_date(depart_date),
-                None
-            )
-            
-            if not is_dest_everywhere and dest == dest_iata:
-                flights = [f for f in flights if f.get("destination") == dest]
-            
-            for f in flights:
-                f["origin"] = orig
-                f["destination"] = dest
-            
-            all_flights.extend(flights)
-            await asyncio.sleep(0.5)
+    wait_msg = await message.answer("Ищу билеты (включая с пересадками)...")
+    # Один запрос «куда угодно» (или перебор хабов) — services/everywhere_engine
+    if is_dest_everywhere:
+        all_flights = await search_destination_everywhere(orig_iata, depart_date, on_leg=LegProgress(wait_msg))
+    else:
+        all_flights = await search_origin_everywhere(dest_iata, depart_date, on_leg=LegProgress(wait_msg))
     
     if not all_flights:
         return False
@@ -559,7 +475,7 @@ async def handle_everywhere_search_manual(
     # Кнопка "Все направления" только для "Город → Везде"
     if is_dest_everywhere:
         d1 = format_avia_link_date(depart_date)
-        map_link = f"https://www.aviasales.ru/map?params={origins[0]}{d1}{passengers_code}"
+        map_link = f"https://www.aviasales.ru/map?params={orig_iata}{d1}{passengers_code}"
         map_link = await convert_to_partner_link(map_link)
         kb_buttons.append([
             InlineKeyboardButton(text="🌍 Все направления", url=map_link)
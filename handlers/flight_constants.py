@@ -224,9 +224,13 @@ def iso_flag(iso: str) -> str:
 
 
 def iata_country_iso(iata: str) -> str:
-    """Возвращает ISO-код страны по IATA города (через CITIES_DATA)."""
+    """Возвращает ISO-код страны по IATA города или аэропорта (через газеттир)."""
     try:
-        from utils.cities_loader import CITIES_DATA
-        return CITIES_DATA.get(iata, {}).get("country_code", "") or ""
+        from utils.cities_loader import CITIES_DATA, PLACES
+        place = PLACES.get(iata)
+        if place and place.country_code:
+            return place.country_code
+        rec = CITIES_DATA.get(iata)
+        return rec.country_code if rec else ""
     except Exception:
         return ""
\ No newline at end of file
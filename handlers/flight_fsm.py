@@ -11,6 +11,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from handlers.flight_constants import MULTI_AIRPORT_CITIES, AIRPORT_TO_METRO
 from handlers.everywhere_search import format_user_date
+from services.flex_dates import FLEX_DAYS
 
 # ════════════════════════════════════════════════════════════════
 # FSM
@@ -181,6 +182,12 @@ def build_choices_summary(data: dict) -> str:
         ft_map = {"direct": "прямые рейсы", "transfer": "рейсы с пересадками", "all": "все варианты"}
         lines.append(f"{n}. Тип рейса: {ft_map.get(data['flight_type'], 'все варианты')}"); n += 1
 
+    if data.get("include_nearby"):
+        lines.append(f"{n}. Аэропорты рядом: да"); n += 1
+
+    if data.get("flex_dates"):
+        lines.append(f"{n}. Гибкие даты: ±{FLEX_DAYS} дня"); n += 1
+
     if "passenger_desc" in data or "adults" in data:
         pd = data.get("passenger_desc")
         if not pd:
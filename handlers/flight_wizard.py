@@ -13,7 +13,7 @@ from aiogram.fsm.context import FSMContext
 
 from utils.cities_loader import (
     get_iata, get_city_name, fuzzy_get_iata,
-    CITY_TO_IATA, IATA_TO_CITY, _normalize_name, get_country_cities,
+    CITY_TO_IATA, IATA_TO_CITY, _normalize_name, get_country_cities, NEARBY_RADIUS_KM,
 )
 from utils.smart_reminder import schedule_inactivity, cancel_inactivity, mark_fsm_inactive
 from utils.logger import logger
@@ -26,6 +26,7 @@ from handlers.flight_fsm import (
 )
 from handlers.country_search import _ask_country_city
 from services.flight_search import normalize_date
+from services.flex_dates import FLEX_DAYS
 from utils.date_hints import hint_depart, hint_return
 from utils.redis_client import redis_client
 
@@ -618,14 +619,7 @@ async def show_summary(message, state: FSMContext):
     data = await state.get_data()
 
     summary = "✈️ <b>6/6 - Подтверждение</b>\n\nПроверь даты и данные:\n\n" + build_choices_summary(data)
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_search")],
-        [InlineKeyboardButton(text="✏️ Маршрут",   callback_data="edit_route"),
-         InlineKeyboardButton(text="✏️ Даты",       callback_data="edit_dates")],
-        [InlineKeyboardButton(text="✏️ Тип рейса",  callback_data="edit_flight_type"),
-         InlineKeyboardButton(text="✏️ Пассажиры",  callback_data="edit_passengers")],
-        [InlineKeyboardButton(text="↩️ В начало",   callback_data="main_menu")],
-    ])
+    kb = _summary_keyboard(data)
 
     await message.answer(summary, parse_mode="HTML")
     await message.answer("Подтверди или измени параметры:", reply_markup=kb)
@@ -636,6 +630,50 @@ async def show_summary(message, state: FSMContext):
     schedule_inactivity(chat_id, message.from_user.id)
 
 
+def _summary_keyboard(data: dict) -> InlineKeyboardMarkup:
+    rows = [
+        [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_search")],
+        [InlineKeyboardButton(text="✏️ Маршрут",   callback_data="edit_route"),
+         InlineKeyboardButton(text="✏️ Даты",       callback_data="edit_dates")],
+        [InlineKeyboardButton(text="✏️ Тип рейса",  callback_data="edit_flight_type"),
+         InlineKeyboardButton(text="✏️ Пассажиры",  callback_data="edit_passengers")],
+    ]
+    # «Аэропорты рядом» — только для поиска город → город
+    if data.get("origin_iata") and data.get("dest_iata") and not data.get("origin_airports"):
+        mark = "✅" if data.get("include_nearby") else "⬜"
+        rows.append([InlineKeyboardButton(text=f"{mark} 📍 Аэропорты рядом", callback_data="toggle_nearby")])
+    # «Гибкие даты» — город → город (для «Везде» и страны дата и так подбирается по городам)
+    if data.get("origin_iata") and data.get("dest_iata"):
+        mark = "✅" if data.get("flex_dates") else "⬜"
+        rows.append([InlineKeyboardButton(text=f"{mark} 📅 Гибкие даты ±{FLEX_DAYS} дня", callback_data="toggle_flex")])
+    rows.append([InlineKeyboardButton(text="↩️ В начало",   callback_data="main_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@router.callback_query(FlightSearch.confirm, F.data == "toggle_nearby")
+async def toggle_nearby(callback: CallbackQuery, state: FSMContext):
+    """Включает/выключает поиск с соседних аэропортов (nearby_airports)."""
+    data = await state.get_data()
+    await state.update_data(include_nearby=not data.get("include_nearby"))
+    try:
+        await callback.message.edit_reply_markup(reply_markup=_summary_keyboard(await state.get_data()))
+    except Exception:
+        pass
+    await callback.answer(f"Добавлю аэропорты в радиусе {NEARBY_RADIUS_KM} км" if not data.get("include_nearby") else "Только выбранные города")
+
+
+@router.callback_query(FlightSearch.confirm, F.data == "toggle_flex")
+async def toggle_flex(callback: CallbackQuery, state: FSMContext):
+    """Включает/выключает поиск по соседним датам (services/flex_dates)."""
+    data = await state.get_data()
+    await state.update_data(flex_dates=not data.get("flex_dates"))
+    try:
+        await callback.message.edit_reply_markup(reply_markup=_summary_keyboard(await state.get_data()))
+    except Exception:
+        pass
+    await callback.answer(f"Найду самую дешёвую дату в пределах ±{FLEX_DAYS} дней" if not data.get("flex_dates") else "Только выбранные даты")
+
+
 # ════════════════════════════════════════════════════════════════
 # Редактирование из summary
 # ════════════════════════════════════════════════════════════════
@@ -491,7 +491,7 @@ async def hd_custom_dest_text(message: Message, state: FSMContext):
     """Обрабатываем введённый город/страну назначения."""
     from utils.cities_loader import (
         get_iata, get_city_name, fuzzy_get_iata,
-        COUNTRY_NAME_TO_ISO, COUNTRY_TOP_CITIES, IATA_TO_CITY,
+        resolve_country, COUNTRY_TOP_CITIES, IATA_TO_CITY,
     )
     raw = message.text.strip()
     norm = raw.lower().replace("ё", "е")
@@ -499,8 +499,8 @@ async def hd_custom_dest_text(message: Message, state: FSMContext):
     dest_iata_list = []
     dest_name      = ""
 
-    # 1. Пробуем как страну
-    iso = COUNTRY_NAME_TO_ISO.get(norm)
+    # 1. Пробуем как страну (в любом падеже: «в Турцию»)
+    iso = resolve_country(norm)
     if iso:
         dest_iata_list = COUNTRY_TOP_CITIES.get(iso, [])[:6]
         # Красивое название страны — берём из исходного ввода с заглавной
@@ -16,12 +16,9 @@ from aiogram.fsm.state import State, StatesGroup
 
 from services.flight_search import format_avia_link_date
 from utils.cities_loader import (
-    get_iata,
     get_city_name,
     fuzzy_get_iata,
-    CITY_TO_IATA,
-    IATA_TO_CITY,
-    _normalize_name,
+    resolve_place,
 )
 from utils.link_converter import convert_to_partner_link
 from utils.redis_client import redis_client
@@ -56,12 +53,10 @@ class MultiSearch(StatesGroup):
 
 def _resolve_city(text: str) -> tuple[str | None, str | None]:
     """Возвращает (iata, city_name) или (None, None)."""
-    text = text.strip().lower()
-    iata = get_iata(text) or CITY_TO_IATA.get(_normalize_name(text))
-    if not iata:
+    place = resolve_place(text)
+    if not place:
         return None, None
-    name = get_city_name(iata) or IATA_TO_CITY.get(iata, iata.upper())
-    return iata, name
+    return place.iata, get_city_name(place.iata) or place.name
 
 
 def _validate_date(date_str: str) -> bool:
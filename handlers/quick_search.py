@@ -8,6 +8,7 @@
   Санкт-Петербург Бангкок 20.03 2 взр прямые
   Везде Стамбул 10.03
   MOW AER 15.04
+  Москва Сочи 10.03 ±3        (гибкие даты: самая дешёвая в пределах ±3 дней)
 
 Не регистрирует роутер — handle_flight_request вызывается из start.py.
 Вынесен для удобства отладки и тестирования.
@@ -20,6 +21,7 @@ from uuid import uuid4
 
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 
+from services.flex_dates import FLEX_DAYS, FLEX_MAX_DAYS, flex_search, format_flex
 from services.flight_search import (
     search_flights,
     generate_booking_link,
@@ -29,7 +31,7 @@ from services.flight_search import (
     update_passengers_in_link,
     format_passenger_desc,
 )
-from utils.cities_loader import get_iata, get_city_name, CITY_TO_IATA, IATA_TO_CITY, _normalize_name
+from utils.cities_loader import get_city_name, resolve_place, segment_places, IATA_TO_CITY, PLACES
 from utils.redis_client import redis_client
 from utils.link_converter import convert_to_partner_link
 from handlers.everywhere_search import (
@@ -49,6 +51,7 @@ logger = logging.getLogger(__name__)
 
 _DATE_RE = re.compile(r'^\d{1,2}\.\d{1,2}$')
 _IATA_RE = re.compile(r'^[A-Za-z]{3}$')
+_FLEX_RE = re.compile(r'(?:±|\+-|\+/-)\s*(\d{1,2})(?!\d)|\bгибк\w*', re.IGNORECASE)
 
 _AIRLINE_NAMES = {
     "SU": "Аэрофлот", "S7": "S7 Airlines", "DP": "Победа",
@@ -62,17 +65,27 @@ _AIRLINE_NAMES = {
 def _resolve_city(city_str: str) -> tuple[str | None, str | None]:
     """Принимает название или IATA. Возвращает (iata, display_name) или (None, None)."""
     c = city_str.strip()
-    if _IATA_RE.match(c):
-        iata = c.upper()
-        name = get_city_name(iata) or IATA_TO_CITY.get(iata, iata)
-        return iata, name
-    iata = get_iata(c) or CITY_TO_IATA.get(_normalize_name(c))
-    if iata:
-        name = get_city_name(iata) or IATA_TO_CITY.get(iata, c.capitalize())
-        return iata, name
+    if _IATA_RE.match(c) and c.upper() not in PLACES:
+        iata = c.upper()  # неизвестный газеттиру код — отдаём как есть
+        return iata, IATA_TO_CITY.get(iata, iata)
+    place = resolve_place(c)
+    if place:
+        return place.iata, get_city_name(place.iata) or place.name or c.capitalize()
     return None, None
 
 
+def _extract_flex(passengers_part: str) -> tuple[int, str]:
+    """
+    «±3» / «+-10» / «гибко» в хвосте запроса → (дней окна, хвост без метки);
+    0 — даты точные. Окно шире FLEX_MAX_DAYS урезается до него.
+    """
+    m = _FLEX_RE.search(passengers_part or "")
+    if not m:
+        return 0, passengers_part
+    days = min(int(m.group(1)), FLEX_MAX_DAYS) if m.group(1) else FLEX_DAYS
+    return days, (passengers_part[:m.start()] + passengers_part[m.end():]).strip()
+
+
 def _parse_quick_search(text: str) -> tuple | None:
     """
     Парсит строку свободного ввода.
@@ -84,7 +97,8 @@ def _parse_quick_search(text: str) -> tuple | None:
       2. Токенизируем, ищем индексы дат (ДД.ММ).
       3. Нет даты → не наш формат, возвращаем None.
       4. Всё до первой даты — токены городов.
-      5. Пробуем найти пару городов через get_iata или по разделителю "|".
+      5. Делим токены на пару мест за один проход (segment_places: падежи,
+         предлоги, «везде») или по разделителю "|".
     """
     text = text.strip()
     # Нормализуем разделители: " - " → "|", "→", "—" → "|", дефис внутри слова не трогаем
@@ -121,19 +135,13 @@ def _parse_quick_search(text: str) -> tuple | None:
         if origin_city and dest_city:
             return origin_city, dest_city, depart_date, return_date, passengers_part
 
-    # Перебор вариантов разбиения
+    # Один проход по газеттиру: «из Москвы в Стамбул» → ["Москвы", "Стамбул"]
+    places = segment_places(city_tokens, keywords=("везде",))
+    if places and len(places) == 2:
+        return places[0], places[1], depart_date, return_date, passengers_part
+
+    # Один из городов "Везде" (второй не распознан — дальше подскажем нечётким поиском)
     n = len(city_tokens)
-    for split in range(1, n):
-        o = " ".join(city_tokens[:split])
-        d = " ".join(city_tokens[split:])
-        if o.lower() == "везде" or d.lower() == "везде":
-            return o, d, depart_date, return_date, passengers_part
-        o_iata = get_iata(o) or CITY_TO_IATA.get(_normalize_name(o))
-        d_iata = get_iata(d) or CITY_TO_IATA.get(_normalize_name(d))
-        if o_iata and d_iata:
-            return o, d, depart_date, return_date, passengers_part
-
-    # Один из городов "Везде"
     if city_tokens[0].lower() == "везде" and n >= 2:
         return "везде", " ".join(city_tokens[1:]), depart_date, return_date, passengers_part
     if city_tokens[-1].lower() == "везде" and n >= 2:
@@ -161,6 +169,8 @@ async def handle_flight_request(message: Message) -> None:
         f"depart='{depart_date}' return='{return_date}' pax='{passengers_part}'"
     )
 
+    flex_days, passengers_part = _extract_flex(passengers_part)
+
     is_origin_everywhere = origin_city.strip().lower() == "везде"
     is_dest_everywhere   = dest_city.strip().lower()   == "везде"
 
@@ -239,6 +249,19 @@ async def handle_flight_request(message: Message) -> None:
         else [orig_iata]
     )
 
+    # Гибкие даты: лучшая дата окна из календаря цен, дальше обычный поиск на неё
+    if flex_days:
+        flex = await flex_search(
+            orig_iata, dest_iata, normalize_date(depart_date),
+            normalize_date(return_date) if return_date else None,
+            days=flex_days, direct=direct_only,
+        )
+        if flex.best:
+            depart, ret, _ = flex.best
+            depart_date = f"{depart[8:10]}.{depart[5:7]}"
+            return_date = f"{ret[8:10]}.{ret[5:7]}" if ret else return_date
+            await message.answer(format_flex(flex), parse_mode="HTML")
+
     passengers_code  = parse_passengers(passengers_part or "")
     passenger_desc_s = build_passenger_desc(passengers_code)
     display_depart   = format_user_date(depart_date)
@@ -3,6 +3,10 @@
 Показ результатов поиска, обработка после поиска:
 confirm_search, _do_confirm_search, watch_price, трансферы,
 retry_with_transfers, edit_from_results, _show_no_flights.
+
+Поиск кеширует все найденные предложения без фильтра (offers); фильтры
+и сортировки экрана результата (rv_/rf_) работают по этому кэшу локально,
+браузер вариантов (rp_) листает страницы по готовым индексам сортировки.
 """
 import asyncio
 import os
@@ -20,8 +24,16 @@ from services.flight_search import (
     find_cheapest_flight_on_exact_date, update_passengers_in_link, format_passenger_desc,
 )
 from services.transfer_search import search_transfers, generate_transfer_link
-from utils.cities_loader import get_city_name, IATA_TO_CITY
-from utils.flight_utils import _format_duration
+from services.country_prices import cheapest_in_country
+from services.flex_dates import flex_search, format_flex
+from utils.cities_loader import get_city_name, nearby_airports, IATA_TO_CITY
+from utils.api_limiter import NEARBY_LEG_SEMAPHORE
+from utils.progressive import LegProgress, gather_streaming
+from utils.offer_view import (
+    AIRLINES_IN_MENU, DURATION_STEPS, PAGE_SIZE, SORTS, TIME_WINDOWS, TYPES, View,
+    airlines, apply_view, decode_view, describe, page, sort_indexes, view_for_flight_type,
+)
+from utils.flight_utils import _format_datetime, _format_duration
 from utils.redis_client import redis_client
 from utils.logger import logger
 from utils.link_converter import convert_to_partner_link
@@ -39,6 +51,7 @@ from handlers.flight_fsm import (
     FlightSearch, build_choices_summary, _get_metro,
 )
 from handlers.billing import can_add_sub, show_paywall
+from handlers.flight_wizard import _summary_keyboard
 from handlers.start import _SEARCH_SEMAPHORE
 
 router = Router()
@@ -46,6 +59,9 @@ router = Router()
 # Контекст трансферов: user_id → dict
 transfer_context: dict[int, dict] = {}
 
+REALTIME_LATENCY_BUDGET = 60.0  # секунд на все пары маршрута (realtime сам опрашивает до 45с)
+SLOW_LEG_GRACE          = 10.0  # после первого ответа с билетами остальные пары ждём не дольше
+
 @router.callback_query(FlightSearch.confirm, F.data == "confirm_search")
 async def confirm_search(callback: CallbackQuery, state: FSMContext):
     cancel_inactivity(callback.message.chat.id)
@@ -68,6 +84,14 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
     direct_only    = flight_type == "direct"
     transfers_only = flight_type == "transfer"
 
+    def _keep(f: dict) -> bool:
+        """Фильтр типа рейса — для «пока лучшее» на экране ожидания."""
+        if direct_only:
+            return f.get("transfers", 999) == 0
+        if transfers_only:
+            return f.get("transfers", 0) > 0
+        return True
+
     # ── Любой город в стране (назначение) ──────────────────────
     if is_dest_country and not is_origin_everywhere and not is_origin_country:
         country_iatas = data.get("_country_dest_iatas", [])
@@ -75,23 +99,12 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
         origin_iata   = data.get("origin_iata", "")
         depart_date   = data.get("depart_date", "")
 
-        # Ищем параллельно по всем городам страны
-        tasks = [
-            search_flights(origin_iata, dest, normalize_date(depart_date), None)
-            for dest in country_iatas if dest != origin_iata
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        all_flights = []
-        for dest, result in zip(
-            [d for d in country_iatas if d != origin_iata], results
-        ):
-            if isinstance(result, Exception):
-                continue
-            for f in result:
-                f["origin"] = origin_iata
-                f["destination"] = dest
-            all_flights.extend(result)
+        # Календари городов страны на месяц — из кеша, недостающие из API
+        all_flights = await cheapest_in_country(
+            origin_iata, data.get("_country_dest_iso"), country_iatas,
+            normalize_date(depart_date), direct=direct_only,
+            on_leg=LegProgress(callback.message, keep=_keep),
+        )
 
         if direct_only:
             all_flights = [f for f in all_flights if f.get("transfers", 999) == 0]
@@ -137,6 +150,7 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
         all_flights = await search_origin_everywhere(
             dest_iata=data["dest_iata"], depart_date=data["depart_date"],
             flight_type=flight_type,
+            on_leg=LegProgress(callback.message, keep=_keep),
         )
         if direct_only:
             all_flights = [f for f in all_flights if f.get("transfers", 999) == 0]
@@ -168,6 +182,7 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
         all_flights = await search_destination_everywhere(
             origin_iata=data["origin_iata"], depart_date=data["depart_date"],
             flight_type=flight_type,
+            on_leg=LegProgress(callback.message, keep=_keep),
         )
         if direct_only:
             all_flights = [f for f in all_flights if f.get("transfers", 999) == 0]
@@ -195,10 +210,42 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
             )
         return
 
+    # Сообщение, на котором идёт обычный поиск; с гибкими датами — новое, под матрицей
+    target_msg = callback.message
+
+    # ── Гибкие даты: окно ±FLEX_DAYS из календаря, realtime — только лучшая ячейка ──
+    if data.get("flex_dates") and data.get("origin_iata") and data.get("dest_iata"):
+        flex = await flex_search(
+            data["origin_iata"], data["dest_iata"], normalize_date(data["depart_date"]),
+            normalize_date(data["return_date"]) if data.get("return_date") else None,
+            direct=direct_only,
+        )
+        if flex.best:
+            depart, ret, _ = flex.best
+            chosen = {"depart_date": f"{depart[8:10]}.{depart[5:7]}"}
+            if ret:
+                chosen["return_date"] = f"{ret[8:10]}.{ret[5:7]}"
+            await state.update_data(**chosen)
+            data = {**data, **chosen}
+            # Сообщение ожидания становится матрицей цен, проверка ячейки — в новом сообщении
+            await callback.message.edit_text(format_flex(flex), parse_mode="HTML")
+            target_msg = await callback.message.answer(
+                f"⏳ Проверяю актуальную цену на {format_user_date(data['depart_date'])}"
+                + (f" — {format_user_date(data['return_date'])}" if ret else "") + "..."
+            )
+
     # ── Обычный поиск ──────────────────────────────────────────
-    origins      = data.get("origin_airports") or [data["origin_iata"]]
+    origins      = list(data.get("origin_airports") or [data["origin_iata"]])
     destinations = [data["dest_iata"]]
-    all_flights  = []
+    offers       = []  # все предложения всех пар, без фильтра типа рейса
+    # Опция «аэропорты рядом»: соседние города из пространственного индекса
+    nearby_legs = set()
+    if data.get("include_nearby"):
+        for ends, iata in ((origins, data["origin_iata"]), (destinations, data["dest_iata"])):
+            for code, _km in nearby_airports(iata):
+                if code not in ends:
+                    ends.append(code)
+                    nearby_legs.add(code)
 
     pax_code = data.get("passenger_code", "1")
     try:
@@ -209,7 +256,7 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
         rt_adults, rt_children, rt_infants = 1, 0, 0
 
     # Прогресс-анимация
-    progress_msg = await callback.message.edit_text("⏳ <b>Ищу билеты...</b>", parse_mode="HTML")
+    progress_msg = await target_msg.edit_text("⏳ <b>Ищу билеты...</b>", parse_mode="HTML")
 
     async def _update_progress():
         await asyncio.sleep(10)
@@ -236,31 +283,38 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
 
     async def _fetch_pair(orig: str, dest: str):
         """Один запрос пары маршрут — вызывается параллельно через gather."""
-        result = await search_flights_realtime(
+        request = search_flights_realtime(
             origin=orig, destination=dest,
             depart_date=normalize_date(data["depart_date"]),
             return_date=normalize_date(data["return_date"]) if data.get("return_date") else None,
             adults=rt_adults, children=rt_children, infants=rt_infants,
         )
+        if orig in nearby_legs or dest in nearby_legs:
+            async with NEARBY_LEG_SEMAPHORE:  # плечи «рядом» — под общим потолком
+                result = await request
+        else:
+            result = await request
         for f in result:
             f["origin"] = orig
             f["destination"] = dest
         return result
 
+    progress = LegProgress(progress_msg, total=len(_search_pairs), keep=_keep)
+
+    async def _on_pair(pair, flights):
+        progress_task.cancel()  # дальше экран ожидания ведёт LegProgress
+        await progress(pair, flights)
+
     try:
-        # Все пары маршрутов запускаются ПАРАЛЛЕЛЬНО
+        # Все пары маршрутов запускаются ПАРАЛЛЕЛЬНО, ответы показываются по мере прихода;
         # Москва (SVO+DME+VKO+ZIA) → Бангкок = 4 запроса одновременно вместо последовательно
-        results = await asyncio.gather(*[_fetch_pair(o, d) for o, d in _search_pairs], return_exceptions=True)
-        for r in results:
-            if isinstance(r, Exception):
-                logger.warning(f"[Search] Ошибка в паре: {r}")
-                continue
-            flights = r
-            if direct_only:
-                flights = [f for f in flights if f.get("transfers", 999) == 0]
-            elif transfers_only:
-                flights = [f for f in flights if f.get("transfers", 0) > 0]
-            all_flights.extend(flights)
+        results = await gather_streaming(
+            {(o, d): _fetch_pair(o, d) for o, d in _search_pairs},
+            _on_pair if len(_search_pairs) > 1 else None,
+            budget=REALTIME_LATENCY_BUDGET, grace=SLOW_LEG_GRACE,
+        )
+        for flights in results.values():
+            offers.extend(flights)
     finally:
         progress_task.cancel()
         try:
@@ -268,56 +322,31 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
         except asyncio.CancelledError:
             pass
 
-    logger.info(f"🔍 [Search] {len(all_flights)} рейсов от {set(f.get('_source') for f in all_flights)}")
-
-    # ── Нет прямых → предлагаем с пересадками ──────────────────
-    if direct_only and not all_flights:
-        _fb_results = await asyncio.gather(*[
-            search_flights_realtime(
-                origin=o, destination=d,
-                depart_date=normalize_date(data["depart_date"]),
-                return_date=normalize_date(data["return_date"]) if data.get("return_date") else None,
-                adults=rt_adults, children=rt_children, infants=rt_infants,
-            )
-            for o, d in _search_pairs
-        ], return_exceptions=True)
-        all_any = [f for r in _fb_results if not isinstance(r, Exception) for f in r]
-
-        if all_any:
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Показать рейсы с пересадками",
-                                      callback_data="retry_with_transfers")],
-                [InlineKeyboardButton(text="✏️ Изменить параметры", callback_data="back_to_summary")],
-                [InlineKeyboardButton(text="↩️ В начало", callback_data="main_menu")],
-            ])
-            await callback.message.edit_text(
-                "😔 <b>Прямых рейсов на эти даты не найдено.</b>\n\nЕсть варианты с пересадками — они часто дешевле!",
-                parse_mode="HTML", reply_markup=kb,
-            )
-        else:
-            await _show_no_flights(callback, data, origins, destinations, pax_code)
-        return
+    # Фильтр типа рейса — локально по всем предложениям; они же уходят в кэш для экрана фильтров
+    view        = view_for_flight_type(flight_type)
+    order       = sort_indexes(offers)
+    all_flights = apply_view(offers, view, order)
+    logger.info(f"🔍 [Search] {len(all_flights)} из {len(offers)} рейсов от {set(f.get('_source') for f in offers)}")
 
     # ── Вообще нет рейсов ───────────────────────────────────────
-    if not all_flights:
-        await _show_no_flights(callback, data, origins, destinations, pax_code)
+    if not offers:
+        await _show_no_flights(target_msg, data, origins, destinations, pax_code)
         await state.clear()
         return
 
-    # ── Сохраняем кэш и показываем результат ───────────────────
-    cache_id       = str(uuid4())
-    display_depart = format_user_date(data["depart_date"])
-    display_return = format_user_date(data["return_date"]) if data.get("return_date") else None
-
-    await redis_client.set_search_cache(cache_id, {
+    # ── Сохраняем кэш: все предложения без фильтра + текущий вид ─
+    cache_id = str(uuid4())
+    cached = {
         "flights": all_flights,
+        "offers": offers, "order": order, "view": view.encode(),
         "origin": data.get("origin", ""), "origin_iata": data.get("origin_iata", ""),
         "origin_name": data.get("origin_name", ""),
         "dest": data.get("dest", ""),     "dest_iata": data["dest_iata"],
         "dest_name": data.get("dest_name", ""),
         "depart_date": data["depart_date"],       "return_date": data.get("return_date"),
         "need_return": data.get("need_return", False),
-        "display_depart": display_depart,         "display_return": display_return,
+        "display_depart": format_user_date(data["depart_date"]),
+        "display_return": format_user_date(data["return_date"]) if data.get("return_date") else None,
         "original_depart": data["depart_date"],   "original_return": data.get("return_date"),
         "passenger_desc": data["passenger_desc"], "passengers_code": data["passenger_code"],
         "passenger_code": data["passenger_code"],
@@ -325,13 +354,68 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
         "infants": data.get("infants", 0),
         "origin_everywhere": False, "dest_everywhere": False,
         "flight_type": flight_type,
-    })
+    }
+    await redis_client.set_search_cache(cache_id, cached)
+
+    # ── Под тип рейса ничего нет → остальные варианты из того же кэша ─
+    if not all_flights:
+        if direct_only:
+            text = "😔 <b>Прямых рейсов на эти даты не найдено.</b>\n\nЕсть варианты с пересадками — они часто дешевле!"
+            button = "🔄 Показать рейсы с пересадками"
+        else:
+            text = "😔 <b>Рейсов с пересадками на эти даты не найдено.</b>\n\nЗато есть прямые рейсы!"
+            button = "🔄 Показать прямые рейсы"
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=button, callback_data=f"rv_{cache_id}_{View().encode()}")],
+            [InlineKeyboardButton(text="✏️ Изменить параметры", callback_data="back_to_summary")],
+            [InlineKeyboardButton(text="↩️ В начало", callback_data="main_menu")],
+        ])
+        await target_msg.edit_text(text, parse_mode="HTML", reply_markup=kb)
+        return
 
     # Трекинг: тип поиска и воронка
     import asyncio as _aio
     _aio.ensure_future(redis_client.track_search_type("normal"))
     _aio.ensure_future(redis_client.track_funnel_step("5_result_shown"))
-    top_flight   = find_cheapest_flight_on_exact_date(all_flights, data["depart_date"], data.get("return_date"))
+
+    await _render_result(target_msg, cached, cache_id, view, all_flights)
+
+    # Сохраняем в историю поисков
+    try:
+        await redis_client.save_search_history(callback.from_user.id, {
+            "origin_name": data.get("origin_name") or data.get("origin", ""),
+            "dest_name":   data.get("dest_name")   or data.get("dest", ""),
+            "origin_iata": data.get("origin_iata", ""),
+            "dest_iata":   data.get("dest_iata", ""),
+            "depart_date": data.get("depart_date", ""),
+            "return_date": data.get("return_date", ""),
+            "pax":         data.get("passenger_code", "1"),
+        })
+    except Exception:
+        pass
+
+    await state.clear()
+    await callback.answer()
+
+    # Умное напоминание — предложим вау-цены через 15 минут если ещё не подписаны
+    asyncio.create_task(
+        remind_after_search(callback.message.chat.id, callback.from_user.id, delay_min=15)
+    )
+
+
+async def _render_result(message, data: dict, cache_id: str, view: View, flights: list):
+    """
+    Экран «Лучший результат» по кэшу поиска: первый вариант вида view
+    (для сортировки по цене — самый дешёвый на точную дату) и кнопки.
+    Вызывается и после поиска, и при смене фильтров — без запросов к API поиска.
+    """
+    offers = data.get("offers") or data.get("flights") or []
+    if view.sort == "p":
+        top_flight = find_cheapest_flight_on_exact_date(flights, data["depart_date"], data.get("return_date"))
+    else:
+        top_flight = flights[0]
+    display_depart = data.get("display_depart") or format_user_date(data["depart_date"])
+    display_return = data.get("display_return")
     price        = top_flight.get("value") or top_flight.get("price") or "?"
     origin_iata  = top_flight["origin"]
     dest_iata    = top_flight.get("destination") or data["dest_iata"]
@@ -397,6 +481,12 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
     if data.get("need_return") and display_return:
         text += f"\n<b>Обратно:</b> {display_return}"
     text += f"\n{duration} · {transfer_text}"
+    if len(offers) > 1:
+        active = describe(view)
+        text += (
+            f"\n\n🎛 Вариантов: {len(flights)} из {len(offers)}"
+            + (f" ({active})" if active else "") + f", {SORTS[view.sort]}"
+        )
 
     airline       = top_flight.get("airline", "")
     flight_number = top_flight.get("flight_number", "")
@@ -450,6 +540,12 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
     if _trip_url and is_trip_supported(origin_iata, dest_iata):
         kb_buttons.append([InlineKeyboardButton(text="🌐 Сравнить на Trip.com", url=_trip_url)])
 
+    if len(offers) > 1:
+        row = [InlineKeyboardButton(text="🎛 Фильтры", callback_data=f"rf_{cache_id}_{view.encode()}")]
+        if len(flights) > 1:
+            row.append(InlineKeyboardButton(text=f"📋 Все варианты ({len(flights)})",
+                                            callback_data=f"rp_{cache_id}_{view.encode()}_0"))
+        kb_buttons.append(row)
     kb_buttons.append([InlineKeyboardButton(text="🔔 Следить за ценой", callback_data=f"watch_all_{cache_id}")])
     kb_buttons.append([InlineKeyboardButton(text="✏️ Изменить запрос", callback_data=f"edit_from_results_{cache_id}")])
 
@@ -462,32 +558,10 @@ async def _do_confirm_search(callback: CallbackQuery, state: FSMContext, data: d
     kb_buttons.append([InlineKeyboardButton(text="↩️ В начало", callback_data="main_menu")])
     kb = InlineKeyboardMarkup(inline_keyboard=kb_buttons)
 
-    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-
-    # Сохраняем в историю поисков
-    try:
-        await redis_client.save_search_history(callback.from_user.id, {
-            "origin_name": data.get("origin_name") or data.get("origin", ""),
-            "dest_name":   data.get("dest_name")   or data.get("dest", ""),
-            "origin_iata": data.get("origin_iata", ""),
-            "dest_iata":   data.get("dest_iata", ""),
-            "depart_date": data.get("depart_date", ""),
-            "return_date": data.get("return_date", ""),
-            "pax":         data.get("passenger_code", "1"),
-        })
-    except Exception:
-        pass
-
-    await state.clear()
-    await callback.answer()
-
-    # Умное напоминание — предложим вау-цены через 15 минут если ещё не подписаны
-    asyncio.create_task(
-        remind_after_search(callback.message.chat.id, callback.from_user.id, delay_min=15)
-    )
+    await message.edit_text(text, parse_mode="HTML", reply_markup=kb)
 
 
-async def _show_no_flights(callback: CallbackQuery, data: dict,
+async def _show_no_flights(message, data: dict,
                             origins: list, destinations: list, pax_code: str):
     """Показать экран 'билеты не найдены' со ссылками на Aviasales и Trip.com."""
     for orig in origins:
@@ -541,13 +615,27 @@ async def _show_no_flights(callback: CallbackQuery, data: dict,
     if _trip_url and is_trip_supported(origin_iata, dest_iata):
         kb_buttons.append([InlineKeyboardButton(text="🌐 Поискать на Trip.com", url=_trip_url)])
 
+    # Альтернативные аэропорты рядом (если поиск был без них)
+    alt_lines = []
+    if not data.get("include_nearby"):
+        for label, iata in (("вылета", data.get("origin_iata", "")), ("прилёта", dest_iata)):
+            near = nearby_airports(iata) if iata else []
+            if near:
+                alt_lines.append(f"  • рядом с городом {label}: " + ", ".join(
+                    f"{get_city_name(code) or IATA_TO_CITY.get(code, code)} ({code}, {km} км)" for code, km in near
+                ))
+    if alt_lines:
+        kb_buttons.append([InlineKeyboardButton(text="📍 Искать с аэропортами рядом",
+                                                callback_data=f"search_nearby_{cache_id}")])
+
     kb_buttons.append([InlineKeyboardButton(text="✏️ Изменить маршрут", callback_data=f"edit_from_results_{cache_id}")])
     kb_buttons.append([InlineKeyboardButton(text="↩️ В начало", callback_data="main_menu")])
 
     kb = InlineKeyboardMarkup(inline_keyboard=kb_buttons)
-    await callback.message.edit_text(
+    alt_text = ("\n\n💡 <b>Можно вылететь или прилететь рядом:</b>\n" + "\n".join(alt_lines)) if alt_lines else ""
+    await message.edit_text(
         "😔 <b>К сожалению, нет данных по этому маршруту</b>\n\n"
-        "Актуальные цены смотри напрямую на Aviasales 👇",
+        "Актуальные цены смотри напрямую на Aviasales 👇" + alt_text,
         parse_mode="HTML", reply_markup=kb,
     )
 
@@ -556,8 +644,131 @@ async def _show_no_flights(callback: CallbackQuery, data: dict,
 # Callback-хендлеры результатов
 # ════════════════════════════════════════════════════════════════
 
+def _mark(label: str, active: bool) -> str:
+    return f"✅ {label}" if active else label
+
+
+def _filters_keyboard(cache_id: str, view: View, offers: list) -> InlineKeyboardMarkup:
+    """Меню фильтров: каждая кнопка — готовый вид rv_{cache_id}_{код}."""
+    def _btn(label: str, new_view: View) -> InlineKeyboardButton:
+        return InlineKeyboardButton(text=_mark(label, new_view == view),
+                                    callback_data=f"rv_{cache_id}_{new_view.encode()}")
+
+    rows = [
+        [_btn(label.capitalize(), view._replace(type=code)) for code, label in TYPES.items()],
+        [_btn("Любое время", view._replace(time="-"))]
+        + [_btn(label.capitalize(), view._replace(time=code)) for code, (_, _, label) in TIME_WINDOWS.items()],
+        [_btn("Любая длительность", view._replace(max_hours=0))]
+        + [_btn(f"≤{h}ч", view._replace(max_hours=h)) for h in DURATION_STEPS],
+    ]
+    codes = airlines(offers, AIRLINES_IN_MENU)
+    if len(codes) > 1:
+        rows.append([_btn("Любая а/к", view._replace(airline=""))]
+                    + [_btn(code, view._replace(airline=code)) for code in codes])
+    rows.append([_btn(label.capitalize(), view._replace(sort=code)) for code, label in SORTS.items()])
+    rows.append([InlineKeyboardButton(text="↩️ К результату", callback_data=f"rv_{cache_id}_{view.encode()}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@router.callback_query(F.data.startswith("rf_"))
+async def show_result_filters(callback: CallbackQuery):
+    """Меню фильтров и сортировки под экраном результата."""
+    cancel_inactivity(callback.message.chat.id)
+    _, cache_id, code = callback.data.split("_", 2)
+    cached = await redis_client.get_search_cache(cache_id)
+    if not cached:
+        await callback.answer("Данные устарели, начните новый поиск", show_alert=True)
+        return
+    offers = cached.get("offers") or cached.get("flights") or []
+    await callback.message.edit_reply_markup(reply_markup=_filters_keyboard(cache_id, decode_view(code), offers))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("rv_"))
+async def show_result_view(callback: CallbackQuery):
+    """Результат с другими фильтрами/сортировкой — из кэша, без нового поиска."""
+    cancel_inactivity(callback.message.chat.id)
+    _, cache_id, code = callback.data.split("_", 2)
+    cached = await redis_client.get_search_cache(cache_id)
+    if not cached:
+        await callback.answer("Данные устарели, начните новый поиск", show_alert=True)
+        return
+    view    = decode_view(code)
+    offers  = cached.get("offers") or cached.get("flights") or []
+    flights = apply_view(offers, view, cached.get("order") or sort_indexes(offers))
+    if not flights:
+        await callback.answer("Под эти фильтры вариантов нет", show_alert=True)
+        return
+    await _render_result(callback.message, cached, cache_id, view, flights)
+    await callback.answer()
+
+
+def _offer_line(n: int, f: dict) -> str:
+    """«6. 7 500 ₽ · 07:30 · 2ч 30м · прямой · SU 100»"""
+    price     = int(float(f.get("value") or f.get("price") or 0))
+    transfers = f.get("transfers", 0)
+    flight_no = f"{f.get('airline', '')} {f.get('flight_number', '')}".strip()
+    parts = [
+        f"<b>{price:,} ₽</b>".replace(",", "\u202f"),
+        _format_datetime(f.get("departure_at", "")),
+        _format_duration(f.get("duration", 0)),
+        "прямой" if transfers == 0 else f"пересадок: {transfers}",
+    ]
+    if flight_no:
+        parts.append(flight_no)
+    return f"{n}. " + " · ".join(parts)
+
+
+@router.callback_query(F.data.startswith("rp_"))
+async def show_result_page(callback: CallbackQuery):
+    """
+    Браузер вариантов: страница PAGE_SIZE предложений вида.
+    rp_{cache_id}_{код вида}_{страница} — одно чтение кэша, срез готового индекса.
+    """
+    cancel_inactivity(callback.message.chat.id)
+    _, cache_id, code, number = callback.data.split("_", 3)
+    cached = await redis_client.get_search_cache(cache_id)
+    if not cached:
+        await callback.answer("Данные устарели, начните новый поиск", show_alert=True)
+        return
+    view   = decode_view(code)
+    offers = cached.get("offers") or cached.get("flights") or []
+    order  = cached.get("order") or sort_indexes(offers)  # кэши до индексов
+    number = int(number) if number.isdigit() else 0
+    items, total = page(offers, order, view, number)
+    if not items:
+        await callback.answer("Под эти фильтры вариантов нет", show_alert=True)
+        return
+
+    start  = number * PAGE_SIZE
+    active = describe(view)
+    text = (
+        f"📋 <b>{cached.get('origin_name') or cached.get('origin_iata', '')} → "
+        f"{cached.get('dest_name') or cached.get('dest_iata', '')}</b>, {SORTS[view.sort]}"
+        + (f"\n🎛 {active}" if active else "")
+        + f"\n<i>Варианты {start + 1}–{start + len(items)} из {total}</i>\n\n"
+        + "\n".join(_offer_line(start + i + 1, f) for i, f in enumerate(items))
+    )
+
+    nav = []
+    if number > 0:
+        nav.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"rp_{cache_id}_{code}_{number - 1}"))
+    if start + len(items) < total:
+        nav.append(InlineKeyboardButton(text=f"Следующие {PAGE_SIZE} ▶️", callback_data=f"rp_{cache_id}_{code}_{number + 1}"))
+    rows = [nav] if nav else []
+    rows.append([
+        InlineKeyboardButton(text=_mark(label.capitalize(), key == view.sort),
+                             callback_data=f"rp_{cache_id}_{view._replace(sort=key).encode()}_0")
+        for key, label in SORTS.items()
+    ])
+    rows.append([InlineKeyboardButton(text="↩️ К результату", callback_data=f"rv_{cache_id}_{code}")])
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    await callback.answer()
+
+
 @router.callback_query(F.data == "retry_with_transfers")
 async def retry_with_transfers(callback: CallbackQuery, state: FSMContext):
+    """Кнопка из сообщений до кэша предложений: повторный поиск с пересадками по FSM."""
     cancel_inactivity(callback.message.chat.id)
     data = await state.get_data()
     if not data:
@@ -594,14 +805,7 @@ async def back_to_summary(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     summary = "Проверьте даты и данные:\n\n" + build_choices_summary(data)
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_search")],
-        [InlineKeyboardButton(text="✏️ Маршрут",    callback_data="edit_route"),
-         InlineKeyboardButton(text="✏️ Даты",        callback_data="edit_dates")],
-        [InlineKeyboardButton(text="✏️ Тип рейса",   callback_data="edit_flight_type"),
-         InlineKeyboardButton(text="✏️ Пассажиры",   callback_data="edit_passengers")],
-        [InlineKeyboardButton(text="↩️ В начало",    callback_data="main_menu")],
-    ])
+    kb = _summary_keyboard(data)  # с переключателями «рядом» / «гибкие даты» из FSM
     await callback.message.edit_text(summary, parse_mode="HTML")
     await callback.message.answer("Подтвердите или измените параметры:", reply_markup=kb)
     await state.set_state(FlightSearch.confirm)
@@ -618,8 +822,34 @@ async def edit_from_results(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Данные устарели, начните новый поиск", show_alert=True)
         return
 
-    cached.pop("flights", None)
-    fsm_data = {
+    fsm_data = _fsm_data_from_cache(cached)
+    await state.update_data(**fsm_data)
+    await state.set_state(FlightSearch.confirm)
+
+    summary = "Проверьте даты и данные:\n\n" + build_choices_summary(fsm_data)
+    kb = _summary_keyboard(await state.get_data())  # флаги поиска, оставшиеся в FSM, — видны и снимаются
+    await callback.message.edit_text(summary, parse_mode="HTML", reply_markup=kb)
+    schedule_inactivity(callback.message.chat.id, callback.from_user.id)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("search_nearby_"))
+async def search_nearby(callback: CallbackQuery, state: FSMContext):
+    """Повтор поиска с экрана «не найдено» с соседними аэропортами (include_nearby)."""
+    cancel_inactivity(callback.message.chat.id)
+    cached = await redis_client.get_search_cache(callback.data.replace("search_nearby_", ""))
+    if not cached:
+        await callback.answer("Данные устарели, начните новый поиск", show_alert=True)
+        return
+    await state.update_data(**_fsm_data_from_cache(cached), include_nearby=True)
+    await state.set_state(FlightSearch.confirm)
+    await confirm_search(callback, state)
+    await callback.answer()
+
+
+def _fsm_data_from_cache(cached: dict) -> dict:
+    """Параметры поиска из кэша результатов — обратно в FSM (для повторного поиска)."""
+    return {
         "origin":         cached.get("origin", ""),
         "origin_iata":    cached.get("origin_iata", ""),
         "origin_name":    cached.get("origin_name", ""),
@@ -637,21 +867,6 @@ async def edit_from_results(callback: CallbackQuery, state: FSMContext):
         "passenger_desc": cached.get("passenger_desc", "1 взр."),
         "_edit_mode":     False,
     }
-    await state.update_data(**fsm_data)
-    await state.set_state(FlightSearch.confirm)
-
-    summary = "Проверьте даты и данные:\n\n" + build_choices_summary(fsm_data)
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_search")],
-        [InlineKeyboardButton(text="✏️ Маршрут",    callback_data="edit_route"),
-         InlineKeyboardButton(text="✏️ Даты",        callback_data="edit_dates")],
-        [InlineKeyboardButton(text="✏️ Тип рейса",   callback_data="edit_flight_type"),
-         InlineKeyboardButton(text="✏️ Пассажиры",   callback_data="edit_passengers")],
-        [InlineKeyboardButton(text="↩️ В начало",    callback_data="main_menu")],
-    ])
-    await callback.message.edit_text(summary, parse_mode="HTML", reply_markup=kb)
-    schedule_inactivity(callback.message.chat.id, callback.from_user.id)
-    await callback.answer()
 
 
 # ════════════════════════════════════════════════════════════════
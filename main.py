@@ -30,9 +30,8 @@ from handlers.get_file_id import router as get_file_id_router
 # Импорт утилит и сервисов
 from utils.logger import logger
 from utils.redis_client import redis_client
-from utils.cities_loader import load_cities_from_api
-from services.price_watcher import PriceWatcher
-from services.hot_deals_sender import HotDealsSender
+from utils.cities_loader import load_cities_from_api, refresh_city_popularity
+from services.worker import start_background_services, stop_background_services
 
 # Уровень логирования: DEBUG — видим все детали, INFO — только важное
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -56,6 +55,7 @@ async def main():
     # ─── 2. Загрузка базы городов ───
     logger.info("🌍 Загружаю базу городов...")
     await load_cities_from_api()
+    await refresh_city_popularity()   # ранжирование автокомплита search_cities
 
     # ─── 3. Инициализация бота ───
     bot_token = os.getenv("BOT_TOKEN", "").strip()
@@ -146,17 +146,13 @@ async def main():
     logger.info("✅ Роутер: everywhere_router")
 
     # ─── 6. Фоновые задачи ───
-    price_watcher = PriceWatcher(bot)
-    watcher_task = asyncio.create_task(price_watcher.start())
-    logger.info("✅ PriceWatcher запущен")
-
-    hot_deals_sender = HotDealsSender(bot)
-    hot_deals_task = asyncio.create_task(hot_deals_sender.start())
-
-    from utils import daily_stats as _daily_stats
-    daily_stats_task = asyncio.create_task(_daily_stats.start())
-    logger.info("✅ Сервис: daily_stats (ежедневный отчёт в канал)")
-    logger.info("✅ HotDealsSender запущен")
+    # BACKGROUND_MODE=worker — сервисы крутятся в отдельном процессе (python -m services.worker),
+    # бот только отвечает пользователям. inline (по умолчанию) — внутри бота, под Redis-лизой.
+    background_tasks = []
+    if os.getenv("BACKGROUND_MODE", "inline").strip().lower() == "worker":
+        logger.info("ℹ️ Фоновые сервисы вынесены в services.worker — здесь не запускаются")
+    else:
+        background_tasks = start_background_services(bot)
 
     logger.info("🚀 Бот запущен! Ожидаю сообщения...")
 
@@ -199,20 +195,8 @@ async def main():
     finally:
         logger.info("🛑 Остановка бота...")
 
-        # Останавливаем фоновые задачи
-        price_watcher.running = False
-        hot_deals_sender.stop()
-
-        watcher_task.cancel()
-        hot_deals_task.cancel()
-        daily_stats_task.cancel()
-
-        # Ждём завершения
-        for task in [watcher_task, hot_deals_task, daily_stats_task]:
-            try:
-                await asyncio.wait_for(task, timeout=5.0)
-            except (asyncio.CancelledError, asyncio.TimeoutError):
-                pass
+        # Останавливаем фоновые задачи (и освобождаем их лизы)
+        await stop_background_services(background_tasks)
 
         await redis_client.close()
         await bot.session.close()
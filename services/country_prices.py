@@ -0,0 +1,84 @@
+# services/country_prices.py
+"""
+Поиск «из города в любой город страны» по кешу календарей.
+
+Для каждого города страны хранится календарь grouped_prices на месяц
+вылета (Redis HASH country:{origin}:{ISO}:{ГГГГ-ММ}:{a|d}, поле — город).
+Запрос на любой день месяца считается из календарей; к API идём только
+за городами, которых в кеше ещё нет (какие опрашивать — hub_selector),
+и докладываем их в тот же HASH — следующий «Москва → Турция» в этом
+месяце обходится без запросов.
+"""
+from typing import Dict, List, Optional
+
+from services import hub_selector
+from services.flight_search import grouped_prices
+from utils.api_limiter import FANOUT_SEMAPHORE
+from utils.progressive import OnResult, gather_streaming
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+COUNTRY_BUDGET = 4  # городов страны в выдаче на один поиск — выбирает hub_selector
+COUNTRY_LATENCY_BUDGET = 12.0  # секунд на докачку календарей; опоздавшие города отменяются
+
+
+def _price(flight: dict) -> float:
+    return flight.get("value") or flight.get("price") or 999_999
+
+
+def flights_on(calendars: Dict[str, List[Dict]], origin: str, depart_date: str) -> List[Dict]:
+    """Билеты на день (ГГГГ-ММ-ДД) или месяц (ГГГГ-ММ) из календарей, по возрастанию цены."""
+    flights = []
+    for dest, calendar in calendars.items():
+        for f in calendar:
+            if str(f.get("departure_at", "")).startswith(depart_date):
+                flights.append(dict(f, origin=origin, destination=dest))
+    return sorted(flights, key=_price)
+
+
+async def _fetch_calendars(
+    origin: str, dests: List[str], month: str, direct: bool, on_leg: Optional[OnResult] = None,
+) -> Dict[str, List[Dict]]:
+    async def _one(dest: str) -> List[Dict]:
+        async with FANOUT_SEMAPHORE:
+            flights = await grouped_prices(origin, dest, month, None, direct=direct)
+        if flights is None:  # 429 / ошибка — не путать с пустым маршрутом, в кеш не кладём
+            raise RuntimeError(f"{origin}→{dest}: нет ответа API")
+        return flights
+
+    return await gather_streaming({d: _one(d) for d in dests}, on_leg, budget=COUNTRY_LATENCY_BUDGET)
+
+
+async def cheapest_in_country(
+    origin: str,
+    iso: Optional[str],
+    candidates: List[str],
+    depart_date: str,
+    direct: bool = False,
+    on_leg: Optional[OnResult] = None,
+) -> List[Dict]:
+    """
+    Билеты из origin в города страны на depart_date (ГГГГ-ММ-ДД или ГГГГ-ММ),
+    по возрастанию цены. iso=None — страна не распознана, кеш не используется.
+    on_leg получает билеты на depart_date по каждому докачанному городу.
+    """
+    month = depart_date[:7]
+    cached = await redis_client.get_country_month(origin, iso, month, direct) if iso else {}
+
+    chosen  = await hub_selector.choose("from", origin, candidates, COUNTRY_BUDGET, depart_date)
+    missing = [d for d in chosen if d not in cached]
+
+    async def _day_leg(dest: str, calendar: List[Dict]) -> None:
+        await on_leg(dest, flights_on({dest: calendar}, origin, depart_date))
+
+    fetched = await _fetch_calendars(origin, missing, month, direct, _day_leg if on_leg else None) if missing else {}
+    if fetched:
+        if not direct:  # «нет прямых» — не «маршрут пуст»: route_empty общий для всех поисков
+            await hub_selector.record_outcome("from", origin, depart_date, fetched)
+        if iso:
+            await redis_client.set_country_routes(origin, iso, month, direct, fetched)
+
+    logger.info(
+        f"[CountryPrices] {origin}→{iso} {depart_date}: из кеша {len(cached)}, запрошено {len(fetched)}"
+    )
+    return flights_on({**cached, **fetched}, origin, depart_date)
@@ -0,0 +1,98 @@
+# services/cycle_store.py
+"""
+Хранилище результатов проверки маршрутов на один проход (цикл) HotDealsSender.
+
+Один проход = одна загрузка: объединение маршрутов всех подписок
+запрашивается один раз (очередь воркеров или сами под BACKGROUND_SEMAPHORE),
+дальше горячие проверки, напоминалки и дайджест только читают из памяти.
+Второго пути запросов к API нет — маршрута нет в хранилище, значит его
+нет и в этом цикле.
+
+Счётчики цикла (для логов):
+  api_calls   — проверок маршрутов выполнено этим процессом
+  queued      — получено от воркеров route_queue
+  naive_calls — сколько проверок сделал бы прежний код (по подписке, плюс
+                повторный проход напоминалки)
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from services import route_queue
+from utils.redis_client import redis_client
+from utils.api_limiter import BACKGROUND_SEMAPHORE
+from utils.logger import logger
+
+ROUTE_PACING = 0.3   # пауза после запроса под семафором — бережём лимит Data API
+
+
+class CycleStore:
+    def __init__(self, tag: str):
+        self.tag      = tag
+        self.cycle_id = f"{tag.lower()}:{int(time.time())}"
+        self.started  = time.monotonic()
+        self._results: Dict[str, Optional[dict]] = {}
+        self.api_calls   = 0
+        self.queued      = 0
+        self.naive_calls = 0
+
+    # ── Загрузка ───────────────────────────────────────────────────────────────
+
+    async def load(self, jobs: Dict[str, dict], naive_calls: int = 0) -> None:
+        """
+        jobs: route_key → {"origin", "dest", "depart_date"} — уже без дублей.
+        Маршруты, которые уже есть в хранилище, повторно не запрашиваются
+        (дайджест догружает хранилище порциями по мере наступления слотов).
+        Для каждого маршрута с ценой добавляет baseline (EMA до обновления)
+        и avg (после) — базовая цена обновляется один раз на маршрут.
+        """
+        self.naive_calls += naive_calls
+        jobs = {k: j for k, j in jobs.items() if k not in self._results}
+        results: Dict[str, Optional[dict]] = {}
+
+        if route_queue.enabled() and jobs:
+            try:
+                results = await route_queue.check_routes(self.cycle_id, list(jobs.values()), timeout=15 * 60)
+                self.queued = len(results)
+            except Exception as e:
+                logger.error(f"[{self.tag}] очередь недоступна, проверяю сам: {e}")
+
+        async def _fetch(key: str) -> None:
+            job = jobs[key]
+            try:
+                async with BACKGROUND_SEMAPHORE:
+                    self.api_calls += 1
+                    results[key] = await route_queue.check_route(job["origin"], job["dest"], job["depart_date"], None)
+                    await asyncio.sleep(ROUTE_PACING)
+            except Exception as e:
+                logger.warning(f"[{self.tag}] {job['origin']}→{job['dest']}: {e}")
+                results[key] = None
+
+        await asyncio.gather(*[_fetch(k) for k in jobs if k not in results])
+
+        for key, res in results.items():
+            if res and key in jobs:
+                origin, dest = jobs[key]["origin"], jobs[key]["dest"]
+                res["baseline"] = await redis_client.get_baseline_price(origin, dest)
+                res["avg"]      = await redis_client.update_baseline_price(origin, dest, res["price"])
+        self._results.update(results)
+
+    # ── Чтение (только память) ─────────────────────────────────────────────────
+
+    def get(self, origin: str, dest: str, depart_str: str) -> Optional[dict]:
+        """{"price", "flight", "baseline", "avg"} или None (пусто / не загружался)."""
+        return self._results.get(route_queue.route_key(origin, dest, depart_str, None))
+
+    def count_avoided(self, n: int) -> None:
+        """Учесть чтения, для которых прежний код делал бы отдельный запрос (напоминалки)."""
+        self.naive_calls += n
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def report(self) -> str:
+        return (
+            f"[{self.tag}] цикл {self.cycle_id}: запросов к API {self.api_calls}"
+            f" (+{self.queued} через воркеров), без общего хранилища было бы {self.naive_calls};"
+            f" маршрутов {len(self._results)}, {time.monotonic() - self.started:.0f}с"
+        )
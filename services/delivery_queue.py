@@ -0,0 +1,132 @@
+# services/delivery_queue.py
+"""
+Отложенная доставка уведомлений (бесплатный тариф получает их через PRIORITY_DELAY).
+
+Вместо asyncio.sleep между платными и бесплатными подписчиками готовое
+сообщение кладётся в Redis и отправляется диспетчером, когда подойдёт срок.
+Очередь переживает перезапуск, цикл оценки подписок не ждёт.
+
+Redis-ключи:
+  delivery:due   ZSET  job_id → deliver_at (unix-время)
+  delivery:jobs  HASH  job_id → JSON задания
+
+job_id = "{kind}:{sub_id}" — одна ожидающая доставка на подписку и тип:
+повторная постановка обновляет текст, но не отодвигает срок.
+
+Без Redis — очередь в памяти процесса (срок соблюдается, перезапуск её теряет).
+Забор заданий — Lua-скрипт (ZRANGEBYSCORE + ZREM + HGET/HDEL атомарно),
+поэтому два диспетчера одно задание не отправят.
+"""
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+DISPATCH_INTERVAL = 5      # сек между опросами, когда очередь пуста
+DISPATCH_BATCH    = 50     # заданий за один забор
+DISPATCH_PACING   = 0.05   # между отправками — лимит Telegram (~30 сообщений/с)
+RETRY_DELAY       = 60     # сек до повтора неудачной отправки
+MAX_ATTEMPTS      = 3
+
+_CLAIM_LUA = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local out = {}
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], id)
+    local job = redis.call('HGET', KEYS[2], id)
+    redis.call('HDEL', KEYS[2], id)
+    if job then table.insert(out, job) end
+end
+return out
+"""
+
+# Запасная очередь без Redis: job_id → (deliver_at, job)
+_local: Dict[str, Tuple[float, dict]] = {}
+
+
+def _due_key() -> str:
+    return f"{redis_client.prefix}delivery:due"
+
+
+def _jobs_key() -> str:
+    return f"{redis_client.prefix}delivery:jobs"
+
+
+async def schedule(job_id: str, job: dict, deliver_at: float) -> None:
+    job = {**job, "job_id": job_id}
+    if not redis_client.client:
+        prev = _local.get(job_id)
+        _local[job_id] = (prev[0] if prev else deliver_at, job)
+        return
+    pipe = redis_client.client.pipeline()
+    pipe.hset(_jobs_key(), job_id, json.dumps(job, ensure_ascii=False))
+    pipe.zadd(_due_key(), {job_id: deliver_at}, nx=True)
+    await pipe.execute()
+
+
+async def claim_due(now: float, limit: int = DISPATCH_BATCH) -> List[dict]:
+    """Забрать (и удалить из очереди) задания со сроком <= now."""
+    if not redis_client.client:
+        due = sorted((at, jid) for jid, (at, _) in _local.items() if at <= now)[:limit]
+        return [_local.pop(jid)[1] for _, jid in due]
+    raw = await redis_client.client.eval(_CLAIM_LUA, 2, _due_key(), _jobs_key(), now, limit)
+    jobs = []
+    for item in raw or []:
+        try:
+            jobs.append(json.loads(item))
+        except Exception:
+            logger.warning(f"[Delivery] битое задание: {item!r:.100}")
+    return jobs
+
+
+async def pending() -> Tuple[int, int]:
+    """(всего в очереди, из них уже просрочено)."""
+    now = time.time()
+    if not redis_client.client:
+        return len(_local), sum(1 for at, _ in _local.values() if at <= now)
+    pipe = redis_client.client.pipeline()
+    pipe.zcard(_due_key())
+    pipe.zcount(_due_key(), "-inf", now)
+    total, overdue = await pipe.execute()
+    return int(total), int(overdue)
+
+
+async def retry(job: dict) -> None:
+    attempts = job.get("attempts", 0) + 1
+    if attempts >= MAX_ATTEMPTS:
+        logger.error(f"[Delivery] {job.get('job_id')}: {attempts} неудачных попыток — отбрасываем")
+        return
+    await schedule(job["job_id"], {**job, "attempts": attempts}, time.time() + RETRY_DELAY)
+
+
+async def run_dispatcher(
+    deliver: Callable[[dict], Awaitable[bool]],
+    should_run: Callable[[], bool] = lambda: True,
+) -> None:
+    """
+    deliver(job) → True, если задание закрыто (отправлено или больше не нужно);
+    False — повторить через RETRY_DELAY.
+    """
+    logger.info("[Delivery] диспетчер отложенных уведомлений запущен")
+    while should_run():
+        try:
+            jobs = await claim_due(time.time())
+        except Exception as e:
+            logger.error(f"[Delivery] забор заданий: {e}")
+            jobs = []
+
+        for job in jobs:
+            try:
+                done = await deliver(job)
+            except Exception as e:
+                logger.error(f"[Delivery] {job.get('job_id')}: {e}", exc_info=True)
+                done = False
+            if not done:
+                await retry(job)
+            await asyncio.sleep(DISPATCH_PACING)
+
+        if len(jobs) < DISPATCH_BATCH:
+            await asyncio.sleep(DISPATCH_INTERVAL)
@@ -0,0 +1,118 @@
+# services/digest_scheduler.py
+"""
+Расписание дайджестов по местному времени подписчика.
+
+Каждой подписке — свой слот в окне [DIGEST_WINDOW_START, +DIGEST_WINDOW_HOURS)
+по часовому поясу её первого города вылета (time_zone из справочника городов,
+по умолчанию — Москва). Смещение внутри окна — хэш sub_id: стабильно между
+рестартами и равномерно размазывает отправки вместо одного всплеска в 9:00 МСК.
+
+Планировщик каждые DIGEST_TICK секунд берёт подписки, чей слот наступит
+в ближайшие PREFETCH_LEAD секунд: содержимое считается заранее, а отправка
+ставится в delivery_queue ровно на время слота.
+
+Redis-ключ:
+  digest_done:{sub_id}:{YYYY-MM-DD}  — слот этого местного дня взят: на время сборки
+                                       CLAIM_TTL, после постановки в очередь — 3 дня.
+Упал процесс или сборка между claim и confirm — отметка истечёт (или снимается
+release) и слот досылается следующим тиком в пределах CATCHUP.
+"""
+import hashlib
+import os
+from datetime import date, datetime, time as dtime, timedelta
+from typing import List, NamedTuple, Set
+from zoneinfo import ZoneInfo
+
+from utils.redis_client import redis_client
+from utils.cities_loader import get_city_timezone
+
+DIGEST_WINDOW_START = int(os.getenv("DIGEST_WINDOW_START", "8"))      # местный час начала окна
+DIGEST_WINDOW_HOURS = float(os.getenv("DIGEST_WINDOW_HOURS", "3"))    # ширина окна, ч
+DIGEST_TICK         = 5 * 60      # период планировщика
+PREFETCH_LEAD       = 15 * 60     # содержимое считается за столько секунд до слота
+CATCHUP             = 2 * 3600    # пропущенный слот (рестарт) досылаем не позже чем через 2 ч
+DONE_TTL            = 3 * 86400
+CLAIM_TTL           = PREFETCH_LEAD  # слот «в работе»: не подтверждён за это время — снова свободен
+
+DEFAULT_TZ = ZoneInfo("Europe/Moscow")
+
+# Без Redis — отметки в памяти процесса
+_done_local: Set[str] = set()
+
+
+class DueDigest(NamedTuple):
+    user_id: int
+    sub_id:  str
+    sub:     dict
+    slot_ts: float   # unix-время отправки
+    day:     str     # местная дата слота, YYYY-MM-DD
+
+
+def sub_timezone(sub: dict) -> ZoneInfo:
+    origins = [o.get("iata") for o in sub.get("origins", []) if o.get("iata")] or [sub.get("origin_iata")]
+    name = get_city_timezone(origins[0]) if origins[0] else None
+    try:
+        return ZoneInfo(name) if name else DEFAULT_TZ
+    except Exception:
+        return DEFAULT_TZ
+
+
+def slot_offset(sub_id: str) -> int:
+    """Секунды от начала окна — детерминированно по sub_id."""
+    window = max(1, int(DIGEST_WINDOW_HOURS * 3600))
+    return int(hashlib.sha1(sub_id.encode()).hexdigest()[:8], 16) % window
+
+
+def slot_for(sub_id: str, tz: ZoneInfo, day: date) -> datetime:
+    start = datetime.combine(day, dtime(DIGEST_WINDOW_START), tzinfo=tz)
+    return start + timedelta(seconds=slot_offset(sub_id))
+
+
+def due_slots(digest_subs: list, now: datetime) -> List[DueDigest]:
+    """
+    Подписки, чей слот попадает в [now - CATCHUP, now + PREFETCH_LEAD].
+    Еженедельные — только по понедельникам (местным).
+    """
+    lo = now - timedelta(seconds=CATCHUP)
+    hi = now + timedelta(seconds=PREFETCH_LEAD)
+    due: List[DueDigest] = []
+    for user_id, sub_id, sub in digest_subs:
+        tz = sub_timezone(sub)
+        today = now.astimezone(tz).date()
+        for day in (today - timedelta(days=1), today, today + timedelta(days=1)):
+            if sub.get("frequency", "daily") == "weekly" and day.weekday() != 0:
+                continue
+            slot = slot_for(sub_id, tz, day)
+            if lo <= slot <= hi:
+                due.append(DueDigest(user_id, sub_id, sub, slot.timestamp(), day.isoformat()))
+    due.sort(key=lambda d: d.slot_ts)
+    return due
+
+
+async def claim(sub_id: str, day: str) -> bool:
+    """Взять слот местного дня на время сборки; False — уже взят (этим или другим процессом)."""
+    key = f"digest_done:{sub_id}:{day}"
+    if not redis_client.client:
+        if key in _done_local:
+            return False
+        _done_local.add(key)
+        return True
+    return bool(await redis_client.client.set(f"{redis_client.prefix}{key}", "1", nx=True, ex=CLAIM_TTL))
+
+
+async def confirm(sub_id: str, day: str) -> None:
+    """Дайджест поставлен в очередь — слот занят до конца DONE_TTL."""
+    if redis_client.client:
+        await redis_client.client.expire(f"{redis_client.prefix}digest_done:{sub_id}:{day}", DONE_TTL)
+
+
+async def release(sub_id: str, day: str) -> None:
+    """Сборка или постановка в очередь не удались — слот снова свободен."""
+    key = f"digest_done:{sub_id}:{day}"
+    if not redis_client.client:
+        _done_local.discard(key)
+        return
+    try:
+        await redis_client.client.delete(f"{redis_client.prefix}{key}")
+    except Exception:
+        pass  # не сняли — отметка сама истечёт через CLAIM_TTL
@@ -0,0 +1,117 @@
+# services/everywhere_engine.py
+"""
+Поиск «Везде»: самый дешёвый билет из города в каждое направление
+(или в город из каждого) на день вылета.
+
+Порядок:
+  1. Карта цен в Redis (anywhere:{side}:{IATA}:{месяц}) — день уже есть,
+     к API не ходим.
+  2. Один запрос Data API без второго города (search_cheapest_anywhere).
+  3. API недоступно — перебор HUB_BUDGET хабов из HUBS под общим
+     FANOUT_SEMAPHORE; какие именно — решает services/hub_selector по
+     накопленной статистике города.
+
+Результат дня пишется в карту месяца (HASH: день → билеты); её же читают
+слежения «Везде» (route_queue.check_route → search_*_everywhere).
+"""
+from typing import Dict, List, Optional
+
+from services import hub_selector
+from services.flight_search import grouped_prices, search_cheapest_anywhere
+from utils.api_limiter import FANOUT_SEMAPHORE
+from utils.progressive import OnResult, gather_streaming
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+SIDE_FROM = "from"   # из города во все направления
+SIDE_TO   = "to"     # из всех направлений в город
+
+# Хабы для запасного перебора — разбиты по регионам для лучшего покрытия
+SEARCH_HUBS_RUSSIA = [
+    "MOW", "LED", "AER", "KZN", "OVB", "SVX", "UFA", "ROV",
+    "KRR", "IKT", "VVO", "CEK", "KUF", "GOJ", "PEE"
+]
+SEARCH_HUBS_INTERNATIONAL = [
+    "IST", "DXB", "BKK", "BCN", "AMS", "CDG", "FCO", "BER",
+    "PRG", "BUD", "ATH", "WAW", "VIE", "TLV", "HEL"
+]
+# Полный список: сначала российские хабы, потом международные
+HUBS = SEARCH_HUBS_RUSSIA + SEARCH_HUBS_INTERNATIONAL
+HUB_BUDGET = 12  # сколько хабов опрашиваем за один перебор (из len(HUBS))
+FANOUT_LATENCY_BUDGET = 15.0  # секунд на перебор; не ответившие хабы отменяются
+
+
+def _price(flight: dict) -> float:
+    return flight.get("value") or flight.get("price") or 999_999
+
+
+def _cheapest_per_city(flights: List[Dict], side: str, iata: str, day: str) -> List[Dict]:
+    """Один самый дешёвый билет на каждый второй город маршрута, по возрастанию цены."""
+    other = "destination" if side == SIDE_FROM else "origin"
+    best: Dict[str, Dict] = {}
+    for f in flights:
+        city = f.get(other)
+        if not city or city == iata or not str(f.get("departure_at", day)).startswith(day):
+            continue
+        if city not in best or _price(f) < _price(best[city]):
+            best[city] = f
+    return sorted(best.values(), key=_price)
+
+
+async def _hub_fanout(
+    day: str, origin: Optional[str], destination: Optional[str], on_leg: Optional[OnResult] = None,
+) -> List[Dict]:
+    """
+    Запасной путь: по запросу grouped_prices на хаб, не больше FANOUT_SEMAPHORE
+    одновременно. Ответ каждого хаба сразу уходит в on_leg (экран ожидания).
+    Хаб без ответа API (429, ошибка) — упавшее плечо: в статистику и
+    route_empty попадают только настоящие ответы.
+    """
+    side, iata = (SIDE_FROM, origin) if origin else (SIDE_TO, destination)
+
+    async def _one(hub: str) -> List[Dict]:
+        pair = (iata, hub) if origin else (hub, iata)
+        async with FANOUT_SEMAPHORE:
+            flights = await grouped_prices(pair[0], pair[1], day, None)
+        if flights is None:
+            raise RuntimeError(f"{pair[0]}→{pair[1]}: нет ответа API")
+        for f in flights:
+            f["origin"], f["destination"] = pair
+        return flights
+
+    hubs = await hub_selector.choose(side, iata, HUBS, HUB_BUDGET, day)
+    observed = await gather_streaming({h: _one(h) for h in hubs}, on_leg, budget=FANOUT_LATENCY_BUDGET)
+    await hub_selector.record_outcome(side, iata, day, observed)
+    return [f for flights in observed.values() for f in flights]
+
+
+async def cheapest_everywhere(
+    depart_date: str,
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    on_leg: Optional[OnResult] = None,
+) -> List[Dict]:
+    """
+    Самые дешёвые билеты на день depart_date (ГГГГ-ММ-ДД): задаётся только
+    origin («город → везде») или только destination («везде → город»).
+    Один билет на каждый второй город, по возрастанию цены. on_leg получает
+    ответы хабов по мере прихода, если дело дошло до перебора.
+    """
+    side, iata = (SIDE_FROM, origin) if origin else (SIDE_TO, destination)
+
+    cached = await redis_client.get_anywhere_day(side, iata, depart_date)
+    if cached is not None:
+        logger.info(f"[Everywhere] {side}:{iata} {depart_date}: из карты цен ({len(cached)})")
+        return cached
+
+    flights = await search_cheapest_anywhere(depart_date, origin=origin, destination=destination)
+    source = "anywhere"
+    if flights is None:
+        flights = await _hub_fanout(depart_date, origin, destination, on_leg)
+        source = "hubs"
+
+    day_flights = _cheapest_per_city(flights, side, iata, depart_date)
+    await redis_client.set_anywhere_day(side, iata, depart_date, day_flights)
+    logger.info(f"[Everywhere] {side}:{iata} {depart_date}: {len(day_flights)} городов ({source})")
+    return day_flights
+
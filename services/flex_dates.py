@@ -0,0 +1,158 @@
+# services/flex_dates.py
+"""
+Гибкие даты: самый дешёвый вылет в окне ±N дней, для поездки туда-обратно —
+матрица «дата туда × дата обратно».
+
+Цены берутся из календаря grouped_prices на месяц — один запрос на плечо и
+месяц (окно на стыке месяцев — два), календари кешируются в Redis
+(calendar:{origin}:{dest}:{месяц}:{a|d}). Цена ячейки матрицы — сумма двух
+билетов в одну сторону: ориентир для выбора дат. Реальную цену выбранной
+ячейки проверяет обычный поиск — один realtime-запрос вместо ручных повторов.
+"""
+import asyncio
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from services.flight_search import search_flights
+from utils.api_limiter import FANOUT_SEMAPHORE
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+FLEX_DAYS     = 3   # окно по умолчанию: ±3 дня
+FLEX_MAX_DAYS = 7   # больше не даём — матрица перестаёт помещаться в сообщение
+
+Calendar = Dict[str, Dict]  # ГГГГ-ММ-ДД → самый дешёвый билет дня
+
+
+class FlexResult(NamedTuple):
+    departs: List[str]           # дни окна туда (ГГГГ-ММ-ДД)
+    returns: List[str]           # дни окна обратно ([] — в одну сторону)
+    out: Calendar                # цены туда по дням окна
+    back: Calendar               # цены обратно по дням окна
+    best: Optional[Tuple[str, Optional[str], int]]  # (туда, обратно, цена) или None
+
+
+# ══════════════════════════════════════════════════════════════════
+# Чистые функции
+# ══════════════════════════════════════════════════════════════════
+
+def _price(flight: dict) -> int:
+    return int(float(flight.get("value") or flight.get("price") or 0))
+
+
+def window(center: str, days: int = FLEX_DAYS, today: Optional[date] = None) -> List[str]:
+    """Дни center ± days (ГГГГ-ММ-ДД), без прошедших."""
+    c = date.fromisoformat(center)
+    today = today or date.today()
+    return [
+        d.isoformat() for d in (c + timedelta(days=i) for i in range(-days, days + 1))
+        if d >= today
+    ]
+
+
+def day_prices(flights: List[Dict], days: List[str]) -> Calendar:
+    """Самый дешёвый билет по каждому дню из days."""
+    wanted = set(days)
+    best: Calendar = {}
+    for f in flights:
+        day = str(f.get("departure_at", ""))[:10]
+        if day in wanted and _price(f) > 0 and (day not in best or _price(f) < _price(best[day])):
+            best[day] = f
+    return best
+
+
+def matrix(out: Calendar, back: Calendar) -> Dict[Tuple[str, str], int]:
+    """Цена (туда, обратно) для каждой пары дней, где обратно позже туда."""
+    return {(d, r): _price(fo) + _price(fb) for d, fo in out.items() for r, fb in back.items() if r > d}
+
+
+def best_cell(out: Calendar, back: Optional[Calendar]) -> Optional[Tuple[str, Optional[str], int]]:
+    """Самая дешёвая ячейка; при равной цене — ранний вылет."""
+    if back is None:
+        if not out:
+            return None
+        day = min(out, key=lambda d: (_price(out[d]), d))
+        return day, None, _price(out[day])
+    cells = matrix(out, back)
+    if not cells:
+        return None
+    (d, r), price = min(cells.items(), key=lambda kv: (kv[1], kv[0]))
+    return d, r, price
+
+
+def _short(day: str) -> str:
+    return f"{day[8:10]}.{day[5:7]}"
+
+
+def _k(price: int) -> str:
+    return f"{price / 1000:.1f}".rstrip("0").rstrip(".") + "к"
+
+
+def format_flex(result: FlexResult) -> str:
+    """Полоса цен по дням (в одну сторону) или матрица в <pre> (туда-обратно), HTML."""
+    if not result.returns:
+        best_day = result.best[0] if result.best else None
+        lines = []
+        for day in result.departs:
+            f = result.out.get(day)
+            price = f"{_price(f):,} ₽".replace(",", "\u202f") if f else "—"
+            mark = "  ← дешевле всего" if day == best_day else ""
+            lines.append(f"{_short(day)}  {price}{mark}")
+        return "📅 <b>Цены по соседним датам</b>\n<pre>" + "\n".join(lines) + "</pre>"
+
+    cells = matrix(result.out, result.back)
+    best = (result.best[0], result.best[1]) if result.best else None
+    width = 7
+    lines = ["туда\\обр".ljust(width) + "".join(_short(r).rjust(width) for r in result.returns)]
+    for d in result.departs:
+        row = _short(d).ljust(width)
+        for r in result.returns:
+            price = cells.get((d, r))
+            text = "—" if price is None else _k(price) + ("*" if (d, r) == best else "")
+            row += text.rjust(width)
+        lines.append(row)
+    return (
+        "📅 <b>Цены туда-обратно по соседним датам</b> (тыс. ₽, * — дешевле всего)\n"
+        "<pre>" + "\n".join(lines) + "</pre>"
+    )
+
+
+# ══════════════════════════════════════════════════════════════════
+# Календари
+# ══════════════════════════════════════════════════════════════════
+
+async def _month_calendar(origin: str, dest: str, month: str, direct: bool) -> List[Dict]:
+    cached = await redis_client.get_route_calendar(origin, dest, month, direct)
+    if cached is not None:
+        return cached
+    async with FANOUT_SEMAPHORE:  # плечи и месяцы окна — под общим потолком, как календари страны
+        flights = await search_flights(origin, dest, month, None, direct=direct)
+    await redis_client.set_route_calendar(origin, dest, month, direct, flights)
+    return flights
+
+
+async def leg_prices(origin: str, dest: str, days: List[str], direct: bool = False) -> Calendar:
+    """Цены плеча по дням окна: календарь на каждый месяц окна (обычно один)."""
+    months = sorted({d[:7] for d in days})
+    calendars = await asyncio.gather(*[_month_calendar(origin, dest, m, direct) for m in months])
+    return day_prices([f for cal in calendars for f in cal], days)
+
+
+async def flex_search(
+    origin: str, dest: str, depart: str, return_: Optional[str] = None,
+    days: int = FLEX_DAYS, direct: bool = False,
+) -> FlexResult:
+    """Окно ±days вокруг depart (и return_), даты ГГГГ-ММ-ДД."""
+    days = max(1, min(days, FLEX_MAX_DAYS))
+    departs = window(depart, days)
+    returns = window(return_, days) if return_ else []
+    if returns:
+        out, back = await asyncio.gather(
+            leg_prices(origin, dest, departs, direct),
+            leg_prices(dest, origin, returns, direct),
+        )
+    else:
+        out, back = await leg_prices(origin, dest, departs, direct), {}
+    best = best_cell(out, back if returns else None)
+    logger.info(f"[FlexDates] {origin}→{dest} {depart}±{days}" + (f" / {return_}" if return_ else "") + f": {best}")
+    return FlexResult(departs, returns, out, back, best)
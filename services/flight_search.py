@@ -8,6 +8,7 @@ from urllib.parse import urlparse, urlunparse
 from datetime import datetime, date
 from utils.logger import logger
 from utils.flight_utils import parse_passengers
+from services.price_history import record_flights_later
 
 
 # ══════════════════════════════════════════════════════════════════
@@ -16,6 +17,9 @@ from utils.flight_utils import parse_passengers
 
 # Data API (grouped_prices, кеш ~48ч) — фоновые задачи, горячие предложения
 AVIASALES_GROUPED_URL = "https://api.travelpayouts.com/aviasales/v3/grouped_prices"
+# Data API без пункта назначения (или вылета) — самые дешёвые билеты «куда угодно»
+AVIASALES_PRICES_URL  = "https://api.travelpayouts.com/aviasales/v3/prices_for_dates"
+ANYWHERE_LIMIT        = 1000   # максимум строк prices_for_dates за один запрос
 
 # Real-time Search API — поиск по запросу пользователя
 AVIASALES_SEARCH_URL         = "https://api.travelpayouts.com/v1/flight_search"
@@ -454,6 +458,10 @@ async def search_flights_realtime(
         rub_rate=rub_rate,
     )
     logger.info(f"✅ [RT] Нормализовано {len(flights)} рейсов")
+    # min_price — за всех пассажиров; в историю только поиски на одного взрослого,
+    # чтобы цена совпадала с ценой Data API за человека
+    if pax_code == "1":
+        record_flights_later(origin, destination, flights, depart_date, return_date)
     return flights
 
 
@@ -475,9 +483,26 @@ async def search_flights(
     Не требует MARKER — только TOKEN.
     Используется для фоновых задач: мониторинг цен, горячие предложения.
     """
+    flights = await grouped_prices(origin, destination, depart_date, return_date, currency, direct)
+    return flights if flights is not None else []
+
+
+async def grouped_prices(
+    origin: str,
+    destination: str,
+    depart_date: str,
+    return_date: Optional[str] = None,
+    currency: str = "rub",
+    direct: bool = False,
+) -> Optional[List[Dict]]:
+    """
+    То же, что search_flights, но отличает ошибку от пустого маршрута:
+    None — API не ответило (нет токена, 429, не 200, таймаут), [] — ответило,
+    билетов нет. Для перебора хабов и городов, которые пишут статистику.
+    """
     if not AVIASALES_TOKEN:
         logger.warning("⚠️ [Cache] AVIASALES_TOKEN не задан")
-        return []
+        return None
 
     params: Dict = {
         "origin":       origin,
@@ -510,15 +535,15 @@ async def search_flights(
                 if response.status == 429:
                     logger.warning("⚠️ [Cache] Rate limit 429, ждём 60с...")
                     await asyncio.sleep(60)
-                    return []
+                    return None
                 if response.status != 200:
                     logger.error(f"❌ [Cache] {response.status}: {(await response.text())[:200]}")
-                    return []
+                    return None
 
                 data = await response.json()
                 if not data.get("success"):
                     logger.error(f"❌ [Cache] error: {data.get('error')}")
-                    return []
+                    return None
 
                 flights = []
                 for date_key, flight in data.get("data", {}).items():
@@ -529,14 +554,79 @@ async def search_flights(
                     flight["destination"]  = flight.get("destination", destination)
                     flight["_source"]      = "cached"
                     flights.append(flight)
+                record_flights_later(origin, destination, flights, depart_date, return_date)
                 return flights
 
     except asyncio.TimeoutError:
         logger.error("❌ [Cache] Таймаут")
-        return []
+        return None
     except Exception as e:
         logger.error(f"❌ [Cache] Ошибка: {e}")
-        return []
+        return None
+
+async def search_cheapest_anywhere(
+    depart_date: str,
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    currency: str = "rub",
+    direct: bool = False,
+) -> Optional[List[Dict]]:
+    """
+    Самый дешёвый билет в каждый город (или из каждого города) за один
+    запрос Data API (prices_for_dates, unique=true): задаётся только origin
+    или только destination. depart_date — ГГГГ-ММ-ДД или ГГГГ-ММ.
+    None — API недоступно (нет токена, 429, ошибка): вызывающий переходит
+    на перебор хабов. [] — API ответило, билетов нет.
+    """
+    if not AVIASALES_TOKEN:
+        return None
+
+    params: Dict = {
+        "departure_at": depart_date,
+        "one_way":      "true",
+        "unique":       "true",
+        "sorting":      "price",
+        "limit":        ANYWHERE_LIMIT,
+        "currency":     currency,
+        "token":        AVIASALES_TOKEN,
+        "direct":       "true" if direct else "false",
+    }
+    if origin:
+        params["origin"] = origin
+    if destination:
+        params["destination"] = destination
+
+    try:
+        async with _http_session() as session:
+            async with session.get(
+                AVIASALES_PRICES_URL,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as response:
+                if response.status != 200:
+                    logger.warning(f"⚠️ [Anywhere] {response.status}: {(await response.text())[:200]}")
+                    return None
+                data = await response.json()
+                if not data.get("success"):
+                    logger.warning(f"⚠️ [Anywhere] error: {data.get('error')}")
+                    return None
+
+                flights = []
+                for flight in data.get("data") or []:
+                    flight["value"]       = flight.get("price")
+                    flight["origin"]      = flight.get("origin", origin)
+                    flight["destination"] = flight.get("destination", destination)
+                    flight["return_at"]   = flight.get("return_at", "")
+                    flight["_source"]     = "cached"
+                    flights.append(flight)
+                return flights
+
+    except asyncio.TimeoutError:
+        logger.warning("⚠️ [Anywhere] Таймаут")
+        return None
+    except Exception as e:
+        logger.warning(f"⚠️ [Anywhere] Ошибка: {e}")
+        return None
 
 # ══════════════════════════════════════════════════════════════════
 # Multi-segment (составной маршрут) — real-time API
@@ -7,36 +7,47 @@
   2. Дайджест ищет рейсы на выбранный пользователем месяц (не +14 дней).
   3. Базовая цена (EMA в Redis): уведомляем только когда цена упала >= DROP_THRESHOLD.
   4. Кулдаун маршрута: одно направление не шлётся чаще раза в ROUTE_COOLDOWN секунд.
+  5. Напоминалки: текущие цены — из хранилища цикла, «обычные» — из истории цен
+     (services/price_history), без повторного опроса API.
+  6. ROUTE_QUEUE=1: маршруты всех подписок цикла проверяют воркеры через Redis Stream
+     (services/route_queue.py); здесь остаётся только оценка и рассылка.
+  7. Цены прохода хранятся в CycleStore (services/cycle_store.py): горячие проверки,
+     напоминалки и дайджест читают только оттуда, второго пути запросов нет.
+  8. Бесплатный тариф: готовые сообщения уходят в отложенную доставку
+     (services/delivery_queue.py), цикл оценки не засыпает на PRIORITY_DELAY.
+  9. Дайджест — по местному времени подписчика, слоты размазаны по окну
+     (services/digest_scheduler.py); содержимое считается за PREFETCH_LEAD до слота.
+ 10. Подборка дайджеста считается один раз на профиль (города, направления, дата,
+     пассажиры); на пользователя — только бюджет, кулдауны и оформление.
 """
 
 import asyncio
 import time
 import logging
-from datetime import datetime, date, timedelta
-from typing import List, Optional, Tuple
-from zoneinfo import ZoneInfo
+from datetime import datetime, date, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramAPIError
 
 from utils.redis_client import redis_client
-from handlers.billing import get_user_plan
-from utils.api_limiter import BACKGROUND_SEMAPHORE
+from handlers.billing import get_plans, is_paid
 from utils.link_converter import convert_to_partner_link
-from services.flight_search import search_flights, generate_booking_link
+from services.flight_search import generate_booking_link
+from services import delivery_queue, digest_scheduler, hot_scoring, price_history, route_queue
+from services.cycle_store import CycleStore
 from utils.cities_loader import get_city_name
 from utils.trip_link import build_trip_link, is_trip_supported
 
 logger = logging.getLogger(__name__)
-MSK = ZoneInfo("Europe/Moscow")
 
 DROP_THRESHOLD = 0.05      # уведомлять только при снижении >= 5% от базовой
 ROUTE_COOLDOWN = 86400     # кулдаун на маршрут: 24 часа
 SUB_COOLDOWN   = 12 * 3600 # общий таймер подписки: не чаще 12 ч
 
 # Задержка для бесплатного тарифа: платные получают уведомления сразу,
-# бесплатные — через PRIORITY_DELAY секунд
+# бесплатные — через PRIORITY_DELAY секунд (отложенная доставка в Redis)
 PRIORITY_DELAY = 30 * 60  # 30 минут
 
 # ── Расписание напоминалок (когда реального уведомления нет) ─────────────────
@@ -47,6 +58,11 @@ PRIORITY_DELAY = 30 * 60  # 30 минут
 NUDGE_DELAYS     = [3 * 86400, 5 * 86400, 10 * 86400]  # ожидание ДО каждого шага
 NUDGE_RESET_TTL  = 30 * 86400  # пауза после 3-й напоминалки
 
+SEND_PACING  = 0.05  # между подписками — только лимит Telegram (~30 сообщений/с)
+
+# «Обычная» цена и минимум для напоминалок — по истории цен (services/price_history)
+NUDGE_STATS_WIN  = 30 * 86400  # окно для «обычной» цены и минимума
+
 # Единый источник категорий — из handlers
 from handlers.hot_deals import CATEGORIES
 
@@ -92,18 +108,56 @@ def _resolve_search_date(sub: dict) -> date:
     return today + timedelta(days=30)
 
 
+def _sub_routes(sub: dict) -> Tuple[List[str], List[str]]:
+    """Города вылета и пул направлений подписки (мультигород, custom-список)."""
+    origins_list = sub.get("origins", [])
+    if origins_list:
+        origin_iatas = [o["iata"] for o in origins_list if o.get("iata")]
+    else:
+        origin_iatas = [sub.get("origin_iata")] if sub.get("origin_iata") else []
+    category = sub.get("category", "world")
+    if category == "custom":
+        dest_pool = sub.get("dest_iata_list", [])
+    else:
+        dest_pool = CATEGORIES.get(category, ("", []))[1]
+    return origin_iatas, dest_pool
+
+
+def _digest_profile_key(sub: dict) -> str:
+    """Нормализованный профиль дайджеста: одинаковый ключ — одинаковая подборка рейсов."""
+    origin_iatas, dest_pool = _sub_routes(sub)
+    category = sub.get("category", "world")
+    return "|".join([
+        ",".join(sorted(origin_iatas)),
+        category,
+        ",".join(sorted(dest_pool)) if category == "custom" else "",
+        _resolve_search_date(sub).isoformat(),
+        str(sub.get("passengers", 1)),
+    ])
+
+
 class HotDealsSender:
     def __init__(self, bot: Bot):
         self.bot = bot
         self.running = False
         self.hot_check_interval    = 3 * 3600
-        self.digest_check_interval = 60 * 10
+        self.digest_check_interval = digest_scheduler.DIGEST_TICK
+        # Цены маршрутов текущего прохода — свои у горячих и у дайджеста:
+        # циклы идут параллельно и не должны подменять друг другу хранилище
+        self._hot_store    = CycleStore("HotDeals")
+        self._digest_store = CycleStore("Digest")
+        # Подборки дайджеста по профилю (_digest_profile_key) — живут вместе с _digest_store
+        self._digest_profiles: Dict[str, dict] = {}
 
     async def start(self):
         self.running = True
         logger.info("🔥 HotDealsSender запущен")
         try:
-            await asyncio.gather(self._hot_deals_loop(), self._digest_loop())
+            await asyncio.gather(
+                self._hot_deals_loop(),
+                self._digest_loop(),
+                delivery_queue.run_dispatcher(self._send_job, lambda: self.running),
+            )
         except asyncio.CancelledError:
             logger.info("🛑 HotDealsSender остановлен")
         finally:
@@ -133,12 +187,11 @@ class HotDealsSender:
         # ── Приоритет уведомлений: сначала платные, потом бесплатные ────────
         # Определяем план каждого пользователя и делим на две очереди
         priority_subs = []   # plus / premium / vip — получают сразу
-        free_subs     = []   # free — получают через PRIORITY_DELAY
+        free_subs     = []   # free — в отложенную доставку на PRIORITY_DELAY
 
+        plans = await get_plans(uid for uid, _, _ in hot_subs)  # один MGET на весь проход
         for user_id, sub_id, sub in hot_subs:
-            plan_data = await get_user_plan(user_id)
-            plan_key  = plan_data.get("plan", "free")
-            if plan_key in ("plus", "premium", "vip"):
+            if is_paid(plans[user_id]):
                 priority_subs.append((user_id, sub_id, sub))
             else:
                 free_subs.append((user_id, sub_id, sub))
@@ -148,112 +201,115 @@ class HotDealsSender:
             f"{len(free_subs)} бесплатных (задержка {PRIORITY_DELAY//60} мин)"
         )
 
-        # Сначала — платные подписчики
-        for user_id, sub_id, sub in priority_subs:
-            if not self.running:
-                return
-            try:
-                await self._check_hot_sub(user_id, sub_id, sub)
-                await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(f"❌ [HotDeals] sub {sub_id}: {e}", exc_info=True)
-
-        # Ждём PRIORITY_DELAY если есть кому отправлять из бесплатных
-        if free_subs and priority_subs and self.running:
-            logger.info(f"⏳ [HotDeals] пауза {PRIORITY_DELAY//60} мин перед бесплатными")
-            await asyncio.sleep(PRIORITY_DELAY)
+        # ── Один запрос на уникальный маршрут для всех подписок цикла ───────
+        # Тысячи подписок «Море из Москвы» спрашивают одни и те же 14 маршрутов —
+        # дальше бюджет, порог снижения и кулдаун оцениваются уже в памяти.
+        self._hot_store = await self._prefetch_routes(
+            "HotDeals", [s for _, _, s in hot_subs if time.time() - s.get("last_notified", 0) >= SUB_COOLDOWN],
+        )
+        try:
+            await self._notify_hot(priority_subs, free_subs)
+        finally:
+            logger.info(self._hot_store.report())
+
+    async def _notify_hot(self, priority_subs: list, free_subs: list) -> None:
+        # Сначала платные; бесплатным _deliver ставит отложенную доставку — без паузы
+        now  = time.time()
+        todo = [t for t in priority_subs + free_subs if now - t[2].get("last_notified", 0) >= SUB_COOLDOWN]
+
+        # Бюджет / порог снижения по всем парам (подписка, маршрут) — одним проходом,
+        # кулдауны всех кандидатов — одним pipeline и маской в том же проходе
+        t0 = time.monotonic()
+        ranked = hot_scoring.score_subs(
+            [s for _, _, s in todo], self._hot_store, DROP_THRESHOLD, _sub_routes, _resolve_search_date,
+        )
+        sub_ids = [sub_id for _, sub_id, _ in todo]
+        cooldowns = await redis_client.get_routes_on_cooldown_many(
+            [(sub_id, ranked.dests(i)) for i, sub_id in enumerate(sub_ids)]
+        )
+        chosen = ranked.pick(sub_ids, cooldowns)
+        logger.info(
+            f"[HotDeals] оценка {len(todo)} подписок × {len(ranked.routes)} маршрутов: "
+            f"{time.monotonic() - t0:.2f}с"
+        )
 
-        # Затем — бесплатные подписчики
-        for user_id, sub_id, sub in free_subs:
+        for i, (user_id, sub_id, sub) in enumerate(todo):
             if not self.running:
                 return
             try:
-                await self._check_hot_sub(user_id, sub_id, sub)
-                await asyncio.sleep(1)
+                await self._check_hot_sub(
+                    user_id, sub_id, sub,
+                    scored=(ranked.candidates(i), chosen[i]),
+                )
+                await asyncio.sleep(SEND_PACING)
             except Exception as e:
                 logger.error(f"❌ [HotDeals] sub {sub_id}: {e}", exc_info=True)
 
-    async def _check_hot_sub(self, user_id: int, sub_id: str, sub: dict):
+    # ── Проверка маршрутов: один раз на уникальный маршрут за проход ──────────
+
+    async def _prefetch_routes(
+        self, tag: str, subs: List[dict], store: Optional[CycleStore] = None,
+    ) -> CycleStore:
+        """
+        CycleStore на проход (новый или переданный — тогда догружается):
+        объединение (origin, dest, дата) по всем подпискам → по одному запросу
+        на маршрут. Базовая цена обновляется тоже один раз на маршрут.
+        """
+        store = store or CycleStore(tag)
+        jobs: Dict[str, dict] = {}
+        total = 0
+        for sub in subs:
+            origin_iatas, dest_pool = _sub_routes(sub)
+            depart_str = _resolve_search_date(sub).strftime("%Y-%m-%d")
+            for origin in origin_iatas:
+                for dest in dest_pool:
+                    if dest != origin:
+                        total += 1
+                        jobs[route_queue.route_key(origin, dest, depart_str, None)] = {
+                            "origin": origin, "dest": dest, "depart_date": depart_str,
+                        }
+        # Прежде каждая подписка опрашивала свои маршруты сама — это и есть «до»
+        await store.load(jobs, naive_calls=total)
+        logger.info(f"[{tag}] {len(subs)} подписок → {total} маршрутов, уникальных {len(jobs)}")
+        return store
+
+    async def _check_hot_sub(
+        self, user_id: int, sub_id: str, sub: dict,
+        scored: Optional[Tuple[List[hot_scoring.Candidate], Optional[hot_scoring.Candidate]]] = None,
+    ):
+        """
+        scored — (кандидаты, выбранный не на кулдауне) из общего прохода _notify_hot;
+        без него подписка оценивается сама (те же правила, hot_scoring.score_subs).
+        """
         if time.time() - sub.get("last_notified", 0) < SUB_COOLDOWN:
             return
 
-        # ── Города вылета: поддержка мультигорода ──
-        origins_list = sub.get("origins", [])
-        if origins_list:
-            origin_iatas = [o["iata"] for o in origins_list if o.get("iata")]
-        else:
-            origin_iatas = [sub.get("origin_iata")] if sub.get("origin_iata") else []
+        # ── Города вылета (мультигород) и направления (категория / custom) ──
+        origin_iatas, dest_pool = _sub_routes(sub)
         if not origin_iatas:
             logger.warning(f"[HotDeals] sub={sub_id}: нет городов вылета — пропускаем")
             return
-
-        category   = sub.get("category", "world")
-        max_price  = sub.get("max_price", 0)
-        passengers = sub.get("passengers", 1)
-        _, cat_destinations = CATEGORIES.get(category, ("", []))
-
-        # ── Направления назначения ──
-        # custom: пользователь задал свой список; иначе — список категории
-        if category == "custom":
-            dest_pool = sub.get("dest_iata_list", [])
-        else:
-            dest_pool = cat_destinations
-
         if not dest_pool:
-            logger.warning(f"[HotDeals] sub={sub_id}: пустой список назначений (cat={category})")
+            logger.warning(f"[HotDeals] sub={sub_id}: пустой список назначений (cat={sub.get('category', 'world')})")
             return
 
+        passengers = sub.get("passengers", 1)
         depart_str = _resolve_search_date(sub).strftime("%Y-%m-%d")
-        logger.info(f"[HotDeals] sub={sub_id} origins={origin_iatas} → {len(dest_pool)} направлений дата={depart_str}")
-
-        candidates: List[Tuple[int, str, str, dict, Optional[float]]] = []
-        for origin in origin_iatas:
-            scan_dests = [d for d in dest_pool if d != origin]
-            for dest in scan_dests:
-                try:
-                    # Пропускаем маршруты без данных Aviasales (кеш 48ч)
-                    if await redis_client.is_route_empty(origin, dest):
-                        logger.debug(f"[HotDeals] {origin}→{dest}: пропуск (нет данных, кеш 48ч)")
-                        continue
-
-                    async with BACKGROUND_SEMAPHORE:
-                        flights = await search_flights(origin, dest, depart_str, None)
-                    if not flights:
-                        await redis_client.set_route_empty(origin, dest)
-                        logger.debug(f"[HotDeals] {origin}→{dest}: нет данных → кеш 48ч")
-                        continue
-                    # Данные появились — сбрасываем метку если была
-                    await redis_client.clear_route_empty(origin, dest)
-
-                    cheapest = min(flights, key=lambda f: f.get("value") or f.get("price") or 999999)
-                    price = cheapest.get("value") or cheapest.get("price") or 0
-                    if not price:
-                        continue
-
-                    baseline = await redis_client.get_baseline_price(origin, dest)
-                    await redis_client.update_baseline_price(origin, dest, price)
-
-                    # ── Фильтр по бюджету и порогу снижения ───────────────────
-                    # Если пользователь указал бюджет:
-                    #   - цена <= бюджет+10% → всегда уведомляем (близко к желаемому)
-                    #   - цена > бюджет+10% → пропускаем
-                    # Если бюджета нет → применяем DROP_THRESHOLD (защита от спама)
-                    if max_price:
-                        budget_limit = max_price * 1.10  # +10% от бюджета
-                        if price > budget_limit:
-                            logger.debug(f"[HotDeals] {origin}→{dest}: {price}₽ > бюджет+10% ({budget_limit:.0f}₽)")
-                            continue
-                        # Цена близка к бюджету или ниже — уведомляем без проверки %
-                    else:
-                        # Нет бюджета — проверяем порог снижения
-                        if baseline is not None and (baseline - price) / baseline < DROP_THRESHOLD:
-                            logger.debug(f"[HotDeals] {origin}→{dest}: снижение < {DROP_THRESHOLD:.0%}")
-                            continue
-
-                    candidates.append((price, origin, dest, cheapest, baseline))
-                    await asyncio.sleep(0.5)
-                except Exception as e:
-                    logger.warning(f"[HotDeals] {origin}→{dest}: {e}")
+        logger.debug(f"[HotDeals] sub={sub_id} origins={origin_iatas} → {len(dest_pool)} направлений дата={depart_str}")
+
+        # ── Фильтр по бюджету и порогу снижения (services/hot_scoring.py) ──
+        # Бюджет указан: цена <= бюджет+10% → уведомляем, иначе пропускаем.
+        # Бюджета нет: применяем DROP_THRESHOLD (защита от спама).
+        if scored is None:
+            ranked = hot_scoring.score_subs(
+                [sub], self._hot_store, DROP_THRESHOLD, _sub_routes, _resolve_search_date,
+            )
+            candidates, chosen = ranked.candidates(0), None
+            if candidates:
+                on_cooldown = await redis_client.get_routes_on_cooldown(sub_id, [c[2] for c in candidates])
+                chosen = ranked.pick([sub_id], {sub_id: on_cooldown})[0]
+        else:
+            candidates, chosen = scored
 
         if not candidates:
             logger.info(f"[HotDeals] sub={sub_id}: нет кандидатов")
@@ -261,12 +317,6 @@ class HotDealsSender:
             await self._maybe_send_nudge(user_id, sub_id, sub, origin_iatas, dest_pool, depart_str)
             return
 
-        candidates.sort(key=lambda x: x[0])
-        chosen = None
-        for price, orig, dest, flight, baseline in candidates:
-            if not await redis_client.is_route_on_cooldown(sub_id, dest, ROUTE_COOLDOWN):
-                chosen = (price, orig, dest, flight, baseline)
-                break
 
         if chosen is None:
             logger.info(f"[HotDeals] sub={sub_id}: все {len(candidates)} кандидатов на кулдауне")
@@ -337,34 +387,26 @@ class HotDealsSender:
         max_price  = sub.get("max_price", 0)
         passengers = sub.get("passengers", 1)
 
-        # Собираем цены по всем направлениям без бюджетных фильтров
+        # Цены по всем направлениям без бюджетных фильтров — из хранилища цикла
+        # (прежде здесь был повторный проход по API), «обычная» цена — из истории.
+        routes = [(o, d) for o in origin_iatas for d in dest_pool if d != o]
+        self._hot_store.count_avoided(len(routes))
+        history = await price_history.get_stats_many(
+            routes, price_history.month_of(depart_str), window=NUDGE_STATS_WIN,
+        )
+
         all_results: List[Tuple[int, str, str, dict, Optional[float]]] = []
-        for origin in origin_iatas:
-            for dest in [d for d in dest_pool if d != origin]:
-                try:
-                    if await redis_client.is_route_empty(origin, dest):
-                        logger.debug(f"[Nudge] {origin}→{dest}: пропуск (кеш 48ч)")
-                        continue
-
-                    async with BACKGROUND_SEMAPHORE:
-                        flights = await search_flights(origin, dest, depart_str, None)
-                    if not flights:
-                        await redis_client.set_route_empty(origin, dest)
-                        continue
-                    await redis_client.clear_route_empty(origin, dest)
-
-                    cheapest = min(flights, key=lambda f: f.get("value") or f.get("price") or 999999)
-                    price = cheapest.get("value") or cheapest.get("price") or 0
-                    if not price:
-                        continue
-                    baseline = await redis_client.get_baseline_price(origin, dest)
-                    all_results.append((price, origin, dest, cheapest, baseline))
-                    await asyncio.sleep(0.3)
-                except Exception:
-                    continue
+        for origin, dest in routes:
+            res = self._hot_store.get(origin, dest, depart_str)
+            if not res:
+                continue
+            # «Обычная» цена — медиана истории; EMA — запасной вариант для коротких рядов
+            stats = history.get((origin, dest))
+            baseline = stats["median"] if stats and stats["count"] >= 3 else res.get("baseline")
+            all_results.append((res["price"], origin, dest, res["flight"], baseline))
 
         if not all_results:
-            logger.info(f"[Nudge] sub={sub_id}: нет данных API — пропускаем")
+            logger.info(f"[Nudge] sub={sub_id}: нет цен в этом цикле — пропускаем")
             return
 
         all_results.sort(key=lambda x: x[0])
@@ -394,6 +436,7 @@ class HotDealsSender:
             max_price=max_price, baseline=best_baseline,
             nudge_step=step,
             all_results=all_results,
+            best_stats=history.get((best_orig, best_dest)),
         )
 
     async def _send_nudge_notification(
@@ -403,6 +446,7 @@ class HotDealsSender:
         max_price: int, baseline: Optional[float],
         nudge_step: int = 0,
         all_results: Optional[List] = None,
+        best_stats: Optional[dict] = None,
     ):
         origin_name = get_city_name(origin_iata) or sub.get("origin_name", origin_iata)
         dest_name   = get_city_name(dest_iata) or dest_iata
@@ -424,6 +468,13 @@ class HotDealsSender:
                     f"(обычно от {int(baseline):,} ₽)".replace(",", nb)
                 )
 
+        # ── Общий блок: диапазон цен за месяц наблюдений (из истории) ─────────
+        range_note = ""
+        if best_stats and best_stats["count"] >= 3 and best_stats["max"] > best_stats["min"]:
+            range_note = (
+                f"\n📊 За 30 дней: от {best_stats['min']:,} до {best_stats['max']:,} ₽".replace(",", nb)
+            )
+
         # ── Общий блок: пометка о бюджете ─────────────────────────────────────
         budget_note = ""
         if over_budget:
@@ -481,6 +532,7 @@ class HotDealsSender:
                 f"📅 Примерно: {depart_str}\n"
                 f"💰 Минимальная цена: <b>{price:,} ₽</b> / чел.".replace(",", nb)
                 + history_note
+                + range_note
                 + avg_block
                 + budget_note
                 + "\n\nПродолжаю искать выгодные предложения! 🔍"
@@ -525,6 +577,7 @@ class HotDealsSender:
                 f"📅 Примерно: {depart_str}\n"
                 f"💰 Лучшая цена: <b>{price:,} ₽</b> / чел.".replace(",", nb)
                 + history_note
+                + range_note
                 + top3_block
                 + tips_block
                 + budget_note
@@ -561,18 +614,10 @@ class HotDealsSender:
             callback_data=f"hd_del_{sub_id}",
         )])
 
-        try:
-            await self.bot.send_message(
-                user_id, text, parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows),
-            )
-            logger.info(f"✅ [Nudge] step={nudge_step} {user_id}: {origin_iata}→{dest_iata} {price}₽")
-        except TelegramForbiddenError:
-            await redis_client.delete_hot_sub(user_id, sub_id)
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except TelegramAPIError as e:
-            logger.error(f"❌ [Nudge] API: {e}")
+        await self._deliver(
+            "nudge", user_id, sub_id, text, InlineKeyboardMarkup(inline_keyboard=kb_rows),
+            log=f"✅ [Nudge] step={nudge_step} {user_id}: {origin_iata}→{dest_iata} {price}₽",
+        )
 
     async def _send_hot_notification(
         self, user_id: int, sub_id: str, sub: dict,
@@ -618,12 +663,72 @@ class HotDealsSender:
         kb_rows.append([InlineKeyboardButton(text="↩️ В начало",  callback_data="main_menu")])
         kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
 
+        await self._deliver(
+            "hot", user_id, sub_id, text, kb,
+            cooldown_dests=[dest_iata], touch_sub=True,
+            # Сбрасываем счётчик напоминалок — реальное уведомление отправлено
+            reset_nudge=True,
+            log=f"✅ [HotDeals] {user_id}: {origin_iata}→{dest_iata} {price}₽",
+        )
+
+    # ── Доставка: сразу (платные) или через delivery_queue (бесплатные) ──────
+
+    async def _deliver(
+        self, kind: str, user_id: int, sub_id: str, text: str, kb: InlineKeyboardMarkup,
+        cooldown_dests: Optional[List[str]] = None, touch_sub: bool = False, reset_nudge: bool = False, log: str = "",
+        deliver_at: Optional[float] = None,
+    ) -> None:
+        job = {
+            "kind": kind, "user_id": user_id, "sub_id": sub_id, "text": text,
+            "markup": kb.model_dump(mode="json", exclude_none=True),
+            "cooldown_dests": cooldown_dests or [], "touch_sub": touch_sub,
+            "reset_nudge": reset_nudge, "log": log,
+        }
+        now = time.time()
+        at  = deliver_at or now
+        plans = await get_plans([user_id])  # из кэша — планы уже загружены проходом
+        if not is_paid(plans[user_id]):
+            at += PRIORITY_DELAY
+        if at > now + 1:
+            await delivery_queue.schedule(f"{kind}:{sub_id}", job, at)
+            logger.info(f"⏳ [{kind}] {user_id}: доставка через {int(at - now) // 60} мин")
+            return
+        if not await self._send_job(job):
+            await delivery_queue.retry({**job, "job_id": f"{kind}:{sub_id}"})
+
+    async def _send_job(self, job: dict) -> bool:
+        """
+        Отправить готовое сообщение и применить последствия (кулдауны,
+        last_notified, сброс напоминалок). False — повторить позже.
+        """
+        user_id, sub_id = job["user_id"], job["sub_id"]
+        # Подписку перечитываем: за время ожидания её могли изменить или удалить
+        sub = await redis_client.get_hot_sub(user_id, sub_id)
+        if sub is None:
+            logger.info(f"[{job['kind']}] sub={sub_id}: подписка удалена — не отправляем")
+            return True
+
         try:
-            await self.bot.send_message(user_id, text, parse_mode="HTML", reply_markup=kb)
+            await self.bot.send_message(
+                user_id, job["text"], parse_mode="HTML",
+                reply_markup=InlineKeyboardMarkup.model_validate(job["markup"]),
+            )
+        except TelegramForbiddenError:
+            await redis_client.delete_hot_sub(user_id, sub_id)
+            return True
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            return False
+        except TelegramAPIError as e:
+            logger.error(f"❌ [{job['kind']}] API: {e}")
+            return True
+
+        if job.get("touch_sub"):
             sub["last_notified"] = int(time.time())
             await redis_client.update_hot_sub(user_id, sub_id, sub)
+        for dest_iata in job.get("cooldown_dests", []):
             await redis_client.set_route_cooldown(sub_id, dest_iata, ROUTE_COOLDOWN)
-            # Сбрасываем счётчик напоминалок — реальное уведомление отправлено
+        if job.get("reset_nudge"):
             try:
                 _p = redis_client.prefix
                 await redis_client.client.delete(
@@ -633,13 +738,9 @@ class HotDealsSender:
                 )
             except Exception:
                 pass
-            logger.info(f"✅ [HotDeals] {user_id}: {origin_iata}→{dest_iata} {price}₽")
-        except TelegramForbiddenError:
-            await redis_client.delete_hot_sub(user_id, sub_id)
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except TelegramAPIError as e:
-            logger.error(f"❌ [HotDeals] API: {e}")
+        if job.get("log"):
+            logger.info(job["log"])
+        return True
 
     # ══════════════════════════════════════════════
     # Дайджест
@@ -647,65 +748,91 @@ class HotDealsSender:
 
     async def _digest_loop(self):
         await asyncio.sleep(120)
-        logger.info("[Digest] Цикл запущен")
+        logger.info(
+            f"[Digest] Цикл запущен: окно {digest_scheduler.DIGEST_WINDOW_START}:00 "
+            f"+{digest_scheduler.DIGEST_WINDOW_HOURS:g} ч по местному времени"
+        )
         while self.running:
             try:
-                now = datetime.now(MSK)
-                if now.hour == 9 and now.minute < 10:
-                    await self._process_digest_subs(is_monday_run=(now.weekday() == 0))
-                    await asyncio.sleep(600)
+                await self._process_digest_tick()
             except Exception as e:
                 logger.error(f"❌ [Digest] {e}", exc_info=True)
             await asyncio.sleep(self.digest_check_interval)
 
-    async def _process_digest_subs(self, is_monday_run: bool):
+    async def _process_digest_tick(self):
+        """Подписки, чей слот наступит в ближайшие PREFETCH_LEAD: считаем и ставим на время слота."""
         all_subs = await redis_client.get_all_hot_subs()
         digest_subs = [(uid, sid, s) for uid, sid, s in all_subs if s.get("sub_type") == "digest"]
-        logger.info(f"📰 [Digest] {len(digest_subs)} подписок (пн={is_monday_run})")
-
-        # ── Приоритет: сначала платные, потом бесплатные ────────────────
-        priority_subs = []
-        free_subs     = []
-        for user_id, sub_id, sub in digest_subs:
-            if sub.get("frequency", "daily") == "weekly" and not is_monday_run:
-                continue
-            plan_data = await get_user_plan(user_id)
-            plan_key  = plan_data.get("plan", "free")
-            if plan_key in ("plus", "premium", "vip"):
-                priority_subs.append((user_id, sub_id, sub))
-            else:
-                free_subs.append((user_id, sub_id, sub))
-
-        logger.info(
-            f"📰 [Digest] приоритет: {len(priority_subs)} платных, "
-            f"{len(free_subs)} бесплатных"
-        )
+        due = digest_scheduler.due_slots(digest_subs, datetime.now(timezone.utc))
+        batch = [d for d in due if await digest_scheduler.claim(d.sub_id, d.day)]
+        if not batch:
+            return
+        logger.info(f"📰 [Digest] {len(batch)} из {len(digest_subs)} подписок — слоты в ближайшие "
+                    f"{digest_scheduler.PREFETCH_LEAD // 60} мин")
 
-        for user_id, sub_id, sub in priority_subs:
-            try:
-                await self._send_digest(user_id, sub_id, sub)
-                await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(f"❌ [Digest] sub {sub_id}: {e}")
+        pending = list(batch)  # взятые, но ещё не поставленные в очередь слоты
+        try:
+            await get_plans(d.user_id for d in batch)  # прогрев кэша тарифов одним MGET для _deliver
+
+            # Хранилище дайджеста живёт всё окно: порции догружают только новые маршруты
+            store = self._digest_store
+            if time.monotonic() - store.started > digest_scheduler.DIGEST_WINDOW_HOURS * 3600:
+                store = CycleStore("Digest")
+                self._digest_profiles = {}
+            self._digest_store = await self._prefetch_routes("Digest", [d.sub for d in batch], store=store)
+            for d in batch:
+                try:
+                    # Платным — точно в слот, бесплатным _deliver добавит PRIORITY_DELAY
+                    await self._send_digest(d.user_id, d.sub_id, d.sub, deliver_at=d.slot_ts)
+                except Exception as e:
+                    logger.error(f"❌ [Digest] sub {d.sub_id}: {e}")
+                    continue
+                pending.remove(d)
+                await digest_scheduler.confirm(d.sub_id, d.day)
+        finally:
+            # Не дошли до очереди (ошибка сборки/постановки) — слот снова свободен, следующий тик дошлёт
+            for d in pending:
+                await digest_scheduler.release(d.sub_id, d.day)
+            logger.info(self._digest_store.report())
+            logger.info(
+                f"[Digest] {len(batch)} подписок → {len({_digest_profile_key(d.sub) for d in batch})} профилей "
+                f"(всего в окне {len(self._digest_profiles)})"
+            )
 
-        if free_subs and priority_subs:
-            logger.info(f"⏳ [Digest] пауза {PRIORITY_DELAY//60} мин перед бесплатными")
-            await asyncio.sleep(PRIORITY_DELAY)
+    async def _digest_profile(self, sub: dict) -> dict:
+        """
+        Подборка профиля: все маршруты с ценой, по возрастанию, без бюджета
+        и кулдаунов. Считается один раз на профиль за окно дайджеста.
+        """
+        key = _digest_profile_key(sub)
+        profile = self._digest_profiles.get(key)
+        if profile is not None:
+            return profile
 
-        for user_id, sub_id, sub in free_subs:
-            try:
-                await self._send_digest(user_id, sub_id, sub)
-                await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(f"❌ [Digest] sub {sub_id}: {e}")
+        origin_iatas, dest_pool = _sub_routes(sub)
+        depart_date = _resolve_search_date(sub).strftime("%Y-%m-%d")
+        deals: List[Tuple[int, str, str, dict, Optional[float]]] = []
+        for origin in origin_iatas:
+            for dest in [d for d in dest_pool if d != origin]:
+                res = self._digest_store.get(origin, dest, depart_date)
+                if res:
+                    deals.append((res["price"], origin, dest, res["flight"], res.get("avg")))
+        deals.sort(key=lambda x: x[0])
+        profile = {"depart_date": depart_date, "deals": deals, "links": {}}
+        self._digest_profiles[key] = profile
+        return profile
+
+    async def _profile_link(self, profile: dict, flight: dict, orig: str, dest: str, passengers: int) -> str:
+        """Партнёрская ссылка — тоже одна на профиль и маршрут (это запрос к Travelpayouts)."""
+        if (orig, dest) not in profile["links"]:
+            profile["links"][(orig, dest)] = await convert_to_partner_link(generate_booking_link(
+                flight=flight, origin=orig, dest=dest,
+                depart_date=profile["depart_date"], passengers_code=str(passengers), return_date=None,
+            ))
+        return profile["links"][(orig, dest)]
 
-    async def _send_digest(self, user_id: int, sub_id: str, sub: dict):
-        # ── Города вылета: мультигород ──
-        origins_list = sub.get("origins", [])
-        if origins_list:
-            origin_iatas = [o["iata"] for o in origins_list if o.get("iata")]
-        else:
-            origin_iatas = [sub.get("origin_iata")] if sub.get("origin_iata") else []
+    async def _send_digest(self, user_id: int, sub_id: str, sub: dict, deliver_at: Optional[float] = None):
+        origin_iatas, dest_pool = _sub_routes(sub)
         if not origin_iatas:
             logger.warning(f"[Digest] sub={sub_id}: нет городов вылета")
             return
@@ -717,60 +844,25 @@ class HotDealsSender:
         category   = sub.get("category", "world")
         max_price  = sub.get("max_price", 0)
         passengers = sub.get("passengers", 1)
-        cat_label, cat_destinations = CATEGORIES.get(category, ("", []))
-
-        if category == "custom":
-            dest_pool = sub.get("dest_iata_list", [])
-        else:
-            dest_pool = cat_destinations
+        cat_label, _ = CATEGORIES.get(category, ("", []))
 
         if not dest_pool:
             logger.warning(f"[Digest] sub={sub_id}: пустой список назначений (cat={category})")
             return
 
-        depart_date = _resolve_search_date(sub).strftime("%Y-%m-%d")
+        profile     = await self._digest_profile(sub)
+        depart_date = profile["depart_date"]
         logger.info(f"[Digest] user={user_id} origins={origin_iatas} кат={category} дата={depart_date}")
 
-        deals: List[Tuple[int, str, str, dict, Optional[float]]] = []
-        for origin in origin_iatas:
-            scan_dests = [d for d in dest_pool if d != origin]
-            for dest in scan_dests:
-                try:
-                    if await redis_client.is_route_empty(origin, dest):
-                        logger.debug(f"[Digest] {origin}→{dest}: пропуск (кеш 48ч)")
-                        continue
-
-                    async with BACKGROUND_SEMAPHORE:
-                        flights = await search_flights(origin, dest, depart_date, None)
-                    if not flights:
-                        await redis_client.set_route_empty(origin, dest)
-                        continue
-                    await redis_client.clear_route_empty(origin, dest)
-
-                    cheapest = min(flights, key=lambda f: f.get("value") or f.get("price") or 999999)
-                    price = cheapest.get("value") or cheapest.get("price") or 0
-                    if not price:
-                        continue
-
-                    baseline = await redis_client.update_baseline_price(origin, dest, price)
-
-                    if max_price and price > max_price:
-                        continue
-
-                    if await redis_client.is_route_on_cooldown(sub_id, dest, ROUTE_COOLDOWN):
-                        logger.debug(f"[Digest] {origin}→{dest}: кулдаун")
-                        continue
-
-                    deals.append((price, origin, dest, cheapest, baseline))
-                    await asyncio.sleep(0.3)
-                except Exception:
-                    pass
+        # Поверх общей подборки — только личное: бюджет и кулдауны подписки
+        deals = [d for d in profile["deals"] if not (max_price and d[0] > max_price)]
+        on_cooldown = await redis_client.get_routes_on_cooldown(sub_id, list({d[2] for d in deals}))
+        deals = [d for d in deals if d[2] not in on_cooldown]
 
         if not deals:
             logger.info(f"[Digest] sub={sub_id}: нет предложений")
             return
 
-        deals.sort(key=lambda x: x[0])
         top3 = deals[:3]
         freq_str = "Ежедневная подборка" if sub.get("frequency", "daily") == "daily" else "Еженедельная подборка"
         text = f"📰 <b>{freq_str} горячих рейсов</b>\n{cat_label}\n🛫 Из: <b>{origin_name}</b>\n\n"
@@ -790,10 +882,7 @@ class HotDealsSender:
                 text += f" · {price * passengers:,} ₽ за {passengers} чел.".replace(",", "\u202f")
             text += "\n\n"
 
-            booking_link = await convert_to_partner_link(generate_booking_link(
-                flight=flight, origin=orig_iata, dest=dest_iata,
-                depart_date=depart_date, passengers_code=str(passengers), return_date=None,
-            ))
+            booking_link = await self._profile_link(profile, flight, orig_iata, dest_iata, passengers)
             kb_buttons.append([InlineKeyboardButton(
                 text=f"✈️ {dest_name} — {price:,} ₽".replace(",", "\u202f"),
                 url=booking_link,
@@ -813,20 +902,9 @@ class HotDealsSender:
         kb_buttons.append([InlineKeyboardButton(text="❌ Отписаться от дайджеста", callback_data=f"hd_del_{sub_id}")])
         kb_buttons.append([InlineKeyboardButton(text="↩️ В начало", callback_data="main_menu")])
 
-        try:
-            await self.bot.send_message(
-                user_id, text, parse_mode="HTML",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_buttons),
-            )
-            sub["last_notified"] = int(time.time())
-            await redis_client.update_hot_sub(user_id, sub_id, sub)
-            # Улучшение 4: кулдаун на все отправленные маршруты
-            for _, _orig, dest_iata, _, _ in top3:
-                await redis_client.set_route_cooldown(sub_id, dest_iata, ROUTE_COOLDOWN)
-            logger.info(f"✅ [Digest] {user_id} топ-3: {[d for _,d,_,_ in top3]}")
-        except TelegramForbiddenError:
-            await redis_client.delete_hot_sub(user_id, sub_id)
-        except TelegramRetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-        except TelegramAPIError as e:
-            logger.error(f"❌ [Digest] API: {e}")
\ No newline at end of file
+        # Улучшение 4: кулдаун на все отправленные маршруты
+        await self._deliver(
+            "digest", user_id, sub_id, text, InlineKeyboardMarkup(inline_keyboard=kb_buttons),
+            cooldown_dests=[d for _, _, d, _, _ in top3], touch_sub=True, deliver_at=deliver_at,
+            log=f"✅ [Digest] {user_id} топ-3: {[d for _, _, d, _, _ in top3]}",
+        )
\ No newline at end of file
@@ -0,0 +1,181 @@
+# services/hot_scoring.py
+"""
+Оценка кандидатов горячих предложений одним проходом по всем парам
+(подписка, маршрут) цикла.
+
+Цены маршрутов уже лежат в CycleStore, поэтому фильтры _check_hot_sub
+(бюджет +10% или порог снижения от базовой цены) считаются векторно:
+массивы цены, базовой цены и бюджета по всем парам → маска → сортировка
+по (группа, цена). Результат зависит только от набора маршрутов подписки
+и её бюджета, поэтому пары строятся по группам (профиль, бюджет), а не по
+каждой подписке — тысячи «Море из Москвы» без бюджета дают одну группу.
+Результат — таблица CSR: кандидаты группы g лежат в order[ptr[g]:ptr[g + 1]],
+уже по возрастанию цены.
+
+Кулдауны маршрутов — личные для подписки, поэтому применяются вторым шагом
+(Ranked.pick): пары (подписка, кандидат) разворачиваются в массивы, кулдауны
+становятся маской, и для каждой подписки берётся первый незаблокированный
+кандидат — тоже без цикла по кандидатам.
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.cycle_store import CycleStore
+
+BUDGET_SLACK = 1.10   # цена <= бюджет + 10% — уведомляем без проверки снижения
+
+# Кандидат: (price, origin, dest, flight, baseline) — как и раньше в _check_hot_sub
+Candidate = Tuple[int, str, str, dict, Optional[float]]
+
+
+class Ranked:
+    """
+    Кандидаты всех подписок. Результат зависит только от (профиль маршрутов,
+    бюджет) — такие группы считаются один раз: routes — уникальные маршруты,
+    order/ptr — CSR по группам, sub_group — группа каждой подписки.
+    """
+
+    def __init__(self, routes: List[Candidate], ptr: Sequence[int], order: Sequence[int], sub_group: Sequence[int]):
+        self.routes    = routes
+        self.ptr       = ptr
+        self.order     = order
+        self.sub_group = sub_group
+
+    def _slice(self, i: int):
+        g = self.sub_group[i]
+        return self.order[int(self.ptr[g]):int(self.ptr[g + 1])]
+
+    def candidates(self, i: int) -> List[Candidate]:
+        return [self.routes[r] for r in self._slice(i)]
+
+    def dests(self, i: int) -> List[str]:
+        return [self.routes[r][2] for r in self._slice(i)]
+
+    def __len__(self) -> int:
+        return len(self.sub_group)
+
+    def pick(self, sub_ids: Sequence[str], cooldowns: Dict[str, Set[str]]) -> List[Optional[Candidate]]:
+        """
+        Для каждой подписки — самый дешёвый кандидат не на кулдауне (None — все
+        на кулдауне или кандидатов нет). cooldowns: sub_id → направления на кулдауне.
+        """
+        n = len(self.sub_group)
+        if n == 0:
+            return []
+        ptr   = np.asarray(self.ptr, dtype=np.int64)
+        order = np.asarray(self.order, dtype=np.int64)
+        grp   = np.asarray(self.sub_group, dtype=np.int64)
+        start, lens = ptr[grp], ptr[grp + 1] - ptr[grp]
+
+        # Пары (подписка, кандидат) подряд по подпискам, внутри — по цене
+        seg   = np.concatenate(([0], np.cumsum(lens)))
+        total = int(seg[-1])
+        pair_sub   = np.repeat(np.arange(n, dtype=np.int64), lens)
+        pair_route = order[np.repeat(start - seg[:-1], lens) + np.arange(total, dtype=np.int64)]
+
+        # Кулдаун — маска по ключу (подписка, направление); направления → номера
+        dest_ids: Dict[str, int] = {}
+        route_dest = np.fromiter(
+            (dest_ids.setdefault(r[2], len(dest_ids)) for r in self.routes), dtype=np.int64, count=len(self.routes),
+        )
+        blocked_keys = np.fromiter(
+            (i * len(dest_ids) + dest_ids[d]
+             for i, sid in enumerate(sub_ids) for d in cooldowns.get(sid, ()) if d in dest_ids),
+            dtype=np.int64,
+        )
+        free = ~np.isin(pair_sub * len(dest_ids) + route_dest[pair_route], blocked_keys)
+
+        # Первый свободный кандидат в отрезке каждой подписки
+        free_pos = np.append(np.flatnonzero(free), total)  # total — «свободных дальше нет»
+        first = free_pos[np.searchsorted(free_pos, seg[:-1])]
+        hit   = first < seg[1:]
+        return [self.routes[int(pair_route[first[i]])] if hit[i] else None for i in range(n)]
+
+
+def _index_routes(
+    subs: List[dict], store: CycleStore, sub_routes, resolve_date,
+) -> Tuple[List[Candidate], List[List[int]], List[float], List[int]]:
+    """
+    Уникальные маршруты с ценой и группы (профиль, бюджет): для каждой группы —
+    индексы маршрутов профиля и бюджет, для каждой подписки — номер группы.
+    Профиль — одинаковые города, направления и дата: маршруты собираются один раз.
+    """
+    routes: List[Candidate] = []
+    route_idx: Dict[Tuple[str, str, str], int] = {}
+    profile_routes: Dict[tuple, List[int]] = {}
+    group_id: Dict[tuple, int] = {}
+    group_routes: List[List[int]] = []
+    group_budget: List[float] = []
+    sub_group: List[int] = []
+
+    for sub in subs:
+        origin_iatas, dest_pool = sub_routes(sub)
+        depart = resolve_date(sub).strftime("%Y-%m-%d")
+        budget = float(sub.get("max_price") or 0)
+        pkey = (tuple(origin_iatas), tuple(dest_pool), depart)
+        gid = group_id.get((pkey, budget))
+        if gid is None:
+            idxs = profile_routes.get(pkey)
+            if idxs is None:
+                idxs = profile_routes[pkey] = []
+                for origin in origin_iatas:
+                    for dest in dest_pool:
+                        if dest == origin:
+                            continue
+                        rkey = (origin, dest, depart)
+                        r = route_idx.get(rkey)
+                        if r is None:
+                            res = store.get(origin, dest, depart)
+                            r = route_idx[rkey] = len(routes) if res else -1
+                            if res:
+                                routes.append((res["price"], origin, dest, res["flight"], res.get("baseline")))
+                        if r >= 0:
+                            idxs.append(r)
+            gid = group_id[(pkey, budget)] = len(group_routes)
+            group_routes.append(idxs)
+            group_budget.append(budget)
+        sub_group.append(gid)
+    return routes, group_routes, group_budget, sub_group
+
+
+def _rank(routes, group_routes, group_budget, drop_threshold):
+    g = len(group_routes)
+    route_price = np.array([r[0] for r in routes], dtype=np.float64)
+    route_base  = np.array([math.nan if r[4] is None else r[4] for r in routes], dtype=np.float64)
+
+    lens      = np.fromiter((len(p) for p in group_routes), dtype=np.int64, count=g)
+    grp_idx   = np.repeat(np.arange(g, dtype=np.int64), lens)
+    route_idx = np.fromiter((r for p in group_routes for r in p), dtype=np.int64, count=int(lens.sum()))
+
+    price  = route_price[route_idx]
+    base   = route_base[route_idx]
+    budget = np.asarray(group_budget, dtype=np.float64)[grp_idx]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drop_ok = np.isnan(base) | ((base - price) / base >= drop_threshold)
+    mask = np.where(budget > 0, price <= budget * BUDGET_SLACK, drop_ok)
+
+    # Ключ сортировки (группа, ранг цены) одним int64; stable — при равной цене порядок маршрутов
+    uniq, price_rank = np.unique(route_price, return_inverse=True)
+    sel_grp, sel_route = grp_idx[mask], route_idx[mask]
+    key  = sel_grp * len(uniq) + price_rank[sel_route]
+    perm = np.argsort(key, kind="stable")
+    ptr  = np.searchsorted(sel_grp[perm], np.arange(g + 1))
+    return ptr, sel_route[perm]
+
+
+def score_subs(
+    subs: List[dict], store: CycleStore, drop_threshold: float,
+    sub_routes, resolve_date,
+) -> Ranked:
+    """
+    subs — подписки в порядке обработки; кандидаты подписки i — ranked.candidates(i).
+    sub_routes / resolve_date — функции HotDealsSender (города и дата поиска подписки).
+    """
+    routes, group_routes, group_budget, sub_group = _index_routes(subs, store, sub_routes, resolve_date)
+    if not routes:
+        return Ranked(routes, [0] * (len(group_routes) + 1), [], sub_group)
+    ptr, order = _rank(routes, group_routes, group_budget, drop_threshold)
+    return Ranked(routes, ptr, order, sub_group)
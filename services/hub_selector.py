@@ -0,0 +1,117 @@
+# services/hub_selector.py
+"""
+Выбор кандидатов для перебора: хабы поиска «Везде» (everywhere_engine)
+и города страны (поиск «любой город в стране»).
+
+Вместо статичных списков — по городу iata и стороне (from / to) из
+накопленных наблюдений:
+  - route_empty: маршрут недавно был пустым — не спрашиваем вовсе;
+  - hubstat: доля непустых ответов кандидата, Beta(1, 1) — (hit + 1) / (n + 2);
+  - price_history: медиана цены маршрута за месяц — чем дешевле, тем выше.
+score = P(непусто) × (самая низкая медиана / медиана кандидата).
+
+Лучшие по score занимают бюджет, кроме EXPLORE_SHARE мест — их получают
+случайные кандидаты с весом 1 / (1 + n): так мало опрошенные хабы тоже
+набирают статистику. Без наблюдений все score равны и порядок — статичный
+список (он и есть априорный выбор).
+
+Каждый перебор пишет результат: record_outcome → hubstat + route_empty +
+журнал hubobs; на журнале работает bench/hub_selection_eval.py. Пишутся
+только ответы API: 429 и ошибки — упавшие плечи, а не «пусто».
+"""
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from services import price_history
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+EXPLORE_SHARE = 0.2   # доля бюджета на исследование (не меньше одного места)
+CHEAP_PRIOR   = 0.5   # «дешевизна» кандидата без истории цен
+
+_rng = random.Random()
+
+
+def _route(side: str, iata: str, cand: str) -> tuple:
+    return (iata, cand) if side == "from" else (cand, iata)
+
+
+# ══════════════════════════════════════════════════════════════════
+# Чистые функции (без Redis)
+# ══════════════════════════════════════════════════════════════════
+
+def score_candidates(
+    candidates: Sequence[str],
+    stats: Dict[str, List[int]],
+    medians: Dict[str, float],
+) -> Dict[str, float]:
+    """score кандидата: P(непусто) × относительная дешевизна."""
+    floor = min(medians.values()) if medians else None
+    scores = {}
+    for cand in candidates:
+        n, hit = stats.get(cand, (0, 0))
+        p_hit = (hit + 1) / (n + 2)
+        cheap = floor / medians[cand] if cand in medians and medians[cand] > 0 else CHEAP_PRIOR
+        scores[cand] = p_hit * cheap
+    return scores
+
+
+def select_candidates(
+    candidates: Sequence[str],
+    budget: int,
+    stats: Dict[str, List[int]],
+    medians: Dict[str, float],
+    empty: Set[str] = frozenset(),
+    rng: Optional[random.Random] = None,
+    explore: float = EXPLORE_SHARE,
+) -> List[str]:
+    """
+    До budget кандидатов: лучшие по score + EXPLORE_SHARE случайных из
+    остальных. Кандидаты из empty отбрасываются. При равных score —
+    порядок исходного списка.
+    """
+    pool = [c for c in dict.fromkeys(candidates) if c not in empty]
+    scores = score_candidates(pool, stats, medians)
+    ranked = sorted(pool, key=lambda c: -scores[c])   # sorted стабилен — ничьи по исходному порядку
+    if len(ranked) <= budget:
+        return ranked
+    rng = rng or _rng
+
+    n_explore = max(1, round(budget * explore)) if explore > 0 else 0
+    chosen = ranked[:budget - n_explore]
+    rest   = ranked[budget - n_explore:]
+    for _ in range(min(n_explore, len(rest))):
+        weights = [1 / (1 + stats.get(c, (0, 0))[0]) for c in rest]
+        chosen.append(rest.pop(rng.choices(range(len(rest)), weights)[0]))
+    return chosen
+
+
+# ══════════════════════════════════════════════════════════════════
+# Redis
+# ══════════════════════════════════════════════════════════════════
+
+async def choose(
+    side: str, iata: str, candidates: Iterable[str], budget: int, depart_date: str,
+) -> List[str]:
+    """Кандидаты для перебора от города iata на месяц depart_date."""
+    candidates = [c for c in candidates if c != iata]
+    if not redis_client.client:
+        return candidates[:budget]
+    by_route = {_route(side, iata, c): c for c in candidates}
+    routes   = list(by_route)
+    empty    = {by_route[r] for r in await redis_client.get_empty_routes(routes)}
+    stats    = await redis_client.get_hub_stats(side, iata)
+    history  = await price_history.get_stats_many(routes, price_history.month_of(depart_date))
+    medians  = {by_route[r]: s["median"] for r, s in history.items()}
+    chosen   = select_candidates(candidates, budget, stats, medians, empty)
+    logger.debug(f"[HubSelector] {side}:{iata}: {len(chosen)} из {len(candidates)} (пустых {len(empty)})")
+    return chosen
+
+
+async def record_outcome(side: str, iata: str, day: str, results: Dict[str, List[Dict]]) -> None:
+    """results: {кандидат: билеты} — по одному перебору."""
+    prices = {}
+    for cand, flights in results.items():
+        valid = [int(float(f.get("value") or f.get("price") or 0)) for f in flights]
+        prices[cand] = min((p for p in valid if p > 0), default=0)
+    await redis_client.record_hub_observation(side, iata, day, prices)
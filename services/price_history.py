@@ -0,0 +1,269 @@
+# services/price_history.py
+"""
+История цен по маршруту и месяцу вылета.
+
+Вместо одного EMA-числа (baseline:{origin}:{dest}) храним компактный
+временной ряд минимальных цен — его пополняет каждый search_flights /
+search_flights_realtime. По ряду считаются min / медиана / перцентили,
+поэтому аналитика в напоминалках не требует повторного опроса API.
+
+Хранение (Redis ZSET на маршрут + месяц):
+  ключ   price_hist:{kind}:{origin}:{dest}:{YYYY-MM}   kind = ow | rt
+  member начало корзины (unix ts), score — минимальная цена в корзине.
+  ZADD LT атомарно оставляет минимум — запись append-only, без чтения.
+
+Даунсемплинг и ретеншн (раз в сутки на ключ):
+  - свежие HOURLY_WINDOW — почасовые корзины;
+  - старше — схлопываются в суточные (минимум за день);
+  - старше RETENTION — удаляются, сам ключ живёт HISTORY_TTL с последней записи.
+"""
+
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+HOUR = 3600
+DAY  = 86400
+
+HOURLY_WINDOW = 7 * DAY    # почасовая детализация за последнюю неделю
+RETENTION     = 90 * DAY   # точки старше 90 дней удаляются
+HISTORY_TTL   = 120 * DAY  # TTL ключа — продлевается при каждой записи
+COMPACT_EVERY = DAY        # как часто даунсемплим один ключ
+
+Point = Tuple[int, int]    # (ts корзины, цена)
+
+_pending: Set[asyncio.Task] = set()  # фоновые записи — сильные ссылки, чтобы задачи не собрал GC
+
+
+# ══════════════════════════════════════════════════════════════════
+# Чистые функции (без Redis)
+# ══════════════════════════════════════════════════════════════════
+
+def _hist_key(origin: str, dest: str, month: str, kind: str = "ow") -> str:
+    return f"{redis_client.prefix}price_hist:{kind}:{origin}:{dest}:{month}"
+
+
+def month_of(date_str: str) -> str:
+    """'2026-03-15' / '2026-03-15T10:00:00+03:00' → '2026-03'."""
+    return (date_str or "")[:7]
+
+
+def _bucket(ts: float, size: int) -> int:
+    return int(ts) // size * size
+
+
+def _flight_price(flight: Dict) -> int:
+    try:
+        return int(flight.get("value") or flight.get("price") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def month_minimums(flights: Iterable[Dict], fallback_date: str = "") -> Dict[str, int]:
+    """
+    Минимальная цена по каждому месяцу вылета из ответа API.
+    grouped_prices может вернуть несколько дат — группируем по departure_at[:7].
+    """
+    result: Dict[str, int] = {}
+    for f in flights:
+        price = _flight_price(f)
+        if price <= 0:
+            continue
+        month = month_of(f.get("departure_at") or fallback_date)
+        if len(month) != 7:
+            continue
+        if month not in result or price < result[month]:
+            result[month] = price
+    return result
+
+
+def downsample(points: List[Point], now: float) -> List[Point]:
+    """
+    Схлопывает точки старше HOURLY_WINDOW в суточные минимумы
+    и отбрасывает всё, что старше RETENTION. Возвращает ряд по возрастанию ts.
+    """
+    hourly_from = now - HOURLY_WINDOW
+    keep_from   = now - RETENTION
+    merged: Dict[int, int] = {}
+    for ts, price in points:
+        if ts < keep_from:
+            continue
+        bucket = ts if ts >= hourly_from else _bucket(ts, DAY)
+        if bucket not in merged or price < merged[bucket]:
+            merged[bucket] = price
+    return sorted(merged.items())
+
+
+def percentile(sorted_prices: List[int], q: float) -> Optional[float]:
+    """Перцентиль q ∈ [0, 1] с линейной интерполяцией; список уже отсортирован."""
+    if not sorted_prices:
+        return None
+    if len(sorted_prices) == 1:
+        return float(sorted_prices[0])
+    pos = (len(sorted_prices) - 1) * min(max(q, 0.0), 1.0)
+    lo  = int(pos)
+    hi  = min(lo + 1, len(sorted_prices) - 1)
+    return sorted_prices[lo] + (sorted_prices[hi] - sorted_prices[lo]) * (pos - lo)
+
+
+def summarize(points: List[Point]) -> Optional[Dict]:
+    """
+    Сводка по ряду: last / last_ts / min / max / median / p25 / p75 / count.
+    None — если точек нет.
+    """
+    if not points:
+        return None
+    points = sorted(points)
+    prices = sorted(p for _, p in points)
+    return {
+        "last":    points[-1][1],
+        "last_ts": points[-1][0],
+        "min":     prices[0],
+        "max":     prices[-1],
+        "median":  percentile(prices, 0.5),
+        "p25":     percentile(prices, 0.25),
+        "p75":     percentile(prices, 0.75),
+        "count":   len(prices),
+    }
+
+
+# ══════════════════════════════════════════════════════════════════
+# Запись
+# ══════════════════════════════════════════════════════════════════
+
+async def record_flights(
+    origin: str,
+    dest: str,
+    flights: List[Dict],
+    depart_date: str = "",
+    return_date: Optional[str] = None,
+    ts: Optional[float] = None,
+) -> None:
+    """
+    Добавляет наблюдение из ответа search_flights / search_flights_realtime.
+    Ошибки Redis не пробрасываются — история не должна ломать поиск.
+    """
+    if not redis_client.client or not flights or not origin or not dest:
+        return
+    kind   = "rt" if return_date else "ow"
+    now    = ts or time.time()
+    bucket = _bucket(now, HOUR)
+    try:
+        minimums = month_minimums(flights, depart_date)
+        if not minimums:
+            return
+        pipe = redis_client.client.pipeline(transaction=False)
+        for month, price in minimums.items():
+            key = _hist_key(origin, dest, month, kind)
+            pipe.zadd(key, {str(bucket): price}, lt=True)
+            pipe.expire(key, HISTORY_TTL)
+            pipe.set(f"{key}:cmp", "1", nx=True, ex=COMPACT_EVERY)
+        results = await pipe.execute()
+        # Каждый третий результат — флаг «пора даунсемплить этот ключ»
+        for (month, _), need_compact in zip(minimums.items(), results[2::3]):
+            if need_compact:
+                await _compact(_hist_key(origin, dest, month, kind), now)
+    except Exception as e:
+        logger.debug(f"[PriceHistory] {origin}→{dest}: запись не удалась: {e}")
+
+
+def record_flights_later(
+    origin: str,
+    dest: str,
+    flights: List[Dict],
+    depart_date: str = "",
+    return_date: Optional[str] = None,
+) -> None:
+    """
+    record_flights в фоне — для пользовательского поиска: результат не ждёт
+    ZADD/EXPIRE и даунсемплинг, а сбой Redis не замедляет выдачу.
+    """
+    if not redis_client.client or not flights or not origin or not dest:
+        return
+    task = asyncio.create_task(record_flights(origin, dest, list(flights), depart_date, return_date))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _compact(key: str, now: float) -> None:
+    """
+    Даунсемплинг + ретеншн одного ключа. Ключ не пересоздаётся: схлопнутые
+    и устаревшие точки снимаются ZREM поимённо, суточные минимумы ложатся
+    ZADD LT. Запись идёт в корзину текущего часа, которую компакция не
+    трогает, — точка, добавленная между чтением и записью, не теряется.
+    """
+    raw = await redis_client.client.zrange(key, 0, -1, withscores=True)
+    points = [(int(m), int(s)) for m, s in raw]
+    compacted = downsample(points, now)
+    if compacted == sorted(points):
+        return
+    kept  = {t for t, _ in compacted}
+    stale = [str(t) for t, _ in points if t not in kept]
+    pipe = redis_client.client.pipeline(transaction=True)
+    if stale:
+        pipe.zrem(key, *stale)
+    if compacted:
+        pipe.zadd(key, {str(t): p for t, p in compacted}, lt=True)
+    await pipe.execute()
+    logger.debug(f"[PriceHistory] {key}: {len(points)} → {len(compacted)} точек")
+
+
+# ══════════════════════════════════════════════════════════════════
+# Чтение
+# ══════════════════════════════════════════════════════════════════
+
+async def get_series(
+    origin: str, dest: str, month: str,
+    since: Optional[float] = None, until: Optional[float] = None,
+    kind: str = "ow",
+) -> List[Point]:
+    """Ряд (ts, цена) за [since, until], по возрастанию времени."""
+    if not redis_client.client:
+        return []
+    try:
+        raw = await redis_client.client.zrange(_hist_key(origin, dest, month, kind), 0, -1, withscores=True)
+    except Exception:
+        return []
+    lo = since if since is not None else float("-inf")
+    hi = until if until is not None else float("inf")
+    return sorted((int(m), int(s)) for m, s in raw if lo <= int(m) <= hi)
+
+
+async def get_stats(
+    origin: str, dest: str, month: str,
+    window: Optional[int] = None, kind: str = "ow",
+) -> Optional[Dict]:
+    """Сводка summarize() по маршруту за последние window секунд (None — вся история)."""
+    since = time.time() - window if window else None
+    return summarize(await get_series(origin, dest, month, since=since, kind=kind))
+
+
+async def get_stats_many(
+    routes: List[Tuple[str, str]], month: str,
+    window: Optional[int] = None, kind: str = "ow",
+) -> Dict[Tuple[str, str], Dict]:
+    """
+    Сводки сразу по многим маршрутам одного месяца — один pipeline вместо N запросов.
+    В результат попадают только маршруты, по которым есть история.
+    """
+    if not redis_client.client or not routes:
+        return {}
+    since = time.time() - window if window else float("-inf")
+    try:
+        pipe = redis_client.client.pipeline(transaction=False)
+        for origin, dest in routes:
+            pipe.zrange(_hist_key(origin, dest, month, kind), 0, -1, withscores=True)
+        raws = await pipe.execute()
+    except Exception as e:
+        logger.debug(f"[PriceHistory] get_stats_many: {e}")
+        return {}
+    result = {}
+    for route, raw in zip(routes, raws):
+        stats = summarize([(int(m), int(s)) for m, s in raw or [] if int(m) >= since])
+        if stats:
+            result[route] = stats
+    return result
+
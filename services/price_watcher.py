@@ -7,6 +7,8 @@
      делаем ОДИН запрос к API, результат раздаём всем.
   2. BACKGROUND_SEMAPHORE: фоновые запросы не блокируют живых пользователей.
   3. Параллельные запросы к API по уникальным маршрутам (с семафором).
+  4. ROUTE_QUEUE=1: маршруты проверяют процессы-воркеры через Redis Stream
+     (services/route_queue.py), недостающее добираем здесь же.
 """
 import asyncio
 import json
@@ -18,8 +20,8 @@ from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter, TelegramAPIError
 
-from services.flight_search import search_flights, generate_booking_link, normalize_date
-from handlers.everywhere_search import search_destination_everywhere, search_origin_everywhere
+from services.flight_search import generate_booking_link, normalize_date
+from services import route_queue
 from utils.redis_client import redis_client
 from utils.api_limiter import BACKGROUND_SEMAPHORE
 from utils.logger import logger
@@ -91,9 +93,17 @@ class PriceWatcher:
 
         self._cycle_cache.clear()
 
-        # Запрашиваем цены параллельно — по одному на маршрут
+        # Очередь: маршруты разбирают воркеры, ждём результаты
+        if route_queue.enabled():
+            try:
+                await self._fetch_via_queue(by_route)
+            except Exception as e:
+                logger.error(f"[PriceWatch] очередь недоступна, проверяю сам: {e}")
+
+        # Запрашиваем цены параллельно — по одному на маршрут (всё, что не пришло из очереди)
+        missing = {rk: items for rk, items in by_route.items() if rk not in self._cycle_cache}
         await asyncio.gather(
-            *[self._fetch_route_price(rk, items[0][1]) for rk, items in by_route.items()],
+            *[self._fetch_route_price(rk, items[0][1]) for rk, items in missing.items()],
             return_exceptions=True
         )
 
@@ -123,44 +133,33 @@ class PriceWatcher:
         return (f"{watch.get('origin') or 'X'}:{watch.get('dest') or 'X'}:"
                 f"{watch.get('depart_date', '')}:{watch.get('return_date') or ''}")
 
+    @staticmethod
+    def _route_job(watch: dict) -> dict:
+        return {
+            "origin":      watch.get("origin") or None,
+            "dest":        watch.get("dest") or None,
+            "depart_date": normalize_date(watch.get("depart_date", "")),
+            "return_date": normalize_date(watch["return_date"]) if watch.get("return_date") else None,
+        }
+
+    async def _fetch_via_queue(self, by_route: Dict[str, List[Tuple[str, dict]]]) -> None:
+        cycle = f"pw:{int(time.time())}"
+        jobs  = {rk: self._route_job(items[0][1]) for rk, items in by_route.items()}
+        results = await route_queue.check_routes(cycle, list(jobs.values()), timeout=self.check_interval / 4)
+        for rk, job in jobs.items():
+            qk = route_queue.route_key(job["origin"], job["dest"], job["depart_date"], job["return_date"])
+            if qk in results:
+                res = results[qk]
+                self._cycle_cache[rk] = (res["price"] if res else None, time.time())
+        logger.info(f"[PriceWatch] очередь: {len(results)}/{len(jobs)} маршрутов проверено воркерами")
+
     async def _fetch_route_price(self, route_key: str, watch: dict) -> None:
         async with BACKGROUND_SEMAPHORE:
             try:
-                origin      = watch.get("origin")
-                dest        = watch.get("dest")
-                depart_date = normalize_date(watch.get("depart_date", ""))
-                return_date = normalize_date(watch["return_date"]) if watch.get("return_date") else None
-
-                # Переиспользуем уже существующие функции везде-поиска
-                if not origin and dest:
-                    # Везде → конкретный город
-                    flights = await search_origin_everywhere(
-                        dest_iata=dest, depart_date=depart_date
-                    )
-                elif origin and not dest:
-                    # Конкретный город → Везде
-                    flights = await search_destination_everywhere(
-                        origin_iata=origin, depart_date=depart_date
-                    )
-                else:
-                    # Конкретный маршрут — пропускаем если недавно был пустым
-                    if await redis_client.is_route_empty(origin, dest):
-                        logger.debug(f"[PriceWatch] {origin}→{dest}: пропуск (нет данных, кеш 48ч)")
-                        self._cycle_cache[route_key] = (None, time.time())
-                        return
-                    flights = await search_flights(
-                        origin=origin, destination=dest,
-                        depart_date=depart_date, return_date=return_date,
-                    )
-
-                if not flights:
-                    if origin and dest:  # только конкретный маршрут, не везде
-                        await redis_client.set_route_empty(origin, dest)
-                    self._cycle_cache[route_key] = (None, time.time())
-                    return
-                mf = min(flights, key=lambda f: f.get("value") or f.get("price") or 999999)
-                raw = mf.get("value") or mf.get("price")
-                self._cycle_cache[route_key] = (int(float(raw)) if raw else None, time.time())
+                job = self._route_job(watch)
+                # Та же проверка, что выполняют воркеры очереди (везде-поиск, кеш пустых маршрутов)
+                res = await route_queue.check_route(**job)
+                self._cycle_cache[route_key] = (res["price"] if res else None, time.time())
             except Exception as e:
                 logger.error(f"API ошибка {route_key}: {e}")
                 self._cycle_cache[route_key] = (None, time.time())
@@ -0,0 +1,254 @@
+# services/route_queue.py
+"""
+Очередь проверок маршрутов на Redis Streams.
+
+PriceWatcher и HotDealsSender (лидеры своих лиз) публикуют уникальные
+маршруты цикла как задания в stream, а проверяют их N процессов-воркеров
+(python -m services.worker на одной или нескольких машинах) через
+consumer group. Так запросы к API и разбор JSON не упираются в один event loop.
+
+Ключи:
+  route_jobs                — stream заданий {cycle, origin, dest, depart_date, return_date}
+  route_jobs:dead           — задания, упавшие MAX_DELIVERIES раз
+  route_results:{cycle}     — HASH route_key → JSON {price, flight, ts}, TTL RESULT_TTL
+
+Надёжность:
+  - задание ack-ается только после записи результата;
+  - зависшие у упавшего воркера задания перехватываются XAUTOCLAIM через CLAIM_IDLE;
+  - после MAX_DELIVERIES попыток — в dead-stream, результат {price: None}.
+  - продюсер ждёт результаты не дольше таймаута, недостающее проверяет сам.
+
+Включается переменной ROUTE_QUEUE=1 (и только при доступном Redis).
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from services.flight_search import search_flights
+from handlers.everywhere_search import search_destination_everywhere, search_origin_everywhere
+from utils.redis_client import redis_client
+from utils.api_limiter import BACKGROUND_SEMAPHORE
+from utils.logger import logger
+
+GROUP          = "route_checkers"
+STREAM_MAXLEN  = 50_000        # приблизительный MAXLEN для XADD
+BATCH          = 10            # сколько заданий забирает один XREADGROUP
+BLOCK_MS       = 5_000         # блокирующее ожидание новых заданий
+CLAIM_IDLE_MS  = 60_000        # задание без ack дольше минуты — перехватываем
+CLAIM_EVERY    = 30            # сек между проходами XAUTOCLAIM
+MAX_DELIVERIES = 3             # после стольких попыток — dead-letter
+RESULT_TTL     = 6 * 3600      # результаты живут один цикл PriceWatcher
+POLL_INTERVAL  = 0.5           # как часто продюсер проверяет готовность
+
+
+def enabled() -> bool:
+    return os.getenv("ROUTE_QUEUE", "0") == "1" and redis_client.client is not None
+
+
+def route_key(origin: Optional[str], dest: Optional[str], depart_date: str, return_date: Optional[str]) -> str:
+    return f"{origin or 'X'}:{dest or 'X'}:{depart_date or ''}:{return_date or ''}"
+
+
+def _stream() -> str:
+    return f"{redis_client.prefix}route_jobs"
+
+
+def _results_key(cycle: str) -> str:
+    return f"{redis_client.prefix}route_results:{cycle}"
+
+
+# ══════════════════════════════════════════════════════════════════
+# Проверка одного маршрута (общая для очереди и inline-режима)
+# ══════════════════════════════════════════════════════════════════
+
+async def check_route(
+    origin: Optional[str], dest: Optional[str],
+    depart_date: str, return_date: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Самый дешёвый рейс маршрута: {"price": int, "flight": dict} или None.
+    Пустой origin / dest — поиск «Везде». Учитывает кеш пустых маршрутов.
+    Семафор не берёт — это делает вызывающий.
+    """
+    if not origin and dest:
+        flights = await search_origin_everywhere(dest_iata=dest, depart_date=depart_date)
+    elif origin and not dest:
+        flights = await search_destination_everywhere(origin_iata=origin, depart_date=depart_date)
+    else:
+        if await redis_client.is_route_empty(origin, dest):
+            logger.debug(f"[RouteCheck] {origin}→{dest}: пропуск (нет данных, кеш 48ч)")
+            return None
+        flights = await search_flights(
+            origin=origin, destination=dest,
+            depart_date=depart_date, return_date=return_date,
+        )
+        if not flights:
+            await redis_client.set_route_empty(origin, dest)
+            return None
+        await redis_client.clear_route_empty(origin, dest)
+
+    if not flights:
+        return None
+    cheapest = min(flights, key=lambda f: f.get("value") or f.get("price") or 999999)
+    raw = cheapest.get("value") or cheapest.get("price")
+    if not raw:
+        return None
+    return {"price": int(float(raw)), "flight": cheapest}
+
+
+# ══════════════════════════════════════════════════════════════════
+# Продюсер
+# ══════════════════════════════════════════════════════════════════
+
+async def publish(cycle: str, jobs: List[dict]) -> int:
+    """Публикует задания {origin, dest, depart_date, return_date}. Возвращает число заданий."""
+    if not jobs:
+        return 0
+    pipe = redis_client.client.pipeline(transaction=False)
+    for job in jobs:
+        pipe.xadd(_stream(), {
+            "cycle":       cycle,
+            "origin":      job.get("origin") or "",
+            "dest":        job.get("dest") or "",
+            "depart_date": job.get("depart_date") or "",
+            "return_date": job.get("return_date") or "",
+        }, maxlen=STREAM_MAXLEN, approximate=True)
+    await pipe.execute()
+    return len(jobs)
+
+
+async def collect(cycle: str, keys: List[str], timeout: float) -> Dict[str, Optional[dict]]:
+    """
+    Ждёт результаты по keys до timeout секунд.
+    Возвращает только готовые: {route_key: {"price", "flight"} | None}.
+    """
+    pending = list(dict.fromkeys(keys))
+    results: Dict[str, Optional[dict]] = {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        raw = await redis_client.client.hmget(_results_key(cycle), pending)
+        still = []
+        for key, value in zip(pending, raw):
+            if value is None:
+                still.append(key)
+                continue
+            data = json.loads(value)
+            results[key] = data if data.get("price") else None
+        pending = still
+        if not pending or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(POLL_INTERVAL)
+    if pending:
+        logger.warning(f"[RouteQueue] cycle={cycle}: {len(pending)} из {len(keys)} без результата за {timeout:.0f}с")
+    return results
+
+
+async def check_routes(cycle: str, jobs: List[dict], timeout: float = 600) -> Dict[str, Optional[dict]]:
+    """publish + collect. Ключи результата — route_key(origin, dest, depart_date, return_date)."""
+    await publish(cycle, jobs)
+    keys = [route_key(j.get("origin"), j.get("dest"), j.get("depart_date"), j.get("return_date")) for j in jobs]
+    return await collect(cycle, keys, timeout)
+
+
+# ══════════════════════════════════════════════════════════════════
+# Потребитель
+# ══════════════════════════════════════════════════════════════════
+
+async def _ensure_group() -> None:
+    try:
+        await redis_client.client.xgroup_create(_stream(), GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _write_result(cycle: str, key: str, result: Optional[dict]) -> None:
+    payload = {"price": None, "flight": None, "ts": int(time.time())}
+    if result:
+        payload.update(result)
+    pipe = redis_client.client.pipeline(transaction=False)
+    pipe.hset(_results_key(cycle), key, json.dumps(payload, ensure_ascii=False))
+    pipe.expire(_results_key(cycle), RESULT_TTL)
+    await pipe.execute()
+
+
+async def _ack(msg_id: str) -> None:
+    pipe = redis_client.client.pipeline(transaction=False)
+    pipe.xack(_stream(), GROUP, msg_id)
+    pipe.xdel(_stream(), msg_id)
+    await pipe.execute()
+
+
+async def _handle(msg_id: str, fields: dict) -> None:
+    cycle = fields.get("cycle", "")
+    origin, dest = fields.get("origin") or None, fields.get("dest") or None
+    depart, ret  = fields.get("depart_date", ""), fields.get("return_date") or None
+    try:
+        async with BACKGROUND_SEMAPHORE:
+            result = await check_route(origin, dest, depart, ret)
+        await _write_result(cycle, route_key(origin, dest, depart, ret), result)
+        await _ack(msg_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Без ack — задание перехватит XAUTOCLAIM и повторит
+        logger.warning(f"[RouteQueue] {origin}→{dest} {depart}: {e} — будет повтор")
+
+
+async def _claim_stale(consumer: str) -> List[tuple]:
+    """Перехватывает зависшие задания; исчерпавшие попытки отправляет в dead-stream."""
+    client = redis_client.client
+    _, messages, *_ = await client.xautoclaim(
+        _stream(), GROUP, consumer, min_idle_time=CLAIM_IDLE_MS, start_id="0-0", count=BATCH,
+    )
+    retry = []
+    for msg_id, fields in messages:
+        if not fields:  # удалено из stream, осталось только в PEL
+            await _ack(msg_id)
+            continue
+        info = await client.xpending_range(_stream(), GROUP, min=msg_id, max=msg_id, count=1)
+        delivered = info[0]["times_delivered"] if info else 1
+        if delivered > MAX_DELIVERIES:
+            logger.error(f"❌ [RouteQueue] {fields.get('origin')}→{fields.get('dest')}: {delivered} попыток — dead-letter")
+            await client.xadd(f"{_stream()}:dead", fields, maxlen=1000, approximate=True)
+            await _write_result(fields.get("cycle", ""), route_key(
+                fields.get("origin"), fields.get("dest"), fields.get("depart_date"), fields.get("return_date"),
+            ), None)
+            await _ack(msg_id)
+        else:
+            retry.append((msg_id, fields))
+    return retry
+
+
+async def run_consumer(consumer: str) -> None:
+    """
+    Цикл потребителя. Имя consumer уникально в пределах группы
+    (host:pid:n). Вызывать через asyncio.create_task(run_consumer(...)).
+    """
+    await _ensure_group()
+    logger.info(f"[RouteQueue] consumer {consumer} запущен")
+    last_claim = 0.0
+    while True:
+        try:
+            batch: List[tuple] = []
+            if time.monotonic() - last_claim > CLAIM_EVERY:
+                last_claim = time.monotonic()
+                batch = await _claim_stale(consumer)
+            if not batch:
+                resp = await redis_client.client.xreadgroup(
+                    GROUP, consumer, {_stream(): ">"}, count=BATCH, block=BLOCK_MS,
+                )
+                for _stream_name, messages in resp or []:
+                    batch.extend(messages)
+            if batch:
+                await asyncio.gather(*[_handle(mid, fields) for mid, fields in batch])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if "NOGROUP" in str(e):
+                await _ensure_group()
+                continue
+            logger.error(f"❌ [RouteQueue] consumer {consumer}: {e}")
+            await asyncio.sleep(5)
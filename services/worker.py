@@ -0,0 +1,132 @@
+# services/worker.py
+"""
+Отдельная точка входа для фоновых сервисов:
+
+    python -m services.worker
+
+Запускает PriceWatcher, HotDealsSender и daily_stats без Telegram-поллинга,
+поэтому тяжёлые проходы по маршрутам не задерживают ответы пользователям.
+Каждый сервис работает под своей Redis-лизой (utils/leader_lock.py):
+можно поднять несколько воркеров — каждый проход выполняет ровно один.
+
+Бот (main.py) при BACKGROUND_MODE=worker фоновые сервисы не запускает
+и масштабируется горизонтально. По умолчанию (BACKGROUND_MODE=inline)
+сервисы стартуют внутри бота — тоже под лизой, так что две реплики
+бота не задвоят рассылки.
+
+ROUTE_QUEUE=1: каждый процесс дополнительно поднимает ROUTE_QUEUE_CONSUMERS
+потребителей services/route_queue.py (без лизы — проверки маршрутов
+делят все воркеры), а лидеры PriceWatcher / HotDealsSender только
+публикуют задания и собирают результаты.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import List
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from dotenv import load_dotenv
+
+from utils.logger import logger
+from utils.redis_client import redis_client
+from utils.cities_loader import load_cities_from_api
+from utils.leader_lock import run_as_leader
+from services import route_queue
+
+# Имена лиз (они же ключи heartbeat:{name})
+BACKGROUND_SERVICES = ("price_watcher", "hot_deals", "daily_stats")
+
+
+def start_background_services(bot: Bot) -> List[asyncio.Task]:
+    """Создаёт задачи фоновых сервисов, каждая — под своей лизой."""
+    from services.price_watcher import PriceWatcher
+    from services.hot_deals_sender import HotDealsSender
+    from utils import daily_stats
+
+    factories = {
+        "price_watcher": lambda: PriceWatcher(bot).start(),
+        "hot_deals":     lambda: HotDealsSender(bot).start(),
+        "daily_stats":   daily_stats.start,
+    }
+    tasks = [
+        asyncio.create_task(run_as_leader(name, factories[name]), name=f"leader:{name}")
+        for name in BACKGROUND_SERVICES
+    ]
+    logger.info(f"✅ Фоновые сервисы под лизой: {', '.join(BACKGROUND_SERVICES)}")
+
+    if route_queue.enabled():
+        n = int(os.getenv("ROUTE_QUEUE_CONSUMERS", "3"))
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        tasks += [
+            asyncio.create_task(route_queue.run_consumer(f"{base}:{i}"), name=f"route_queue:{i}")
+            for i in range(n)
+        ]
+        logger.info(f"✅ Потребители очереди маршрутов: {n}")
+    return tasks
+
+
+async def stop_background_services(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await asyncio.wait_for(task, timeout=10.0)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+
+
+async def main():
+    # ─── 1. Redis и база городов ───
+    await redis_client.connect()
+    if not redis_client.client:
+        logger.warning("⚠️ [Worker] Redis недоступен — лизы отключены, воркер должен быть единственным")
+    await load_cities_from_api()
+
+    # ─── 2. Бот — только для отправки уведомлений (без поллинга) ───
+    bot_token = os.getenv("BOT_TOKEN", "").strip()
+    if not bot_token:
+        logger.critical("❌ [Worker] BOT_TOKEN не задан")
+        raise SystemExit(1)
+    bot = Bot(token=bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    import utils.bot_instance as _bot_instance
+    _bot_instance.bot = bot
+
+    from utils.channel_logger import ChannelLogHandler
+    _ch_handler = ChannelLogHandler(level=logging.ERROR)
+    _ch_handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+    logging.getLogger().addHandler(_ch_handler)
+
+    # ─── 3. Сервисы и ожидание сигнала остановки ───
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    tasks = start_background_services(bot)
+    logger.info("🚀 [Worker] Запущен")
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("🛑 [Worker] Остановка...")
+        await stop_background_services(tasks)
+        await redis_client.close()
+        await bot.session.close()
+        logger.info("✅ [Worker] Остановлен")
+
+
+if __name__ == "__main__":
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL, logging.INFO),
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    load_dotenv()
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+test_billing.py
+===============
+Тесты получения тарифов: кэш планов в процессе и пакетный get_plans.
+
+Запуск из корня проекта:
+    pytest test/test_billing.py -v
+
+Файл НЕ требует реального Redis — клиент мокируется.
+"""
+
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from handlers import billing
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    billing._plan_cache.clear()
+    yield
+    billing._plan_cache.clear()
+
+
+def _plan(key="plus", expires_in=86400) -> str:
+    return json.dumps({"plan": key, "expires_at": time.time() + expires_in, "paid_at": 0, "payment_id": "p"})
+
+
+def _client(mget=None, get=None) -> MagicMock:
+    client = MagicMock()
+    client.mget = AsyncMock(return_value=mget or [])
+    client.get  = AsyncMock(return_value=get)
+    client.set  = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    client.pipeline = MagicMock(return_value=pipe)
+    return client
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — get_plans: один MGET на проход
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestGetPlans:
+
+    @pytest.mark.asyncio
+    async def test_single_mget_for_all_users(self):
+        client = _client(mget=[_plan("plus"), None, _plan("premium")])
+        with patch.object(billing.redis_client, "client", client):
+            plans = await billing.get_plans([1, 2, 3, 1, 2])
+        client.mget.assert_awaited_once()
+        assert len(client.mget.call_args.args[0]) == 3  # дубли user_id не запрашиваются
+        assert [plans[u]["plan"] for u in (1, 2, 3)] == ["plus", "free", "premium"]
+        client.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_second_sweep_hits_cache(self):
+        client = _client(mget=[_plan("plus"), None])
+        with patch.object(billing.redis_client, "client", client):
+            await billing.get_plans([1, 2])
+            plans = await billing.get_plans([1, 2])
+            assert (await billing.get_user_plan(1))["plan"] == "plus"
+        assert client.mget.await_count == 1
+        client.get.assert_not_called()
+        assert billing.is_paid(plans[1]) and not billing.is_paid(plans[2])
+
+    @pytest.mark.asyncio
+    async def test_expired_plan_downgraded_and_persisted(self):
+        client = _client(mget=[_plan("plus", expires_in=-10)])
+        with patch.object(billing.redis_client, "client", client):
+            plans = await billing.get_plans([7])
+        assert plans[7]["plan"] == "free"
+        pipe = client.pipeline.return_value
+        key, payload = pipe.set.call_args.args
+        assert key.endswith("plan:7") and json.loads(payload)["plan"] == "free"
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — инвалидация кэша
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestPlanCacheInvalidation:
+
+    @pytest.mark.asyncio
+    async def test_cache_entry_ends_at_plan_expiry(self):
+        client = _client(get=_plan("plus", expires_in=1))
+        with patch.object(billing.redis_client, "client", client):
+            await billing.get_user_plan(5)
+        until, _ = billing._plan_cache[5]
+        assert until <= time.time() + 1
+
+    @pytest.mark.asyncio
+    async def test_returned_plans_are_copies(self):
+        """Правка полученного плана не портит кэш для остальных вызывающих."""
+        client = _client(get=_plan("plus", expires_in=3600))
+        with patch.object(billing.redis_client, "client", client):
+            (await billing.get_user_plan(7))["plan"] = "free"
+            (await billing.get_plans([7]))[7]["annotated"] = True
+            plan = await billing.get_user_plan(7)
+        assert plan["plan"] == "plus" and "annotated" not in plan
+
+    @pytest.mark.asyncio
+    async def test_persist_replaces_cached_plan(self):
+        """После оплаты процесс сразу видит новый тариф, без ожидания PLAN_CACHE_TTL."""
+        client = _client(get=None)
+        with patch.object(billing.redis_client, "client", client):
+            assert (await billing.get_user_plan(9))["plan"] == "free"
+            billing.invalidate_plan(9)
+            await billing._persist_plan(9, json.loads(_plan("premium")))
+            assert (await billing.get_user_plan(9))["plan"] == "premium"
+        assert client.get.await_count == 1
@@ -0,0 +1,538 @@
+"""
+test_cities_loader.py
+=====================
+Тесты справочника городов (utils/cities_loader.py): нечёткий поиск
+через индекс удалений, автокомплит по префиксному индексу, снимок таблиц
+и фоновое обновление базы (stale-while-revalidate), компактные записи CITIES_DATA,
+газеттир NAME_INDEX/PLACES, падежи городов и стран, аэропорты рядом.
+
+Запуск из корня проекта:
+    pytest test/test_cities_loader.py -v
+
+Файл НЕ делает запросов к API — словари заполняются из utils/cities.py.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from utils import cities_loader as cl
+from utils.cities import CITY_TO_IATA as FALLBACK_C2I, IATA_TO_CITY as FALLBACK_I2C
+
+
+@pytest.fixture
+def cities():
+    """Изолированные словари: fallback-справочник + ручные алиасы."""
+    c2i = dict(FALLBACK_C2I)
+    for alias, iata in cl.MANUAL_ALIASES.items():
+        c2i.setdefault(cl._normalize_name(alias), iata)
+    with patch.dict(cl.CITY_TO_IATA, c2i, clear=True), \
+         patch.dict(cl.IATA_TO_CITY, FALLBACK_I2C, clear=True):
+        cl._build_fuzzy_index()
+        yield c2i
+    cl._build_fuzzy_index()
+
+
+def _typo(word: str, rnd: random.Random, edits: int) -> str:
+    alpha = "абвгдежзийклмнопрстуфхцчшщыьэюя "
+    w = list(word)
+    for _ in range(edits):
+        i = rnd.randrange(len(w) + 1)
+        op = rnd.randint(0, 2)
+        if op == 0 and i < len(w):
+            del w[i]
+        elif op == 1:
+            w.insert(i, rnd.choice(alpha))
+        elif i < len(w):
+            w[i] = rnd.choice(alpha)
+    return "".join(w)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — индекс даёт тот же ответ, что и линейный проход
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestFuzzyIndex:
+
+    def test_common_typos(self, cities):
+        assert cl.fuzzy_get_iata("масква") == ("MOW", cl.IATA_TO_CITY["MOW"])
+        assert cl.fuzzy_get_iata("екатеренбург")[0] == "SVX"
+        assert cl.fuzzy_get_iata("zzzzzz") == (None, None)
+        assert cl.fuzzy_get_iata("мо") == (None, None)
+
+    def test_parity_with_scan(self, cities):
+        rnd = random.Random(11)
+        names = list(cities)
+        for _ in range(150):
+            q = cl._normalize_name(_typo(rnd.choice(names), rnd, rnd.randint(0, 3)))
+            if len(q) < 3:
+                continue
+            for max_dist in (1, 2):
+                assert cl._fuzzy_lookup(q, max_dist) == cl._fuzzy_scan(q, max_dist), q
+
+    def test_larger_max_dist_falls_back_to_scan(self, cities):
+        with patch.object(cl, "_fuzzy_lookup", side_effect=AssertionError("индекс строится только до 2")):
+            assert cl.fuzzy_get_iata("масквааа", max_dist=3)[0] == "MOW"
+
+    def test_rebuilt_when_dictionary_grows(self, cities):
+        cl.CITY_TO_IATA["новоградск"] = "NGX"
+        assert cl.fuzzy_get_iata("новоградкс")[0] == "NGX"
+        assert len(cl._FUZZY_NAMES) == len(cl.CITY_TO_IATA)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — автокомплит search_cities: префиксный индекс и ранжирование
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestSearchCities:
+
+    @pytest.fixture
+    def small(self):
+        c2i = {"москва": "MOW", "мурманск": "MMK", "мюнхен": "MUC", "минск": "MSQ",
+               "санкт петербург": "LED", "спб": "LED", "moscow": "MOW", "рим": "ROM", "римини": "RMI"}
+        i2c = {"MOW": "Москва", "MMK": "Мурманск", "MUC": "Мюнхен", "MSQ": "Минск",
+               "LED": "Санкт-Петербург", "ROM": "Рим", "RMI": "Римини"}
+        with patch.dict(cl.CITY_TO_IATA, c2i, clear=True), \
+             patch.dict(cl.IATA_TO_CITY, i2c, clear=True), \
+             patch.dict(cl.CITY_POPULARITY, {}, clear=True):
+            cl._build_prefix_index()
+            yield
+        cl._build_prefix_index()
+
+    def test_prefix_not_substring(self, small):
+        assert {c["iata"] for c in cl.search_cities("м")} == {"MOW", "MMK", "MUC", "MSQ"}
+        assert cl.search_cities("оск") == []  # середина слова — не подсказка
+
+    def test_later_word_of_name(self, small):
+        assert [c["iata"] for c in cl.search_cities("петер")] == ["LED"]
+
+    def test_ranked_by_popularity_then_hub(self, small):
+        # Без аналитики: MSQ и MOW — первые в COUNTRY_TOP_CITIES (короче — выше), MUC — третий в DE
+        assert [c["iata"] for c in cl.search_cities("м", limit=3)] == ["MSQ", "MOW", "MUC"]
+        cl.set_city_popularity({"MMK": 50, "Мюнхен": 10})
+        assert [c["iata"] for c in cl.search_cities("м", limit=2)] == ["MMK", "MUC"]
+
+    def test_exact_match_first_and_dedup(self, small):
+        cl.set_city_popularity({"RMI": 100})
+        assert [c["iata"] for c in cl.search_cities("рим")] == ["ROM", "RMI"]
+        assert [c["iata"] for c in cl.search_cities("мос")] == ["MOW"]
+
+    @pytest.mark.asyncio
+    async def test_refresh_popularity_from_redis(self, small):
+        with patch.object(cl.redis_client, "get_city_popularity", AsyncMock(return_value={"MSQ": 3.0, "минск": 2.0})):
+            await cl.refresh_city_popularity()
+        assert cl.CITY_POPULARITY == {"MSQ": 5.0}
+
+    @pytest.mark.asyncio
+    async def test_stale_popularity_refreshed_by_search(self, small):
+        get = AsyncMock(return_value={"MMK": 7.0})
+        with patch.object(cl.redis_client, "get_city_popularity", get), \
+             patch.object(cl, "_POPULARITY_AT", time.time()):
+            cl.search_cities("м")                       # свежая — Redis не трогаем
+            await asyncio.sleep(0)
+            assert get.await_count == 0
+            cl._POPULARITY_AT -= cl.POPULARITY_TTL + 1
+            cl.search_cities("м")
+            cl.search_cities("м")                       # вторая задача не ставится
+            await cl._popularity_task
+            assert get.await_count == 1
+        assert cl.CITY_POPULARITY == {"MMK": 7.0}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — снимок таблиц: быстрый старт без разбора JSON
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _api_city(iata: str, name: str, en: str) -> dict:
+    return {"code": iata, "name": name, "country_code": "RU", "has_flightable_airport": True,
+            "cases": {"su": name}, "name_translations": {"en": en}}
+
+
+class TestSnapshot:
+
+    @pytest.fixture
+    def files(self, tmp_path):
+        cache = tmp_path / "cities_cache.json"
+        cache.write_text(json.dumps([_api_city("MOW", "Москва", "Moscow"), _api_city("KZN", "Казань", "Kazan")]),
+                         encoding="utf-8")
+        with patch.object(cl, "CACHE_FILE", cache), \
+             patch.object(cl, "SNAPSHOT_FILE", tmp_path / "cities_snapshot.bin"), \
+             patch.object(cl, "RECORDS_FILE", tmp_path / "cities_records.jsonl"), \
+             patch.dict(cl.CITY_TO_IATA, {}, clear=True), \
+             patch.dict(cl.IATA_TO_CITY, {}, clear=True), \
+             patch.dict(cl.CITIES_DATA, {}, clear=True):
+            yield cache
+        cl._build_fuzzy_index()
+        cl._build_prefix_index()
+        cl._build_gazetteer()
+
+    @pytest.mark.asyncio
+    async def test_second_start_reads_snapshot(self, files):
+        assert await cl.load_cities_from_api() is True
+        assert cl.SNAPSHOT_FILE.exists()
+        expected = dict(cl.CITY_TO_IATA)
+
+        cl.CITY_TO_IATA.clear()
+        with patch.object(cl, "_build_tables", side_effect=AssertionError("JSON не разбираем")):
+            assert await cl.load_cities_from_api() is True
+        assert cl.CITY_TO_IATA == expected
+        assert cl.fuzzy_get_iata("казанб")[0] == "KZN"
+        assert [c["iata"] for c in cl.search_cities("каз")] == ["KZN"]
+
+    @pytest.mark.asyncio
+    async def test_rebuilt_when_cache_changes(self, files):
+        await cl.load_cities_from_api()
+        files.write_text(json.dumps([_api_city("OVB", "Новосибирск", "Novosibirsk")]), encoding="utf-8")
+        await cl.load_cities_from_api()
+        assert cl.get_iata("новосибирск") == "OVB" and "казань" not in cl.CITY_TO_IATA
+
+    @pytest.mark.asyncio
+    async def test_other_version_ignored(self, files):
+        await cl.load_cities_from_api()
+        with patch.object(cl, "SNAPSHOT_VERSION", cl.SNAPSHOT_VERSION + 1):
+            assert cl._load_snapshot() is None
+
+    @pytest.mark.asyncio
+    async def test_rebuilt_when_extra_source_changes(self, files, tmp_path):
+        manual = tmp_path / "iata_manual.json"
+        manual.write_text(json.dumps({"тестоград": "TST"}), encoding="utf-8")
+        with patch.object(cl, "IATA_MANUAL_FILE", manual):
+            await cl.load_cities_from_api()
+            assert cl._load_snapshot() is not None
+            manual.write_text(json.dumps({"тестоград": "TSU", "другоград": "DRG"}), encoding="utf-8")
+            assert cl._load_snapshot() is None
+            await cl.load_cities_from_api()
+            assert cl.get_iata("тестоград") == "TSU"
+
+    @pytest.mark.asyncio
+    async def test_rebuilt_when_aliases_in_code_change(self, files):
+        await cl.load_cities_from_api()
+        with patch.dict(cl.MANUAL_ALIASES, {"казанька": "KZN"}):
+            assert cl._load_snapshot() is None
+        assert cl._load_snapshot() is not None
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 4 — старт без ожидания сети, обновление в фоне, подмена таблиц
+# ═════════════════════════════════════════════════════════════════════════════
+
+class _FakeResponse:
+    def __init__(self, status: int, data):
+        self.status, self._data = status, data
+
+    async def json(self):
+        return self._data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    def __init__(self, response: _FakeResponse):
+        self._response = response
+
+    def get(self, url, timeout=None):
+        return self._response
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class TestBackgroundRefresh:
+
+    @pytest.fixture
+    def files(self, tmp_path):
+        with patch.object(cl, "CACHE_FILE", tmp_path / "cities_cache.json"), \
+             patch.object(cl, "SNAPSHOT_FILE", tmp_path / "cities_snapshot.bin"), \
+             patch.object(cl, "RECORDS_FILE", tmp_path / "cities_records.jsonl"), \
+             patch.dict(cl.CITY_TO_IATA, {}, clear=True), \
+             patch.dict(cl.IATA_TO_CITY, {}, clear=True), \
+             patch.dict(cl.CITIES_DATA, {}, clear=True):
+            yield tmp_path
+        cl._build_fuzzy_index()
+        cl._build_prefix_index()
+        cl._build_gazetteer()
+
+    @pytest.mark.asyncio
+    async def test_no_cache_starts_on_fallback_and_refreshes_in_background(self, files):
+        with patch.object(cl, "refresh_cities", AsyncMock(return_value=True)) as refresh:
+            assert await cl.load_cities_from_api() is True
+            assert cl.cities_db_info()["source"] == "fallback"
+            assert cl.get_iata("москва") == "MOW"
+            await cl._refresh_task
+        refresh.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_stale_cache_served_then_refreshed(self, files):
+        cl.CACHE_FILE.write_text(json.dumps([_api_city("KZN", "Казань", "Kazan")]), encoding="utf-8")
+        old = time.time() - cl.CACHE_TTL_SECONDS - 60
+        os.utime(cl.CACHE_FILE, (old, old))
+        with patch.object(cl, "refresh_cities", AsyncMock(return_value=True)) as refresh:
+            await cl.load_cities_from_api()
+            await cl._refresh_task
+        assert cl.get_iata("казань") == "KZN"
+        assert cl.cities_db_info()["age_sec"] >= cl.CACHE_TTL_SECONDS
+        refresh.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_refresh_swaps_tables_in_place(self, files):
+        c2i = cl.CITY_TO_IATA
+        generation = cl.CITIES_GENERATION
+        session = _FakeSession(_FakeResponse(200, [_api_city("OVB", "Новосибирск", "Novosibirsk")]))
+        with patch.object(cl.aiohttp, "ClientSession", return_value=session):
+            assert await cl.refresh_cities() is True
+        assert cl.CITY_TO_IATA is c2i and c2i["novosibirsk"] == "OVB"
+        assert cl.CITIES_GENERATION == generation + 1
+        assert cl.CACHE_FILE.exists() and cl._load_snapshot() is not None
+        assert cl.fuzzy_get_iata("новосибирк")[0] == "OVB"
+
+    @pytest.mark.asyncio
+    async def test_refresh_builds_gazetteer_off_loop(self, files):
+        session = _FakeSession(_FakeResponse(200, [_api_city("OVB", "Новосибирск", "Novosibirsk")]))
+        with patch.object(cl.aiohttp, "ClientSession", return_value=session), \
+             patch.object(cl, "_build_gazetteer", side_effect=AssertionError("газеттир — в потоке")):
+            assert await cl.refresh_cities() is True
+            assert cl.get_iata("новосибирск") == "OVB"
+            assert cl.resolve_place("SVO").metro == "MOW"
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_tables(self, files):
+        cl.CITY_TO_IATA["казань"] = "KZN"
+        generation = cl.CITIES_GENERATION
+        with patch.object(cl.aiohttp, "ClientSession", return_value=_FakeSession(_FakeResponse(502, None))):
+            assert await cl.refresh_cities() is False
+        assert cl.CITY_TO_IATA == {"казань": "KZN"} and cl.CITIES_GENERATION == generation
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 5 — CITIES_DATA: компактные записи вместо словарей API
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestCityRecords:
+
+    def test_only_used_fields_kept(self):
+        city = dict(_api_city("OVB", "Новосибирск", "Novosibirsk"), time_zone="Asia/Novosibirsk",
+                    coordinates={"lat": 55.01, "lon": 82.65})
+        rec = cl._build_tables([city])["cities_data"]["OVB"]
+        assert rec == cl.CityRecord("OVB", "Новосибирск", "RU", "Asia/Novosibirsk", 55.01, 82.65)
+        assert rec.get("country_code") == "RU" and rec.get("cases") is None
+
+    def test_country_codes_interned(self):
+        tables = cl._build_tables([_api_city("MOW", "Москва", "Moscow"), _api_city("KZN", "Казань", "Kazan")])
+        data = tables["cities_data"]
+        assert data["MOW"].country_code is data["KZN"].country_code
+
+    def test_full_record_read_by_offset(self, tmp_path):
+        cities = [_api_city("MOW", "Москва", "Moscow"), _api_city("KZN", "Казань", "Kazan")]
+        with patch.object(cl, "RECORDS_FILE", tmp_path / "cities_records.jsonl"), \
+             patch.dict(cl.CITIES_DATA, {}, clear=True), \
+             patch.dict(cl._RECORD_OFFSETS, {}, clear=True):
+            tables = cl._build_tables(cities)
+            tables["record_offsets"] = cl._save_records(cities, tables["cities_data"])
+            cl._install_tables({k: tables[k] for k in ("cities_data", "record_offsets")})
+            with patch.object(cl.json, "load", side_effect=AssertionError("весь кэш не читаем")):
+                assert cl.get_city_info("KZN")["cases"] == {"su": "Казань"}
+                assert cl.get_city_info("MOW")["name_translations"] == {"en": "Moscow"}
+
+            cl.RECORDS_FILE.write_text("", encoding="utf-8")  # файл от другого поколения
+            assert cl.get_city_info("KZN") == cl.CITIES_DATA["KZN"]._asdict()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 6 — газеттир: все источники в NAME_INDEX / PLACES, разрешение за одно обращение
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestGazetteer:
+
+    @pytest.fixture
+    def gaz(self):
+        city = dict(_api_city("MOW", "Москва", "Moscow"))
+        tables = cl._build_tables([city, _api_city("IST", "Стамбул", "Istanbul")])
+        with patch.dict(cl.CITY_TO_IATA, tables["city_to_iata"], clear=True), \
+             patch.dict(cl.IATA_TO_CITY, tables["iata_to_city"], clear=True), \
+             patch.dict(cl.CITIES_DATA, tables["cities_data"], clear=True):
+            cl._install_tables(tables)
+            yield tables
+        cl._build_gazetteer()
+
+    def test_api_name_wins_over_other_sources(self, gaz):
+        assert cl.resolve_place("Москва").iata == "MOW"
+        assert cl.get_iata("moscow") == "MOW"
+
+    def test_fallback_and_csv_sources_merged(self, gaz):
+        assert "казань" not in cl.CITY_TO_IATA
+        assert cl.get_iata("Казань") == "KZN"          # utils/cities.py
+        assert cl.resolve_place("новосибирск").iata == "OVB"
+
+    def test_airport_resolves_to_itself_with_metro(self, gaz):
+        for text in ("шереметьево", "SVO", "svo"):
+            place = cl.resolve_place(text)
+            assert (place.iata, place.metro, place.name) == ("SVO", "MOW", "Шереметьево"), text
+        assert cl.PLACES["SVO"].country_code == "RU"  # страна — от города-метро
+
+    def test_metro_lists_airports(self, gaz):
+        moscow = cl.PLACES["MOW"]
+        assert moscow.metro is None and [code for code, _ in moscow.airports] == ["SVO", "DME", "VKO", "ZIA"]
+        assert cl.PLACES["IST"].metro is None  # аэропорт и город с одним кодом
+
+    def test_unknown_text(self, gaz):
+        assert cl.resolve_place("НесуществующийГород9999") is None
+        assert cl.resolve_place("") is None
+
+    def test_rebuilt_only_for_new_generation(self, gaz):
+        cl._build_gazetteer()
+        cl.CITY_TO_IATA["тестоград"] = "TST"
+        with patch.object(cl, "_gazetteer_tables", side_effect=AssertionError("файлы не читаем")):
+            assert cl.resolve_place("тестоград") is None  # размер словаря — не признак
+        with patch.object(cl, "CITIES_GENERATION", cl.CITIES_GENERATION + 1):
+            assert cl.resolve_place("тестоград").iata == "TST"
+
+    def test_kept_in_snapshot(self, gaz, tmp_path):
+        with patch.object(cl, "SNAPSHOT_FILE", tmp_path / "cities_snapshot.bin"), \
+             patch.object(cl, "CACHE_FILE", tmp_path / "cities_cache.json"):
+            cl.CACHE_FILE.write_text("[]", encoding="utf-8")
+            cl._save_snapshot(gaz)
+            loaded = cl._load_snapshot()
+        assert loaded["places"] == gaz["places"] and loaded["name_index"] == gaz["name_index"]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 7 — падежи: «из Москвы в Турцию» разрешается за одно обращение
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _api_city_cases(iata: str, name: str, en: str, **cases) -> dict:
+    return dict(_api_city(iata, name, en), cases=dict(cases, su=name))
+
+
+class TestCaseForms:
+
+    @pytest.fixture
+    def gaz(self):
+        tables = cl._build_tables([
+            _api_city_cases("MOW", "Москва", "Moscow", ro="Москвы", da="Москве", vi="Москву", tv="Москвой", pr="Москве"),
+            _api_city_cases("IST", "Стамбул", "Istanbul", ro="Стамбула", vi="Стамбул", pr="Стамбуле"),
+        ])
+        with patch.dict(cl.CITY_TO_IATA, tables["city_to_iata"], clear=True), \
+             patch.dict(cl.IATA_TO_CITY, tables["iata_to_city"], clear=True), \
+             patch.dict(cl.CITIES_DATA, tables["cities_data"], clear=True), \
+             patch.dict(cl.CITY_CASE_FORMS, {}, clear=True):
+            cl._install_tables(tables)
+            yield tables
+        cl._build_gazetteer()
+
+    def test_inflected_forms_resolve(self, gaz):
+        for text in ("Москвы", "москве", "Москвой", "из Москвы", "в Москву"):
+            assert cl.resolve_place(text).iata == "MOW", text
+        assert cl.get_iata("Стамбуле") == "IST"
+
+    def test_cases_not_in_fuzzy_or_autocomplete(self, gaz):
+        assert "москвы" not in cl.CITY_TO_IATA
+        assert [c["name"] for c in cl.search_cities("москв")] == ["Москва"]
+
+    def test_segment_route_in_one_pass(self, gaz):
+        assert cl.segment_places("из Москвы в Стамбул".split()) == ["Москвы", "Стамбул"]
+        assert cl.segment_places(["Нижний", "Новгород", "Москва"]) == ["Нижний Новгород", "Москва"]
+        assert cl.segment_places(["Москва", "везде"], keywords=("везде",)) == ["Москва", "везде"]
+        assert cl.segment_places(["Москва", "абракадабра"]) is None
+
+    def test_case_forms_survive_rebuild_and_snapshot(self, gaz, tmp_path):
+        cl.CITY_TO_IATA["тестоград"] = "TST"
+        with patch.object(cl, "CITIES_GENERATION", cl.CITIES_GENERATION + 1):
+            assert cl.resolve_place("москвы").iata == "MOW"
+        with patch.object(cl, "SNAPSHOT_FILE", tmp_path / "cities_snapshot.bin"), \
+             patch.object(cl, "CACHE_FILE", tmp_path / "cities_cache.json"):
+            cl.CACHE_FILE.write_text("[]", encoding="utf-8")
+            cl._save_snapshot(gaz)
+            assert cl._load_snapshot()["case_forms"]["стамбуле"] == "IST"
+
+
+class TestCountryForms:
+
+    @pytest.mark.parametrize("text,iso", [
+        ("Турции", "TR"), ("в Турцию", "TR"), ("Турцией", "TR"), ("Китае", "CN"),
+        ("на Кипре", "CY"), ("в Корею", "KR"), ("Мальдивах", "MV"),
+        ("шри-ланка", "LK"), ("оаэ", "AE"), ("Беларуси", "BY"),
+        ("Израиля", "IL"), ("в Израилю", "IL"), ("Израилем", "IL"), ("в Израиле", "IL"),
+        ("Египта", "EG"), ("в России", "RU"),
+    ])
+    def test_country_inflections(self, text, iso):
+        assert cl.resolve_country(text) == iso
+
+    @pytest.mark.parametrize("form", ["сши", "сше", "сшу", "сшой", "израили", "израилью",
+                                      "турцие", "россие", "египета"])
+    def test_no_wrong_forms(self, form):
+        assert form not in cl.COUNTRY_INDEX
+
+    def test_explicit_alias_wins(self):
+        assert cl.resolve_country("дубай") == "AE"
+        assert cl.resolve_country("Атлантида") is None
+
+    def test_get_country_cities_accepts_cases(self):
+        assert cl.get_country_cities("в Турции") == cl.get_country_cities("Турция") != []
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 8 — пространственный индекс: аэропорты рядом
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestNearbyAirports:
+
+    @pytest.fixture
+    def geo(self):
+        rnd = random.Random(5)
+        data = {f"C{i:02d}": cl.CityRecord(f"C{i:02d}", f"Город {i}", "RU", None,
+                                             rnd.uniform(-70, 70), rnd.uniform(-180, 180)) for i in range(300)}
+        data.update({
+            "MOW": cl.CityRecord("MOW", "Москва", "RU", None, 55.75, 37.62),
+            "SVO": cl.CityRecord("SVO", "Шереметьево", "RU", None, 55.97, 37.41),
+            "YKS": cl.CityRecord("YKS", "Ярославль", "RU", None, 57.63, 39.87),   # ~250 км
+            "TVR": cl.CityRecord("TVR", "Тверь", "RU", None, 56.86, 35.90),       # ~150 км
+            "ANW": cl.CityRecord("ANW", "Запад", "FJ", None, -17.0, 179.9),       # через 180-й меридиан
+            "ANE": cl.CityRecord("ANE", "Восток", "FJ", None, -17.0, -179.9),
+            "NOC": cl.CityRecord("NOC", "Без координат", "RU", None, None, None),
+        })
+        with patch.dict(cl.CITIES_DATA, data, clear=True):
+            cl._build_geo_index()
+            cl._build_gazetteer()  # метро и аэропорты — из PLACES
+            yield data
+        cl._build_geo_index()
+
+    def test_matches_brute_force(self, geo):
+        for iata in list(geo)[:100]:
+            rec = geo[iata]
+            if rec.lat is None:
+                continue
+            brute = sorted(
+                (round(cl._distance_km(rec.lat, rec.lon, o.lat, o.lon)), code)
+                for code, o in geo.items()
+                if o.lat is not None and code != iata and cl._distance_km(rec.lat, rec.lon, o.lat, o.lon) <= 1500
+            )
+            got = cl.nearby_airports(iata, radius_km=1500, limit=50)
+            assert [code for code, _ in got] == [code for _, code in brute][:50], iata
+
+    def test_metro_airports_skipped(self, geo):
+        codes = [code for code, _ in cl.nearby_airports("MOW", radius_km=300, limit=5)]
+        assert codes == ["TVR", "YKS"]
+        assert [code for code, _ in cl.nearby_airports("SVO", radius_km=300, limit=5)] == ["TVR", "YKS"]
+
+    def test_antimeridian(self, geo):
+        assert cl.nearby_airports("ANW", radius_km=100) == [("ANE", 21)]
+
+    def test_unknown_or_without_coordinates(self, geo):
+        assert cl.nearby_airports("NOC") == []
+        assert cl.nearby_airports("XXX") == []
+
+    def test_rebuilt_when_data_changes(self, geo):
+        cl.CITIES_DATA["KLF"] = cl.CityRecord("KLF", "Калуга", "RU", None, 54.51, 36.26)
+        assert "KLF" in [code for code, _ in cl.nearby_airports("MOW", radius_km=200, limit=5)]
@@ -0,0 +1,137 @@
+"""
+test_country_prices.py
+======================
+Тесты поиска «в любой город страны» по кешу календарей
+(services/country_prices.py).
+
+Запуск из корня проекта:
+    pytest test/test_country_prices.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import country_prices as cp
+from utils.redis_client import RedisClient
+
+
+def _calendar(*days_prices) -> list:
+    return [{"price": p, "value": p, "departure_at": f"{d}T10:00:00+03:00", "transfers": 0}
+            for d, p in days_prices]
+
+
+class _FakeRedis:
+    """Кеш страны в памяти — как HASH country:*, без TTL."""
+
+    def __init__(self):
+        self.client = None  # hub_selector без Redis — статичный порядок
+        self.store = {}
+
+    async def get_country_month(self, origin, iso, month, direct):
+        return dict(self.store.get((origin, iso, month, direct), {}))
+
+    async def set_country_routes(self, origin, iso, month, direct, calendars):
+        self.store.setdefault((origin, iso, month, direct), {}).update(calendars)
+
+
+@pytest.fixture
+def fake_redis():
+    redis = _FakeRedis()
+    with patch.object(cp, "redis_client", redis), \
+         patch.object(cp.hub_selector, "redis_client", MagicMock(client=None, record_hub_observation=AsyncMock())):
+        yield redis
+
+
+CALENDARS = {
+    "IST": _calendar(("2026-03-15", 9000), ("2026-03-16", 7000)),
+    "AYT": _calendar(("2026-03-15", 8000)),
+    "ADB": [],
+}
+
+
+async def _grouped(origin, dest, month, ret, direct=False):
+    return CALENDARS[dest]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — cheapest_in_country: календари месяца, кеш, докачка
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestCheapestInCountry:
+
+    @pytest.mark.asyncio
+    async def test_day_from_month_calendars(self, fake_redis):
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_grouped)) as grouped:
+            res = await cp.cheapest_in_country("MOW", "TR", ["IST", "AYT", "ADB"], "2026-03-15")
+        assert [(f["destination"], f["price"]) for f in res] == [("AYT", 8000), ("IST", 9000)]
+        assert all(c.args[2] == "2026-03" for c in grouped.await_args_list)
+
+    @pytest.mark.asyncio
+    async def test_second_search_same_month_served_from_cache(self, fake_redis):
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_grouped)):
+            await cp.cheapest_in_country("MOW", "TR", ["IST", "AYT", "ADB"], "2026-03-15")
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=AssertionError("API не нужно"))):
+            res = await cp.cheapest_in_country("MOW", "TR", ["IST", "AYT", "ADB"], "2026-03-16")
+        assert [(f["destination"], f["price"]) for f in res] == [("IST", 7000)]
+
+    @pytest.mark.asyncio
+    async def test_only_missing_cities_fetched(self, fake_redis):
+        fake_redis.store[("MOW", "TR", "2026-03", False)] = {"IST": CALENDARS["IST"]}
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_grouped)) as grouped:
+            res = await cp.cheapest_in_country("MOW", "TR", ["IST", "AYT"], "2026-03-15")
+        assert [c.args[1] for c in grouped.await_args_list] == ["AYT"]
+        assert res[0]["destination"] == "AYT"
+
+    @pytest.mark.asyncio
+    async def test_direct_flag_is_separate_cache(self, fake_redis):
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_grouped)) as grouped:
+            await cp.cheapest_in_country("MOW", "TR", ["IST"], "2026-03-15")
+            await cp.cheapest_in_country("MOW", "TR", ["IST"], "2026-03-15", direct=True)
+        assert grouped.await_count == 2
+        assert grouped.await_args.kwargs["direct"] is True
+
+    @pytest.mark.asyncio
+    async def test_failed_city_not_cached_or_recorded(self, fake_redis):
+        async def _flaky(origin, dest, month, ret, direct=False):
+            return None if dest == "AYT" else CALENDARS[dest]
+
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_flaky)), \
+             patch.object(cp.hub_selector, "record_outcome", AsyncMock()) as record:
+            await cp.cheapest_in_country("MOW", "TR", ["IST", "AYT", "ADB"], "2026-03-15")
+        assert set(fake_redis.store[("MOW", "TR", "2026-03", False)]) == {"IST", "ADB"}
+        assert record.await_args.args[2] == "2026-03-15"  # день, как в everywhere_engine
+        assert set(record.await_args.args[3]) == {"IST", "ADB"}
+
+    @pytest.mark.asyncio
+    async def test_direct_search_does_not_mark_routes(self, fake_redis):
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_grouped)), \
+             patch.object(cp.hub_selector, "record_outcome", AsyncMock()) as record:
+            await cp.cheapest_in_country("MOW", "TR", ["IST", "ADB"], "2026-03-15", direct=True)
+        record.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_unknown_country_skips_cache(self, fake_redis):
+        with patch.object(cp, "grouped_prices", AsyncMock(side_effect=_grouped)):
+            res = await cp.cheapest_in_country("MOW", None, ["IST"], "2026-03-15")
+        assert res and fake_redis.store == {}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — HASH country:* в Redis
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestCountryHash:
+
+    @pytest.mark.asyncio
+    async def test_stale_cities_dropped(self):
+        client = RedisClient()
+        fresh = json.dumps({"ts": time.time(), "flights": [{"price": 1}]})
+        stale = json.dumps({"ts": time.time() - client.COUNTRY_TTL - 1, "flights": []})
+        client.client = MagicMock(hgetall=AsyncMock(return_value={"IST": fresh, "AYT": stale}))
+        assert await client.get_country_month("MOW", "TR", "2026-03", False) == {"IST": [{"price": 1}]}
+        assert client.client.hgetall.await_args.args[0].endswith("country:MOW:TR:2026-03:a")
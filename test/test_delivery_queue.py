@@ -0,0 +1,135 @@
+"""
+test_delivery_queue.py
+======================
+Тесты отложенной доставки уведомлений (services/delivery_queue.py)
+и её использования в HotDealsSender.
+
+Запуск из корня проекта:
+    pytest test/test_delivery_queue.py -v
+
+Файл НЕ требует реального Redis и Telegram — всё мокируется.
+"""
+
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from services import delivery_queue as dq
+from services import hot_deals_sender as hds
+
+
+@pytest.fixture(autouse=True)
+def _clean_local():
+    dq._local.clear()
+    yield
+    dq._local.clear()
+
+
+def _kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="❌", callback_data="hd_del_s1")]])
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — очередь: постановка и забор по сроку
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestQueue:
+
+    @pytest.mark.asyncio
+    async def test_local_fallback_respects_deliver_at(self):
+        now = time.time()
+        with patch.object(dq.redis_client, "client", None):
+            await dq.schedule("hot:s1", {"text": "a"}, now + 60)
+            await dq.schedule("hot:s2", {"text": "b"}, now - 1)
+            due = await dq.claim_due(now)
+            assert [j["job_id"] for j in due] == ["hot:s2"]
+            assert await dq.pending() == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_reschedule_keeps_original_deadline(self):
+        now = time.time()
+        with patch.object(dq.redis_client, "client", None):
+            await dq.schedule("hot:s1", {"text": "old"}, now - 1)
+            await dq.schedule("hot:s1", {"text": "new"}, now + 3600)
+            due = await dq.claim_due(now)
+        assert [j["text"] for j in due] == ["new"]
+
+    @pytest.mark.asyncio
+    async def test_redis_schedule_uses_zadd_nx(self):
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[1, 1])
+        client = MagicMock(pipeline=MagicMock(return_value=pipe))
+        with patch.object(dq.redis_client, "client", client):
+            await dq.schedule("digest:s1", {"text": "x"}, 1000.0)
+        key, job_id, payload = pipe.hset.call_args.args
+        assert job_id == "digest:s1" and json.loads(payload)["job_id"] == "digest:s1"
+        assert pipe.zadd.call_args.args[1] == {"digest:s1": 1000.0}
+        assert pipe.zadd.call_args.kwargs == {"nx": True}
+
+    @pytest.mark.asyncio
+    async def test_retry_gives_up_after_max_attempts(self):
+        with patch.object(dq.redis_client, "client", None):
+            await dq.retry({"job_id": "hot:s1", "attempts": dq.MAX_ATTEMPTS - 1})
+            assert dq._local == {}
+            await dq.retry({"job_id": "hot:s2"})
+            assert dq._local["hot:s2"][1]["attempts"] == 1
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — HotDealsSender: бесплатным откладываем, платным сразу
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestSenderDelivery:
+
+    def _sender(self):
+        sender = hds.HotDealsSender(bot=MagicMock())
+        sender.bot.send_message = AsyncMock()
+        return sender
+
+    def _redis(self, sub=None):
+        fake = MagicMock()
+        fake.get_hot_sub        = AsyncMock(return_value=sub)
+        fake.update_hot_sub     = AsyncMock()
+        fake.set_route_cooldown = AsyncMock()
+        fake.delete_hot_sub     = AsyncMock()
+        fake.prefix = "t:"
+        fake.client = MagicMock(delete=AsyncMock())
+        return fake
+
+    @pytest.mark.asyncio
+    async def test_free_user_deferred_without_sleep(self):
+        sender = self._sender()
+        with patch.object(hds, "get_plans", AsyncMock(return_value={1: {"plan": "free"}})), \
+             patch.object(dq.redis_client, "client", None):
+            await sender._deliver("hot", 1, "s1", "🔥", _kb(), cooldown_dests=["AER"], touch_sub=True)
+        sender.bot.send_message.assert_not_called()
+        deliver_at, job = dq._local["hot:s1"]
+        assert deliver_at >= time.time() + hds.PRIORITY_DELAY - 5
+        assert job["cooldown_dests"] == ["AER"]
+
+    @pytest.mark.asyncio
+    async def test_paid_user_sent_now_with_effects(self):
+        sender = self._sender()
+        fake_redis = self._redis(sub={"sub_type": "hot"})
+        with patch.object(hds, "get_plans", AsyncMock(return_value={1: {"plan": "plus"}})), \
+             patch.object(hds, "redis_client", fake_redis):
+            await sender._deliver("hot", 1, "s1", "🔥", _kb(), cooldown_dests=["AER"],
+                                  touch_sub=True, reset_nudge=True)
+        sender.bot.send_message.assert_awaited_once()
+        assert sender.bot.send_message.call_args.kwargs["reply_markup"] == _kb()
+        fake_redis.set_route_cooldown.assert_awaited_once_with("s1", "AER", hds.ROUTE_COOLDOWN)
+        assert fake_redis.update_hot_sub.call_args.args[2]["last_notified"] > 0
+        fake_redis.client.delete.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_deleted_sub_not_delivered(self):
+        """Пользователь отписался, пока уведомление ждало в очереди."""
+        sender = self._sender()
+        job = {"kind": "hot", "user_id": 1, "sub_id": "s1", "text": "🔥",
+               "markup": _kb().model_dump(mode="json", exclude_none=True)}
+        with patch.object(hds, "redis_client", self._redis(sub=None)):
+            assert await sender._send_job(job) is True
+        sender.bot.send_message.assert_not_called()
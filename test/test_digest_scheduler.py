@@ -0,0 +1,135 @@
+"""
+test_digest_scheduler.py
+========================
+Тесты расписания дайджестов по местному времени (services/digest_scheduler.py).
+
+Запуск из корня проекта:
+    pytest test/test_digest_scheduler.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from services import digest_scheduler as ds
+from services import hot_deals_sender as hds
+
+
+def _digest(origin="MOW", **extra) -> dict:
+    sub = {"sub_type": "digest", "origin_iata": origin, "category": "custom",
+           "dest_iata_list": ["AER"], "frequency": "daily"}
+    sub.update(extra)
+    return sub
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — слоты
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestSlots:
+
+    def test_timezone_from_origin_city(self):
+        with patch.object(ds, "get_city_timezone", return_value="Asia/Novosibirsk"):
+            assert ds.sub_timezone(_digest("OVB")) == ZoneInfo("Asia/Novosibirsk")
+        with patch.object(ds, "get_city_timezone", return_value=None):
+            assert ds.sub_timezone(_digest("XXX")) == ds.DEFAULT_TZ
+
+    def test_slot_inside_local_window(self):
+        tz = ZoneInfo("Asia/Vladivostok")
+        for i in range(200):
+            slot = ds.slot_for(f"s{i}", tz, date(2026, 3, 16))
+            assert ds.DIGEST_WINDOW_START <= slot.hour < ds.DIGEST_WINDOW_START + ds.DIGEST_WINDOW_HOURS
+            assert slot.utcoffset() == timedelta(hours=10)
+
+    def test_slots_spread_across_window(self):
+        """1000 подписок не сваливаются в одну минуту."""
+        tz = ds.DEFAULT_TZ
+        minutes = {ds.slot_for(f"sub{i}", tz, date(2026, 3, 16)).strftime("%H:%M") for i in range(1000)}
+        assert len(minutes) > ds.DIGEST_WINDOW_HOURS * 60 * 0.8
+
+    def test_due_slots_respects_lead_and_weekly(self):
+        tz = ds.DEFAULT_TZ
+        monday = date(2026, 3, 16)
+        subs = [(1, "d1", _digest()), (2, "w1", _digest(frequency="weekly"))]
+        with patch.object(ds, "get_city_timezone", return_value=None):
+            slot = ds.slot_for("d1", tz, monday)
+            due = ds.due_slots(subs, slot - timedelta(minutes=5))
+            assert "d1" in [d.sub_id for d in due]
+            assert not ds.due_slots(subs[:1], slot - timedelta(seconds=ds.PREFETCH_LEAD + 60))
+            # Вторник: еженедельная не попадает ни при каком now
+            tue_slot = ds.slot_for("w1", tz, monday + timedelta(days=1))
+            assert "w1" not in [d.sub_id for d in ds.due_slots(subs, tue_slot)]
+
+    @pytest.mark.asyncio
+    async def test_claim_once_per_day(self):
+        with patch.object(ds.redis_client, "client", None):
+            ds._done_local.clear()
+            assert await ds.claim("s1", "2026-03-16") is True
+            assert await ds.claim("s1", "2026-03-16") is False
+            assert await ds.claim("s1", "2026-03-17") is True
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — тик планировщика: отправка ставится на время слота
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestDigestTick:
+
+    @pytest.mark.asyncio
+    async def test_tick_schedules_send_at_slot(self):
+        now = datetime(2026, 3, 16, 6, 0, tzinfo=timezone.utc)  # 9:00 МСК
+        slot_ts = now.timestamp() + 600
+        due = [ds.DueDigest(1, "d1", _digest(), slot_ts, "2026-03-16")]
+
+        sender = hds.HotDealsSender(bot=MagicMock())
+        sender._send_digest = AsyncMock()
+        sender._prefetch_routes = AsyncMock(return_value=sender._digest_store)
+        fake_redis = MagicMock(get_all_hot_subs=AsyncMock(return_value=[(1, "d1", _digest())]))
+        with patch.object(hds, "redis_client", fake_redis), \
+             patch.object(hds.digest_scheduler, "due_slots", return_value=due), \
+             patch.object(hds.digest_scheduler, "claim", AsyncMock(side_effect=[True])), \
+             patch.object(hds, "get_plans", AsyncMock(return_value={})):
+            await sender._process_digest_tick()
+
+        sender._send_digest.assert_awaited_once()
+        assert sender._send_digest.call_args.kwargs["deliver_at"] == slot_ts
+
+    @pytest.mark.asyncio
+    async def test_claimed_elsewhere_skipped(self):
+        due = [ds.DueDigest(1, "d1", _digest(), 0.0, "2026-03-16")]
+        sender = hds.HotDealsSender(bot=MagicMock())
+        sender._send_digest = AsyncMock()
+        sender._prefetch_routes = AsyncMock()
+        fake_redis = MagicMock(get_all_hot_subs=AsyncMock(return_value=[]))
+        with patch.object(hds, "redis_client", fake_redis), \
+             patch.object(hds.digest_scheduler, "due_slots", return_value=due), \
+             patch.object(hds.digest_scheduler, "claim", AsyncMock(return_value=False)):
+            await sender._process_digest_tick()
+        sender._prefetch_routes.assert_not_called()
+        sender._send_digest.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_failed_send_releases_slot(self):
+        """Сборка/постановка упала после claim — слот свободен, следующий тик дошлёт."""
+        due = [ds.DueDigest(1, "d1", _digest(), 0.0, "2026-03-16")]
+        sender = hds.HotDealsSender(bot=MagicMock())
+        sender._send_digest = AsyncMock(side_effect=RuntimeError("delivery_queue down"))
+        sender._prefetch_routes = AsyncMock(return_value=sender._digest_store)
+        fake_redis = MagicMock(get_all_hot_subs=AsyncMock(return_value=[]))
+        with patch.object(ds.redis_client, "client", None), \
+             patch.object(hds, "redis_client", fake_redis), \
+             patch.object(hds.digest_scheduler, "due_slots", return_value=due), \
+             patch.object(hds, "get_plans", AsyncMock(return_value={})):
+            ds._done_local.clear()
+            await sender._process_digest_tick()
+            assert await ds.claim("d1", "2026-03-16") is True
+
+            ds._done_local.clear()
+            sender._prefetch_routes = AsyncMock(side_effect=RuntimeError("redis down"))
+            with pytest.raises(RuntimeError):
+                await sender._process_digest_tick()
+            assert await ds.claim("d1", "2026-03-16") is True
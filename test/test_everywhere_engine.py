@@ -0,0 +1,199 @@
+"""
+test_everywhere_engine.py
+=========================
+Тесты поиска «Везде» (services/everywhere_engine.py): один запрос
+«куда угодно» к Data API, запасной перебор хабов, карта цен в Redis.
+
+Запуск из корня проекта:
+    pytest test/test_everywhere_engine.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import everywhere_engine as ee
+from services import flight_search as fs
+from utils.redis_client import RedisClient
+
+
+def _flight(origin: str, dest: str, price: int, day: str = "2026-03-15", transfers: int = 0) -> dict:
+    return {"origin": origin, "destination": dest, "price": price, "value": price,
+            "departure_at": f"{day}T10:00:00+03:00", "transfers": transfers}
+
+
+@pytest.fixture
+def fake_redis():
+    redis = MagicMock(get_anywhere_day=AsyncMock(return_value=None), set_anywhere_day=AsyncMock())
+    with patch.object(ee, "redis_client", redis):
+        yield redis
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — cheapest_everywhere: карта → запрос «куда угодно» → хабы
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestCheapestEverywhere:
+
+    @pytest.mark.asyncio
+    async def test_one_call_cheapest_per_city(self, fake_redis):
+        api = [_flight("MOW", "AER", 5000), _flight("MOW", "AER", 4000), _flight("MOW", "IST", 9000),
+               _flight("MOW", "LED", 3000, day="2026-03-16"), _flight("MOW", "MOW", 100)]
+        with patch.object(ee, "search_cheapest_anywhere", AsyncMock(return_value=api)) as anywhere, \
+             patch.object(ee, "grouped_prices", AsyncMock(side_effect=AssertionError("хабы не нужны"))):
+            res = await ee.cheapest_everywhere("2026-03-15", origin="MOW")
+        anywhere.assert_awaited_once_with("2026-03-15", origin="MOW", destination=None)
+        assert [(f["destination"], f["price"]) for f in res] == [("AER", 4000), ("IST", 9000)]
+        fake_redis.set_anywhere_day.assert_awaited_once_with(ee.SIDE_FROM, "MOW", "2026-03-15", res)
+
+    @pytest.mark.asyncio
+    async def test_cached_day_skips_api(self, fake_redis):
+        fake_redis.get_anywhere_day.return_value = [_flight("MOW", "AER", 4000)]
+        with patch.object(ee, "search_cheapest_anywhere", AsyncMock(side_effect=AssertionError("API не нужно"))):
+            res = await ee.cheapest_everywhere("2026-03-15", destination="AER")
+        fake_redis.get_anywhere_day.assert_awaited_once_with(ee.SIDE_TO, "AER", "2026-03-15")
+        assert res[0]["price"] == 4000
+
+    @pytest.mark.asyncio
+    async def test_hub_fanout_when_api_unavailable(self, fake_redis):
+        async def _grouped(origin, dest, day, ret):
+            return [_flight("X", "X", 1000 + len(origin + dest))] if origin == "KZN" else []
+
+        with patch.object(ee, "search_cheapest_anywhere", AsyncMock(return_value=None)), \
+             patch.object(ee, "grouped_prices", AsyncMock(side_effect=_grouped)) as grouped:
+            res = await ee.cheapest_everywhere("2026-03-15", destination="AER")
+        assert grouped.await_count == ee.HUB_BUDGET
+        assert [(f["origin"], f["destination"]) for f in res] == [("KZN", "AER")]
+
+    @pytest.mark.asyncio
+    async def test_fanout_bounded_by_semaphore(self, fake_redis):
+        running = peak = 0
+
+        async def _grouped(*args):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0)
+            running -= 1
+            return []
+
+        with patch.object(ee, "search_cheapest_anywhere", AsyncMock(return_value=None)), \
+             patch.object(ee, "grouped_prices", AsyncMock(side_effect=_grouped)):
+            await ee.cheapest_everywhere("2026-03-15", origin="MOW")
+        assert peak <= ee.FANOUT_SEMAPHORE._value
+
+    @pytest.mark.asyncio
+    async def test_failed_hubs_not_recorded(self, fake_redis):
+        async def _grouped(origin, dest, day, ret):
+            if origin == "KZN":
+                return [_flight("KZN", "AER", 3000)]
+            return None if origin in ("LED", "OVB") else []  # 429 / ошибка — не «пусто»
+
+        with patch.object(ee, "search_cheapest_anywhere", AsyncMock(return_value=None)), \
+             patch.object(ee, "grouped_prices", AsyncMock(side_effect=_grouped)), \
+             patch.object(ee.hub_selector, "record_outcome", AsyncMock()) as record:
+            res = await ee.cheapest_everywhere("2026-03-15", destination="AER")
+        observed = record.await_args.args[3]
+        assert "LED" not in observed and "OVB" not in observed
+        assert observed["KZN"] and observed["MOW"] == []
+        assert [f["origin"] for f in res] == ["KZN"]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — search_cheapest_anywhere: ответ prices_for_dates
+# ═════════════════════════════════════════════════════════════════════════════
+
+class _FakeResponse:
+    def __init__(self, status: int, data):
+        self.status, self._data = status, data
+
+    async def json(self):
+        return self._data
+
+    async def text(self):
+        return json.dumps(self._data)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    def __init__(self, response: _FakeResponse):
+        self._response = response
+        self.params = None
+
+    def get(self, url, params=None, timeout=None):
+        self.params = params
+        return self._response
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class TestSearchCheapestAnywhere:
+
+    @pytest.mark.asyncio
+    async def test_parses_rows(self):
+        session = _FakeSession(_FakeResponse(200, {"success": True, "data": [
+            {"origin": "MOW", "destination": "AER", "price": 4200, "departure_at": "2026-03-15T10:00:00+03:00"},
+        ]}))
+        with patch.object(fs, "AVIASALES_TOKEN", "t"), patch.object(fs, "_http_session", lambda: session):
+            res = await fs.search_cheapest_anywhere("2026-03-15", origin="MOW")
+        assert res[0]["value"] == 4200 and res[0]["_source"] == "cached"
+        assert "destination" not in session.params and session.params["unique"] == "true"
+
+    @pytest.mark.asyncio
+    async def test_unavailable_returns_none(self):
+        with patch.object(fs, "AVIASALES_TOKEN", "t"), \
+             patch.object(fs, "_http_session", lambda: _FakeSession(_FakeResponse(429, {}))):
+            assert await fs.search_cheapest_anywhere("2026-03-15", origin="MOW") is None
+        with patch.object(fs, "AVIASALES_TOKEN", ""):
+            assert await fs.search_cheapest_anywhere("2026-03-15", origin="MOW") is None
+
+    @pytest.mark.asyncio
+    async def test_grouped_prices_tells_error_from_empty(self):
+        with patch.object(fs, "AVIASALES_TOKEN", "t"), \
+             patch.object(fs, "_http_session", lambda: _FakeSession(_FakeResponse(502, {}))):
+            assert await fs.grouped_prices("MOW", "AER", "2026-03") is None
+            assert await fs.search_flights("MOW", "AER", "2026-03") == []
+        with patch.object(fs, "AVIASALES_TOKEN", "t"), \
+             patch.object(fs, "_http_session", lambda: _FakeSession(_FakeResponse(200, {"success": True, "data": {}}))):
+            assert await fs.grouped_prices("MOW", "AER", "2026-03") == []
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — карта цен в Redis: день в HASH месяца, свежесть по ts
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestAnywhereMap:
+
+    @pytest.mark.asyncio
+    async def test_day_written_to_month_hash(self):
+        client = RedisClient()
+        pipe = MagicMock(execute=AsyncMock())
+        client.client = MagicMock(pipeline=MagicMock(return_value=pipe))
+        await client.set_anywhere_day("from", "MOW", "2026-03-15", [{"price": 1}])
+        key, day, raw = pipe.hset.call_args.args
+        assert key.endswith("anywhere:from:MOW:2026-03") and day == "2026-03-15"
+        assert json.loads(raw)["flights"] == [{"price": 1}]
+
+    @pytest.mark.asyncio
+    async def test_stale_day_ignored(self):
+        client = RedisClient()
+        fresh = json.dumps({"ts": time.time(), "flights": [{"price": 1}]})
+        stale = json.dumps({"ts": time.time() - client.ANYWHERE_TTL - 1, "flights": [{"price": 1}]})
+        client.client = MagicMock(hget=AsyncMock(side_effect=[fresh, stale, None]))
+        assert await client.get_anywhere_day("from", "MOW", "2026-03-15") == [{"price": 1}]
+        assert await client.get_anywhere_day("from", "MOW", "2026-03-15") is None
+        assert await client.get_anywhere_day("from", "MOW", "2026-03-15") is None
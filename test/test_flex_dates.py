@@ -0,0 +1,185 @@
+"""
+test_flex_dates.py
+==================
+Тесты гибких дат (services/flex_dates.py): окно ±N дней, матрица
+«туда × обратно» из месячных календарей grouped_prices, метка «±3»
+в быстром поиске, результат поиска под матрицей цен.
+
+Запуск из корня проекта:
+    pytest test/test_flex_dates.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import flex_dates as fd
+
+
+def _f(day: str, price: int) -> dict:
+    return {"value": price, "price": price, "departure_at": f"{day}T10:00:00+03:00"}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — чистые функции: окно, цены по дням, матрица
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestPureHelpers:
+
+    def test_window_skips_past_days(self):
+        assert fd.window("2026-03-02", 2, today=date(2026, 3, 1)) == ["2026-03-01", "2026-03-02", "2026-03-03", "2026-03-04"]
+
+    def test_window_crosses_month(self):
+        assert fd.window("2026-03-31", 1, today=date(2026, 1, 1)) == ["2026-03-30", "2026-03-31", "2026-04-01"]
+
+    def test_day_prices_cheapest_per_day_in_window(self):
+        flights = [_f("2026-03-10", 9000), _f("2026-03-10", 7000), _f("2026-03-11", 8000), _f("2026-03-20", 100)]
+        res = fd.day_prices(flights, ["2026-03-10", "2026-03-11"])
+        assert {d: f["value"] for d, f in res.items()} == {"2026-03-10": 7000, "2026-03-11": 8000}
+
+    def test_best_cell_one_way(self):
+        out = {"2026-03-10": _f("2026-03-10", 7000), "2026-03-11": _f("2026-03-11", 7000)}
+        assert fd.best_cell(out, None) == ("2026-03-10", None, 7000)
+        assert fd.best_cell({}, None) is None
+
+    def test_matrix_only_return_after_depart(self):
+        out  = {"2026-03-10": _f("2026-03-10", 5000), "2026-03-12": _f("2026-03-12", 2000)}
+        back = {"2026-03-11": _f("2026-03-11", 4000), "2026-03-15": _f("2026-03-15", 6000)}
+        cells = fd.matrix(out, back)
+        assert ("2026-03-12", "2026-03-11") not in cells
+        assert fd.best_cell(out, back) == ("2026-03-12", "2026-03-15", 8000)
+
+    def test_format_matrix_marks_best(self):
+        out  = {"2026-03-10": _f("2026-03-10", 5000)}
+        back = {"2026-03-15": _f("2026-03-15", 6500)}
+        res = fd.FlexResult(["2026-03-10"], ["2026-03-14", "2026-03-15"], out, back, ("2026-03-10", "2026-03-15", 11500))
+        text = fd.format_flex(res)
+        assert "11.5к*" in text and "—" in text and text.count("<pre>") == 1
+
+    def test_format_one_way_thin_space(self):
+        res = fd.FlexResult(["2026-03-10"], [], {"2026-03-10": _f("2026-03-10", 12500)}, {},
+                            ("2026-03-10", None, 12500))
+        text = fd.format_flex(res)
+        assert "12\u202f500 ₽" in text and "12 500" not in text
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — flex_search: один календарь на плечо и месяц, кеш
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestFlexSearch:
+
+    @pytest.fixture
+    def fake_redis(self):
+        redis = MagicMock(get_route_calendar=AsyncMock(return_value=None), set_route_calendar=AsyncMock())
+        with patch.object(fd, "redis_client", redis):
+            yield redis
+
+    @pytest.mark.asyncio
+    async def test_round_trip_one_fetch_per_leg(self, fake_redis):
+        calendars = {
+            ("MOW", "AER"): [_f("2027-03-09", 6000), _f("2027-03-11", 4000)],
+            ("AER", "MOW"): [_f("2027-03-17", 5000), _f("2027-03-20", 3000)],
+        }
+
+        async def grouped(origin, dest, month, ret, direct=False):
+            return calendars[origin, dest]
+
+        with patch.object(fd, "search_flights", AsyncMock(side_effect=grouped)) as api:
+            res = await fd.flex_search("MOW", "AER", "2027-03-10", "2027-03-17")
+        assert api.await_count == 2
+        assert {c.args[2] for c in api.await_args_list} == {"2027-03"}
+        assert res.best == ("2027-03-11", "2027-03-20", 7000)
+        assert fake_redis.set_route_calendar.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cached_calendar_skips_api(self, fake_redis):
+        fake_redis.get_route_calendar.return_value = [_f("2027-03-10", 4000)]
+        with patch.object(fd, "search_flights", AsyncMock(side_effect=AssertionError("API не нужно"))):
+            res = await fd.flex_search("MOW", "AER", "2027-03-10")
+        assert res.best == ("2027-03-10", None, 4000)
+        assert res.returns == []
+
+    @pytest.mark.asyncio
+    async def test_fetch_under_fanout_semaphore(self, fake_redis):
+        import asyncio
+
+        sem = asyncio.Semaphore(1)
+
+        async def grouped(origin, dest, month, ret, direct=False):
+            assert sem.locked(), "календарь качается мимо FANOUT_SEMAPHORE"
+            return [_f("2027-03-10", 4000)]
+
+        with patch.object(fd, "FANOUT_SEMAPHORE", sem), \
+             patch.object(fd, "search_flights", AsyncMock(side_effect=grouped)):
+            res = await fd.flex_search("MOW", "AER", "2027-03-10")
+        assert res.best == ("2027-03-10", None, 4000) and not sem.locked()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — быстрый поиск: метка «±N» / «гибко»
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestQuickSearchFlex:
+
+    def test_extract_flex(self):
+        from handlers.quick_search import _extract_flex, _parse_quick_search
+
+        *_, tail = _parse_quick_search("Москва Сочи 10.03 2 взр ±2")
+        assert _extract_flex(tail) == (2, "2 взр")
+        assert _extract_flex("прямые гибко") == (fd.FLEX_DAYS, "прямые")
+        assert _extract_flex("2 взр") == (0, "2 взр")
+
+    def test_extract_two_digit_flex_clamped(self):
+        from handlers.quick_search import _extract_flex
+
+        assert _extract_flex("±10") == (fd.FLEX_MAX_DAYS, "")
+        assert _extract_flex("2 взр +-14") == (fd.FLEX_MAX_DAYS, "2 взр")
+        assert _extract_flex("+/-5 прямые") == (5, "прямые")
+        assert _extract_flex("±123") == (0, "±123")
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 4 — поиск с гибкими датами: матрица остаётся, результат — в новом сообщении
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestConfirmSearchFlex:
+
+    @pytest.mark.asyncio
+    async def test_result_rendered_under_matrix(self):
+        from handlers import search_results as sr
+
+        matrix_msg = MagicMock(edit_text=AsyncMock(), answer=AsyncMock())
+        matrix_msg.chat.id = 1
+        wait_msg = MagicMock(edit_text=AsyncMock())
+        wait_msg.edit_text.return_value = wait_msg
+        matrix_msg.answer.return_value = wait_msg
+        cb = MagicMock(message=matrix_msg, from_user=MagicMock(id=1), answer=AsyncMock())
+        state = MagicMock(clear=AsyncMock(), update_data=AsyncMock())
+        data = {
+            "origin": "москва", "origin_iata": "MOW", "origin_name": "Москва",
+            "dest": "сочи", "dest_iata": "AER", "dest_name": "Сочи",
+            "depart_date": "10.03", "return_date": None, "need_return": False,
+            "flight_type": "all", "passenger_desc": "1 взр.", "passenger_code": "1",
+            "flex_dates": True,
+        }
+        flex = fd.FlexResult(["2027-03-11"], [], {"2027-03-11": _f("2027-03-11", 4000)}, {},
+                             ("2027-03-11", None, 4000))
+        offer = dict(_f("2027-03-11", 4100), transfers=0, duration=150, airline="SU",
+                     flight_number="100", link="/search/x")
+        redis = MagicMock(set_search_cache=AsyncMock(), track_search_type=AsyncMock(),
+                          track_funnel_step=AsyncMock(), save_search_history=AsyncMock())
+        with patch.object(sr, "flex_search", AsyncMock(return_value=flex)), \
+             patch.object(sr, "search_flights_realtime", AsyncMock(return_value=[offer])), \
+             patch.object(sr, "convert_to_partner_link", AsyncMock(side_effect=lambda url, **kw: url)), \
+             patch.object(sr, "remind_after_search", AsyncMock()), \
+             patch.object(sr, "redis_client", redis):
+            await sr._do_confirm_search(cb, state, data)
+
+        assert matrix_msg.edit_text.await_count == 1  # матрица не затёрта результатом
+        text = wait_msg.edit_text.await_args.args[0]
+        assert "Лучший результат" in text and "4100" in text
+        assert wait_msg.edit_text.await_args.kwargs.get("reply_markup") is not None
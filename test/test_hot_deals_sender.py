@@ -0,0 +1,212 @@
+"""
+test_hot_deals_sender.py
+========================
+Тесты фонового HotDealsSender: дедупликация маршрутов между подписками,
+хранилище цикла (services/cycle_store.py) и оценка подписок в памяти.
+
+Запуск из корня проекта:
+    pytest test/test_hot_deals_sender.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import cycle_store, hot_deals_sender as hds
+
+
+def make_sub(origin="MOW", dests=("AER", "LED"), max_price=0, **extra) -> dict:
+    sub = {
+        "sub_type": "hot", "category": "custom",
+        "origin_iata": origin, "dest_iata_list": list(dests),
+        "max_price": max_price, "passengers": 1,
+        "travel_months": [], "created_at": time.time(),
+    }
+    sub.update(extra)
+    return sub
+
+
+def make_redis(baseline=None, on_cooldown=()) -> MagicMock:
+    fake = MagicMock()
+    fake.get_baseline_price    = AsyncMock(return_value=baseline)
+    fake.update_baseline_price = AsyncMock(side_effect=lambda o, d, p: p)
+    fake.get_routes_on_cooldown = AsyncMock(return_value=set(on_cooldown))
+    return fake
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — _prefetch_routes: один запрос на уникальный маршрут
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestPrefetchRoutes:
+
+    @pytest.mark.asyncio
+    async def test_same_routes_fetched_once(self):
+        prices = {"AER": 7000, "LED": 3000, "KZN": 4000}
+        check = AsyncMock(side_effect=lambda o, d, dep, ret: {"price": prices[d], "flight": {"value": prices[d]}})
+        subs = [make_sub() for _ in range(50)] + [make_sub(dests=("AER", "KZN"))]
+
+        sender = hds.HotDealsSender(bot=MagicMock())
+        with patch.object(cycle_store, "redis_client", make_redis()), \
+             patch.object(hds.route_queue, "check_route", check), \
+             patch.object(hds.route_queue, "enabled", return_value=False), \
+             patch.object(cycle_store, "ROUTE_PACING", 0):
+            store = await sender._prefetch_routes("HotDeals", subs)
+
+        assert check.await_count == 3  # AER, LED, KZN — а не 51×2
+        assert len(store) == 3
+        assert store.api_calls == 3
+        assert store.naive_calls == 102
+
+    @pytest.mark.asyncio
+    async def test_baseline_updated_once_per_route(self):
+        check = AsyncMock(return_value={"price": 5000, "flight": {}})
+        fake_redis = make_redis(baseline=6000.0)
+        sender = hds.HotDealsSender(bot=MagicMock())
+        with patch.object(cycle_store, "redis_client", fake_redis), \
+             patch.object(hds.route_queue, "check_route", check), \
+             patch.object(hds.route_queue, "enabled", return_value=False), \
+             patch.object(cycle_store, "ROUTE_PACING", 0):
+            store = await sender._prefetch_routes("HotDeals", [make_sub(dests=("AER",)) for _ in range(10)])
+
+        fake_redis.update_baseline_price.assert_awaited_once_with("MOW", "AER", 5000)
+        depart = hds._resolve_search_date(make_sub()).strftime("%Y-%m-%d")
+        assert store.get("MOW", "AER", depart)["baseline"] == 6000.0
+
+    @pytest.mark.asyncio
+    async def test_queue_results_not_refetched(self):
+        sub = make_sub()
+        depart = hds._resolve_search_date(sub).strftime("%Y-%m-%d")
+        queued = {hds.route_queue.route_key("MOW", "AER", depart, None): {"price": 7000, "flight": {}}}
+        check = AsyncMock(return_value=None)
+        sender = hds.HotDealsSender(bot=MagicMock())
+        with patch.object(cycle_store, "redis_client", make_redis()), \
+             patch.object(hds.route_queue, "check_route", check), \
+             patch.object(hds.route_queue, "enabled", return_value=True), \
+             patch.object(hds.route_queue, "check_routes", AsyncMock(return_value=queued)), \
+             patch.object(cycle_store, "ROUTE_PACING", 0):
+            store = await sender._prefetch_routes("HotDeals", [sub])
+
+        check.assert_awaited_once()  # только LED, которого нет в ответе очереди
+        assert (store.queued, store.api_calls) == (1, 1)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — _check_hot_sub: бюджет, порог и кулдаун в памяти
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestCheckHotSubInMemory:
+
+    def _sender_with_results(self, sub, results: dict) -> hds.HotDealsSender:
+        sender = hds.HotDealsSender(bot=MagicMock())
+        depart = hds._resolve_search_date(sub).strftime("%Y-%m-%d")
+        sender._hot_store._results = {
+            hds.route_queue.route_key("MOW", dest, depart, None): res for dest, res in results.items()
+        }
+        sender._send_hot_notification = AsyncMock()
+        sender._maybe_send_nudge = AsyncMock()
+        return sender
+
+    @pytest.mark.asyncio
+    async def test_no_api_calls_and_cheapest_chosen(self):
+        sub = make_sub(max_price=8000)
+        sender = self._sender_with_results(sub, {
+            "AER": {"price": 7000, "flight": {}, "baseline": None},
+            "LED": {"price": 3000, "flight": {}, "baseline": None},
+        })
+        check = AsyncMock()
+        with patch.object(hds, "redis_client", make_redis()), \
+             patch.object(hds.route_queue, "check_route", check):
+            await sender._check_hot_sub(1, "s1", sub)
+        check.assert_not_called()
+        args = sender._send_hot_notification.call_args.args
+        assert args[5:7] == ("MOW", "LED")
+
+    @pytest.mark.asyncio
+    async def test_cooldown_skips_to_next_candidate(self):
+        sub = make_sub(max_price=8000)
+        sender = self._sender_with_results(sub, {
+            "AER": {"price": 7000, "flight": {}, "baseline": None},
+            "LED": {"price": 3000, "flight": {}, "baseline": None},
+        })
+        with patch.object(hds, "redis_client", make_redis(on_cooldown={"LED"})):
+            await sender._check_hot_sub(1, "s1", sub)
+        assert sender._send_hot_notification.call_args.args[6] == "AER"
+
+    @pytest.mark.asyncio
+    async def test_small_drop_goes_to_nudge(self):
+        """Без бюджета снижение < DROP_THRESHOLD не уведомляет — уходим в напоминалку."""
+        sub = make_sub()
+        sender = self._sender_with_results(sub, {
+            "AER": {"price": 9900, "flight": {}, "baseline": 10000.0},
+            "LED": None,
+        })
+        with patch.object(hds, "redis_client", make_redis()):
+            await sender._check_hot_sub(1, "s1", sub)
+        sender._send_hot_notification.assert_not_called()
+        sender._maybe_send_nudge.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_route_missing_from_store_not_fetched(self):
+        """Второго пути запросов нет: маршрута нет в хранилище — нет и в цикле."""
+        sub = make_sub(max_price=8000)
+        sender = self._sender_with_results(sub, {"AER": {"price": 7000, "flight": {}, "baseline": None}})
+        check = AsyncMock()
+        with patch.object(hds, "redis_client", make_redis()), \
+             patch.object(hds.route_queue, "check_route", check):
+            await sender._check_hot_sub(1, "s1", sub)
+        check.assert_not_called()
+        assert sender._send_hot_notification.call_args.args[6] == "AER"
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — дайджест: подборка на профиль, бюджет и кулдауны на пользователя
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestDigestProfiles:
+
+    def _sender(self, sub, prices: dict) -> hds.HotDealsSender:
+        sender = hds.HotDealsSender(bot=MagicMock())
+        depart = hds._resolve_search_date(sub).strftime("%Y-%m-%d")
+        sender._digest_store._results = {
+            hds.route_queue.route_key("MOW", dest, depart, None): {"price": p, "flight": {"value": p}, "avg": None}
+            for dest, p in prices.items()
+        }
+        sender._deliver = AsyncMock()
+        return sender
+
+    def test_profile_key_normalized(self):
+        a = make_sub(dests=("AER", "LED"), sub_type="digest", max_price=5000)
+        b = make_sub(dests=("LED", "AER"), sub_type="digest", max_price=9000, frequency="weekly")
+        c = make_sub(dests=("AER", "LED"), sub_type="digest", passengers=2)
+        assert hds._digest_profile_key(a) == hds._digest_profile_key(b)
+        assert hds._digest_profile_key(a) != hds._digest_profile_key(c)
+
+    @pytest.mark.asyncio
+    async def test_profile_computed_once_budget_per_user(self):
+        subs = [make_sub(dests=("AER", "LED", "KZN"), sub_type="digest", max_price=mp) for mp in (0, 5000, 3500)]
+        sender = self._sender(subs[0], {"AER": 7000, "LED": 3000, "KZN": 4000})
+        convert = AsyncMock(side_effect=lambda link: f"p:{link}")
+        with patch.object(hds, "redis_client", make_redis()), \
+             patch.object(hds, "convert_to_partner_link", convert), \
+             patch.object(sender._digest_store, "get", wraps=sender._digest_store.get) as store_get:
+            for i, sub in enumerate(subs):
+                await sender._send_digest(i, f"d{i}", sub)
+
+        assert store_get.call_count == 3          # маршруты профиля — один раз на всех
+        assert convert.await_count == 3           # ссылки тоже общие: AER, LED, KZN
+        assert len(sender._digest_profiles) == 1
+        sent = [c.kwargs["cooldown_dests"] for c in sender._deliver.call_args_list]
+        assert sent == [["LED", "KZN", "AER"], ["LED", "KZN"], ["LED"]]
+
+    @pytest.mark.asyncio
+    async def test_cooldown_applied_per_user(self):
+        sub = make_sub(dests=("AER", "LED"), sub_type="digest")
+        sender = self._sender(sub, {"AER": 7000, "LED": 3000})
+        with patch.object(hds, "redis_client", make_redis(on_cooldown={"LED"})), \
+             patch.object(hds, "convert_to_partner_link", AsyncMock(return_value="https://x")):
+            await sender._send_digest(1, "d1", sub)
+        assert sender._deliver.call_args.kwargs["cooldown_dests"] == ["AER"]
@@ -0,0 +1,156 @@
+"""
+test_hot_scoring.py
+===================
+Тесты общего прохода оценки кандидатов горячих предложений
+(services/hot_scoring.py).
+
+Запуск из корня проекта:
+    pytest test/test_hot_scoring.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+import random
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import hot_deals_sender as hds
+from services import hot_scoring as hs
+from services.cycle_store import CycleStore
+
+DEPART = date(2026, 3, 15)
+
+
+def _store(prices: dict) -> CycleStore:
+    """prices: (origin, dest) → (price, baseline) | None."""
+    store = CycleStore("Test")
+    for (o, d), val in prices.items():
+        res = None if val is None else {"price": val[0], "flight": {"value": val[0]}, "baseline": val[1]}
+        store._results[hds.route_queue.route_key(o, d, "2026-03-15", None)] = res
+    return store
+
+
+def _sub(origin="MOW", dests=("AER", "LED", "KZN"), max_price=0) -> dict:
+    return {"origin_iata": origin, "category": "custom", "dest_iata_list": list(dests), "max_price": max_price}
+
+
+def _score(subs, store):
+    return hs.score_subs(subs, store, hds.DROP_THRESHOLD, hds._sub_routes, lambda s: DEPART)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — правила (те же, что были в _check_hot_sub)
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestRules:
+
+    def test_budget_slack_and_price_order(self):
+        store = _store({("MOW", "AER"): (8700, None), ("MOW", "LED"): (3000, None), ("MOW", "KZN"): (9000, None)})
+        ranked = _score([_sub(max_price=8000)], store)
+        assert [c[2] for c in ranked.candidates(0)] == ["LED", "AER"]  # 9000 > 8000 × 1.10
+
+    def test_drop_threshold_without_budget(self):
+        store = _store({
+            ("MOW", "AER"): (9900, 10000.0),   # −1% — мало
+            ("MOW", "LED"): (9000, 10000.0),   # −10%
+            ("MOW", "KZN"): (5000, None),      # базовой цены ещё нет — проходит
+        })
+        ranked = _score([_sub()], store)
+        assert [c[2] for c in ranked.candidates(0)] == ["KZN", "LED"]
+
+    def test_missing_routes_and_empty_subs(self):
+        store = _store({("MOW", "AER"): None})
+        ranked = _score([_sub(), _sub(origin="LED", dests=("LED",))], store)
+        assert len(ranked) == 2
+        assert ranked.candidates(0) == [] and ranked.candidates(1) == []
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — векторный проход совпадает с прежним циклом, кулдауны — маской
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _reference(sub, store, on_cooldown=()):
+    """Прежний цикл _check_hot_sub: маршрут за маршрутом, затем первый не на кулдауне."""
+    origins, dests = hds._sub_routes(sub)
+    cands = []
+    for o in origins:
+        for d in dests:
+            res = d != o and store.get(o, d, "2026-03-15")
+            if not res:
+                continue
+            price, base = res["price"], res["baseline"]
+            if sub["max_price"]:
+                if price > sub["max_price"] * hs.BUDGET_SLACK:
+                    continue
+            elif base is not None and (base - price) / base < hds.DROP_THRESHOLD:
+                continue
+            cands.append((price, o, d, res["flight"], base))
+    cands.sort(key=lambda c: c[0])
+    return cands, next((c for c in cands if c[2] not in on_cooldown), None)
+
+
+class TestVectorized:
+
+    def _random_cycle(self, n_subs=300):
+        rnd = random.Random(7)
+        dests = [f"D{i:02d}" for i in range(15)]
+        prices = {}
+        for o in ("MOW", "LED", "SVX"):
+            for d in dests:
+                base = rnd.choice([None, float(rnd.randint(5000, 20000))])
+                prices[(o, d)] = (rnd.randint(3000, 20000), base)
+        subs = [_sub(origin=rnd.choice(["MOW", "LED", "SVX"]), dests=rnd.sample(dests, 10),
+                     max_price=rnd.choice([0, 0, 6000, 12000])) for _ in range(n_subs)]
+        cooldowns = {f"s{i}": set(rnd.sample(dests, rnd.choice([0, 0, 1, 3, 10]))) for i in range(n_subs)}
+        return _store(prices), subs, cooldowns
+
+    def test_same_as_reference(self):
+        store, subs, cooldowns = self._random_cycle()
+        ranked = _score(subs, store)
+        chosen = ranked.pick([f"s{i}" for i in range(len(subs))], cooldowns)
+        for i, sub in enumerate(subs):
+            cands, first = _reference(sub, store, cooldowns[f"s{i}"])
+            assert ranked.candidates(i) == cands
+            assert chosen[i] == first
+
+    def test_pick_skips_cooldown_per_sub(self):
+        store = _store({("MOW", "AER"): (7000, None), ("MOW", "LED"): (3000, None)})
+        ranked = _score([_sub(max_price=8000), _sub(max_price=8000), _sub(max_price=8000)], store)
+        chosen = ranked.pick(["a", "b", "c"], {"b": {"LED"}, "c": {"LED", "AER"}})
+        assert [c and c[2] for c in chosen] == ["LED", "AER", None]
+
+    def test_pick_without_routes(self):
+        ranked = _score([_sub()], _store({}))
+        assert ranked.pick(["a"], {}) == [None]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — _notify_hot: один проход оценки, кулдауны одним pipeline
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestNotifyHot:
+
+    @pytest.mark.asyncio
+    async def test_bulk_cooldowns_passed_to_check(self):
+        sender = hds.HotDealsSender(bot=MagicMock())
+        sender.running = True
+        subs = [(1, "s1", _sub(max_price=9000)), (2, "s2", _sub(max_price=9000))]
+        depart = hds._resolve_search_date(subs[0][2]).strftime("%Y-%m-%d")
+        sender._hot_store._results = {
+            hds.route_queue.route_key("MOW", "LED", depart, None): {"price": 3000, "flight": {}, "baseline": None},
+        }
+        sender._send_hot_notification = AsyncMock()
+        sender._maybe_send_nudge = AsyncMock()
+        fake_redis = MagicMock(
+            get_routes_on_cooldown_many=AsyncMock(return_value={"s2": {"LED"}}),
+            get_routes_on_cooldown=AsyncMock(side_effect=AssertionError("по одной подписке не ходим")),
+        )
+        with patch.object(hds, "redis_client", fake_redis), \
+             patch.object(hds, "SEND_PACING", 0):
+            await sender._notify_hot(subs[:1], subs[1:])
+
+        fake_redis.get_routes_on_cooldown_many.assert_awaited_once_with([("s1", ["LED"]), ("s2", ["LED"])])
+        assert sender._send_hot_notification.await_count == 1
+        sender._maybe_send_nudge.assert_awaited_once()  # s2: единственный кандидат на кулдауне
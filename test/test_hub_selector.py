@@ -0,0 +1,103 @@
+"""
+test_hub_selector.py
+====================
+Тесты выбора кандидатов перебора (services/hub_selector.py): хабы поиска
+«Везде» и города страны по статистике route_empty / hubstat / истории цен.
+
+Запуск из корня проекта:
+    pytest test/test_hub_selector.py -v
+
+Файл НЕ требует реального Redis — клиент мокируется.
+"""
+
+import json
+import random
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import hub_selector as hs
+from utils.redis_client import RedisClient
+
+HUBS = ["MOW", "LED", "AER", "KZN", "OVB", "IST", "DXB", "BKK"]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — select_candidates: score, пустые маршруты, исследование
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestSelectCandidates:
+
+    def test_cold_start_keeps_static_order(self):
+        """Без наблюдений — статичный порядок, исследование берёт из хвоста."""
+        chosen = hs.select_candidates(HUBS, 5, {}, {}, rng=random.Random(1))
+        assert chosen[:4] == HUBS[:4]
+        assert chosen[4] in HUBS[4:]
+
+    def test_history_ranks_cheap_and_reliable_first(self):
+        stats   = {"MOW": [10, 0], "IST": [10, 10], "BKK": [10, 9]}
+        medians = {"IST": 9000, "BKK": 30000}
+        chosen  = hs.select_candidates(HUBS, 3, stats, medians, explore=0)
+        assert chosen[0] == "IST"
+        assert "MOW" not in chosen
+
+    def test_empty_routes_dropped(self):
+        chosen = hs.select_candidates(HUBS, 8, {}, {}, empty={"LED", "DXB"})
+        assert chosen == [h for h in HUBS if h not in ("LED", "DXB")]
+
+    def test_exploration_prefers_unobserved(self):
+        """Исследуемые места достаются кандидатам, которых спрашивали реже."""
+        stats = {h: [50, 25] for h in HUBS[:-1]}
+        picks = [hs.select_candidates(HUBS, 2, stats, {}, rng=random.Random(seed))[1] for seed in range(200)]
+        assert picks.count("BKK") > 100
+
+    def test_budget_not_exceeded(self):
+        assert len(hs.select_candidates(HUBS, 3, {}, {})) == 3
+        assert hs.select_candidates(HUBS[:2], 3, {}, {}) == HUBS[:2]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — choose / record_outcome с Redis
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestChooseAndRecord:
+
+    @pytest.mark.asyncio
+    async def test_choose_without_redis_truncates_static_list(self):
+        with patch.object(hs, "redis_client", MagicMock(client=None)):
+            assert await hs.choose("from", "MOW", HUBS, 3, "2026-03-15") == ["LED", "AER", "KZN"]
+
+    @pytest.mark.asyncio
+    async def test_choose_uses_empty_routes_and_history(self):
+        redis = MagicMock(
+            client=object(),
+            get_empty_routes=AsyncMock(return_value={("LED", "MOW")}),
+            get_hub_stats=AsyncMock(return_value={}),
+        )
+        history = AsyncMock(return_value={("BKK", "MOW"): {"median": 5000}})
+        with patch.object(hs, "redis_client", redis), \
+             patch.object(hs.price_history, "get_stats_many", history):
+            chosen = await hs.choose("to", "MOW", HUBS, 7, "2026-03-15")
+        assert chosen == ["BKK", "AER", "KZN", "OVB", "IST", "DXB"]
+        routes, month = history.await_args.args
+        assert ("AER", "MOW") in routes and month == "2026-03"
+
+    @pytest.mark.asyncio
+    async def test_record_outcome_counts_and_marks_empty(self):
+        client = RedisClient()
+        pipe = MagicMock(execute=AsyncMock())
+        client.client = MagicMock(pipeline=MagicMock(return_value=pipe))
+        with patch.object(hs, "redis_client", client):
+            await hs.record_outcome("from", "MOW", "2026-03-15", {
+                "IST": [{"value": 9000}, {"price": 8000}], "AER": [],
+            })
+        incrs = [c.args[1] for c in pipe.hincrby.call_args_list]
+        assert incrs == ["IST:n", "IST:hit", "AER:n"]
+        assert pipe.set.call_args.args[0].endswith("route_empty:MOW:AER")
+        assert json.loads(pipe.lpush.call_args.args[1])["prices"] == {"IST": 8000, "AER": 0}
+
+    @pytest.mark.asyncio
+    async def test_hub_stats_parsed(self):
+        client = RedisClient()
+        client.client = MagicMock(hgetall=AsyncMock(return_value={"IST:n": "4", "IST:hit": "3", "AER:n": "2"}))
+        assert await client.get_hub_stats("from", "MOW") == {"IST": [4, 3], "AER": [2, 0]}
@@ -0,0 +1,125 @@
+"""
+test_leader_lock.py
+===================
+Тесты Redis-лизы фоновых сервисов (utils/leader_lock.py).
+
+Запуск из корня проекта:
+    pytest test/test_leader_lock.py -v
+
+Файл НЕ требует реального Redis — клиент мокируется.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from utils import leader_lock as ll
+
+
+def _fake_client(set_result=True, eval_results=(1,)):
+    client = MagicMock()
+    client.set  = AsyncMock(return_value=set_result)
+    client.eval = AsyncMock(side_effect=list(eval_results) + [1] * 100)
+    client.get  = AsyncMock(return_value=None)
+    return client
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — LeaderLease
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestLeaderLease:
+
+    @pytest.mark.asyncio
+    async def test_acquire_uses_set_nx_px(self):
+        client = _fake_client()
+        with patch.object(ll.redis_client, "client", client):
+            lease = ll.LeaderLease("price_watcher", ttl=30)
+            assert await lease.acquire() is True
+        key, token = client.set.call_args_list[0].args
+        assert key.endswith("leader:price_watcher")
+        assert token == lease.token
+        assert client.set.call_args_list[0].kwargs == {"nx": True, "px": 30_000}
+        # Второй SET — heartbeat
+        assert client.set.call_args_list[1].args[0].endswith("heartbeat:price_watcher")
+
+    @pytest.mark.asyncio
+    async def test_acquire_busy(self):
+        client = _fake_client(set_result=None)
+        with patch.object(ll.redis_client, "client", client):
+            assert await ll.LeaderLease("hot_deals").acquire() is False
+
+    @pytest.mark.asyncio
+    async def test_without_redis_always_leader(self):
+        with patch.object(ll.redis_client, "client", None):
+            lease = ll.LeaderLease("daily_stats")
+            assert await lease.acquire() is True
+            assert await lease.renew() is True
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — run_as_leader: запуск и остановка сервиса
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestRunAsLeader:
+
+    @pytest.mark.asyncio
+    async def test_service_cancelled_when_lease_lost(self):
+        """Продление вернуло 0 → сервис отменяется, процесс снова ждёт лизу."""
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def service():
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        client = _fake_client(eval_results=(0,))
+        with patch.object(ll.redis_client, "client", client), \
+             patch.object(ll, "RENEW_INTERVAL", 0.01), \
+             patch.object(ll, "RETRY_INTERVAL", 0.01):
+            runner = asyncio.create_task(ll.run_as_leader("hot_deals", service))
+            await asyncio.wait_for(cancelled.wait(), timeout=2)
+            assert started.is_set()
+            runner.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await runner
+
+    @pytest.mark.asyncio
+    async def test_service_stopped_when_redis_down_longer_than_ttl(self):
+        """Продление падает дольше ttl → сервис останавливается, двух лидеров нет."""
+        cancelled = asyncio.Event()
+
+        async def service():
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        client = _fake_client()
+        client.eval = AsyncMock(side_effect=ConnectionError("redis down"))
+        with patch.object(ll.redis_client, "client", client), \
+             patch.object(ll, "RENEW_INTERVAL", 0.01), \
+             patch.object(ll, "RETRY_INTERVAL", 0.01):
+            runner = asyncio.create_task(ll.run_as_leader("hot_deals", service, ttl=0.1))
+            await asyncio.wait_for(cancelled.wait(), timeout=2)
+            runner.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await runner
+
+    @pytest.mark.asyncio
+    async def test_not_leader_does_not_start(self):
+        service = AsyncMock()
+        client = _fake_client(set_result=None)
+        with patch.object(ll.redis_client, "client", client), \
+             patch.object(ll, "RETRY_INTERVAL", 0.01):
+            runner = asyncio.create_task(ll.run_as_leader("price_watcher", service))
+            await asyncio.sleep(0.05)
+            runner.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await runner
+        service.assert_not_called()
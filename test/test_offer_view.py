@@ -0,0 +1,194 @@
+"""
+test_offer_view.py
+==================
+Тесты локальных фильтров результата (utils/offer_view.py): кодирование вида
+в callback_data, фильтры и сортировки по кэшу, поиск «только прямые» без
+второго круга запросов и переключение вида без API, браузер вариантов по
+готовым индексам сортировки.
+
+Запуск из корня проекта:
+    pytest test/test_offer_view.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+
+from utils import offer_view as ov
+
+
+def _f(price, transfers=0, hour=10, duration=180, airline="SU"):
+    return {
+        "origin": "MOW", "destination": "AER", "value": price, "price": price,
+        "transfers": transfers, "duration": duration, "airline": airline,
+        "flight_number": "100", "departure_at": f"2027-03-15T{hour:02d}:00:00+03:00",
+        "link": "https://www.aviasales.ru/search/x",
+    }
+
+
+OFFERS = [
+    _f(9000, transfers=0, hour=7, duration=150, airline="SU"),
+    _f(6000, transfers=1, hour=22, duration=420, airline="TK"),
+    _f(7500, transfers=0, hour=14, duration=140, airline="U6"),
+    _f(5000, transfers=2, hour=3, duration=900, airline="TK"),
+]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — вид: кодирование и фильтры
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestView:
+
+    def test_encode_roundtrip_fits_callback(self):
+        view = ov.View("d", "m", "d", 8, "SU")
+        assert ov.decode_view(view.encode()) == view
+        assert len(f"rv_{uuid4()}_{view.encode()}".encode()) <= 64
+
+    def test_garbage_code_gives_default(self):
+        assert ov.decode_view("zz") == ov.View()
+        assert ov.decode_view("q-p00") == ov.View()
+
+    def test_flight_type_maps_to_view(self):
+        assert ov.view_for_flight_type("direct").type == "d"
+        assert ov.view_for_flight_type("all") == ov.View()
+
+    def test_filters(self):
+        assert [f["value"] for f in ov.apply_view(OFFERS, ov.View(type="d"))] == [7500, 9000]
+        assert [f["value"] for f in ov.apply_view(OFFERS, ov.View(type="x"))] == [5000, 6000]
+        assert [f["value"] for f in ov.apply_view(OFFERS, ov.View(time="e"))] == [6000]
+        assert [f["value"] for f in ov.apply_view(OFFERS, ov.View(airline="TK", max_hours=8))] == [6000]
+
+    def test_sorts(self):
+        assert [f["value"] for f in ov.apply_view(OFFERS, ov.View(sort="d"))] == [7500, 9000, 6000, 5000]
+        assert [f["value"] for f in ov.apply_view(OFFERS, ov.View(sort="t"))] == [5000, 9000, 7500, 6000]
+
+    def test_airlines_and_describe(self):
+        assert ov.airlines(OFFERS)[0] == "TK"
+        assert ov.describe(ov.View("d", "m", "p", 8, "SU")) == "прямые · утро · до 8ч в пути · SU"
+        assert ov.describe(ov.View()) == ""
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — поиск кеширует всё один раз, смена вида — из кэша
+# ═════════════════════════════════════════════════════════════════════════════
+
+SEARCH_DATA = {
+    "origin": "москва", "origin_iata": "MOW", "origin_name": "Москва",
+    "dest": "сочи", "dest_iata": "AER", "dest_name": "Сочи",
+    "depart_date": "15.03", "return_date": None, "need_return": False,
+    "flight_type": "direct", "passenger_desc": "1 взр.", "passenger_code": "1",
+    "adults": 1, "children": 0, "infants": 0,
+}
+
+
+def _callback(data: str = "confirm_search"):
+    msg = MagicMock(edit_text=AsyncMock(), edit_reply_markup=AsyncMock(), answer=AsyncMock())
+    msg.edit_text.return_value = msg
+    msg.chat.id = 1
+    return MagicMock(data=data, message=msg, from_user=MagicMock(id=1), answer=AsyncMock())
+
+
+def _buttons(markup):
+    return [b for row in markup.inline_keyboard for b in row]
+
+
+class TestCachedView:
+
+    @pytest.fixture
+    def fake_redis(self):
+        store = {}
+        redis = MagicMock(
+            set_search_cache=AsyncMock(side_effect=lambda cid, data: store.__setitem__(cid, data)),
+            get_search_cache=AsyncMock(side_effect=lambda cid: store.get(cid)),
+            track_search_type=AsyncMock(), track_funnel_step=AsyncMock(),
+            save_search_history=AsyncMock(), track_no_results=AsyncMock(),
+        )
+        redis.store = store
+        with patch("handlers.search_results.redis_client", redis):
+            yield redis
+
+    @pytest.mark.asyncio
+    async def test_direct_empty_no_second_round(self, fake_redis):
+        from handlers import search_results as sr
+
+        realtime = AsyncMock(return_value=[_f(6000, transfers=1)])
+        state = MagicMock(clear=AsyncMock(), update_data=AsyncMock())
+        cb = _callback()
+        with patch.object(sr, "search_flights_realtime", realtime):
+            await sr._do_confirm_search(cb, state, dict(SEARCH_DATA))
+
+        assert realtime.await_count == 1
+        (cached,) = fake_redis.store.values()
+        assert cached["flights"] == [] and len(cached["offers"]) == 1
+        markup = cb.message.edit_text.await_args.kwargs["reply_markup"]
+        assert any((b.callback_data or "").startswith("rv_") for b in _buttons(markup))
+
+    @pytest.mark.asyncio
+    async def test_view_switch_renders_from_cache(self, fake_redis):
+        from handlers import search_results as sr
+
+        fake_redis.store["cid"] = dict(SEARCH_DATA, offers=OFFERS, flights=[])
+        cb = _callback(f"rv_cid_{ov.View(sort='d').encode()}")
+        with patch.object(sr, "search_flights_realtime", AsyncMock(side_effect=AssertionError("API не нужно"))), \
+             patch.object(sr, "convert_to_partner_link", AsyncMock(side_effect=lambda url, **kw: url)):
+            await sr.show_result_view(cb)
+
+        text = cb.message.edit_text.await_args.args[0]
+        assert "7500" in text and "4 из 4" in text
+
+    @pytest.mark.asyncio
+    async def test_empty_view_keeps_screen(self, fake_redis):
+        from handlers import search_results as sr
+
+        fake_redis.store["cid"] = dict(SEARCH_DATA, offers=OFFERS, flights=[])
+        cb = _callback(f"rv_cid_{ov.View(type='d', time='n').encode()}")
+        await sr.show_result_view(cb)
+        cb.message.edit_text.assert_not_awaited()
+        assert cb.answer.await_args.kwargs.get("show_alert") is True
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — браузер вариантов: страницы срезом готовых индексов
+# ═════════════════════════════════════════════════════════════════════════════
+
+MANY = [_f(5000 + 100 * i, transfers=i % 2, hour=6 + i % 12, duration=600 - 10 * i) for i in range(12)]
+
+
+class TestPaging:
+
+    def test_indexes_match_sorted_views(self):
+        order = ov.sort_indexes(MANY)
+        for code in ov.SORTS:
+            view = ov.View(sort=code)
+            assert ov.apply_view(MANY, view, order) == ov.apply_view(MANY, view)
+
+    def test_page_slices_index(self):
+        order = ov.sort_indexes(MANY)
+        items, total = ov.page(MANY, order, ov.View(sort="d"), 1)
+        assert total == 12
+        assert [f["duration"] for f in items] == [540, 550, 560, 570, 580]
+        items, total = ov.page(MANY, order, ov.View(type="d"), 1)
+        assert total == 6 and len(items) == 1
+
+    @pytest.mark.asyncio
+    async def test_page_turn_one_cache_read_no_sort(self):
+        from handlers import search_results as sr
+
+        cached = dict(SEARCH_DATA, offers=MANY, order=ov.sort_indexes(MANY))
+        redis = MagicMock(get_search_cache=AsyncMock(return_value=cached))
+        cb = _callback(f"rp_{uuid4()}_{ov.View(sort='d').encode()}_1")
+        with patch.object(sr, "redis_client", redis), \
+             patch.object(sr, "sort_indexes", MagicMock(side_effect=AssertionError("индекс уже в кэше"))):
+            await sr.show_result_page(cb)
+
+        assert redis.get_search_cache.await_count == 1
+        text = cb.message.edit_text.await_args.args[0]
+        assert "6–10 из 12" in text and text.startswith("📋")
+        markup = cb.message.edit_text.await_args.kwargs["reply_markup"]
+        datas = [b.callback_data for b in _buttons(markup)]
+        assert all(len(d.encode()) <= 64 for d in datas)
+        assert any(d.endswith("_2") for d in datas) and any(d.endswith("_0") for d in datas)
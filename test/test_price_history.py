@@ -0,0 +1,262 @@
+"""
+test_price_history.py
+=====================
+Тесты истории цен (services/price_history.py) и напоминалок,
+которые строятся по ней вместо повторного опроса API.
+
+Запуск из корня проекта:
+    pytest test/test_price_history.py -v
+
+Файл НЕ требует реального Redis — клиент мокируется.
+"""
+
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import price_history as ph
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — чистые функции: месяц, минимумы, перцентили
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestPureHelpers:
+
+    def test_month_minimums_groups_by_departure_month(self):
+        flights = [
+            {"value": 9000, "departure_at": "2026-03-10T10:00:00+03:00"},
+            {"value": 7000, "departure_at": "2026-03-20T10:00:00+03:00"},
+            {"price": 12000, "departure_at": "2026-04-01T10:00:00+03:00"},
+            {"value": 0,     "departure_at": "2026-04-02T10:00:00+03:00"},
+        ]
+        assert ph.month_minimums(flights) == {"2026-03": 7000, "2026-04": 12000}
+
+    def test_month_minimums_uses_fallback_date(self):
+        """Без departure_at месяц берётся из даты запроса."""
+        assert ph.month_minimums([{"value": 5000}], "2026-05-15") == {"2026-05": 5000}
+
+    def test_percentile_interpolates(self):
+        prices = [100, 200, 300, 400]
+        assert ph.percentile(prices, 0.0) == 100
+        assert ph.percentile(prices, 1.0) == 400
+        assert ph.percentile(prices, 0.5) == 250
+        assert ph.percentile([], 0.5) is None
+
+    def test_summarize(self):
+        stats = ph.summarize([(30, 500), (10, 300), (20, 100)])
+        assert stats["last"] == 500 and stats["last_ts"] == 30
+        assert stats["min"] == 100 and stats["max"] == 500
+        assert stats["median"] == 300
+        assert stats["count"] == 3
+        assert ph.summarize([]) is None
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — даунсемплинг и ретеншн
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestDownsample:
+
+    def test_recent_points_stay_hourly(self):
+        now = 1_800_000_000
+        points = [(now - 2 * ph.HOUR, 900), (now - ph.HOUR, 800)]
+        assert ph.downsample(points, now) == sorted(points)
+
+    def test_old_points_merge_into_daily_minimum(self):
+        now = 1_800_000_000
+        day_start = (now - 10 * ph.DAY) // ph.DAY * ph.DAY
+        points = [(day_start + ph.HOUR, 900), (day_start + 5 * ph.HOUR, 700)]
+        assert ph.downsample(points, now) == [(day_start, 700)]
+
+    def test_points_beyond_retention_dropped(self):
+        now = 1_800_000_000
+        points = [(now - ph.RETENTION - ph.DAY, 100), (now - ph.HOUR, 500)]
+        assert ph.downsample(points, now) == [(now - ph.HOUR, 500)]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — запись и чтение через Redis (мок pipeline)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _fake_pipeline(results):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results)
+    return pipe
+
+
+class TestRedisIO:
+
+    @pytest.mark.asyncio
+    async def test_record_flights_writes_min_with_lt(self):
+        """Одна запись на месяц: ZADD LT + продление TTL + флаг компакции."""
+        pipe = _fake_pipeline([1, True, None])
+        client = MagicMock()
+        client.pipeline = MagicMock(return_value=pipe)
+        with patch.object(ph.redis_client, "client", client):
+            await ph.record_flights(
+                "MOW", "AER",
+                [{"value": 8000, "departure_at": "2026-03-10"},
+                 {"value": 6000, "departure_at": "2026-03-12"}],
+                "2026-03-10", ts=1_800_000_123,
+            )
+        (key, mapping), kwargs = pipe.zadd.call_args
+        assert key.endswith("price_hist:ow:MOW:AER:2026-03")
+        assert mapping == {str(1_800_000_123 // ph.HOUR * ph.HOUR): 6000}
+        assert kwargs == {"lt": True}
+
+    @pytest.mark.asyncio
+    async def test_compact_keeps_key_and_fresh_points(self):
+        """Компакция не удаляет ключ: только старые точки по имени + суточные минимумы LT."""
+        now = 1_800_000_000
+        day_start = (now - 10 * ph.DAY) // ph.DAY * ph.DAY
+        fresh = now // ph.HOUR * ph.HOUR
+        client = MagicMock()
+        client.zrange = AsyncMock(return_value=[
+            (str(day_start + ph.HOUR), 900.0), (str(day_start + 5 * ph.HOUR), 700.0),
+            (str(now - ph.RETENTION - ph.DAY), 100.0), (str(fresh), 500.0),
+        ])
+        pipe = _fake_pipeline([1, 1])
+        client.pipeline = MagicMock(return_value=pipe)
+        with patch.object(ph.redis_client, "client", client):
+            await ph._compact("k", now)
+        pipe.delete.assert_not_called()
+        assert set(pipe.zrem.call_args.args[1:]) == {
+            str(day_start + ph.HOUR), str(day_start + 5 * ph.HOUR), str(now - ph.RETENTION - ph.DAY),
+        }
+        (key, mapping), kwargs = pipe.zadd.call_args
+        assert mapping == {str(day_start): 700, str(fresh): 500} and kwargs == {"lt": True}
+
+    @pytest.mark.asyncio
+    async def test_record_flights_without_redis_is_noop(self):
+        with patch.object(ph.redis_client, "client", None):
+            await ph.record_flights("MOW", "AER", [{"value": 1}], "2026-03-10")
+
+    @pytest.mark.asyncio
+    async def test_record_later_does_not_block_search(self):
+        """Поиск не ждёт записи истории: зависший Redis не задерживает выдачу."""
+        import asyncio
+
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_record(*args, **kwargs):
+            started.set()
+            await release.wait()
+
+        with patch.object(ph.redis_client, "client", MagicMock()), \
+             patch.object(ph, "record_flights", slow_record):
+            ph.record_flights_later("MOW", "AER", [{"value": 1}], "2026-03-10")
+            assert len(ph._pending) == 1
+            await started.wait()
+            release.set()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+        assert not ph._pending
+
+    @pytest.mark.asyncio
+    async def test_realtime_recorded_only_for_one_adult(self):
+        from services import flight_search as fs
+
+        proposal = {"min_price": {"rub": 24000}, "segment": [{"flight": [
+            {"departure": "2026-03-10T10:00:00", "arrival": "2026-03-10T14:00:00", "marketing_carrier": "SU"},
+        ]}]}
+
+        class _Resp:
+            def __init__(self, data):
+                self.status, self._data = 200, data
+
+            async def json(self, content_type=None):
+                return self._data
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        class _Session:
+            def __init__(self):
+                self._chunks = [[proposal], {"search_id": "s"}]
+
+            def post(self, *args, **kwargs):
+                return _Resp({"search_id": "s"})
+
+            def get(self, *args, **kwargs):
+                return _Resp(self._chunks.pop(0))
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        with patch.object(fs, "AVIASALES_TOKEN", "t"), patch.object(fs, "AVIASALES_MARKER", "m"), \
+             patch.object(fs, "_http_session", lambda: _Session()), \
+             patch.object(fs, "record_flights_later") as record:
+            family = await fs.search_flights_realtime("MOW", "AER", "2026-03-10", adults=2, children=1,
+                                                      poll_interval=0)
+            assert family[0]["value"] == 24000 and record.call_count == 0
+            await fs.search_flights_realtime("MOW", "AER", "2026-03-10", poll_interval=0)
+        assert record.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_get_stats_many_filters_window(self):
+        now = time.time()
+        fresh, stale = int(now - ph.HOUR), int(now - 40 * ph.DAY)
+        pipe = _fake_pipeline([
+            [(str(stale), 1000.0), (str(fresh), 5000.0)],
+            [],
+        ])
+        client = MagicMock()
+        client.pipeline = MagicMock(return_value=pipe)
+        with patch.object(ph.redis_client, "client", client):
+            res = await ph.get_stats_many([("MOW", "AER"), ("MOW", "LED")], "2026-03", window=30 * ph.DAY)
+        assert list(res) == [("MOW", "AER")]
+        assert res[("MOW", "AER")]["min"] == 5000
+        assert res[("MOW", "AER")]["count"] == 1
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 4 — напоминалка: цены из хранилища цикла, «обычная» — из истории
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestNudgeFromHistory:
+
+    @pytest.mark.asyncio
+    async def test_nudge_uses_history_not_api(self):
+        from services import hot_deals_sender as hds
+
+        now = time.time()
+        history = {
+            ("MOW", "AER"): {"last": 7000, "last_ts": now - 600, "min": 6500, "max": 9000,
+                             "median": 8000.0, "p25": 7000.0, "p75": 8500.0, "count": 5},
+            ("MOW", "LED"): {"last": 3000, "last_ts": now - 10 * 86400, "min": 3000, "max": 3000,
+                             "median": 3000.0, "p25": 3000.0, "p75": 3000.0, "count": 1},
+        }
+        client = MagicMock()
+        client.get = AsyncMock(return_value=None)
+        client.set = AsyncMock()
+        client.delete = AsyncMock()
+
+        sender = hds.HotDealsSender(bot=MagicMock())
+        sender._hot_store._results = {
+            hds.route_queue.route_key("MOW", "AER", "2026-03-15", None): {"price": 7000, "flight": {"value": 7000}, "baseline": None},
+            hds.route_queue.route_key("MOW", "LED", "2026-03-15", None): None,
+        }
+        sender._send_nudge_notification = AsyncMock()
+        sub = {"created_at": now - 4 * 86400, "max_price": 0, "passengers": 1}
+
+        with patch.object(hds.redis_client, "client", client), \
+             patch.object(hds.price_history, "get_stats_many", AsyncMock(return_value=history)), \
+             patch.object(hds.route_queue, "check_route", AsyncMock()) as api:
+            await sender._maybe_send_nudge(1, "s1", sub, ["MOW"], ["AER", "LED"], "2026-03-15")
+
+        api.assert_not_called()
+        kwargs = sender._send_nudge_notification.call_args.kwargs
+        # По LED в этом цикле цен нет — лучшая цена AER, «обычная» = медиана истории
+        assert kwargs["dest_iata"] == "AER"
+        assert kwargs["price"] == 7000
+        assert kwargs["baseline"] == 8000.0
+        assert kwargs["best_stats"] is history[("MOW", "AER")]
+        assert sender._hot_store.naive_calls == 2  # прежний повторный проход по API
@@ -0,0 +1,116 @@
+"""
+test_progressive.py
+===================
+Тесты потокового сбора переборов (utils/progressive.py): ответы плеч
+по мере прихода, отмена по бюджету задержки, прореженные правки экрана.
+
+Запуск из корня проекта:
+    pytest test/test_progressive.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from utils import progressive as pg
+
+
+async def _leg(delay: float, result, fail: bool = False):
+    await asyncio.sleep(delay)
+    if fail:
+        raise RuntimeError("boom")
+    return result
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — gather_streaming: порядок, ошибки, бюджет
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestGatherStreaming:
+
+    @pytest.mark.asyncio
+    async def test_results_streamed_in_completion_order(self):
+        seen = []
+
+        async def on_result(key, result):
+            seen.append(key)
+
+        res = await pg.gather_streaming(
+            {"slow": _leg(0.03, [1]), "fast": _leg(0.0, [2]), "bad": _leg(0.01, [], fail=True)}, on_result,
+        )
+        assert seen == ["fast", "slow"]
+        assert res == {"fast": [2], "slow": [1]}
+
+    @pytest.mark.asyncio
+    async def test_budget_cancels_slow_legs(self):
+        cancelled = asyncio.Event()
+
+        async def hang():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        res = await pg.gather_streaming({"ok": _leg(0.0, [1]), "hang": hang()}, budget=0.05)
+        assert res == {"ok": [1]}
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_grace_after_first_nonempty(self):
+        res = await pg.gather_streaming(
+            {"empty": _leg(0.0, []), "hit": _leg(0.01, [1]), "late": _leg(1.0, [2])}, budget=5, grace=0.05,
+        )
+        assert res == {"empty": [], "hit": [1]}
+
+    @pytest.mark.asyncio
+    async def test_callback_error_does_not_break_stream(self):
+        res = await pg.gather_streaming({"a": _leg(0.0, [1])}, AsyncMock(side_effect=RuntimeError))
+        assert res == {"a": [1]}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — экран ожидания: прореживание правок, лучший билет
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestProgressScreen:
+
+    @pytest.mark.asyncio
+    async def test_edits_throttled(self):
+        msg = MagicMock(edit_text=AsyncMock())
+        editor = pg.ThrottledEditor(msg, interval=60)
+        assert await editor.edit("a") is True
+        assert await editor.edit("b") is False
+        assert msg.edit_text.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_leg_progress_tracks_cheapest_kept(self):
+        msg = MagicMock(edit_text=AsyncMock())
+        progress = pg.LegProgress(msg, total=3, keep=lambda f: f["transfers"] == 0, interval=0)
+        await progress("IST", [{"origin": "MOW", "destination": "IST", "value": 9000, "transfers": 0}])
+        await progress("AYT", [{"origin": "MOW", "destination": "AYT", "value": 5000, "transfers": 1}])
+        assert progress.best["destination"] == "IST"
+        text = msg.edit_text.await_args.args[0]
+        assert "2/3" in text and "9 000 ₽" in text
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 3 — перебор хабов отдаёт ответы в on_leg
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestEverywhereStreaming:
+
+    @pytest.mark.asyncio
+    async def test_hub_fanout_reports_each_hub(self):
+        from services import everywhere_engine as ee
+
+        redis = MagicMock(get_anywhere_day=AsyncMock(return_value=None), set_anywhere_day=AsyncMock())
+        on_leg = AsyncMock()
+        with patch.object(ee, "redis_client", redis), \
+             patch.object(ee, "search_cheapest_anywhere", AsyncMock(return_value=None)), \
+             patch.object(ee, "grouped_prices", AsyncMock(return_value=[])):
+            await ee.cheapest_everywhere("2026-03-15", origin="MOW", on_leg=on_leg)
+        assert on_leg.await_count == ee.HUB_BUDGET
@@ -0,0 +1,102 @@
+"""
+test_route_queue.py
+===================
+Тесты очереди проверок маршрутов (services/route_queue.py).
+
+Запуск из корня проекта:
+    pytest test/test_route_queue.py -v
+
+Файл НЕ требует реального Redis и НЕ делает запросов к API — всё мокируется.
+"""
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services import route_queue as rq
+
+
+def _pipe():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    return pipe
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 1 — check_route: общая проверка маршрута
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestCheckRoute:
+
+    @pytest.mark.asyncio
+    async def test_returns_cheapest(self):
+        flights = [{"value": 9000}, {"value": 5000, "airline": "SU"}]
+        fake_redis = MagicMock(is_route_empty=AsyncMock(return_value=False),
+                               clear_route_empty=AsyncMock(), set_route_empty=AsyncMock())
+        with patch.object(rq, "redis_client", fake_redis), \
+             patch.object(rq, "search_flights", AsyncMock(return_value=flights)):
+            res = await rq.check_route("MOW", "AER", "2026-03-15")
+        assert res == {"price": 5000, "flight": flights[1]}
+        fake_redis.clear_route_empty.assert_awaited_once_with("MOW", "AER")
+
+    @pytest.mark.asyncio
+    async def test_empty_route_marked(self):
+        fake_redis = MagicMock(is_route_empty=AsyncMock(return_value=False), set_route_empty=AsyncMock())
+        with patch.object(rq, "redis_client", fake_redis), \
+             patch.object(rq, "search_flights", AsyncMock(return_value=[])):
+            assert await rq.check_route("MOW", "AER", "2026-03-15") is None
+        fake_redis.set_route_empty.assert_awaited_once_with("MOW", "AER")
+
+    @pytest.mark.asyncio
+    async def test_everywhere_origin(self):
+        with patch.object(rq, "search_origin_everywhere", AsyncMock(return_value=[{"price": 4000}])) as se:
+            res = await rq.check_route(None, "AER", "2026-03-15")
+        se.assert_awaited_once()
+        assert res["price"] == 4000
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# БЛОК 2 — продюсер / потребитель
+# ═════════════════════════════════════════════════════════════════════════════
+
+class TestQueueFlow:
+
+    @pytest.mark.asyncio
+    async def test_collect_distinguishes_empty_and_missing(self):
+        client = MagicMock()
+        client.hmget = AsyncMock(return_value=[
+            json.dumps({"price": 7000, "flight": {"value": 7000}}),
+            json.dumps({"price": None, "flight": None}),
+            None,
+        ])
+        with patch.object(rq.redis_client, "client", client):
+            res = await rq.collect("c1", ["a", "b", "c"], timeout=0)
+        assert res == {"a": {"price": 7000, "flight": {"value": 7000}}, "b": None}
+
+    @pytest.mark.asyncio
+    async def test_handle_writes_result_then_acks(self):
+        pipes = [_pipe(), _pipe()]
+        client = MagicMock()
+        client.pipeline = MagicMock(side_effect=pipes)
+        fields = {"cycle": "c1", "origin": "MOW", "dest": "AER", "depart_date": "2026-03-15", "return_date": ""}
+        with patch.object(rq.redis_client, "client", client), \
+             patch.object(rq, "check_route", AsyncMock(return_value={"price": 5000, "flight": {}})):
+            await rq._handle("1-0", fields)
+        write, ack = pipes
+        key, field, payload = write.hset.call_args.args
+        assert key.endswith("route_results:c1")
+        assert field == "MOW:AER:2026-03-15:"
+        assert json.loads(payload)["price"] == 5000
+        ack.xack.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_handle_failure_leaves_pending(self):
+        """Ошибка проверки — без ack: задание перехватит XAUTOCLAIM."""
+        client = MagicMock()
+        client.pipeline = MagicMock(side_effect=AssertionError("не должно писать"))
+        fields = {"cycle": "c1", "origin": "MOW", "dest": "AER", "depart_date": "2026-03-15"}
+        with patch.object(rq.redis_client, "client", client), \
+             patch.object(rq, "check_route", AsyncMock(side_effect=RuntimeError("timeout"))):
+            await rq._handle("1-0", fields)
+        client.pipeline.assert_not_called()
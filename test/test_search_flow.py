@@ -275,6 +275,16 @@ class TestParseQuickSearch:
         o, d, dep, ret, pax = r
         assert o.lower() == "везде"
 
+    def test_prepositions_skipped(self):
+        r = self.p("из Сочи в Казань 10.03")
+        assert r is not None
+        assert (r[0], r[1]) == ("Сочи", "Казань")
+
+    def test_multiword_city(self):
+        r = self.p("Санкт-Петербург Нижний Новгород 10.03")
+        assert r is not None
+        assert (r[0], r[1]) == ("Санкт-Петербург", "Нижний Новгород")
+
     def test_with_passengers(self):
         r = self.p("Москва Сочи 10.03 2 взр")
         assert r is not None
@@ -955,6 +965,30 @@ class TestEditFromResults:
         cb.answer.assert_called()
         assert "устарел" in str(cb.answer.call_args_list[-1]).lower()
 
+    async def test_summary_keeps_search_toggles(self):
+        """«Изменить» и «Назад» показывают те же переключатели, что и мастер."""
+        fake_redis = MagicMock()
+        fake_redis.get_search_cache = AsyncMock(return_value=dict(SAMPLE_CACHE))
+
+        with (
+            patch("utils.smart_reminder.cancel_inactivity", PATCHES["cancel_inactivity"]),
+            patch("utils.smart_reminder.schedule_inactivity", PATCHES["schedule_inactivity"]),
+            patch("handlers.search_results.redis_client", fake_redis),
+        ):
+            from handlers.search_results import back_to_summary, edit_from_results
+            cb = make_callback(f"edit_from_results_{uuid4()}")
+            state = make_state({"flex_dates": True})
+            await edit_from_results(cb, state)
+            edit_kb = cb.message.edit_text.call_args.kwargs["reply_markup"]
+
+            cb = make_callback("back_to_summary")
+            await back_to_summary(cb, state)
+            back_kb = cb.message.answer.call_args.kwargs["reply_markup"]
+
+        for kb in (edit_kb, back_kb):
+            texts = {b.callback_data: b.text for row in kb.inline_keyboard for b in row}
+            assert texts["toggle_flex"].startswith("✅") and texts["toggle_nearby"].startswith("⬜")
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # БЛОК 15 — Везде: process_everywhere_search (карточка результата)
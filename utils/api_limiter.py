@@ -14,3 +14,13 @@ USER_SEARCH_SEMAPHORE = asyncio.Semaphore(8)
 
 # Для фоновых задач — намеренно уже, чтобы живые пользователи имели приоритет
 BACKGROUND_SEMAPHORE = asyncio.Semaphore(3)
+
+# Дополнительные плечи «аэропорты рядом» (search_results) — поверх слота
+# USER_SEARCH_SEMAPHORE: общий потолок, чтобы опция не удваивала нагрузку на API
+NEARBY_LEG_SEMAPHORE = asyncio.Semaphore(4)
+
+# Перебор хабов «Везде» (services/everywhere_engine.py), когда запрос «куда угодно»
+# недоступен: общий потолок на всех пользователей и фоновые проверки вместо
+# пачек по 5 с паузой в каждом поиске; тот же потолок — у месячных календарей
+# «любой город в стране» и гибких дат
+FANOUT_SEMAPHORE = asyncio.Semaphore(5)
@@ -1,17 +1,117 @@
 # utils/cities_loader.py
+import asyncio
+import hashlib
 import json
+import math
+import pickle
+import struct
+import sys
+import time
 import aiohttp
+from array import array
+from bisect import bisect_left
+from heapq import nsmallest
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, NamedTuple, Optional, List
+
+from utils.redis_client import redis_client
 
 CITIES_API_URL = "https://api.travelpayouts.com/data/ru/cities.json"
 CACHE_FILE = Path("data/cities_cache.json")
 CACHE_TTL_SECONDS = 86400 * 7  # 7 дней
+RECORDS_FILE = Path("data/cities_records.jsonl")  # полные записи API по строке на город (get_city_info)
+
+# Дополнительные источники газеттира (см. _gazetteer_tables)
+IATA_MANUAL_FILE = Path("data/iata_manual.json")       # название → IATA, ручной список
+IATA_CSV_FILE = Path("data/cities_IATA_utf8.csv")      # IATA|IATA|название|название_рус
+
+# Снимок готовых таблиц: пересобирается при изменении любого источника (_source_stamp)
+SNAPSHOT_FILE = Path("data/cities_snapshot.bin")
+SNAPSHOT_VERSION = 5           # поднять при изменении состава таблиц или _build_tables
+_SNAPSHOT_MAGIC = b"FSCITY"    # заголовок: magic + версия (uint16) + pickle таблиц
+
+
+class CityRecord(NamedTuple):
+    """
+    Запись города в CITIES_DATA — только поля, которые читает код.
+    Коды стран и часовые пояса интернированы: на тысячи городов их пара сотен.
+    Остальное из дампа API (падежи, переводы) — get_city_info, по строке из RECORDS_FILE.
+    """
+    iata: str
+    name: str
+    country_code: str
+    time_zone: Optional[str]
+    lat: Optional[float]
+    lon: Optional[float]
+
+    def get(self, key: str, default=None):
+        """Совместимость с прежним CITIES_DATA[iata].get(...)."""
+        return getattr(self, key, default) if key in self._fields else default
+
+
+class Place(NamedTuple):
+    """
+    Запись газеттира: город или аэропорт. Для аэропорта metro — код города
+    (SVO → MOW), для города airports — аэропорты из MULTI_AIRPORT_CITIES.
+    """
+    iata: str
+    name: str
+    country_code: str
+    metro: Optional[str]
+    airports: tuple
+    airport_name: Optional[str]
+
 
 # Глобальные словари (заполняются при инициализации)
 CITY_TO_IATA: Dict[str, str] = {}
 IATA_TO_CITY: Dict[str, str] = {}
-CITIES_DATA: Dict[str, dict] = {}
+CITIES_DATA: Dict[str, CityRecord] = {}
+_RECORD_OFFSETS: Dict[str, int] = {}  # IATA → смещение строки города в RECORDS_FILE
+
+# ── Газеттир: все источники городов и аэропортов в двух таблицах ─────────────
+CITY_CASES = ("ro", "da", "vi", "tv", "pr")  # падежи из дампа (кроме именительного su) → NAME_INDEX
+MAX_NAME_WORDS = 4                          # самое длинное название в словах: «сан карлос де барилоче»
+ROUTE_PREPOSITIONS = frozenset({"из", "в", "во", "до", "на", "от", "с", "со"})  # «из Москвы в Стамбул»
+NAME_INDEX: Dict[str, str] = {}    # нормализованное название / падеж / алиас / код → IATA
+CITY_CASE_FORMS: Dict[str, str] = {}  # косвенные падежи из дампа («москвы», «москве») → IATA
+PLACES: Dict[str, Place] = {}      # IATA города или аэропорта → Place
+_GAZETTEER_GENERATION = -1         # CITIES_GENERATION, для которого собран газеттир
+
+# Поколение таблиц: +1 при каждой подмене (старт, фоновое обновление, fallback)
+CITIES_GENERATION = 0
+_CITIES_SOURCE = "empty"                    # snapshot | cache | api | fallback
+_CITIES_FETCHED_AT: Optional[float] = None  # когда данные скачаны из API (mtime кэша)
+_refresh_task: Optional[asyncio.Task] = None
+
+# ── Индекс нечёткого поиска (SymSpell: словарь удалений) ──────────────────────
+FUZZY_MAX_DIST = 2      # для какого max_dist строится индекс (больше — линейный проход)
+FUZZY_PREFIX_LEN = 7    # удаления считаются от префикса названия: память ×2–3 меньше, recall тот же
+
+_FUZZY_NAMES: List[str] = []             # названия в порядке CITY_TO_IATA (он же порядок при равном расстоянии)
+_FUZZY_INDEX: Dict[str, int] = {}        # вариант префикса после ≤ FUZZY_MAX_DIST удалений → номер списка
+_FUZZY_PTR = array("I", [0])              # CSR: номера названий варианта j — _FUZZY_IDS[_FUZZY_PTR[j]:_FUZZY_PTR[j + 1]]
+_FUZZY_IDS = array("I")
+
+# ── Префиксный индекс автокомплита (search_cities) ─────────────────────────────
+_PREFIX_KEYS: List[str] = []    # отсортированные ключи: названия, алиасы и их слова со 2-го («петербург»)
+_PREFIX_NAMES: List[str] = []   # полное нормализованное название для каждого ключа
+_PREFIX_SIZE = 0                # len(CITY_TO_IATA) на момент сборки — признак устаревания
+
+# ── Пространственный индекс (nearby_airports): сетка по широте и долготе ───────
+NEARBY_CELL_DEG = 1.0     # сторона ячейки в градусах (~111 км по широте)
+NEARBY_RADIUS_KM = 250    # «аэропорты рядом» по умолчанию — доехать за 2–3 часа
+NEARBY_MAX_EXTRA = 2      # сколько соседних городов добавлять к каждому концу маршрута
+_LON_CELLS = int(round(360 / NEARBY_CELL_DEG))
+_EARTH_KM = 6371.0
+
+_GEO_GRID: Dict[tuple, List[str]] = {}  # (ячейка широты, ячейка долготы) → IATA городов с координатами
+_GEO_SIZE = -1                          # len(CITIES_DATA) на момент сборки — признак устаревания
+
+CITY_POPULARITY: Dict[str, float] = {}  # IATA → поиски из аналитики (refresh_city_popularity)
+POPULARITY_TTL = 3600                   # сек: как часто search_cities перечитывает популярность
+_POPULARITY_AT: Optional[float] = None  # когда популярность читали из Redis (попытка, не успех)
+_popularity_task: Optional[asyncio.Task] = None
+_HUB_WEIGHT: Dict[str, int] = {}        # IATA → «размер» аэропорта 0–4 (_hub_weights)
 
 # Ручные алиасы (поверх API-данных) — для популярных сокращений
 MANUAL_ALIASES = {
@@ -29,90 +129,339 @@ def _normalize_name(name: str) -> str:
     """Приводит название города к ключу для поиска"""
     return name.lower().strip().replace("ё", "е").replace("-", " ").replace("  ", " ")
 
-async def load_cities_from_api() -> bool:
-    """Загружает города из API Travelpayouts и строит словари"""
-    global CITY_TO_IATA, IATA_TO_CITY, CITIES_DATA
-    
+async def load_cities_from_api(background_refresh: bool = True) -> bool:
+    """
+    Загружает базу городов, не дожидаясь сети: сразу берёт то, что есть
+    (снимок → кэш → fallback из cities.py), а устаревший или отсутствующий
+    кэш обновляет из API в фоне и подменяет таблицы целиком (stale-while-revalidate).
+    background_refresh=False — дождаться обновления (скрипты, ручной запуск).
+    """
     print("=" * 60)
     print("🌍 [CITIES_LOADER] Начало загрузки городов...")
     print("=" * 60)
-    
+
+    loaded = False
+    stale = True
     try:
-        # Проверяем локальный кэш
         print(f"[CITIES_LOADER] Проверяем кэш-файл: {CACHE_FILE}")
         if CACHE_FILE.exists():
-            import time
-            age = time.time() - CACHE_FILE.stat().st_mtime
-            age_hours = age / 3600
-            print(f"[CITIES_LOADER] Возраст кэша: {age_hours:.2f} часов (максимум: {CACHE_TTL_SECONDS/3600:.0f} часов)")
-            
-            if age < CACHE_TTL_SECONDS:
-                print("[CITIES_LOADER] ✅ Кэш актуален, загружаем из файла...")
-                with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                _build_dictionaries(data)
-                print(f"[CITIES_LOADER] ✅ Загружено {len(CITY_TO_IATA)} городов из кэша")
-                print("=" * 60)
-                return True
-            else:
-                print("[CITIES_LOADER] ⚠️ Кэш устарел, обновляем из API...")
+            mtime = CACHE_FILE.stat().st_mtime
+            age = time.time() - mtime
+            stale = age >= CACHE_TTL_SECONDS
+            print(f"[CITIES_LOADER] Возраст кэша: {age / 3600:.2f} часов (максимум: {CACHE_TTL_SECONDS/3600:.0f} часов)")
+
+            t0 = time.perf_counter()
+            tables, source = _load_snapshot(), "snapshot"
+            if tables is None:
+                print("[CITIES_LOADER] 📦 Снимка нет — собираем таблицы из кэша...")
+                tables, source = await asyncio.to_thread(_tables_from_cache), "cache"
+            _swap_tables(tables, source, mtime)
+            loaded = True
+            print(f"[CITIES_LOADER] ✅ Загружено {len(CITY_TO_IATA)} городов ({source}) "
+                  f"за {(time.perf_counter() - t0) * 1000:.0f} мс")
         else:
-            print("[CITIES_LOADER] ⚠️ Кэш-файл не найден, загружаем из API...")
-        
-        # Скачиваем с API
+            print("[CITIES_LOADER] ⚠️ Кэш-файл не найден")
+    except Exception as e:
+        print(f"[CITIES_LOADER] ❌ Ошибка чтения кэша: {e}")
+
+    if not loaded:
+        print("[CITIES_LOADER] 🔄 Пока загружаем fallback из cities.py...")
+        loaded = _load_fallback()
+
+    if stale:
+        if background_refresh:
+            print("[CITIES_LOADER] 🌐 Кэш устарел или отсутствует — обновляем из API в фоне")
+            _schedule_refresh()
+        else:
+            loaded = await refresh_cities() or loaded
+    print("=" * 60)
+    return loaded
+
+
+async def refresh_cities() -> bool:
+    """
+    Скачивает дамп городов, пишет кэш и снимок и подменяет таблицы.
+    Разбор и сборка идут в потоке — бот продолжает отвечать на старых таблицах.
+    При ошибке таблицы не трогаются.
+    """
+    try:
         print(f"[CITIES_LOADER] 🌐 Запрос к API: {CITIES_API_URL}")
         async with aiohttp.ClientSession() as session:
             async with session.get(CITIES_API_URL, timeout=30) as resp:
                 print(f"[CITIES_LOADER] 📡 Статус ответа: {resp.status}")
                 if resp.status != 200:
-                    print(f"[CITIES_LOADER] ❌ Ошибка HTTP {resp.status}")
                     raise Exception(f"HTTP {resp.status}")
                 data = await resp.json()
-                print(f"[CITIES_LOADER] 📦 Получено {len(data)} записей из API")
-        
-        # Сохраняем в кэш
-        print(f"[CITIES_LOADER] 💾 Сохраняем кэш в {CACHE_FILE}")
-        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print("[CITIES_LOADER] ✅ Кэш сохранён")
-        
-        _build_dictionaries(data)
-        print(f"[CITIES_LOADER] ✅ Загружено {len(CITY_TO_IATA)} городов")
-        print(f"[CITIES_LOADER] 📊 IATA кодов: {len(IATA_TO_CITY)}")
-        print(f"[CITIES_LOADER] 📊 Детальных записей: {len(CITIES_DATA)}")
-        print("=" * 60)
+        print(f"[CITIES_LOADER] 📦 Получено {len(data)} записей из API")
+        tables = await asyncio.to_thread(_tables_from_download, data)
+        _swap_tables(tables, "api", time.time())
+        print(f"[CITIES_LOADER] ✅ Таблицы обновлены: {len(CITY_TO_IATA)} городов, поколение {CITIES_GENERATION}")
         return True
-        
     except Exception as e:
-        print(f"[CITIES_LOADER] ❌ Ошибка загрузки: {e}")
-        print("[CITIES_LOADER] 🔄 Пробуем загрузить fallback из cities.py...")
-        return _load_fallback()
+        print(f"[CITIES_LOADER] ❌ Обновление из API не удалось, остаёмся на старых таблицах: {e}")
+        return False
+
+
+def _schedule_refresh() -> None:
+    """Одно фоновое обновление за раз."""
+    global _refresh_task
+    if _refresh_task and not _refresh_task.done():
+        return
+    _refresh_task = asyncio.create_task(refresh_cities())
+
+
+def cities_db_info() -> dict:
+    """Поколение, источник и возраст таблиц — для health check."""
+    return {
+        "generation": CITIES_GENERATION,
+        "source":     _CITIES_SOURCE,
+        "age_sec":    None if _CITIES_FETCHED_AT is None else int(time.time() - _CITIES_FETCHED_AT),
+        "cities":     len(CITY_TO_IATA),
+        "refreshing": bool(_refresh_task and not _refresh_task.done()),
+    }
+
 
 def _load_fallback() -> bool:
     """Загружает города из старого cities.py как fallback"""
-    global CITY_TO_IATA, IATA_TO_CITY, CITIES_DATA
     try:
         print("[CITIES_LOADER] 📦 Загружаем fallback из utils.cities...")
         from utils.cities import CITY_TO_IATA as FALLBACK_C2I, IATA_TO_CITY as FALLBACK_I2C
         CITY_TO_IATA.update(FALLBACK_C2I)
         IATA_TO_CITY.update(FALLBACK_I2C)
+        _build_fuzzy_index()
+        _build_prefix_index()
+        _swap_tables(_gazetteer_tables(CITY_TO_IATA, IATA_TO_CITY, CITIES_DATA, CITY_CASE_FORMS), "fallback", None)
         print(f"[CITIES_LOADER] ✅ Загружено {len(CITY_TO_IATA)} городов из fallback")
-        print("=" * 60)
         return True
     except ImportError as e:
         print(f"[CITIES_LOADER] ❌ Не удалось загрузить fallback: {e}")
-        print("=" * 60)
         return False
 
-def _build_dictionaries(data: List[dict]):
-    """Строит словари из данных API"""
-    global CITY_TO_IATA, IATA_TO_CITY, CITIES_DATA
-    
+
+def _tables_from_cache() -> dict:
+    """Поток: разбор CACHE_FILE, сборка таблиц, запись снимка."""
+    with open(CACHE_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    tables = _build_tables(data)
+    tables["record_offsets"] = _save_records(data, tables["cities_data"])
+    _save_snapshot(tables)
+    return tables
+
+
+def _tables_from_download(data: List[dict]) -> dict:
+    """Поток: сборка таблиц из ответа API, запись кэша и снимка."""
+    tables = _build_tables(data)
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    tmp.replace(CACHE_FILE)
+    print(f"[CITIES_LOADER] 💾 Кэш сохранён в {CACHE_FILE}")
+    tables["record_offsets"] = _save_records(data, tables["cities_data"])
+    _save_snapshot(tables)
+    return tables
+
+
+def _save_records(data: List[dict], cities_data: Dict[str, CityRecord]) -> Dict[str, int]:
+    """
+    Поток: полные записи городов из CITIES_DATA в RECORDS_FILE, по JSON на
+    строку. Возвращает смещения строк — get_city_info читает одну строку,
+    а не весь кэш.
+    """
+    offsets: Dict[str, int] = {}
+    try:
+        RECORDS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = RECORDS_FILE.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            for city in data:
+                iata = city.get("code")
+                if iata in cities_data and iata not in offsets:
+                    offsets[iata] = f.tell()
+                    f.write(json.dumps(city, ensure_ascii=False).encode("utf-8") + b"\n")
+        tmp.replace(RECORDS_FILE)
+    except Exception as e:
+        print(f"[CITIES_LOADER] ⚠️ Записи городов не сохранены: {e}")
+        return {}
+    return offsets
+
+
+def _install_tables(tables: dict) -> None:
+    """
+    Кладёт готовые таблицы в глобальные словари. Без await внутри — для
+    корутин подмена атомарна. Словари меняются на месте: хендлеры
+    импортировали их по ссылке.
+    """
+    global _FUZZY_INDEX, _PREFIX_SIZE
+    for target, key in ((CITY_TO_IATA, "city_to_iata"), (IATA_TO_CITY, "iata_to_city"),
+                        (CITIES_DATA, "cities_data")):
+        if key in tables:
+            target.clear()
+            target.update(tables[key])
+    if "cities_data" in tables:
+        _RECORD_OFFSETS.clear()
+        _RECORD_OFFSETS.update(tables.get("record_offsets", {}))
+        _build_geo_index()
+    if "fuzzy_index" in tables:
+        _FUZZY_NAMES[:] = tables["fuzzy_names"]
+        _FUZZY_INDEX = tables["fuzzy_index"]
+        _FUZZY_PTR[:] = tables["fuzzy_ptr"]
+        _FUZZY_IDS[:] = tables["fuzzy_ids"]
+    if "prefix_keys" in tables:
+        _PREFIX_KEYS[:] = tables["prefix_keys"]
+        _PREFIX_NAMES[:] = tables["prefix_names"]
+        _PREFIX_SIZE = len(CITY_TO_IATA)
+        _HUB_WEIGHT.clear()
+        _HUB_WEIGHT.update(_hub_weights())
+    if "case_forms" in tables:
+        CITY_CASE_FORMS.clear()
+        CITY_CASE_FORMS.update(tables["case_forms"])
+    if "name_index" in tables:
+        NAME_INDEX.clear()
+        NAME_INDEX.update(tables["name_index"])
+        PLACES.clear()
+        PLACES.update(tables["places"])
+
+
+def _swap_tables(tables: dict, source: str, fetched_at: Optional[float]) -> None:
+    """
+    Подмена всех таблиц новым поколением. Газеттир собирается вместе с
+    остальными таблицами (в потоке у refresh_cities) и приходит в tables.
+    """
+    global CITIES_GENERATION, _CITIES_SOURCE, _CITIES_FETCHED_AT, _GAZETTEER_GENERATION
+    _install_tables(tables)
+    CITIES_GENERATION += 1
+    if "name_index" in tables:
+        _GAZETTEER_GENERATION = CITIES_GENERATION
+    _CITIES_SOURCE, _CITIES_FETCHED_AT = source, fetched_at
+
+
+def _source_stamp() -> list:
+    """
+    Отпечаток всех источников таблиц: (mtime_ns, size) CACHE_FILE,
+    IATA_MANUAL_FILE и IATA_CSV_FILE плюс хэш таблиц из кода — MANUAL_ALIASES,
+    utils/cities.py и аэропортов из flight_constants. Снимок действителен,
+    пока отпечаток тот же.
+    """
+    from handlers.flight_constants import AIRPORT_NAMES, AIRPORT_TO_METRO, MULTI_AIRPORT_CITIES
+    from utils.cities import CITY_TO_IATA as FALLBACK_C2I
+
+    stamp = []
+    for path in (CACHE_FILE, IATA_MANUAL_FILE, IATA_CSV_FILE):
+        try:
+            st = path.stat()
+            stamp.append([st.st_mtime_ns, st.st_size])
+        except OSError:
+            stamp.append(None)  # файла нет — тоже состояние источника
+    in_code = (MANUAL_ALIASES, FALLBACK_C2I, AIRPORT_NAMES, AIRPORT_TO_METRO, MULTI_AIRPORT_CITIES)
+    stamp.append(hashlib.sha1(repr([sorted(t.items()) for t in in_code]).encode()).hexdigest())
+    return stamp
+
+
+def _save_snapshot(tables: dict) -> None:
+    """
+    Сохраняет готовые таблицы (словари и индексы поиска) в SNAPSHOT_FILE.
+    Пишется во временный файл и переименовывается — читатель не увидит половину.
+    """
+    try:
+        payload = {
+            "source": _source_stamp(),
+            "city_to_iata": tables["city_to_iata"],
+            "iata_to_city": tables["iata_to_city"],
+            "cities_data":  [tuple(r) for r in tables["cities_data"].values()],
+            "fuzzy_names":  tables["fuzzy_names"],
+            # CSR без Python-списков: 100k+ вариантов читаются за миллисекунды
+            "fuzzy_keys":   "\0".join(tables["fuzzy_index"]),
+            "fuzzy_ptr":    tables["fuzzy_ptr"].tobytes(),
+            "fuzzy_ids":    tables["fuzzy_ids"].tobytes(),
+            "prefix_keys":  "\0".join(tables["prefix_keys"]),
+            "prefix_names": "\0".join(tables["prefix_names"]),
+            "case_forms":   tables["case_forms"],
+            "name_index":   tables["name_index"],
+            "places":       [tuple(p) for p in tables["places"].values()],
+            "record_offsets": tables.get("record_offsets", {}),
+        }
+        tmp = SNAPSHOT_FILE.with_suffix(".tmp")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(_SNAPSHOT_MAGIC + struct.pack(">H", SNAPSHOT_VERSION))
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(SNAPSHOT_FILE)
+        print(f"[CITIES_LOADER] 💾 Снимок таблиц сохранён: {SNAPSHOT_FILE} ({SNAPSHOT_FILE.stat().st_size // 1024} КБ)")
+    except Exception as e:
+        print(f"[CITIES_LOADER] ⚠️ Снимок не сохранён: {e}")
+
+
+def _load_snapshot() -> Optional[dict]:
+    """
+    Таблицы из SNAPSHOT_FILE, если он той же версии и снят с тех же
+    источников (_source_stamp); иначе None.
+    """
+    if not SNAPSHOT_FILE.exists():
+        return None
+    try:
+        with open(SNAPSHOT_FILE, "rb") as f:
+            header = f.read(len(_SNAPSHOT_MAGIC) + 2)
+            if header[:len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+                return None
+            if struct.unpack(">H", header[len(_SNAPSHOT_MAGIC):])[0] != SNAPSHOT_VERSION:
+                print("[CITIES_LOADER] ⚠️ Снимок другой версии — пересобираем")
+                return None
+            payload = pickle.load(f)
+        if payload["source"] != _source_stamp():
+            print("[CITIES_LOADER] ⚠️ Источники таблиц изменились — пересобираем снимок")
+            return None
+    except Exception as e:
+        print(f"[CITIES_LOADER] ⚠️ Снимок не прочитан: {e}")
+        return None
+
+    def _split(joined: str) -> List[str]:
+        return joined.split("\0") if joined else []
+
+    fuzzy_keys = _split(payload["fuzzy_keys"])
+    return {
+        "city_to_iata": payload["city_to_iata"],
+        "iata_to_city": payload["iata_to_city"],
+        "cities_data":  {r[0]: CityRecord._make(r) for r in payload["cities_data"]},
+        "fuzzy_names":  payload["fuzzy_names"],
+        "fuzzy_index":  dict(zip(fuzzy_keys, range(len(fuzzy_keys)))),
+        "fuzzy_ptr":    array("I", payload["fuzzy_ptr"]),
+        "fuzzy_ids":    array("I", payload["fuzzy_ids"]),
+        "prefix_keys":  _split(payload["prefix_keys"]),
+        "prefix_names": _split(payload["prefix_names"]),
+        "case_forms":   payload["case_forms"],
+        "name_index":   payload["name_index"],
+        "places":       {p[0]: Place._make(p) for p in payload["places"]},
+        "record_offsets": payload["record_offsets"],
+    }
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else None
+
+
+def _city_record(iata: str, name: str, city: dict) -> CityRecord:
+    coords = city.get("coordinates") or {}
+    lat, lon = coords.get("lat"), coords.get("lon")
+    return CityRecord(
+        iata=sys.intern(iata),
+        name=name,
+        country_code=_intern(city.get("country_code")) or "",
+        time_zone=_intern(city.get("time_zone")),
+        lat=None if lat is None else float(lat),
+        lon=None if lon is None else float(lon),
+    )
+
+
+def _build_tables(data: List[dict]) -> dict:
+    """
+    Строит все таблицы из данных API в новых объектах, не трогая текущие —
+    можно вызывать из потока, пока бот работает на старых.
+    """
     print("[CITIES_LOADER] 🔨 Построение словарей...")
-    CITY_TO_IATA.clear()
-    IATA_TO_CITY.clear()
-    CITIES_DATA.clear()
+    city_to_iata: Dict[str, str] = {}
+    iata_to_city: Dict[str, str] = {}
+    cities_data: Dict[str, dict] = {}
+    case_forms: Dict[str, str] = {}
     
     skipped_no_airport = 0
     skipped_no_code = 0
@@ -138,25 +487,32 @@ def _build_dictionaries(data: List[dict]):
         
         # Основной маппинг
         norm_name = _normalize_name(name)
-        CITY_TO_IATA[norm_name] = iata
-        IATA_TO_CITY[iata] = name
-        CITIES_DATA[iata] = city
+        city_to_iata[norm_name] = iata
+        iata_to_city[iata] = name
+        cities_data[iata] = _city_record(iata, name, city)
         processed += 1
         
         # Добавляем английское название как алиас
         en_name = city.get("name_translations", {}).get("en")
         if en_name:
-            CITY_TO_IATA[_normalize_name(en_name)] = iata
+            city_to_iata[_normalize_name(en_name)] = iata
+
+        # Косвенные падежи («из Москвы», «в Москве») — только в газеттир,
+        # нечёткий поиск и автокомплит работают по именительному
+        for case in CITY_CASES:
+            form = city.get("cases", {}).get(case)
+            if form:
+                case_forms.setdefault(_normalize_name(form), iata)
     
     # Добавляем ручные алиасы (перезаписывают API, если есть конфликт)
     manual_added = 0
     for alias, iata in MANUAL_ALIASES.items():
         norm_alias = _normalize_name(alias)
-        if norm_alias not in CITY_TO_IATA:
-            CITY_TO_IATA[norm_alias] = iata
+        if norm_alias not in city_to_iata:
+            city_to_iata[norm_alias] = iata
             manual_added += 1
-        if iata not in IATA_TO_CITY:
-            IATA_TO_CITY[iata] = alias.capitalize()
+        if iata not in iata_to_city:
+            iata_to_city[iata] = alias.capitalize()
             manual_added += 1
     
     print(f"[CITIES_LOADER] 📊 Обработано: {processed}")
@@ -164,15 +520,153 @@ def _build_dictionaries(data: List[dict]):
     print(f"[CITIES_LOADER] 📊 Пропущено (нет кода): {skipped_no_code}")
     print(f"[CITIES_LOADER] 📊 Пропущено (нет названия): {skipped_no_name}")
     print(f"[CITIES_LOADER] 📊 Добавлено ручных алиасов: {manual_added}")
+    tables = {"city_to_iata": city_to_iata, "iata_to_city": iata_to_city, "cities_data": cities_data,
+              "case_forms": case_forms}
+    tables.update(_fuzzy_tables(city_to_iata))
+    tables.update(_prefix_tables(city_to_iata))
+    tables.update(_gazetteer_tables(city_to_iata, iata_to_city, cities_data, case_forms))
+    return tables
+
+
+def _read_extra_names() -> List[tuple]:
+    """(название, IATA) из data/iata_manual.json и data/cities_IATA_utf8.csv."""
+    pairs = []
+    try:
+        with open(IATA_MANUAL_FILE, "r", encoding="utf-8") as f:
+            pairs.extend(json.load(f).items())
+    except (OSError, ValueError) as e:
+        print(f"[CITIES_LOADER] ⚠️ {IATA_MANUAL_FILE} не прочитан: {e}")
+    try:
+        for row in IATA_CSV_FILE.read_text(encoding="utf-8-sig").splitlines()[1:]:
+            parts = row.split("|")
+            if len(parts) >= 4 and len(parts[0]) == 3 and parts[0].isalpha():
+                for name in {parts[2], parts[3]} - {""}:
+                    pairs.append((name, parts[0]))
+    except OSError as e:
+        print(f"[CITIES_LOADER] ⚠️ {IATA_CSV_FILE} не прочитан: {e}")
+    return pairs
+
+
+def _gazetteer_tables(city_to_iata: Dict[str, str], iata_to_city: Dict[str, str],
+                      cities_data: Dict[str, CityRecord], case_forms: Dict[str, str]) -> dict:
+    """
+    Сводит все источники городов и аэропортов в два словаря, чтобы
+    разрешение названия было одним обращением:
+      name_index — название → IATA. Приоритет: дамп API и MANUAL_ALIASES,
+                   затем падежи из дампа, utils/cities.py, iata_manual.json, CSV, названия
+                   аэропортов; последними — сами коды известных мест («mow», «svo»)
+      places     — IATA → Place: название, страна, метро и аэропорты
+                   (MULTI_AIRPORT_CITIES, AIRPORT_TO_METRO, AIRPORT_NAMES)
+    """
+    from handlers.flight_constants import AIRPORT_NAMES, AIRPORT_TO_METRO, MULTI_AIRPORT_CITIES
+    from utils.cities import CITY_TO_IATA as FALLBACK_C2I
+
+    name_index = dict(city_to_iata)
+    for form, iata in case_forms.items():
+        name_index.setdefault(form, iata)
+    for name, iata in list(FALLBACK_C2I.items()) + _read_extra_names():
+        name_index.setdefault(_normalize_name(name), iata)
+
+    places: Dict[str, Place] = {}
+    codes = set(iata_to_city) | set(MULTI_AIRPORT_CITIES) | set(AIRPORT_TO_METRO) | set(AIRPORT_NAMES)
+    for code in codes:
+        metro = AIRPORT_TO_METRO.get(code)
+        if metro == code:
+            metro = None  # IST, BKK — город и аэропорт с одним кодом
+        city = cities_data.get(code) or cities_data.get(metro or "")
+        places[code] = Place(
+            iata=code,
+            name=iata_to_city.get(code) or AIRPORT_NAMES.get(code) or iata_to_city.get(metro or "") or code,
+            country_code=city.country_code if city else "",
+            metro=metro,
+            airports=tuple(MULTI_AIRPORT_CITIES.get(code, ())),
+            airport_name=AIRPORT_NAMES.get(code),
+        )
+    for code, label in [ap for aps in MULTI_AIRPORT_CITIES.values() for ap in aps] + list(AIRPORT_NAMES.items()):
+        name_index.setdefault(_normalize_name(label.split(" (")[0]), code)  # «шереметьево» → SVO
+    for code in places:
+        name_index.setdefault(code.lower(), code)
+    print(f"[CITIES_LOADER] 📊 Газеттир: {len(name_index)} названий, {len(places)} мест")
+    return {"name_index": name_index, "places": places}
+
+
+def _build_gazetteer() -> None:
+    """
+    Пересобирает газеттир по текущим словарям. Читает файлы — загрузчики
+    сюда не ходят, газеттир приходит к ним готовым из _build_tables.
+    """
+    global _GAZETTEER_GENERATION
+    _install_tables(_gazetteer_tables(CITY_TO_IATA, IATA_TO_CITY, CITIES_DATA, CITY_CASE_FORMS))
+    _GAZETTEER_GENERATION = CITIES_GENERATION
+
+
+def _ensure_gazetteer() -> None:
+    """Газеттир текущего поколения; пересборка — только если таблицы подменили без него."""
+    if _GAZETTEER_GENERATION != CITIES_GENERATION:
+        _build_gazetteer()
+
+
+def _strip_preposition(norm: str) -> str:
+    """«из москвы» → «москвы»; без предлога строка возвращается как есть."""
+    head, _, rest = norm.partition(" ")
+    return rest if rest and head in ROUTE_PREPOSITIONS else norm
+
+
+def _place(iata: str) -> Place:
+    return PLACES.get(iata) or Place(iata, IATA_TO_CITY.get(iata, iata), "", None, (), None)
+
+
+def resolve_place(text: str) -> Optional[Place]:
+    """
+    Название в любом падеже, алиас или код города/аэропорта → Place.
+    Одно обращение к NAME_INDEX (второе — без предлога: «в Стамбул»).
+    """
+    if not text:
+        return None
+    _ensure_gazetteer()
+    norm = _normalize_name(text)
+    iata = NAME_INDEX.get(norm) or NAME_INDEX.get(_strip_preposition(norm))
+    return _place(iata) if iata else None
+
+
+def segment_places(words: List[str], keywords: tuple = ()) -> Optional[List[str]]:
+    """
+    Делит слова маршрута на названия мест за один проход слева направо:
+    в каждой позиции берётся самое длинное (до MAX_NAME_WORDS слов) название
+    из NAME_INDEX, предлоги пропускаются, слова из keywords («везде»)
+    становятся отдельными сегментами. Возвращает фразы в исходном написании
+    или None, если какое-то слово не распознано.
+        ["из", "Москвы", "в", "Стамбул"] → ["Москвы", "Стамбул"]
+    """
+    _ensure_gazetteer()
+    norms = [_normalize_name(w) for w in words]
+    out, i, n = [], 0, len(words)
+    while i < n:
+        if norms[i] in keywords:
+            out.append(words[i])
+            i += 1
+            continue
+        for size in range(min(MAX_NAME_WORDS, n - i), 0, -1):
+            if " ".join(norms[i:i + size]) in NAME_INDEX:
+                out.append(" ".join(words[i:i + size]))
+                i += size
+                break
+        else:
+            if norms[i] not in ROUTE_PREPOSITIONS:
+                return None
+            i += 1
+    return out
+
 
 def get_iata(city_name: str) -> Optional[str]:
-    """Возвращает IATA-код по названию города"""
+    """Возвращает IATA-код по названию города (через газеттир: все источники сразу)"""
     if not city_name:
         print(f"[CITIES_LOADER] [get_iata] ⚠️ Пустое название города")
         return None
     
     norm = _normalize_name(city_name)
-    result = CITY_TO_IATA.get(norm)
+    _ensure_gazetteer()
+    result = NAME_INDEX.get(norm)
     
     if result:
         print(f"[CITIES_LOADER] [get_iata] ✅ '{city_name}' → '{result}'")
@@ -197,20 +691,69 @@ def _levenshtein(a: str, b: str) -> int:
     return prev[-1]
 
 
-def fuzzy_get_iata(city_name: str, max_dist: int = 2) -> tuple[Optional[str], Optional[str]]:
+def _deletes(word: str, depth: int) -> set:
+    """Все варианты слова после удаления не более depth символов (включая само слово)."""
+    out, frontier = {word}, {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _fuzzy_tables(city_to_iata: Dict[str, str]) -> dict:
     """
-    Нечёткий поиск города: исправляет опечатки типа «масква» → «Москва».
+    Словарь удалений для fuzzy_get_iata.
 
-    Возвращает (iata, правильное_название) или (None, None).
-    max_dist=2 ловит большинство опечаток не давая ложных срабатываний.
+    Если расстояние Левенштейна между запросом и названием ≤ k, то у их
+    префиксов есть общий вариант после ≤ k удалений с каждой стороны —
+    поэтому кандидаты находятся поиском по словарю, а точное расстояние
+    считается только для них (обычно десяток названий вместо всех).
     """
-    if not city_name or not CITY_TO_IATA:
-        return None, None
+    names = list(city_to_iata)
+    buckets: Dict[str, List[int]] = {}
+    for i, name in enumerate(names):
+        for variant in _deletes(name[:FUZZY_PREFIX_LEN], FUZZY_MAX_DIST):
+            buckets.setdefault(variant, []).append(i)
+
+    index, ptr, ids = {}, [0], []
+    for slot, (variant, postings) in enumerate(buckets.items()):
+        index[variant] = slot
+        ids.extend(postings)
+        ptr.append(len(ids))
+    print(f"[CITIES_LOADER] 📊 Индекс нечёткого поиска: {len(names)} названий, {len(index)} вариантов")
+    return {"fuzzy_names": names, "fuzzy_index": index,
+            "fuzzy_ptr": array("I", ptr), "fuzzy_ids": array("I", ids)}
+
+
+def _build_fuzzy_index() -> None:
+    """Пересобирает индекс нечёткого поиска по текущему CITY_TO_IATA."""
+    _install_tables(_fuzzy_tables(CITY_TO_IATA))
 
-    q = _normalize_name(city_name)
-    if len(q) < 3:
-        return None, None
 
+def _levenshtein_within(a: str, b: str, k: int) -> int:
+    """
+    Расстояние Левенштейна, если оно ≤ k, иначе k + 1.
+    Считается только полоса |i − j| ≤ k и обрывается, как только вся строка > k.
+    """
+    if abs(len(a) - len(b)) > k:
+        return k + 1
+    inf = k + 1
+    prev = [j if j <= k else inf for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - k), min(len(b), i + k)
+        curr = [inf] * (len(b) + 1)
+        if i <= k:
+            curr[0] = i
+        for j in range(lo, hi + 1):
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+        if min(curr[lo - 1:hi + 1]) > k:
+            return inf
+        prev = curr
+    return min(prev[-1], inf)
+
+
+def _fuzzy_scan(q: str, max_dist: int) -> tuple[Optional[str], Optional[str], int]:
+    """Линейный проход по всем названиям (для max_dist больше, чем покрывает индекс)."""
     best_iata  = None
     best_name  = None
     best_dist  = max_dist + 1
@@ -225,6 +768,56 @@ def fuzzy_get_iata(city_name: str, max_dist: int = 2) -> tuple[Optional[str], Op
             best_dist = d
             best_iata = iata
             best_name = IATA_TO_CITY.get(iata, norm_city.capitalize())
+    return best_iata, best_name, best_dist
+
+
+def _fuzzy_lookup(q: str, max_dist: int) -> tuple[Optional[str], Optional[str], int]:
+    """Тот же результат, что _fuzzy_scan: минимальное расстояние, при равенстве — первое в CITY_TO_IATA."""
+    if len(_FUZZY_NAMES) != len(CITY_TO_IATA):
+        _build_fuzzy_index()  # словарь дополнили мимо загрузчика
+    if q in CITY_TO_IATA:
+        iata = CITY_TO_IATA[q]
+        return iata, IATA_TO_CITY.get(iata, q.capitalize()), 0
+    candidates = set()
+    for variant in _deletes(q[:FUZZY_PREFIX_LEN], max_dist):
+        slot = _FUZZY_INDEX.get(variant)
+        if slot is not None:
+            candidates.update(_FUZZY_IDS[_FUZZY_PTR[slot]:_FUZZY_PTR[slot + 1]])
+
+    best_idx, best_dist = -1, max_dist + 1
+    for i in sorted(candidates):
+        norm_city = _FUZZY_NAMES[i]
+        if abs(len(norm_city) - len(q)) > 4 or norm_city not in CITY_TO_IATA:
+            continue
+        d = _levenshtein_within(q, norm_city, best_dist - 1)
+        if d < best_dist:
+            best_idx, best_dist = i, d
+    if best_idx < 0:
+        return None, None, best_dist
+    norm_city = _FUZZY_NAMES[best_idx]
+    iata = CITY_TO_IATA[norm_city]
+    return iata, IATA_TO_CITY.get(iata, norm_city.capitalize()), best_dist
+
+
+def fuzzy_get_iata(city_name: str, max_dist: int = 2) -> tuple[Optional[str], Optional[str]]:
+    """
+    Нечёткий поиск города: исправляет опечатки типа «масква» → «Москва».
+
+    Возвращает (iata, правильное_название) или (None, None).
+    max_dist=2 ловит большинство опечаток не давая ложных срабатываний.
+    Кандидаты берутся из индекса удалений (_build_fuzzy_index), а не перебором.
+    """
+    if not city_name or not CITY_TO_IATA:
+        return None, None
+
+    q = _normalize_name(city_name)
+    if len(q) < 3:
+        return None, None
+
+    if max_dist <= FUZZY_MAX_DIST:
+        best_iata, best_name, best_dist = _fuzzy_lookup(q, max_dist)
+    else:
+        best_iata, best_name, best_dist = _fuzzy_scan(q, max_dist)
 
     if best_iata:
         print(f"[CITIES_LOADER] [fuzzy_get_iata] '{city_name}' → '{best_name}' ({best_iata}), dist={best_dist}")
@@ -248,6 +841,7 @@ def get_city_name(iata: str) -> Optional[str]:
 
 # ── Словарь стран: русское название → ISO-код + топ-4 города ─────────────────
 # Топовые города выбраны по популярности авиамаршрутов из России
+COUNTRY_POOL_MAX = 12  # кандидатов для «любой город в стране» (country_candidates)
 COUNTRY_TOP_CITIES: Dict[str, List[str]] = {
     # IATA-коды топ-городов по странам
     "AE": ["DXB", "AUH", "SHJ", "RKT"],   # ОАЭ
@@ -371,14 +965,74 @@ COUNTRY_NAME_TO_ISO: Dict[str, str] = {
 }
 
 
+_VOWELS = "аеёиоуыэюя"
+_MASCULINE_SOFT = frozenset({"израиль"})  # мужской род на «ь»; остальные («беларусь») — женский
+_IRREGULAR_CASES = {                       # беглая гласная: по окончанию не вывести
+    "египет": ("египта", "египту", "египтом", "египте"),
+}
+
+
+def _country_case_forms(name: str) -> List[str]:
+    """
+    Косвенные падежи названия страны по окончанию последнего слова:
+    турция → турции/турцию/турцией, китай → китая/китаю/китаем/китае,
+    израиль → израиля/израилю/израилем/израиле. Несклоняемые (оаэ, марокко),
+    аббревиатуры (сша: без гласных до последней буквы) и прилагательные
+    («южная») не трогаем.
+    """
+    head, _, last = name.rpartition(" ")
+    prefix = f"{head} " if head else ""
+    if last in _IRREGULAR_CASES:
+        return [prefix + form for form in _IRREGULAR_CASES[last]]
+    if not any(ch in _VOWELS for ch in last[:-1]):
+        return []
+    if last.endswith("ия"):
+        stem, endings = last[:-1], ("и", "ю", "ей")   # Турции — и род., и предл.
+    elif last.endswith("я"):
+        stem, endings = last[:-1], ("и", "ю", "ей", "е")
+    elif last.endswith("а"):
+        stem = last[:-1]
+        endings = ("и" if stem[-1:] in "гкхжшщч" else "ы", "е", "у", "ой")
+    elif last.endswith("ы"):
+        stem, endings = last[:-1], ("", "ам", "ах", "ами")
+    elif last.endswith("й"):
+        stem, endings = last[:-1], ("я", "ю", "ем", "е")
+    elif last.endswith("ь") and last in _MASCULINE_SOFT:
+        stem, endings = last[:-1], ("я", "ю", "ем", "е")
+    elif last.endswith("ь"):
+        stem, endings = last[:-1], ("и", "ью")
+    elif last[-1:] and last[-1] not in _VOWELS:
+        stem, endings = last, ("а", "у", "ом", "е")
+    else:
+        return []
+    return [prefix + stem + end for end in endings]
+
+
+def _build_country_index() -> Dict[str, str]:
+    """Алиасы COUNTRY_NAME_TO_ISO и их падежи → ISO (явные алиасы важнее форм)."""
+    index = {_normalize_name(name): iso for name, iso in COUNTRY_NAME_TO_ISO.items()}
+    for name, iso in list(index.items()):
+        for form in _country_case_forms(name):
+            index.setdefault(form, iso)
+    return index
+
+
+COUNTRY_INDEX: Dict[str, str] = _build_country_index()  # «турции», «в турцию» → TR
+
+
+def resolve_country(text: str) -> Optional[str]:
+    """Название страны в любом падеже (можно с предлогом) → ISO-код или None."""
+    norm = _normalize_name(text or "")
+    return COUNTRY_INDEX.get(norm) or COUNTRY_INDEX.get(_strip_preposition(norm))
+
+
 def get_country_cities(country_name: str) -> List[dict]:
     """
     По названию страны возвращает список топ-городов (до 4).
     Каждый элемент: {"iata": "BKK", "name": "Бангкок"}
     Возвращает [] если страна не найдена.
     """
-    norm = _normalize_name(country_name)
-    iso = COUNTRY_NAME_TO_ISO.get(norm)
+    iso = resolve_country(country_name)
     if not iso:
         return []
 
@@ -408,17 +1062,195 @@ def get_country_cities(country_name: str) -> List[dict]:
     return result
 
 
+def country_candidates(iso: str, limit: int = COUNTRY_POOL_MAX) -> List[str]:
+    """
+    Города страны для поиска «любой город в стране»: сначала COUNTRY_TOP_CITIES,
+    затем остальные из CITIES_DATA по популярности. Какие из них опрашивать —
+    решает services/hub_selector.
+    """
+    top = COUNTRY_TOP_CITIES.get(iso, [])
+    others = sorted(
+        (c for c, rec in CITIES_DATA.items() if rec.country_code == iso and c not in top),
+        key=lambda c: -CITY_POPULARITY.get(c, 0.0),
+    )
+    return (top + others)[:limit]
+
+
+def _raw_city(iata: str) -> Optional[dict]:
+    """
+    Полная запись города: одна строка RECORDS_FILE по смещению из
+    _RECORD_OFFSETS. Файла нет или он от другого поколения — None.
+    """
+    offset = _RECORD_OFFSETS.get(iata)
+    if offset is None:
+        return None
+    try:
+        with open(RECORDS_FILE, "rb") as f:
+            f.seek(offset)
+            city = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return city if city.get("code") == iata else None
+
+
 def get_city_info(iata: str) -> Optional[dict]:
-    """Возвращает полную информацию о городе по IATA"""
-    result = CITIES_DATA.get(iata)
+    """Возвращает полную информацию о городе по IATA (запись API целиком)"""
+    result = _raw_city(iata) or (CITIES_DATA[iata]._asdict() if iata in CITIES_DATA else None)
     if result:
         print(f"[CITIES_LOADER] [get_city_info] ✅ '{iata}' → найдено ({len(result)} полей)")
     else:
         print(f"[CITIES_LOADER] [get_city_info] ❌ '{iata}' → не найдено")
     return result
 
+def get_city_timezone(iata: str) -> Optional[str]:
+    """Часовой пояс города (IANA, например 'Asia/Novosibirsk') из данных API"""
+    rec = CITIES_DATA.get(iata)
+    return rec.time_zone if rec else None
+
+def _geo_cell(lat: float, lon: float) -> tuple:
+    return int(math.floor(lat / NEARBY_CELL_DEG)), int(math.floor(lon / NEARBY_CELL_DEG)) % _LON_CELLS
+
+
+def _build_geo_index() -> None:
+    """Раскладывает города CITIES_DATA по ячейкам сетки (несколько мс на всю базу)."""
+    global _GEO_SIZE
+    grid: Dict[tuple, List[str]] = {}
+    for iata, rec in CITIES_DATA.items():
+        if rec.lat is not None and rec.lon is not None:
+            grid.setdefault(_geo_cell(rec.lat, rec.lon), []).append(iata)
+    _GEO_GRID.clear()
+    _GEO_GRID.update(grid)
+    _GEO_SIZE = len(CITIES_DATA)
+
+
+def _distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу (гаверсинус)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    h = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * _EARTH_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def nearby_airports(iata: str, radius_km: float = NEARBY_RADIUS_KM,
+                    limit: int = NEARBY_MAX_EXTRA) -> List[tuple]:
+    """
+    Ближайшие города с лётным аэропортом в радиусе radius_km:
+    [(IATA, км), ...] по возрастанию расстояния. Сам город, его метро
+    и аэропорты метро (SVO для MOW) не возвращаются.
+    Просматриваются только ячейки сетки, накрывающие круг.
+    """
+    if _GEO_SIZE != len(CITIES_DATA):
+        _build_geo_index()  # словарь дополнили мимо загрузчика
+    place = PLACES.get(iata)
+    center = place.metro if place and place.metro else iata
+    rec = CITIES_DATA.get(center)
+    if not rec or rec.lat is None or rec.lon is None:
+        return []
+    metro = PLACES.get(center)
+    skip = {iata, center} | {code for code, _ in (metro.airports if metro else ())}
+
+    dlat = radius_km / 111.2
+    lat_lo, lat_hi = _geo_cell(rec.lat - dlat, 0)[0], _geo_cell(rec.lat + dlat, 0)[0]
+    widest = min(89.9, abs(rec.lat) + dlat)
+    dlon = radius_km / (111.32 * math.cos(math.radians(widest)))
+    if dlon >= 180:
+        lon_cells = range(_LON_CELLS)
+    else:
+        lon_cells = {c % _LON_CELLS for c in range(int(math.floor((rec.lon - dlon) / NEARBY_CELL_DEG)),
+                                                     int(math.floor((rec.lon + dlon) / NEARBY_CELL_DEG)) + 1)}
+    found = []
+    for lat_cell in range(lat_lo, lat_hi + 1):
+        for lon_cell in lon_cells:
+            for code in _GEO_GRID.get((lat_cell, lon_cell), ()):
+                if code in skip:
+                    continue
+                other = CITIES_DATA[code]
+                km = _distance_km(rec.lat, rec.lon, other.lat, other.lon)
+                if km <= radius_km:
+                    found.append((code, round(km)))
+    return nsmallest(limit, found, key=lambda item: (item[1], item[0]))
+
+
+def _prefix_tables(city_to_iata: Dict[str, str]) -> dict:
+    """
+    Отсортированный массив ключей для поиска по префиксу через bisect.
+    Ключ — нормализованное название или алиас, а для составных названий ещё
+    и каждое слово со второго: «петер» находит «санкт петербург».
+    """
+    pairs = []
+    for name in city_to_iata:
+        words = name.split(" ")
+        pairs.append((name, name))
+        for i in range(1, len(words)):
+            if words[i]:
+                pairs.append((" ".join(words[i:]), name))
+    pairs.sort()
+    return {"prefix_keys": [k for k, _ in pairs], "prefix_names": [n for _, n in pairs]}
+
+
+def _build_prefix_index() -> None:
+    """Пересобирает префиксный индекс по текущему CITY_TO_IATA."""
+    _install_tables(_prefix_tables(CITY_TO_IATA))
+
+
+def _hub_weights() -> Dict[str, int]:
+    """
+    Размер аэропорта: в cities.json его нет, поэтому берём место города
+    в COUNTRY_TOP_CITIES (первый в стране — крупнейший) и ручные алиасы.
+    """
+    weights = {iata: 4 for iata in MANUAL_ALIASES.values()}
+    for cities in COUNTRY_TOP_CITIES.values():
+        for pos, iata in enumerate(cities):
+            weights[iata] = max(weights.get(iata, 0), 4 - pos)
+    return weights
+
+
+def set_city_popularity(scores: Dict[str, float]) -> None:
+    """
+    Популярность городов из аналитики. Ключи — IATA или названия городов
+    (в analytics:*_cities пишутся и те и другие) — приводятся к IATA.
+    """
+    CITY_POPULARITY.clear()
+    for member, score in scores.items():
+        iata = member if member in IATA_TO_CITY else CITY_TO_IATA.get(_normalize_name(member))
+        if iata:
+            CITY_POPULARITY[iata] = CITY_POPULARITY.get(iata, 0.0) + score
+    print(f"[CITIES_LOADER] 📊 Популярность городов: {len(CITY_POPULARITY)} из аналитики")
+
+
+async def refresh_city_popularity() -> None:
+    """
+    Перечитывает популярность из Redis: при старте после загрузки городов
+    и раз в POPULARITY_TTL из search_cities — у каждого процесса своя копия.
+    """
+    global _POPULARITY_AT
+    _POPULARITY_AT = time.time()
+    try:
+        set_city_popularity(await redis_client.get_city_popularity())
+    except Exception as e:
+        print(f"[CITIES_LOADER] ⚠️ Популярность городов не обновлена: {e}")
+
+
+def _schedule_popularity_refresh() -> None:
+    """Фоновое обновление популярности, если она старше POPULARITY_TTL (одно за раз)."""
+    global _POPULARITY_AT, _popularity_task
+    if _POPULARITY_AT is not None and time.time() - _POPULARITY_AT < POPULARITY_TTL:
+        return
+    if _popularity_task and not _popularity_task.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # вызов вне event loop (скрипты, тесты) — обновлять некому
+    _POPULARITY_AT = time.time()  # не плодим задачи, пока первая не стартовала
+    _popularity_task = loop.create_task(refresh_city_popularity())
+
+
 def search_cities(query: str, limit: int = 10) -> List[dict]:
-    """Поиск городов по подстроке (для автокомплита)"""
+    """
+    Автокомплит: города, у которых название, алиас или слово в названии
+    начинается с запроса. Сначала точное совпадение, затем по популярности
+    в поиске, размеру аэропорта и длине названия.
+    """
     print(f"[CITIES_LOADER] [search_cities] 🔍 Поиск: '{query}', лимит: {limit}")
     
     if not query:
@@ -426,17 +1258,29 @@ def search_cities(query: str, limit: int = 10) -> List[dict]:
         return []
     
     query_norm = _normalize_name(query)
+    if _PREFIX_SIZE != len(CITY_TO_IATA):
+        _build_prefix_index()  # словарь дополнили мимо загрузчика
+    _schedule_popularity_refresh()
+
+    best: Dict[str, tuple] = {}  # IATA → лучший ключ сортировки среди его названий
+    i = bisect_left(_PREFIX_KEYS, query_norm)
+    while i < len(_PREFIX_KEYS) and _PREFIX_KEYS[i].startswith(query_norm):
+        name = _PREFIX_NAMES[i]
+        iata = CITY_TO_IATA.get(name)
+        if iata and iata in IATA_TO_CITY:
+            rank = (_PREFIX_KEYS[i] != query_norm, -CITY_POPULARITY.get(iata, 0.0),
+                    -_HUB_WEIGHT.get(iata, 0), len(name), name)
+            if iata not in best or rank < best[iata]:
+                best[iata] = rank
+        i += 1
+
     results = []
-    
-    for name, iata in CITY_TO_IATA.items():
-        if query_norm in name and iata in IATA_TO_CITY:
-            results.append({
-                "name": IATA_TO_CITY[iata],
-                "iata": iata,
-                "country": CITIES_DATA.get(iata, {}).get("country_code")
-            })
-            if len(results) >= limit:
-                break
+    for rank, iata in nsmallest(limit, ((r, c) for c, r in best.items())):
+        results.append({
+            "name": IATA_TO_CITY[iata],
+            "iata": iata,
+            "country": CITIES_DATA[iata].country_code if iata in CITIES_DATA else None
+        })
     
     print(f"[CITIES_LOADER] [search_cities] ✅ Найдено {len(results)} результатов")
     return results
@@ -450,8 +1294,8 @@ if __name__ == "__main__":
         print("🧪 [ТЕСТ] Запуск тестов cities_loader...")
         print("=" * 60 + "\n")
         
-        # Загружаем города
-        await load_cities_from_api()
+        # Загружаем города (дожидаемся обновления из API)
+        await load_cities_from_api(background_refresh=False)
         
         # Тестируем поиск
         print("\n" + "=" * 60)
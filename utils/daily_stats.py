@@ -179,6 +179,43 @@ async def health_check() -> dict:
     channel_id = os.getenv("ANALYTICS_CHANNEL_ID", "")
     results["Канал аналитики"] = "✅ Задан" if channel_id else "❌ Не задан"
 
+    # 7. Фоновые сервисы — heartbeat лидера каждой лизы (utils/leader_lock.py)
+    try:
+        from utils.leader_lock import get_heartbeats, LEASE_TTL
+        from services.worker import BACKGROUND_SERVICES
+        for name, hb in (await get_heartbeats(BACKGROUND_SERVICES)).items():
+            if hb is None:
+                results[f"Сервис {name}"] = "⚠️ Нет heartbeat"
+                continue
+            age = int(time.time() - hb["ts"])
+            mark = "✅" if age <= LEASE_TTL else "⚠️"
+            results[f"Сервис {name}"] = f"{mark} {hb['host']}:{hb['pid']} ({age}s назад)"
+    except Exception as e:
+        results["Фоновые сервисы"] = f"❌ {e}"
+
+    # 8. Отложенная доставка (бесплатный тариф) — просрочено = диспетчер не успевает / не запущен
+    try:
+        from services.delivery_queue import pending
+        total, overdue = await pending()
+        mark = "✅" if overdue == 0 else "⚠️"
+        results["Отложенные уведомления"] = f"{mark} {total} в очереди, просрочено {overdue}"
+    except Exception as e:
+        results["Отложенные уведомления"] = f"❌ {e}"
+
+    # 9. База городов — поколение таблиц и возраст данных API (обновляется в фоне)
+    try:
+        from utils.cities_loader import cities_db_info, CACHE_TTL_SECONDS
+        info = cities_db_info()
+        age = info["age_sec"]
+        mark = "✅" if age is not None and age < CACHE_TTL_SECONDS * 2 else "⚠️"
+        age_str = "—" if age is None else f"{age // 3600} ч"
+        results["База городов"] = (
+            f"{mark} {info['cities']} названий, {info['source']}, поколение {info['generation']}, возраст {age_str}"
+            + (" (обновляется)" if info["refreshing"] else "")
+        )
+    except Exception as e:
+        results["База городов"] = f"❌ {e}"
+
     return results
 
 
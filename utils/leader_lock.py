@@ -0,0 +1,170 @@
+# utils/leader_lock.py
+"""
+Redis-лиза (leader lock) для фоновых сервисов.
+
+Каждый сервис (price_watcher, hot_deals, daily_stats) работает только в том
+процессе, который держит его лизу. Остальные реплики ждут и перехватывают
+лизу, если лидер перестал её продлевать (упал / завис / редеплой).
+
+Ключи:
+  leader:{name}     — токен владельца, TTL = LEASE_TTL (SET NX PX)
+  heartbeat:{name}  — JSON {owner, host, pid, ts, since}, обновляется при продлении
+
+Продление и освобождение — Lua-скриптом «только если токен мой»,
+чтобы процесс, потерявший лизу, не снял чужую.
+Без Redis (REDIS_URL не задан) процесс считается единственным и всегда лидер.
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from utils.redis_client import redis_client
+from utils.logger import logger
+
+LEASE_TTL      = int(os.getenv("LEADER_LEASE_TTL", "60"))  # сек — сколько живёт лиза без продления
+RENEW_INTERVAL = LEASE_TTL / 3                             # продлеваем с запасом в 2 попытки
+RETRY_INTERVAL = LEASE_TTL / 2                             # как часто не-лидер пробует захватить
+
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    """Лиза на один именованный сервис."""
+
+    def __init__(self, name: str, ttl: int = LEASE_TTL):
+        self.name  = name
+        self.ttl   = ttl
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.since: Optional[float] = None
+
+    @property
+    def _key(self) -> str:
+        return f"{redis_client.prefix}leader:{self.name}"
+
+    @property
+    def _hb_key(self) -> str:
+        return f"{redis_client.prefix}heartbeat:{self.name}"
+
+    async def acquire(self) -> bool:
+        if not redis_client.client:
+            return True
+        ok = await redis_client.client.set(self._key, self.token, nx=True, px=self.ttl * 1000)
+        if ok:
+            self.since = time.time()
+            await self._heartbeat()
+        return bool(ok)
+
+    async def renew(self) -> bool:
+        if not redis_client.client:
+            return True
+        ok = await redis_client.client.eval(_RENEW_LUA, 1, self._key, self.token, self.ttl * 1000)
+        if ok:
+            await self._heartbeat()
+        return bool(ok)
+
+    async def release(self) -> None:
+        if not redis_client.client:
+            return
+        try:
+            await redis_client.client.eval(_RELEASE_LUA, 1, self._key, self.token)
+        except Exception as e:
+            logger.warning(f"[Leader] {self.name}: не удалось освободить лизу: {e}")
+        self.since = None
+
+    async def _heartbeat(self) -> None:
+        host, pid, _ = self.token.split(":")
+        await redis_client.client.set(
+            self._hb_key,
+            json.dumps({"owner": self.token, "host": host, "pid": int(pid),
+                        "ts": int(time.time()), "since": int(self.since or time.time())}),
+            ex=self.ttl * 3,
+        )
+
+
+async def run_as_leader(name: str, service: Callable[[], Awaitable], ttl: int = LEASE_TTL) -> None:
+    """
+    Запускает service() только пока держим лизу name.
+    Потеряли лизу — отменяем задачу сервиса и снова встаём в очередь.
+    Вызывать через asyncio.create_task(run_as_leader(...)).
+    """
+    lease = LeaderLease(name, ttl)
+    task: Optional[asyncio.Task] = None
+    last_ok = 0.0  # monotonic-время последнего успешного захвата/продления
+    try:
+        while True:
+            try:
+                if task is None:
+                    if await lease.acquire():
+                        last_ok = time.monotonic()
+                        logger.info(f"👑 [Leader] {name}: лиза получена ({lease.token})")
+                        task = asyncio.create_task(service())
+                    else:
+                        await asyncio.sleep(RETRY_INTERVAL)
+                        continue
+                elif not await lease.renew():
+                    logger.warning(f"⚠️ [Leader] {name}: лиза потеряна — останавливаю сервис")
+                    task.cancel()
+                    task = None
+                    continue
+                else:
+                    last_ok = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Redis моргнул — не роняем сервис сразу, лиза ещё жива ttl секунд
+                logger.warning(f"[Leader] {name}: ошибка продления: {e}")
+                # …но до следующей попытки она может истечь — тогда её захватит другая реплика
+                if task is not None and time.monotonic() - last_ok >= ttl - RENEW_INTERVAL:
+                    logger.warning(f"⚠️ [Leader] {name}: лиза не продлевалась {ttl}с — останавливаю сервис")
+                    task.cancel()
+                    task = None
+
+            if task is not None and task.done():
+                if not task.cancelled() and task.exception():
+                    logger.error(f"❌ [Leader] {name}: сервис упал: {task.exception()}")
+                task = None
+                try:
+                    await lease.release()
+                except Exception as e:
+                    logger.warning(f"[Leader] {name}: ошибка освобождения лизы: {e}")
+                await asyncio.sleep(RETRY_INTERVAL)
+                continue
+            await asyncio.sleep(RENEW_INTERVAL)
+    finally:
+        if task is not None:
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, timeout=5.0)
+            except (asyncio.CancelledError, asyncio.TimeoutError, Exception):
+                pass
+        await lease.release()
+
+
+async def get_heartbeats(names) -> Dict[str, Optional[dict]]:
+    """Последние heartbeat'ы сервисов: {name: {...} | None} — для health check."""
+    if not redis_client.client:
+        return {n: None for n in names}
+    result = {}
+    for n in names:
+        raw = await redis_client.client.get(f"{redis_client.prefix}heartbeat:{n}")
+        try:
+            result[n] = json.loads(raw) if raw else None
+        except Exception:
+            result[n] = None
+    return result
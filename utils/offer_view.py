@@ -0,0 +1,145 @@
+# utils/offer_view.py
+"""
+Локальные фильтры и сортировки результатов поиска.
+
+Поиск один раз кеширует все найденные предложения без фильтра (offers в
+search-кеше), а тип рейса, окно вылета, авиакомпания, предельное время в пути
+и порядок сортировки применяются к ним здесь — без повторных запросов к API.
+
+Порядки сортировки считаются один раз при поиске (sort_indexes) и лежат в
+кэше рядом с предложениями: смена вида и листание страниц браузера вариантов
+только проходят по готовому индексу, без повторной сортировки.
+
+Состояние экрана — View; в callback_data оно кодируется строкой до 7 символов:
+  тип(a|d|x) окно(-|m|d|e|n) сортировка(p|d|t) часы(2 цифры) авиакомпания(0-2)
+  «a-p00» — все рейсы по цене, «dmd08SU» — прямые утром до 8ч Аэрофлотом по длительности.
+"""
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+TYPES = {"a": "все рейсы", "d": "прямые", "x": "с пересадками"}
+TIME_WINDOWS = {               # код → (с, до, подпись); часы местного времени вылета
+    "m": (6, 12, "утро"),
+    "d": (12, 18, "день"),
+    "e": (18, 24, "вечер"),
+    "n": (0, 6, "ночь"),
+}
+SORTS = {"p": "по цене", "d": "по времени в пути", "t": "по времени вылета"}
+DURATION_STEPS = (4, 8, 12, 24)  # варианты «в пути не дольше, ч»
+AIRLINES_IN_MENU = 4             # сколько авиакомпаний предлагать в фильтре
+PAGE_SIZE        = 5             # вариантов на странице браузера
+
+_FLIGHT_TYPE_CODES = {"direct": "d", "transfer": "x"}
+
+
+class View(NamedTuple):
+    type: str = "a"      # a — все, d — прямые, x — с пересадками
+    time: str = "-"      # окно вылета из TIME_WINDOWS, «-» — любое
+    sort: str = "p"      # порядок из SORTS
+    max_hours: int = 0   # в пути не дольше, ч; 0 — без ограничения
+    airline: str = ""    # IATA-код авиакомпании, «» — любая
+
+    def encode(self) -> str:
+        return f"{self.type}{self.time}{self.sort}{self.max_hours:02d}{self.airline}"
+
+
+def decode_view(code: str) -> View:
+    """Строка из callback_data → View; мусор даёт вид по умолчанию."""
+    try:
+        view = View(code[0], code[1], code[2], int(code[3:5]), code[5:7])
+    except (IndexError, ValueError):
+        return View()
+    if view.type not in TYPES or view.sort not in SORTS or (view.time != "-" and view.time not in TIME_WINDOWS):
+        return View()
+    return view
+
+
+def view_for_flight_type(flight_type: str) -> View:
+    """Начальный вид по выбранному в мастере типу рейса (all/direct/transfer)."""
+    return View(type=_FLIGHT_TYPE_CODES.get(flight_type, "a"))
+
+
+# ══════════════════════════════════════════════════════════════════
+# Фильтры и сортировка
+# ══════════════════════════════════════════════════════════════════
+
+def _price(flight: Dict) -> float:
+    return float(flight.get("value") or flight.get("price") or 999_999_999)
+
+
+def _hour(flight: Dict) -> Optional[int]:
+    """Час вылета из departure_at (ГГГГ-ММ-ДДTЧЧ:ММ…), None — время неизвестно."""
+    try:
+        return int(str(flight.get("departure_at", ""))[11:13])
+    except ValueError:
+        return None
+
+
+def _matches(flight: Dict, view: View) -> bool:
+    transfers = flight.get("transfers")
+    if view.type == "d" and transfers != 0:
+        return False
+    if view.type == "x" and not transfers:
+        return False
+    if view.time != "-":
+        start, end, _ = TIME_WINDOWS[view.time]
+        hour = _hour(flight)
+        if hour is None or not start <= hour < end:
+            return False
+    if view.airline and flight.get("airline") != view.airline:
+        return False
+    if view.max_hours and not 0 < (flight.get("duration") or 0) <= view.max_hours * 60:
+        return False
+    return True
+
+
+_SORT_KEYS = {
+    "p": lambda f: (_price(f), str(f.get("departure_at", ""))),
+    "d": lambda f: (f.get("duration") or 10 ** 6, _price(f)),
+    "t": lambda f: (str(f.get("departure_at", "")), _price(f)),
+}
+
+
+def _filtered(view: View) -> bool:
+    return view._replace(sort="p") != View()
+
+
+def sort_indexes(flights: List[Dict]) -> Dict[str, List[int]]:
+    """Индексы flights в каждом порядке из SORTS — считаются один раз и кешируются."""
+    return {code: sorted(range(len(flights)), key=lambda i: key(flights[i])) for code, key in _SORT_KEYS.items()}
+
+
+def apply_view(flights: List[Dict], view: View, order: Optional[Dict[str, List[int]]] = None) -> List[Dict]:
+    """Предложения, прошедшие фильтры вида, в его порядке; с order — без сортировки."""
+    if order is None:
+        return sorted((f for f in flights if _matches(f, view)), key=_SORT_KEYS[view.sort])
+    return [flights[i] for i in order[view.sort] if _matches(flights[i], view)]
+
+
+def page(
+    flights: List[Dict], order: Dict[str, List[int]], view: View, number: int, size: int = PAGE_SIZE,
+) -> Tuple[List[Dict], int]:
+    """Страница number (с 0) вида view срезом готового индекса и сколько всего вариантов."""
+    idx = order[view.sort]
+    if _filtered(view):
+        idx = [i for i in idx if _matches(flights[i], view)]
+    start = number * size
+    return [flights[i] for i in idx[start:start + size]], len(idx)
+
+
+def airlines(flights: List[Dict], limit: int = AIRLINES_IN_MENU) -> List[str]:
+    """Самые частые авиакомпании среди предложений — кандидаты для фильтра."""
+    counts = Counter(f.get("airline") for f in flights if f.get("airline"))
+    return [code for code, _ in counts.most_common(limit)]
+
+
+def describe(view: View) -> str:
+    """Короткая подпись активных фильтров: «прямые · утро · до 8ч · SU»."""
+    parts = [TYPES[view.type]] if view.type != "a" else []
+    if view.time != "-":
+        parts.append(TIME_WINDOWS[view.time][2])
+    if view.max_hours:
+        parts.append(f"до {view.max_hours}ч в пути")
+    if view.airline:
+        parts.append(view.airline)
+    return " · ".join(parts)
@@ -0,0 +1,122 @@
+# utils/progressive.py
+"""
+Потоковый сбор переборов (хабы «Везде», города страны, пары аэропортов).
+
+gather_streaming — замена asyncio.gather: результат каждого плеча отдаётся
+в on_result сразу, как только плечо ответило, а плечи, не уложившиеся в
+бюджет задержки, отменяются. LegProgress — готовый on_result для экрана
+ожидания: «пока лучшее: …», правки сообщения не чаще EDIT_INTERVAL.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from utils.cities_loader import get_city_name
+from utils.logger import logger
+
+EDIT_INTERVAL = 1.5  # секунд между правками одного сообщения (лимиты Telegram)
+
+OnResult = Callable[[Hashable, Any], Awaitable[None]]
+
+
+async def gather_streaming(
+    coros: Dict[Hashable, Awaitable],
+    on_result: Optional[OnResult] = None,
+    budget: Optional[float] = None,
+    grace: Optional[float] = None,
+) -> Dict[Hashable, Any]:
+    """
+    Запускает плечи параллельно, возвращает {ключ: результат} ответивших.
+    budget — сколько секунд ждать всех; grace — сколько ждать остальных после
+    первого непустого ответа. Упавшие плечи пропускаются, опоздавшие отменяются.
+    """
+    loop  = asyncio.get_running_loop()
+    tasks = {asyncio.ensure_future(c): key for key, c in coros.items()}
+    deadline = loop.time() + budget if budget is not None else None
+    results: Dict[Hashable, Any] = {}
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = None if deadline is None else deadline - loop.time()
+            if timeout is not None and timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = tasks[task]
+                if task.exception() is not None:
+                    logger.warning(f"[Stream] Ошибка плеча {key}: {task.exception()}")
+                    continue
+                results[key] = task.result()
+                if grace is not None and results[key]:
+                    first = loop.time() + grace
+                    deadline = first if deadline is None else min(deadline, first)
+                if on_result:
+                    try:
+                        await on_result(key, results[key])
+                    except Exception as e:
+                        logger.debug(f"[Stream] on_result {key}: {e}")
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"[Stream] Отменено по бюджету: {sorted(map(str, (tasks[t] for t in pending)))}")
+    return results
+
+
+class ThrottledEditor:
+    """edit_text не чаще interval секунд; одинаковый текст не отправляется."""
+
+    def __init__(self, message, interval: float = EDIT_INTERVAL):
+        self.message  = message
+        self.interval = interval
+        self._last    = 0.0
+        self._text: Optional[str] = None
+
+    async def edit(self, text: str, **kwargs) -> bool:
+        now = time.monotonic()
+        if text == self._text or now - self._last < self.interval:
+            return False
+        self._last, self._text = now, text
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except Exception:
+            pass
+        return True
+
+
+def _price(flight: dict) -> float:
+    return flight.get("value") or flight.get("price") or 999_999
+
+
+def progress_text(done: int, total: Optional[int], best: Optional[dict]) -> str:
+    """Экран ожидания: сколько плеч ответило и самый дешёвый билет на сейчас."""
+    counter = f"{done}/{total}" if total else f"{done}"
+    text = f"⏳ <b>Ищу билеты...</b>\n<i>Проверено направлений: {counter}</i>"
+    if best:
+        origin, dest = best.get("origin", ""), best.get("destination", "")
+        price = int(float(_price(best)))
+        text += (
+            f"\n\nПока лучшее: {get_city_name(origin) or origin} → {get_city_name(dest) or dest}"
+            f" — <b>{price:,} ₽</b>".replace(",", " ")
+        )
+    return text
+
+
+class LegProgress:
+    """on_result для gather_streaming: копит лучший билет и правит экран ожидания."""
+
+    def __init__(self, message, total: Optional[int] = None,
+                 keep: Optional[Callable[[dict], bool]] = None, interval: float = EDIT_INTERVAL):
+        self.editor = ThrottledEditor(message, interval)
+        self.total  = total
+        self.keep   = keep or (lambda f: True)
+        self.done   = 0
+        self.best: Optional[dict] = None
+
+    async def __call__(self, _key: Hashable, flights: List[dict]) -> None:
+        self.done += 1
+        for f in flights or []:
+            if self.keep(f) and (self.best is None or _price(f) < _price(self.best)):
+                self.best = f
+        await self.editor.edit(progress_text(self.done, self.total, self.best), parse_mode="HTML")
@@ -212,6 +212,13 @@ class RedisClient:
                 await self.client.srem(f"{self.prefix}hotsubs:{user_id}", sid)
         return result
 
+    async def get_hot_sub(self, user_id: int, sub_id: str) -> Optional[dict]:
+        """Одна подписка или None (удалена / истекла)."""
+        if not self.client:
+            return None
+        raw = await self.client.get(f"{self.prefix}hotsub:{user_id}:{sub_id}")
+        return json.loads(raw) if raw else None
+
     async def get_all_hot_subs(self) -> list:
         """Вернуть все подписки всех пользователей: [(user_id, sub_id, sub_data), ...]."""
         if not self.client:
@@ -311,6 +318,34 @@ class RedisClient:
             return
         await self.client.set(f"{self.prefix}route_cd:{sub_id}:{dest}", "1", ex=cooldown)
 
+    async def get_routes_on_cooldown(self, sub_id: str, dests: List[str]) -> set:
+        """Какие из dests сейчас на кулдауне по подписке — один pipeline вместо N EXISTS."""
+        if not self.client or not dests:
+            return set()
+        pipe = self.client.pipeline(transaction=False)
+        for dest in dests:
+            pipe.exists(f"{self.prefix}route_cd:{sub_id}:{dest}")
+        flags = await pipe.execute()
+        return {dest for dest, flag in zip(dests, flags) if flag}
+
+    async def get_routes_on_cooldown_many(
+        self, pairs: List[tuple], chunk: int = 5000,
+    ) -> Dict[str, set]:
+        """[(sub_id, [dest, ...]), ...] → {sub_id: {dest на кулдауне}}; pipeline порциями по chunk."""
+        flat = [(sub_id, dest) for sub_id, dests in pairs for dest in dests]
+        result: Dict[str, set] = {}
+        if not self.client or not flat:
+            return result
+        for i in range(0, len(flat), chunk):
+            part = flat[i:i + chunk]
+            pipe = self.client.pipeline(transaction=False)
+            for sub_id, dest in part:
+                pipe.exists(f"{self.prefix}route_cd:{sub_id}:{dest}")
+            for (sub_id, dest), flag in zip(part, await pipe.execute()):
+                if flag:
+                    result.setdefault(sub_id, set()).add(dest)
+        return result
+
     # ── Кеш пустых маршрутов ────────────────────────────────────────────────
     # Aviasales grouped_prices кешируется ~48ч на их стороне.
     # Если маршрут вернул пустой ответ — не опрашиваем снова раньше TTL.
@@ -352,6 +387,167 @@ class RedisClient:
         except Exception:
             pass
 
+    # ── Карта цен «Везде» (services/everywhere_engine.py) ───────────────────
+    # HASH anywhere:{side}:{IATA}:{ГГГГ-ММ}: поле — день, значение — JSON
+    # {ts, flights}: самые дешёвые билеты в каждый город (side=from) или из
+    # каждого (side=to). Поиск «Везде» и слежения «Везде» читают одну карту.
+    # Свежесть — по ts дня, TTL ключа продлевается при каждой записи.
+
+    ANYWHERE_TTL = 6 * 3600  # цены Data API и так кешированы — 6ч достаточно свежо
+
+    def _fresh_flights(self, raw: Optional[str], ttl: int) -> Optional[List[Dict[str, Any]]]:
+        """JSON {ts, flights} → flights, если запись моложе ttl."""
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["flights"] if time.time() - entry.get("ts", 0) < ttl else None
+
+    async def get_anywhere_day(self, side: str, iata: str, day: str) -> Optional[List[Dict[str, Any]]]:
+        if not self.client:
+            return None
+        try:
+            raw = await self.client.hget(f"{self.prefix}anywhere:{side}:{iata}:{day[:7]}", day)
+            return self._fresh_flights(raw, self.ANYWHERE_TTL)
+        except Exception:
+            return None
+
+    async def set_anywhere_day(self, side: str, iata: str, day: str, flights: List[Dict[str, Any]]) -> None:
+        if not self.client:
+            return
+        key = f"{self.prefix}anywhere:{side}:{iata}:{day[:7]}"
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(key, day, json.dumps({"ts": int(time.time()), "flights": flights}, ensure_ascii=False))
+            pipe.expire(key, self.ANYWHERE_TTL)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    # ── Кеш поиска по стране (services/country_prices.py) ──────────────────
+    # HASH country:{origin}:{ISO}:{ГГГГ-ММ}:{a|d}: поле — город страны, значение —
+    # JSON {ts, flights}: календарь grouped_prices маршрута на месяц (d — только
+    # прямые). Любой день месяца считается из календарей без запросов к API.
+
+    COUNTRY_TTL = 6 * 3600  # календарь Data API и так кеширован — 6ч достаточно свежо
+
+    def _country_key(self, origin: str, iso: str, month: str, direct: bool) -> str:
+        return f"{self.prefix}country:{origin}:{iso}:{month}:{'d' if direct else 'a'}"
+
+    async def get_country_month(self, origin: str, iso: str, month: str, direct: bool) -> Dict[str, List[Dict[str, Any]]]:
+        """{город: календарь} — только свежие записи."""
+        if not self.client:
+            return {}
+        try:
+            raw = await self.client.hgetall(self._country_key(origin, iso, month, direct))
+            fresh = {dest: self._fresh_flights(value, self.COUNTRY_TTL) for dest, value in raw.items()}
+            return {dest: flights for dest, flights in fresh.items() if flights is not None}
+        except Exception:
+            return {}
+
+    async def set_country_routes(self, origin: str, iso: str, month: str, direct: bool,
+                                 calendars: Dict[str, List[Dict[str, Any]]]) -> None:
+        if not self.client or not calendars:
+            return
+        key = self._country_key(origin, iso, month, direct)
+        ts = int(time.time())
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(key, mapping={
+                dest: json.dumps({"ts": ts, "flights": flights}, ensure_ascii=False)
+                for dest, flights in calendars.items()
+            })
+            pipe.expire(key, self.COUNTRY_TTL)
+            await pipe.execute()
+        except Exception:
+            pass
+
+    # ── Календарь маршрута (services/flex_dates.py) ────────────────────────
+    # calendar:{origin}:{dest}:{ГГГГ-ММ}:{a|d} — JSON {ts, flights}: ответ
+    # grouped_prices на месяц (по билету на день). Гибкие даты строят из него
+    # окно ±N дней и матрицу туда × обратно.
+
+    CALENDAR_TTL = 6 * 3600
+
+    async def get_route_calendar(self, origin: str, dest: str, month: str, direct: bool) -> Optional[List[Dict[str, Any]]]:
+        if not self.client:
+            return None
+        try:
+            raw = await self.client.get(f"{self.prefix}calendar:{origin}:{dest}:{month}:{'d' if direct else 'a'}")
+            return self._fresh_flights(raw, self.CALENDAR_TTL)
+        except Exception:
+            return None
+
+    async def set_route_calendar(self, origin: str, dest: str, month: str, direct: bool,
+                                 flights: List[Dict[str, Any]]) -> None:
+        if not self.client:
+            return
+        try:
+            await self.client.set(
+                f"{self.prefix}calendar:{origin}:{dest}:{month}:{'d' if direct else 'a'}",
+                json.dumps({"ts": int(time.time()), "flights": flights}, ensure_ascii=False),
+                ex=self.CALENDAR_TTL,
+            )
+        except Exception:
+            pass
+
+    # ── Статистика кандидатов перебора (services/hub_selector.py) ───────────
+    # HASH hubstat:{side}:{IATA}: поля {кандидат}:n — сколько раз спрашивали,
+    # {кандидат}:hit — сколько раз ответ был непустым. Пустые ответы заодно
+    # ставят route_empty (как route_queue), непустые — снимают.
+    # LIST hubobs — журнал наблюдений для офлайн-оценки (bench/hub_selection_eval.py).
+
+    HUB_STATS_TTL = 30 * 24 * 3600  # статистика без новых наблюдений живёт месяц
+    HUB_OBS_MAX   = 5000            # длина журнала наблюдений
+
+    async def get_hub_stats(self, side: str, iata: str) -> Dict[str, List[int]]:
+        """{кандидат: [n, hit]} по городу iata."""
+        if not self.client:
+            return {}
+        try:
+            raw = await self.client.hgetall(f"{self.prefix}hubstat:{side}:{iata}")
+        except Exception:
+            return {}
+        stats: Dict[str, List[int]] = {}
+        for field, value in raw.items():
+            cand, _, kind = field.partition(":")
+            stats.setdefault(cand, [0, 0])[kind == "hit"] = int(value)
+        return stats
+
+    async def get_empty_routes(self, routes: List[tuple]) -> set:
+        """Маршруты (origin, dest) с меткой route_empty — один pipeline."""
+        if not self.client or not routes:
+            return set()
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for origin, dest in routes:
+                pipe.exists(f"{self.prefix}route_empty:{origin}:{dest}")
+            return {r for r, flag in zip(routes, await pipe.execute()) if flag}
+        except Exception:
+            return set()
+
+    async def record_hub_observation(self, side: str, iata: str, day: str, prices: Dict[str, int]) -> None:
+        """prices: {кандидат: минимальная цена, 0 — пустой ответ}."""
+        if not self.client or not prices:
+            return
+        key = f"{self.prefix}hubstat:{side}:{iata}"
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for cand, price in prices.items():
+                origin, dest = (iata, cand) if side == "from" else (cand, iata)
+                pipe.hincrby(key, f"{cand}:n", 1)
+                if price:
+                    pipe.hincrby(key, f"{cand}:hit", 1)
+                    pipe.delete(f"{self.prefix}route_empty:{origin}:{dest}")
+                else:
+                    pipe.set(f"{self.prefix}route_empty:{origin}:{dest}", "1", ex=self.EMPTY_ROUTE_TTL)
+            pipe.expire(key, self.HUB_STATS_TTL)
+            entry = {"ts": int(time.time()), "side": side, "iata": iata, "day": day, "prices": prices}
+            pipe.lpush(f"{self.prefix}hubobs", json.dumps(entry))
+            pipe.ltrim(f"{self.prefix}hubobs", 0, self.HUB_OBS_MAX - 1)
+            await pipe.execute()
+        except Exception:
+            pass
+
 
     # ════════════════════════════════════════════════════════════════
     # Analytics
@@ -530,5 +726,19 @@ class RedisClient:
 
         return result
 
+    async def get_city_popularity(self) -> Dict[str, float]:
+        """Популярность городов для автокомплита: сумма analytics:dest_cities и analytics:origin_cities."""
+        if not self.client:
+            return {}
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrange(f"{self.prefix}analytics:dest_cities", 0, -1, withscores=True)
+        pipe.zrange(f"{self.prefix}analytics:origin_cities", 0, -1, withscores=True)
+        result: Dict[str, float] = {}
+        for rows in await pipe.execute():
+            for member, score in rows:
+                member = member.decode() if isinstance(member, bytes) else member
+                result[member] = result.get(member, 0.0) + float(score)
+        return result
+
 # Singleton
 redis_client = RedisClient()
\ No newline at end of file